@@ -0,0 +1,207 @@
+# cython: language_level=3
+
+from libc.stdlib cimport malloc, free
+from libc.string cimport memset
+from cython cimport view
+
+from cysounddevice.types cimport *
+from cysounddevice.buffer cimport (
+    SampleBuffer,
+    BufferItem,
+    SampleLayout,
+    SampleLayout_interleaved,
+    SampleLayout_non_interleaved,
+    sample_buffer_create,
+    sample_buffer_destroy,
+    sample_buffer_write,
+    sample_buffer_write_sf32,
+    sample_buffer_write_frames_sf32,
+    sample_buffer_read,
+    sample_buffer_read_sf32,
+    sample_buffer_read_frames_sf32,
+)
+
+
+cdef class LayoutBenchmark:
+    """Fill and drain a :c:type:`SampleBuffer` using either its slab allocation
+    or one allocation per :c:type:`BufferItem` (the previous layout)
+
+    Each round writes raw interleaved blocks into every item (as the stream
+    callback does) then reads them all back as float32 (as the consumer does).
+
+    Arguments:
+        layout (str): Either ``'slab'`` or ``'scattered'``
+        nchannels (int):
+        block_size (int):
+        sample_format (str):
+        length (int): Number of items in the buffer
+        use_hugepages (bool):
+    """
+    cdef SampleBuffer* bfr
+    cdef char **slab_ptrs
+    cdef char *callback_data
+    cdef float[:,:] block
+    cdef readonly str layout
+    cdef readonly Py_ssize_t nchannels, block_size, length
+    def __cinit__(self, str layout, Py_ssize_t nchannels, Py_ssize_t block_size,
+                  str sample_format, Py_ssize_t length=32, bint use_hugepages=False):
+        cdef SampleTime st = SampleTime(0, 0, block_size, 48000)
+        cdef SampleFormat* fmt = get_sample_format_by_name(sample_format)
+        cdef Py_ssize_t i
+        cdef BufferItem* item
+        self.layout = layout
+        self.nchannels = nchannels
+        self.block_size = block_size
+        self.length = length
+        self.slab_ptrs = NULL
+        self.bfr = sample_buffer_create(st.data, length, nchannels, fmt, use_hugepages)
+        self.callback_data = <char *>malloc(self.bfr.items[0].total_size)
+        if self.callback_data == NULL:
+            raise MemoryError()
+        memset(self.callback_data, 0, self.bfr.items[0].total_size)
+        self.block = view.array(shape=(nchannels, block_size), itemsize=sizeof(float), format='f')
+        if layout == 'scattered':
+            self.slab_ptrs = <char **>malloc(sizeof(char*) * length)
+            if self.slab_ptrs == NULL:
+                raise MemoryError()
+            for i in range(length):
+                item = &self.bfr.items[i]
+                self.slab_ptrs[i] = item.bfr
+                item.bfr = <char *>malloc(item.total_size)
+                if item.bfr == NULL:
+                    raise MemoryError()
+                memset(item.bfr, 0, item.total_size)
+        elif layout != 'slab':
+            raise ValueError('Unknown layout "{}"'.format(layout))
+    def __dealloc__(self):
+        cdef Py_ssize_t i
+        cdef BufferItem* item
+        if self.bfr == NULL:
+            return
+        if self.slab_ptrs != NULL:
+            for i in range(self.length):
+                item = &self.bfr.items[i]
+                if item.bfr != self.slab_ptrs[i]:
+                    free(item.bfr)
+                item.bfr = self.slab_ptrs[i]
+            free(self.slab_ptrs)
+            self.slab_ptrs = NULL
+        sample_buffer_destroy(self.bfr)
+        self.bfr = NULL
+        free(self.callback_data)
+        self.callback_data = NULL
+
+    def run(self, Py_ssize_t nrounds):
+        with nogil:
+            self._run(nrounds)
+
+    cdef void _run(self, Py_ssize_t nrounds) nogil:
+        cdef Py_ssize_t i, j
+        for i in range(nrounds):
+            for j in range(self.length):
+                sample_buffer_write(self.bfr, self.callback_data, self.block_size)
+            for j in range(self.length):
+                sample_buffer_read_sf32(self.bfr, self.block)
+
+
+THROUGHPUT_APIS = ('raw', 'sf32', 'frames')
+
+cdef class ThroughputBenchmark:
+    """Fill a :c:type:`SampleBuffer` then drain it, counting the frames moved
+
+    Arguments:
+        api (str): ``'raw'`` to copy packed samples with :c:func:`sample_buffer_write`
+            and :c:func:`sample_buffer_read`, ``'sf32'`` to convert one block
+            at a time with :c:func:`sample_buffer_write_sf32` and
+            :c:func:`sample_buffer_read_sf32` or ``'frames'`` to convert
+            one and a half blocks at a time with the frame-granular functions
+        layout (str): Either ``'interleaved'`` or ``'non_interleaved'``
+        nchannels (int):
+        block_size (int):
+        sample_format (str):
+        length (int): Number of items in the buffer
+    """
+    cdef SampleBuffer* bfr
+    cdef char *raw_data
+    cdef float[:,:] block
+    cdef int api_mode
+    cdef readonly str api, layout
+    cdef readonly Py_ssize_t nchannels, block_size, length
+    def __cinit__(self, str api, str layout, Py_ssize_t nchannels, Py_ssize_t block_size,
+                  str sample_format, Py_ssize_t length=32):
+        cdef SampleTime st = SampleTime(0, 0, block_size, 48000)
+        cdef SampleFormat* fmt = get_sample_format_by_name(sample_format)
+        cdef SampleLayout _layout
+        cdef Py_ssize_t chunk_size = block_size
+        self.bfr = NULL
+        self.raw_data = NULL
+        if api not in THROUGHPUT_APIS:
+            raise ValueError(f'Invalid api: {api}')
+        self.api_mode = THROUGHPUT_APIS.index(api)
+        if layout == 'interleaved':
+            _layout = SampleLayout_interleaved
+        elif layout == 'non_interleaved':
+            _layout = SampleLayout_non_interleaved
+        else:
+            raise ValueError(f'Invalid layout: {layout}')
+        self.api = api
+        self.layout = layout
+        self.nchannels = nchannels
+        self.block_size = block_size
+        self.length = length
+        self.bfr = sample_buffer_create(st.data, length, nchannels, fmt, False, _layout)
+        self.raw_data = <char *>malloc(self.bfr.items[0].total_size)
+        if self.raw_data == NULL:
+            raise MemoryError()
+        memset(self.raw_data, 0, self.bfr.items[0].total_size)
+        if api == 'frames':
+            chunk_size += block_size // 2
+        if _layout == SampleLayout_interleaved:
+            self.block = view.array(
+                shape=(chunk_size, nchannels), itemsize=sizeof(float), format='f',
+            )
+        else:
+            self.block = view.array(
+                shape=(nchannels, chunk_size), itemsize=sizeof(float), format='f',
+            )
+        self.block[...] = 0
+    def __dealloc__(self):
+        if self.bfr != NULL:
+            sample_buffer_destroy(self.bfr)
+            self.bfr = NULL
+        free(self.raw_data)
+        self.raw_data = NULL
+
+    def run(self, Py_ssize_t nrounds):
+        """Fill and drain the buffer *nrounds* times
+
+        Returns the number of frames moved through the buffer
+        """
+        cdef Py_ssize_t frames
+        with nogil:
+            frames = self._run(nrounds)
+        return frames
+
+    cdef Py_ssize_t _run(self, Py_ssize_t nrounds) nogil:
+        cdef Py_ssize_t i, n, total = 0
+        cdef SampleBuffer* bfr = self.bfr
+        cdef Py_ssize_t block_size = self.block_size
+        for i in range(nrounds):
+            if self.api_mode == 0:
+                while sample_buffer_write(bfr, self.raw_data, block_size):
+                    total += block_size
+                while sample_buffer_read(bfr, self.raw_data, block_size) != NULL:
+                    pass
+            elif self.api_mode == 1:
+                while sample_buffer_write_sf32(bfr, self.block):
+                    total += block_size
+                while sample_buffer_read_sf32(bfr, self.block) != NULL:
+                    pass
+            else:
+                n = sample_buffer_write_frames_sf32(bfr, self.block)
+                while n > 0:
+                    total += n
+                    n = sample_buffer_write_frames_sf32(bfr, self.block)
+                while sample_buffer_read_frames_sf32(bfr, self.block) > 0:
+                    pass
+        return total
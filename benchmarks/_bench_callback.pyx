@@ -0,0 +1,213 @@
+# cython: language_level=3
+
+cimport cython
+from libc.stdlib cimport malloc, free
+from libc.string cimport memset
+
+from cysounddevice.pawrapper cimport *
+from cysounddevice.types cimport *
+from cysounddevice.buffer cimport (
+    SampleLayout,
+    SampleLayout_interleaved,
+    SampleLayout_non_interleaved,
+    sample_buffer_create,
+    sample_buffer_destroy,
+    sample_buffer_write,
+    sample_buffer_read,
+)
+from cysounddevice.processing cimport *
+from cysounddevice.stream_callback cimport (
+    CallbackUserData,
+    CallbackError_none,
+    _stream_callback,
+)
+from cysounddevice.stats cimport callback_stats_init
+from cysounddevice.clock cimport clock_estimator_init
+from cysounddevice.underrun cimport (
+    underrun_handler_create, underrun_handler_destroy, get_underrun_policy,
+)
+from cysounddevice.routing cimport channel_routing_create, channel_routing_destroy
+
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+cdef int copy_process(void *state,
+                      const float **inputs,
+                      float **outputs,
+                      int input_channels,
+                      int output_channels,
+                      unsigned long nframes,
+                      const SampleTime_s *sample_time) nogil:
+    """Add each input channel to the output channel of the same index
+    """
+    cdef int c
+    cdef unsigned long i
+    for c in range(output_channels):
+        for i in range(nframes):
+            outputs[c][i] = outputs[c][i] + inputs[c][i]
+    return 0
+
+
+def _routing_gains(int nchannels, int buffer_channels, bint mix):
+    """Gain rows for the input (buffer x device) and output (device x buffer)
+    """
+    in_gains = [[0.] * nchannels for i in range(buffer_channels)]
+    out_gains = [[0.] * buffer_channels for i in range(nchannels)]
+    for j in range(buffer_channels):
+        if mix:
+            in_gains[j][2 * j] = in_gains[j][2 * j + 1] = .5
+            out_gains[2 * j][j] = out_gains[2 * j + 1][j] = .5
+        else:
+            in_gains[j][j] = 1.
+            out_gains[j][j] = 1.
+    return in_gains, out_gains
+
+
+cdef class CallbackBenchmark:
+    """Drive :c:func:`_stream_callback` for a full duplex stream with a
+    synthetic :c:type:`PaStreamCallbackTimeInfo`
+
+    Each round writes one block to the output :c:type:`SampleBuffer` (as the
+    application would), calls the stream callback and reads the captured block
+    back from the input buffer.
+
+    Arguments:
+        sample_format (str):
+        planar (bool): Use ``non_interleaved`` host buffers
+        nchannels (int):
+        block_size (int):
+        process (bool): Install a :c:type:`ProcessHook` copying the inputs
+            to the outputs
+        underrun_policy (str, optional): If given, no output is written and
+            every callback conceals an underrun using this policy
+        length (int): Number of items in the stream buffers
+        buffer_channels (int): If given, the stream buffers have this many
+            channels, routed from (and to) the first *nchannels* device
+            channels
+        mix (bool): If True, each buffer channel is mixed from (and to) two
+            device channels instead of being selected
+    """
+    cdef CallbackUserData user_data
+    cdef PaStreamCallbackTimeInfo time_info
+    cdef char *in_data
+    cdef char *out_data
+    cdef char *app_data
+    cdef void **in_planes
+    cdef void **out_planes
+    cdef bint write_output
+    cdef readonly bint planar
+    cdef readonly int nchannels
+    cdef readonly Py_ssize_t block_size
+    def __cinit__(self, str sample_format, bint planar, int nchannels,
+                  Py_ssize_t block_size, bint process=False,
+                  str underrun_policy=None, Py_ssize_t length=8,
+                  int buffer_channels=0, bint mix=False):
+        cdef SampleTime st = SampleTime(0, 0, block_size, 48000)
+        cdef SampleFormat* fmt = get_sample_format_by_name(sample_format)
+        cdef SampleLayout layout = SampleLayout_interleaved
+        cdef Py_ssize_t itemsize = fmt.bit_width // 8, nbytes, c
+        memset(&self.user_data, 0, sizeof(CallbackUserData))
+        memset(&self.time_info, 0, sizeof(PaStreamCallbackTimeInfo))
+        self.planar = planar
+        self.nchannels = nchannels
+        self.block_size = block_size
+        self.write_output = underrun_policy is None
+        if planar:
+            layout = SampleLayout_non_interleaved
+        nbytes = nchannels * block_size * itemsize
+        self.in_data = <char *>malloc(nbytes)
+        self.out_data = <char *>malloc(nbytes)
+        self.app_data = <char *>malloc(nbytes)
+        self.in_planes = <void **>malloc(nchannels * sizeof(void *))
+        self.out_planes = <void **>malloc(nchannels * sizeof(void *))
+        if (self.in_data == NULL or self.out_data == NULL or self.app_data == NULL or
+                self.in_planes == NULL or self.out_planes == NULL):
+            raise MemoryError()
+        memset(self.in_data, 0, nbytes)
+        memset(self.app_data, 0, nbytes)
+        for c in range(nchannels):
+            self.in_planes[c] = self.in_data + c * block_size * itemsize
+            self.out_planes[c] = self.out_data + c * block_size * itemsize
+
+        self.user_data.input_channels = nchannels
+        self.user_data.output_channels = nchannels
+        self.user_data.error_status = CallbackError_none
+        self.user_data.notify_fd = -1
+        callback_stats_init(&self.user_data.stats, 48000)
+        clock_estimator_init(&self.user_data.input_clock, 48000, .2)
+        clock_estimator_init(&self.user_data.output_clock, 48000, .2)
+        if buffer_channels <= 0:
+            buffer_channels = nchannels
+        else:
+            in_gains, out_gains = _routing_gains(nchannels, buffer_channels, mix)
+            self.user_data.in_routing = channel_routing_create(
+                in_gains, nchannels, fmt, block_size,
+            )
+            self.user_data.out_routing = channel_routing_create(
+                out_gains, buffer_channels, fmt, block_size,
+            )
+        self.user_data.in_buffer = sample_buffer_create(
+            st.data, length, buffer_channels, fmt, False, layout,
+        )
+        self.user_data.out_buffer = sample_buffer_create(
+            st.data, length, buffer_channels, fmt, False, layout,
+        )
+        if process:
+            self.user_data.process_hook = process_hook_create(
+                copy_process, NULL, fmt, planar,
+                nchannels, nchannels, block_size, &st.data,
+            )
+        if underrun_policy is not None:
+            self.user_data.underrun = underrun_handler_create(
+                get_underrun_policy(underrun_policy), fmt,
+                planar, nchannels, block_size, 0,
+            )
+    def __dealloc__(self):
+        if self.user_data.in_buffer != NULL:
+            sample_buffer_destroy(self.user_data.in_buffer)
+        if self.user_data.out_buffer != NULL:
+            sample_buffer_destroy(self.user_data.out_buffer)
+        if self.user_data.process_hook != NULL:
+            process_hook_destroy(self.user_data.process_hook)
+        if self.user_data.underrun != NULL:
+            underrun_handler_destroy(self.user_data.underrun)
+        if self.user_data.in_routing != NULL:
+            channel_routing_destroy(self.user_data.in_routing)
+        if self.user_data.out_routing != NULL:
+            channel_routing_destroy(self.user_data.out_routing)
+        free(self.in_data)
+        free(self.out_data)
+        free(self.app_data)
+        free(self.in_planes)
+        free(self.out_planes)
+
+    def run(self, Py_ssize_t nrounds):
+        """Run *nrounds* callbacks
+
+        Returns the number of callbacks that did not return ``paContinue``
+        """
+        cdef Py_ssize_t errors
+        with nogil:
+            errors = self._run(nrounds)
+        return errors
+
+    cdef Py_ssize_t _run(self, Py_ssize_t nrounds) nogil:
+        cdef CallbackUserData* user_data = &self.user_data
+        cdef Py_ssize_t i, errors = 0
+        cdef unsigned long nframes = self.block_size
+        cdef PaTime block_time = nframes / 48000.
+        cdef void *in_bfr = self.in_data
+        cdef void *out_bfr = self.out_data
+        if self.planar:
+            in_bfr = self.in_planes
+            out_bfr = self.out_planes
+        for i in range(nrounds):
+            if self.write_output:
+                sample_buffer_write(user_data.out_buffer, self.app_data, nframes)
+            self.time_info.currentTime += block_time
+            self.time_info.inputBufferAdcTime = self.time_info.currentTime - block_time
+            self.time_info.outputBufferDacTime = self.time_info.currentTime + block_time
+            if _stream_callback(in_bfr, out_bfr, nframes, &self.time_info, 0, user_data) != paContinue:
+                errors += 1
+            sample_buffer_read(user_data.in_buffer, self.app_data, nframes)
+        return errors
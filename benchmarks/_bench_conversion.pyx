@@ -0,0 +1,193 @@
+# cython: language_level=3, boundscheck=False, wraparound=False, cdivision=True
+
+from libc.stdint cimport int32_t, int16_t, int8_t, uint8_t
+from cython cimport view
+
+from cysounddevice.types cimport *
+from cysounddevice.buffer cimport (
+    SampleBuffer,
+    BufferItem,
+    sample_buffer_create,
+    sample_buffer_destroy,
+)
+from cysounddevice cimport conversion
+
+
+ctypedef fused sample_t:
+    float
+    int32_t
+    int16_t
+    int8_t
+    uint8_t
+
+# -----------------------------------------------------------------------------
+# Element-by-element conversion through a generic strided memoryview.
+# These reproduce the original kernels and serve as the baseline.
+# -----------------------------------------------------------------------------
+
+cdef void _legacy_pack(BufferItem* item, float[:,:] src, sample_t *data_view) nogil:
+    cdef Py_ssize_t chan_ix, chan_num
+    cdef SampleFormat* fmt = item.parent_buffer.sample_format
+    cdef double multiplier = fmt.float32_divisor
+    cdef double float32_max = fmt.float32_max
+    cdef double value
+
+    for chan_ix in range(item.length):
+        for chan_num in range(item.nchannels):
+            if sample_t is float:
+                data_view[0] = src[chan_num,chan_ix]
+            else:
+                value = src[chan_num,chan_ix]
+                if value > float32_max:
+                    value = float32_max
+                if sample_t is uint8_t:
+                    data_view[0] = <uint8_t>((value+1.0)*128)
+                else:
+                    data_view[0] = <sample_t>(value*multiplier)
+            data_view += 1
+
+cdef void _legacy_pack_sint24(BufferItem* item, float[:,:] src) nogil:
+    cdef Py_ssize_t chan_ix, chan_num
+    cdef SampleFormat* fmt = item.parent_buffer.sample_format
+    cdef unsigned char *bfr = <unsigned char *>item.bfr
+    cdef double multiplier = fmt.float32_divisor
+    cdef int32_t packed_value
+
+    for chan_ix in range(item.length):
+        for chan_num in range(item.nchannels):
+            packed_value = <int32_t>(src[chan_num,chan_ix] * multiplier)
+            bfr[0] = <unsigned char>(packed_value >> 8)
+            bfr[1] = <unsigned char>(packed_value >> 16)
+            bfr[2] = <unsigned char>(packed_value >> 24)
+            bfr += 3
+
+cdef void _legacy_unpack(BufferItem* item, float[:,:] dest, sample_t *data_view) nogil:
+    cdef Py_ssize_t chan_ix, chan_num
+    cdef SampleFormat* fmt = item.parent_buffer.sample_format
+    cdef double multiplier = fmt.float32_multiplier
+
+    for chan_ix in range(item.length):
+        for chan_num in range(item.nchannels):
+            if sample_t is float:
+                dest[chan_num,chan_ix] = data_view[0]
+            elif sample_t is int32_t:
+                dest[chan_num,chan_ix] = <float>data_view[0] * multiplier
+            elif sample_t is uint8_t:
+                dest[chan_num,chan_ix] = (data_view[0] - 128) * multiplier * 2
+            else:
+                dest[chan_num,chan_ix] = data_view[0] * multiplier
+            data_view += 1
+
+cdef void _legacy_unpack_sint24(BufferItem* item, float[:,:] dest) nogil:
+    cdef Py_ssize_t chan_ix, chan_num
+    cdef SampleFormat* fmt = item.parent_buffer.sample_format
+    cdef unsigned char *bfr = <unsigned char *>item.bfr
+    cdef double multiplier = fmt.float32_multiplier
+    cdef int32_t unpacked
+
+    for chan_ix in range(item.length):
+        for chan_num in range(item.nchannels):
+            unpacked =  ((<int32_t>bfr[0]) << 8)
+            unpacked |= ((<int32_t>bfr[1]) << 16)
+            unpacked |= ((<int32_t>bfr[2]) << 24)
+            dest[chan_num,chan_ix] = unpacked * multiplier
+            bfr += 3
+
+cdef void legacy_pack_item(BufferItem* item, float[:,:] src) nogil:
+    cdef PaSampleFormat pa_ident = item.parent_buffer.sample_format.pa_ident
+    if pa_ident == paFloat32:
+        _legacy_pack(item, src, <float *>item.bfr)
+    elif pa_ident == paInt32:
+        _legacy_pack(item, src, <int32_t *>item.bfr)
+    elif pa_ident == paInt24:
+        _legacy_pack_sint24(item, src)
+    elif pa_ident == paInt16:
+        _legacy_pack(item, src, <int16_t *>item.bfr)
+    elif pa_ident == paInt8:
+        _legacy_pack(item, src, <int8_t *>item.bfr)
+    elif pa_ident == paUInt8:
+        _legacy_pack(item, src, <uint8_t *>item.bfr)
+
+cdef void legacy_unpack_item(BufferItem* item, float[:,:] dest) nogil:
+    cdef PaSampleFormat pa_ident = item.parent_buffer.sample_format.pa_ident
+    if pa_ident == paFloat32:
+        _legacy_unpack(item, dest, <float *>item.bfr)
+    elif pa_ident == paInt32:
+        _legacy_unpack(item, dest, <int32_t *>item.bfr)
+    elif pa_ident == paInt24:
+        _legacy_unpack_sint24(item, dest)
+    elif pa_ident == paInt16:
+        _legacy_unpack(item, dest, <int16_t *>item.bfr)
+    elif pa_ident == paInt8:
+        _legacy_unpack(item, dest, <int8_t *>item.bfr)
+    elif pa_ident == paUInt8:
+        _legacy_unpack(item, dest, <uint8_t *>item.bfr)
+
+
+cdef class ConversionBenchmark:
+    """Pack or unpack a single :c:type:`BufferItem` repeatedly
+
+    Arguments:
+        impl (str): ``'kernel'`` for the functions in :mod:`cysounddevice.conversion`
+            or ``'legacy'`` for the element-by-element baseline
+        direction (str): Either ``'pack'`` or ``'unpack'``
+        nchannels (int):
+        block_size (int):
+        sample_format (str):
+        order (str): Memory order of the float32 array. ``'C'`` for
+            (nchannels, block_size) rows, ``'F'`` for interleaved frames
+    """
+    cdef SampleBuffer* bfr
+    cdef float[:,:] block
+    cdef readonly str impl, direction, order
+    cdef readonly Py_ssize_t nchannels, block_size
+    def __cinit__(self, str impl, str direction, Py_ssize_t nchannels,
+                  Py_ssize_t block_size, str sample_format, str order='C'):
+        cdef SampleTime st = SampleTime(0, 0, block_size, 48000)
+        cdef SampleFormat* fmt = get_sample_format_by_name(sample_format)
+        cdef Py_ssize_t i, j
+        self.bfr = NULL
+        if impl not in ('kernel', 'legacy'):
+            raise ValueError(f'Invalid impl: {impl}')
+        if direction not in ('pack', 'unpack'):
+            raise ValueError(f'Invalid direction: {direction}')
+        self.impl = impl
+        self.direction = direction
+        self.order = order
+        self.nchannels = nchannels
+        self.block_size = block_size
+        self.bfr = sample_buffer_create(st.data, 1, nchannels, fmt)
+        if order == 'F':
+            self.block = view.array(
+                shape=(nchannels, block_size), itemsize=sizeof(float), format='f', mode='fortran',
+            )
+        else:
+            self.block = view.array(shape=(nchannels, block_size), itemsize=sizeof(float), format='f')
+        for i in range(nchannels):
+            for j in range(block_size):
+                self.block[i,j] = ((i * block_size + j) % 2000) / 1000. - 1.
+        conversion.pack_buffer_item(&self.bfr.items[0], self.block)
+
+    def __dealloc__(self):
+        if self.bfr != NULL:
+            sample_buffer_destroy(self.bfr)
+            self.bfr = NULL
+
+    def run(self, Py_ssize_t nrounds):
+        cdef BufferItem* item = &self.bfr.items[0]
+        cdef float[:,:] block = self.block
+        cdef bint legacy = self.impl == 'legacy'
+        cdef bint pack = self.direction == 'pack'
+        cdef Py_ssize_t i
+        with nogil:
+            for i in range(nrounds):
+                if pack:
+                    if legacy:
+                        legacy_pack_item(item, block)
+                    else:
+                        conversion.pack_buffer_item(item, block)
+                else:
+                    if legacy:
+                        legacy_unpack_item(item, block)
+                    else:
+                        conversion.unpack_buffer_item(item, block)
@@ -0,0 +1,61 @@
+# cython: language_level=3
+
+from cysounddevice.types cimport *
+
+
+SAMPLE_TIME_OPS = ('set_sample_index', 'set_block_vars', 'set_pa_time', 'to_pa_time')
+
+cdef class SampleTimeBenchmark:
+    """Step a :c:type:`SampleTime_s` through consecutive blocks using one of
+    the ``nogil`` struct functions, as the stream callback and buffers do
+
+    Arguments:
+        op (str): One of ``'set_sample_index'``, ``'set_block_vars'``,
+            ``'set_pa_time'`` or ``'to_pa_time'``
+        block_size (int):
+        sample_rate (float):
+        nsteps (int): Number of blocks stepped through per round
+    """
+    cdef SampleTime_s data
+    cdef int op_mode
+    cdef readonly str op
+    cdef readonly Py_ssize_t nsteps
+    def __cinit__(self, str op, Py_ssize_t block_size=256,
+                  SAMPLE_RATE_t sample_rate=48000, Py_ssize_t nsteps=1024):
+        cdef SampleTime st = SampleTime(0, 0, block_size, sample_rate)
+        if op not in SAMPLE_TIME_OPS:
+            raise ValueError(f'Invalid op: {op}')
+        self.op = op
+        self.op_mode = SAMPLE_TIME_OPS.index(op)
+        self.nsteps = nsteps
+        copy_sample_time_struct(&st.data, &self.data)
+        self.data.time_offset = 1.5
+
+    def run(self, Py_ssize_t nrounds):
+        """Returns the :attr:`SampleTime.pa_time` reached
+        """
+        cdef PaTime result
+        with nogil:
+            result = self._run(nrounds)
+        return result
+
+    cdef PaTime _run(self, Py_ssize_t nrounds) nogil:
+        cdef SampleTime_s* st = &self.data
+        cdef Py_ssize_t i, j
+        cdef SAMPLE_INDEX_t idx
+        cdef PaTime t = 0, block_time = st.block_size / st.sample_rate
+        for i in range(nrounds):
+            for j in range(self.nsteps):
+                if self.op_mode == 0:
+                    idx = j * st.block_size + j % st.block_size
+                    SampleTime_set_sample_index(st, idx, True)
+                elif self.op_mode == 1:
+                    SampleTime_set_block_vars(st, j, j % st.block_size)
+                elif self.op_mode == 2:
+                    SampleTime_set_pa_time(st, st.time_offset + j * block_time, False)
+                else:
+                    st.block = j
+                    t += SampleTime_to_pa_time(st)
+        if self.op_mode == 3:
+            return t
+        return st.pa_time
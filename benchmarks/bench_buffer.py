@@ -0,0 +1,37 @@
+import pytest
+
+from _bench_buffer import LayoutBenchmark, ThroughputBenchmark, THROUGHPUT_APIS
+
+NCHANNELS = (16, 64, 128)
+BLOCK_SIZES = (64, 256)
+SAMPLE_FORMATS = ('float32', 'int24')
+
+@pytest.mark.parametrize('sample_format', SAMPLE_FORMATS)
+@pytest.mark.parametrize('block_size', BLOCK_SIZES)
+@pytest.mark.parametrize('nchannels', NCHANNELS)
+@pytest.mark.parametrize('layout', ['slab', 'scattered'])
+def bench_buffer_layout(benchmark, layout, nchannels, block_size, sample_format):
+    bench = LayoutBenchmark(layout, nchannels, block_size, sample_format)
+    benchmark.group = f'buffer-layout: {nchannels}ch, {block_size}, {sample_format}'
+    benchmark(bench.run, 4)
+
+@pytest.mark.parametrize('nchannels', NCHANNELS)
+@pytest.mark.parametrize('use_hugepages', [False, True])
+def bench_buffer_hugepages(benchmark, nchannels, use_hugepages):
+    bench = LayoutBenchmark('slab', nchannels, 256, 'float32', use_hugepages=use_hugepages)
+    benchmark.group = f'buffer-hugepages: {nchannels}ch'
+    benchmark(bench.run, 4)
+
+@pytest.mark.parametrize('sample_format', ('float32', 'int16'))
+@pytest.mark.parametrize('block_size', (64, 512))
+@pytest.mark.parametrize('nchannels', (2, 16))
+@pytest.mark.parametrize('layout', ['interleaved', 'non_interleaved'])
+@pytest.mark.parametrize('api', THROUGHPUT_APIS)
+def bench_buffer_throughput(benchmark, api, layout, nchannels, block_size, sample_format):
+    bench = ThroughputBenchmark(api, layout, nchannels, block_size, sample_format)
+    benchmark.group = f'buffer-throughput: {nchannels}ch, {block_size}, {sample_format}'
+    frames = benchmark(bench.run, 4)
+    assert frames == 4 * bench.length * block_size
+    if benchmark.stats is not None:
+        benchmark.extra_info['frames'] = frames
+        benchmark.extra_info['frames_per_second'] = frames / benchmark.stats.stats.mean
@@ -0,0 +1,45 @@
+import pytest
+
+from _bench_callback import CallbackBenchmark
+
+NCHANNELS = (2, 32)
+BLOCK_SIZES = (64, 512)
+SAMPLE_FORMATS = ('float32', 'int24', 'int16')
+NROUNDS = 16
+
+@pytest.mark.parametrize('sample_format', SAMPLE_FORMATS)
+@pytest.mark.parametrize('block_size', BLOCK_SIZES)
+@pytest.mark.parametrize('nchannels', NCHANNELS)
+@pytest.mark.parametrize('planar', [False, True])
+@pytest.mark.parametrize('process', [False, True])
+def bench_callback(benchmark, process, planar, nchannels, block_size, sample_format):
+    bench = CallbackBenchmark(sample_format, planar, nchannels, block_size, process)
+    benchmark.group = f'callback: {nchannels}ch, {block_size}, {sample_format}'
+    errors = benchmark(bench.run, NROUNDS)
+    assert errors == 0
+    if benchmark.stats is not None:
+        # Fraction of the real-time budget used by each callback
+        budget = block_size / 48000
+        benchmark.extra_info['load'] = benchmark.stats.stats.mean / NROUNDS / budget
+
+@pytest.mark.parametrize('underrun_policy', ['zero_fill', 'hold', 'crossfade'])
+@pytest.mark.parametrize('nchannels', NCHANNELS)
+def bench_callback_underrun(benchmark, underrun_policy, nchannels):
+    bench = CallbackBenchmark('float32', False, nchannels, 256, underrun_policy=underrun_policy)
+    benchmark.group = f'callback-underrun: {nchannels}ch'
+    errors = benchmark(bench.run, NROUNDS)
+    assert errors == 0
+
+@pytest.mark.parametrize('routing', [None, 'map', 'mix'])
+@pytest.mark.parametrize('sample_format', ['float32', 'int16'])
+def bench_callback_routing(benchmark, routing, sample_format):
+    # 4 of the 64 channels of an interface in the stream buffers
+    if routing is None:
+        bench = CallbackBenchmark(sample_format, False, 64, 256)
+    else:
+        bench = CallbackBenchmark(
+            sample_format, False, 64, 256, buffer_channels=4, mix=routing == 'mix',
+        )
+    benchmark.group = f'callback-routing: {sample_format}'
+    errors = benchmark(bench.run, NROUNDS)
+    assert errors == 0
@@ -0,0 +1,52 @@
+import timeit
+
+import pytest
+
+from cysounddevice.types import get_sample_formats
+
+from _bench_conversion import ConversionBenchmark
+
+NCHANNELS = (2, 64)
+BLOCK_SIZES = (256,)
+SAMPLE_FORMATS = tuple(sf['name'].decode() for sf in get_sample_formats().values())
+NROUNDS = 16
+
+SWEEP_NCHANNELS = (1, 2, 8, 32)
+SWEEP_BLOCK_SIZES = (64, 256, 1024)
+
+def legacy_time(direction, nchannels, block_size, sample_format, order, repeat=50):
+    """Minimum time of the element-by-element baseline for one round of
+    :meth:`ConversionBenchmark.run`
+    """
+    bench = ConversionBenchmark('legacy', direction, nchannels, block_size, sample_format, order)
+    return min(timeit.repeat(lambda: bench.run(NROUNDS), number=1, repeat=repeat))
+
+@pytest.mark.parametrize('order', ['C', 'F'])
+@pytest.mark.parametrize('impl', ['legacy', 'kernel'])
+@pytest.mark.parametrize('sample_format', SAMPLE_FORMATS)
+@pytest.mark.parametrize('block_size', BLOCK_SIZES)
+@pytest.mark.parametrize('nchannels', NCHANNELS)
+@pytest.mark.parametrize('direction', ['pack', 'unpack'])
+def bench_conversion(benchmark, direction, nchannels, block_size, sample_format, impl, order):
+    bench = ConversionBenchmark(impl, direction, nchannels, block_size, sample_format, order)
+    benchmark.group = f'conversion-{direction}: {sample_format}, {nchannels}ch, {block_size}'
+    benchmark(bench.run, NROUNDS)
+    if impl == 'kernel' and benchmark.stats is not None:
+        baseline = legacy_time(direction, nchannels, block_size, sample_format, order)
+        benchmark.extra_info['legacy_min'] = baseline
+        benchmark.extra_info['speedup'] = baseline / benchmark.stats.stats.min
+
+@pytest.mark.parametrize('sample_format', SAMPLE_FORMATS)
+@pytest.mark.parametrize('block_size', SWEEP_BLOCK_SIZES)
+@pytest.mark.parametrize('nchannels', SWEEP_NCHANNELS)
+@pytest.mark.parametrize('direction', ['pack', 'unpack'])
+def bench_conversion_sweep(benchmark, direction, nchannels, block_size, sample_format):
+    """:func:`pack_buffer_item` and :func:`unpack_buffer_item` for every
+    sample format across channel counts and block sizes
+    """
+    bench = ConversionBenchmark('kernel', direction, nchannels, block_size, sample_format)
+    benchmark.group = f'conversion-sweep-{direction}: {nchannels}ch, {block_size}'
+    benchmark(bench.run, NROUNDS)
+    if benchmark.stats is not None:
+        samples = NROUNDS * nchannels * block_size
+        benchmark.extra_info['samples_per_second'] = samples / benchmark.stats.stats.mean
@@ -0,0 +1,60 @@
+import pytest
+
+from cysounddevice.types import SampleTime
+
+from _bench_sample_time import SampleTimeBenchmark, SAMPLE_TIME_OPS
+
+NSTEPS = 1024
+
+def _add_number(st, other):
+    return st + .001
+
+def _add_sample_time(st, other):
+    return st + other
+
+def _sub_sample_time(st, other):
+    return st - other
+
+def _iadd_number(st, other):
+    st += .001
+    return st
+
+def _compare(st, other):
+    return st < other
+
+def _set_sample_index(st, other):
+    st.sample_index += 1
+    return st
+
+def _set_pa_time(st, other):
+    st.pa_time = other.pa_time
+    return st
+
+OPERATIONS = {
+    'add_number':_add_number,
+    'add_sample_time':_add_sample_time,
+    'sub_sample_time':_sub_sample_time,
+    'iadd_number':_iadd_number,
+    'compare':_compare,
+    'set_sample_index':_set_sample_index,
+    'set_pa_time':_set_pa_time,
+}
+
+@pytest.mark.parametrize('op', OPERATIONS.keys())
+def bench_sample_time_arithmetic(benchmark, op):
+    func = OPERATIONS[op]
+    st = SampleTime(0, 0, 256, 48000)
+    other = SampleTime(100, 17, 256, 48000)
+
+    def run():
+        for _ in range(NSTEPS):
+            func(st, other)
+
+    benchmark.group = 'sample-time: SampleTime'
+    benchmark(run)
+
+@pytest.mark.parametrize('op', SAMPLE_TIME_OPS)
+def bench_sample_time_struct(benchmark, op):
+    bench = SampleTimeBenchmark(op, nsteps=NSTEPS)
+    benchmark.group = 'sample-time: SampleTime_s'
+    benchmark(bench.run, 16)
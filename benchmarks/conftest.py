@@ -0,0 +1,33 @@
+import Cython
+
+try:
+    from importlib.metadata import version, PackageNotFoundError
+except ImportError: # pragma: no cover
+    version, PackageNotFoundError = None, Exception
+
+def pytest_benchmark_update_machine_info(config, machine_info):
+    """Add the library and Cython versions to the saved results so runs
+    from different releases can be told apart
+    """
+    pkg_version = None
+    if version is not None:
+        try:
+            pkg_version = version('cython-sounddevice')
+        except PackageNotFoundError:
+            pass
+    machine_info['cysounddevice'] = pkg_version
+    machine_info['cython'] = Cython.__version__
+
+
+def pytest_terminal_summary(terminalreporter):
+    """Report the kernel speedups recorded by ``bench_conversion``
+    """
+    session = getattr(terminalreporter.config, '_benchmarksession', None)
+    if session is None:
+        return
+    results = [bench for bench in session.benchmarks if 'speedup' in bench.extra_info]
+    if not len(results):
+        return
+    terminalreporter.section('conversion speedup (legacy / kernel)')
+    for bench in sorted(results, key=lambda b: b.name):
+        terminalreporter.write_line(f'{bench.name:<64} {bench.extra_info["speedup"]:6.2f}x')
@@ -8,6 +8,7 @@ from Cython.Build import cythonize, Cythonize
 
 ROOT_PATH = os.path.abspath(os.path.dirname(__file__))
 TESTS_PATH = os.path.join(ROOT_PATH, 'tests')
+BENCHMARKS_PATH = os.path.join(ROOT_PATH, 'benchmarks')
 CPU_COUNT = os.cpu_count()
 if CPU_COUNT is None:
     CPU_COUNT = 0
@@ -84,9 +85,10 @@ def do_cythonize(pyx_file, opts=None):
     cython_compile(pyx_file, parsed)
 
 def main():
-    pattern = os.path.join(TESTS_PATH, '*.pyx')
     opts = build_opts()
-    do_cythonize(pattern, opts)
+    for path in [TESTS_PATH, BENCHMARKS_PATH]:
+        pattern = os.path.join(path, '*.pyx')
+        do_cythonize(pattern, opts)
 
 if __name__ == '__main__':
     main()
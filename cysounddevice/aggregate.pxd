@@ -0,0 +1,82 @@
+# cython: language_level=3
+
+from libc.stdint cimport uint64_t
+
+from cysounddevice.pawrapper cimport *
+from cysounddevice.types cimport *
+from cysounddevice.buffer cimport SampleBuffer, StreamInputBuffer
+from cysounddevice.resample cimport ResamplerState
+
+cdef struct DriftEstimator:
+    # Forgetting factor applied to the previous observations
+    double decay
+    double weight
+    # Exponentially weighted means, variance and covariance of the
+    # observations relative to the first one
+    double mean_n
+    double mean_t
+    double var_n
+    double cov_nt
+    SAMPLE_INDEX_t ref_n
+    PaTime ref_t
+    double nominal_period
+    uint64_t count
+
+cdef void drift_estimator_init(DriftEstimator* est, double sample_rate, double decay) nogil
+cdef void drift_estimator_update(DriftEstimator* est, SAMPLE_INDEX_t n, PaTime t) nogil
+cdef double drift_estimator_period(DriftEstimator* est) nogil
+cdef PaTime drift_estimator_time(DriftEstimator* est, double n) nogil
+cdef double drift_estimator_index(DriftEstimator* est, PaTime t) nogil
+
+cdef struct AggregateSource:
+    SampleBuffer* sample_buffer
+    Py_ssize_t nchannels
+    Py_ssize_t channel_offset
+    double sample_rate
+    # Float planes of one input block
+    float *scratch
+    # One input block in the buffer's layout (for reads that cannot borrow)
+    char *raw
+    # NULL for the master
+    ResamplerState* resampler
+    DriftEstimator estimator
+    # Sample index following the last frame read (-1 before the first block)
+    SAMPLE_INDEX_t next_index
+    bint synced
+    # Input frames per output frame for the pending block
+    double step
+    uint64_t lost_frames
+    uint64_t late_frames
+    uint64_t resyncs
+
+cdef class AggregateCapture:
+    cdef readonly tuple streams
+    cdef readonly StreamInputBuffer output_buffer
+    cdef AggregateSource* sources
+    cdef Py_ssize_t nsources
+    cdef SampleBuffer* out_buffer
+    cdef readonly Py_ssize_t nchannels
+    cdef readonly Py_ssize_t block_size
+    cdef readonly double sample_rate
+    cdef readonly Py_ssize_t buffer_len
+    cdef readonly Py_ssize_t max_latency
+    cdef readonly Py_ssize_t half_taps
+    cdef readonly double drift_window
+    cdef readonly uint64_t blocks
+    cdef readonly uint64_t dropped_blocks
+    cdef bint pending
+    cdef SampleTime_s pending_time
+    cdef long poll_ms
+    cdef object _thread
+    cdef uint64_t _stop
+
+    cdef void _free(self) except *
+    cdef void _free_sources(self) except *
+    cdef int _run_loop(self) nogil
+    cdef bint _read_block(self, AggregateSource* src, SampleTime_s* start_time) nogil
+    cdef bint _pull(self, AggregateSource* src) nogil
+    cdef bint _pull_master(self) nogil
+    cdef void _steer(self, AggregateSource* src) nogil
+    cdef bint _ready(self) nogil
+    cdef void _emit(self) nogil
+    cdef void _resample(self, AggregateSource* src, float *dest) nogil
@@ -0,0 +1,519 @@
+# cython: language_level=3
+
+cimport cython
+from libc.math cimport exp, fabs
+from libc.string cimport memset, memcpy
+from cpython.mem cimport PyMem_Malloc, PyMem_Free
+
+from cysounddevice.atomic cimport atomic_load_acquire, atomic_store_release
+from cysounddevice.buffer cimport (
+    BufferItem,
+    SampleLayout_non_interleaved,
+    sample_buffer_create,
+    sample_buffer_destroy,
+    sample_buffer_borrow_read,
+    sample_buffer_release_read,
+    sample_buffer_read,
+    sample_buffer_read_available_frames,
+    sample_buffer_acquire_write,
+    sample_buffer_commit_write_time,
+)
+from cysounddevice.conversion cimport unpack_samples
+from cysounddevice.resample cimport (
+    resampler_create, resampler_destroy, resampler_reset, resampler_end,
+    resampler_space, resampler_push, resampler_push_silence,
+    resampler_available, resampler_process,
+)
+from cysounddevice.streams cimport Stream
+
+import threading
+
+# -----------------------------------------------------------------------------
+# Drift estimation
+#
+# Each stream's blocks are observed as (sample index, ADC time) pairs. An
+# exponentially weighted linear regression of time on sample index gives
+# the period of the stream's clock measured in host time and maps between
+# the two. Observations are stored relative to the first one to keep the
+# sums small.
+# -----------------------------------------------------------------------------
+
+cdef void drift_estimator_init(DriftEstimator* est, double sample_rate, double decay) nogil:
+    est.decay = decay
+    est.weight = 0
+    est.mean_n = 0
+    est.mean_t = 0
+    est.var_n = 0
+    est.cov_nt = 0
+    est.ref_n = 0
+    est.ref_t = 0
+    est.nominal_period = 1. / sample_rate
+    est.count = 0
+
+@cython.cdivision(True)
+cdef void drift_estimator_update(DriftEstimator* est, SAMPLE_INDEX_t n, PaTime t) nogil:
+    cdef double x, y, dx, dy
+    if est.count == 0:
+        est.ref_n = n
+        est.ref_t = t
+    x = <double>(n - est.ref_n)
+    y = t - est.ref_t
+    est.weight = est.weight * est.decay + 1
+    dx = x - est.mean_n
+    dy = y - est.mean_t
+    est.mean_n += dx / est.weight
+    est.mean_t += dy / est.weight
+    est.var_n = est.var_n * est.decay + dx * (x - est.mean_n)
+    est.cov_nt = est.cov_nt * est.decay + dx * (y - est.mean_t)
+    est.count += 1
+
+@cython.cdivision(True)
+cdef double drift_estimator_period(DriftEstimator* est) nogil:
+    """Seconds of host time per sample
+    """
+    if est.count < 2 or est.var_n <= 0:
+        return est.nominal_period
+    return est.cov_nt / est.var_n
+
+cdef PaTime drift_estimator_time(DriftEstimator* est, double n) nogil:
+    """Host time of the (fractional) sample index *n*
+    """
+    return est.ref_t + est.mean_t + drift_estimator_period(est) * (n - est.ref_n - est.mean_n)
+
+@cython.cdivision(True)
+cdef double drift_estimator_index(DriftEstimator* est, PaTime t) nogil:
+    """Fractional sample index at host time *t*
+    """
+    return est.ref_n + est.mean_n + (t - est.ref_t - est.mean_t) / drift_estimator_period(est)
+
+
+cdef class AggregateCapture:
+    """Combines the input of several streams into one sample-aligned block
+    stream on the clock of the first (master) stream
+
+    Devices that are not locked to a common clock drift apart. The ADC
+    times of each stream's blocks are used to estimate the rate of its
+    clock against the master's (see :attr:`ratios`). The other streams are
+    then resampled onto the master's timeline with an adaptive
+    windowed-sinc :class:`~cysounddevice.resample.Resampler`, so that frame
+    ``i`` of every channel in an output block was captured at the same time.
+
+    A worker thread (running without the GIL) reads each stream's
+    :attr:`~cysounddevice.streams.Stream.input_buffer` and writes float32
+    blocks of the master's block size to :attr:`output_buffer`, with the
+    channels of all streams in order. Output blocks carry the master's
+    :class:`~cysounddevice.types.SampleTime` (so lost master blocks show as
+    a :attr:`~cysounddevice.buffer.StreamInputBuffer.discontinuity`).
+
+    Each output block waits for the other streams to provide the input
+    covering it, for up to *max_latency* master blocks. Missing input is
+    replaced by silence and counted in :attr:`late_frames`.
+
+    While running, the capture is the only reader of the streams' input
+    buffers. It is stopped when any of the streams is closed.
+
+    Arguments:
+        streams: A sequence of open :class:`~cysounddevice.streams.Stream`
+            instances with inputs. The first is the master
+        buffer_len (int): Number of blocks in :attr:`output_buffer`
+        max_latency (int): Number of master blocks to wait for the other
+            streams
+        half_taps (int): Number of input frames used on each side of a
+            resampled frame (see :class:`~cysounddevice.resample.Resampler`)
+        drift_window (float): Time constant in seconds of the drift estimate
+
+    Attributes:
+        streams (tuple): The streams
+        output_buffer (StreamInputBuffer): The buffer holding the combined
+            blocks (using the ``'non_interleaved'`` layout). It can be read
+            with any of the :class:`~cysounddevice.buffer.StreamInputBuffer`
+            methods while the capture is running
+        nchannels (int): Total number of channels
+        block_size (int): Frames per block (the master's block size)
+        sample_rate (float): The master's sample rate
+        blocks (int): Number of blocks written to :attr:`output_buffer`
+        dropped_blocks (int): Number of blocks lost because
+            :attr:`output_buffer` was full
+        running (bool): True while the worker thread is running
+    """
+    def __cinit__(self, streams, Py_ssize_t buffer_len=32, Py_ssize_t max_latency=8,
+                  Py_ssize_t half_taps=16, double drift_window=10.):
+        self.streams = tuple(streams)
+        if not len(self.streams):
+            raise ValueError('At least one stream is required')
+        for stream in self.streams:
+            if not isinstance(stream, Stream):
+                raise TypeError('Expected a Stream, got {!r}'.format(stream))
+        if buffer_len <= 0 or max_latency <= 0 or half_taps <= 0:
+            raise ValueError('buffer_len, max_latency and half_taps must be greater than zero')
+        self.buffer_len = buffer_len
+        self.max_latency = max_latency
+        self.half_taps = half_taps
+        self.drift_window = drift_window
+        self.sources = NULL
+        self.nsources = 0
+        self.out_buffer = NULL
+        self.output_buffer = None
+        self._thread = None
+        self._stop = 0
+    def __dealloc__(self):
+        # The thread holds a reference so it cannot be running here
+        self._free_sources()
+
+    @property
+    def running(self):
+        return self._thread is not None
+    @property
+    def ratios(self):
+        """Measured sample rate of each stream divided by the master's
+        """
+        if self.sources == NULL:
+            return None
+        cdef double master_period = drift_estimator_period(&self.sources[0].estimator)
+        return [
+            master_period / drift_estimator_period(&self.sources[i].estimator)
+            for i in range(self.nsources)
+        ]
+    @property
+    def lost_frames(self):
+        """Number of frames each stream lost before they were read
+        (see :attr:`~cysounddevice.buffer.StreamInputBuffer.dropped_frames`)
+        """
+        if self.sources == NULL:
+            return None
+        return [self.sources[i].lost_frames for i in range(self.nsources)]
+    @property
+    def late_frames(self):
+        """Number of output frames replaced by silence for each stream because
+        its input did not arrive within *max_latency* blocks
+        """
+        if self.sources == NULL:
+            return None
+        return [self.sources[i].late_frames for i in range(self.nsources)]
+    @property
+    def resyncs(self):
+        """Number of times each stream's position jumped to the estimate
+        (after lost input or a change of clock)
+        """
+        if self.sources == NULL:
+            return None
+        return [self.sources[i].resyncs for i in range(self.nsources)]
+
+    def start(self):
+        """Start combining the streams
+
+        Raises:
+            RuntimeError: If a stream is not open (or has no input) or its
+                input is already being read by a recorder or capture
+        """
+        cdef Stream stream
+        cdef StreamInputBuffer input_buffer
+        cdef SampleBuffer* bfr
+        cdef AggregateSource* src
+        cdef Py_ssize_t i, nchannels = 0, capacity
+        cdef SampleTime start_time
+        if self._thread is not None:
+            raise RuntimeError('Already running')
+        for stream in self.streams:
+            input_buffer = stream.input_buffer
+            if input_buffer is None or input_buffer.sample_buffer == NULL:
+                raise RuntimeError('Stream is not open or has no input: {!r}'.format(stream))
+            if input_buffer.recorder is not None:
+                raise RuntimeError('Stream input is already being read: {!r}'.format(stream))
+            nchannels += input_buffer.nchannels
+        self._free_sources()
+        self.nsources = len(self.streams)
+        self.sources = <AggregateSource*>PyMem_Malloc(self.nsources * sizeof(AggregateSource))
+        if self.sources == NULL:
+            raise MemoryError()
+        memset(self.sources, 0, self.nsources * sizeof(AggregateSource))
+
+        stream = self.streams[0]
+        self.block_size = stream.input_buffer.sample_buffer.item_length
+        self.sample_rate = stream.buffer_sample_rate
+        self.nchannels = nchannels
+        nchannels = 0
+        for i in range(self.nsources):
+            stream = self.streams[i]
+            bfr = stream.input_buffer.sample_buffer
+            src = &self.sources[i]
+            src.sample_buffer = bfr
+            src.nchannels = bfr.nchannels
+            src.channel_offset = nchannels
+            src.sample_rate = stream.buffer_sample_rate
+            src.next_index = -1
+            nchannels += bfr.nchannels
+            drift_estimator_init(
+                &src.estimator, src.sample_rate,
+                exp(-bfr.item_length / src.sample_rate / self.drift_window),
+            )
+            src.scratch = <float *>PyMem_Malloc(bfr.item_length * bfr.nchannels * sizeof(float))
+            src.raw = <char *>PyMem_Malloc(bfr.item_length * bfr.nchannels * bfr.itemsize)
+            if src.scratch == NULL or src.raw == NULL:
+                self._free_sources()
+                raise MemoryError()
+            if i > 0:
+                # Room for the input covering max_latency output blocks,
+                # plus a few of the stream's own blocks
+                capacity = <Py_ssize_t>(
+                    (self.max_latency + 1) * self.block_size * src.sample_rate / self.sample_rate
+                ) + 4 * bfr.item_length + 2 * self.half_taps
+                try:
+                    src.resampler = resampler_create(
+                        src.nchannels, self.half_taps, 256, .95, 8.6, capacity,
+                    )
+                except:
+                    self._free_sources()
+                    raise
+
+        start_time = SampleTime(0, 0, self.block_size, self.sample_rate)
+        try:
+            self.out_buffer = sample_buffer_create(
+                start_time.data, self.buffer_len, self.nchannels,
+                &SampleFormats.sf_float32, False, SampleLayout_non_interleaved,
+            )
+        except:
+            self._free_sources()
+            raise
+        self.output_buffer = StreamInputBuffer(self.streams[0])
+        self.output_buffer._set_sample_buffer(self.out_buffer)
+
+        self.pending = False
+        self.blocks = 0
+        self.dropped_blocks = 0
+        self.poll_ms = <long>(self.block_size * 250 / self.sample_rate)
+        if self.poll_ms < 1:
+            self.poll_ms = 1
+        self._stop = 0
+        for stream in self.streams:
+            stream.input_buffer.recorder = self
+        self._thread = threading.Thread(target=self._run, name='AggregateCapture')
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        """Stop the worker thread and release :attr:`output_buffer`
+
+        Raises:
+            BufferError: If buffers exported from an item borrowed from
+                :attr:`output_buffer` are still alive
+        """
+        cdef Stream stream
+        if self._thread is None:
+            return
+        atomic_store_release(&self._stop, 1)
+        self._thread.join()
+        self._thread = None
+        for stream in self.streams:
+            if stream.input_buffer is not None and stream.input_buffer.recorder is self:
+                stream.input_buffer.recorder = None
+        self._free()
+
+    def __enter__(self):
+        self.start()
+        return self
+    def __exit__(self, *args):
+        self.stop()
+
+    cdef void _free(self) except *:
+        if self.output_buffer is not None:
+            self.output_buffer._clear_sample_buffer()
+        if self.out_buffer != NULL:
+            sample_buffer_destroy(self.out_buffer)
+            self.out_buffer = NULL
+
+    cdef void _free_sources(self) except *:
+        cdef Py_ssize_t i
+        cdef AggregateSource* src
+        if self.sources == NULL:
+            return
+        for i in range(self.nsources):
+            src = &self.sources[i]
+            PyMem_Free(src.scratch)
+            PyMem_Free(src.raw)
+            if src.resampler != NULL:
+                resampler_destroy(src.resampler)
+        PyMem_Free(self.sources)
+        self.sources = NULL
+        self.nsources = 0
+
+    def _run(self):
+        with nogil:
+            self._run_loop()
+
+    cdef int _run_loop(self) nogil:
+        cdef AggregateSource* master = &self.sources[0]
+        cdef Py_ssize_t i, backlog
+        cdef bint active
+        while atomic_load_acquire(&self._stop) == 0:
+            active = False
+            for i in range(1, self.nsources):
+                while self._pull(&self.sources[i]):
+                    active = True
+            if not self.pending:
+                self.pending = self._pull_master()
+            if self.pending:
+                for i in range(1, self.nsources):
+                    self._steer(&self.sources[i])
+                backlog = sample_buffer_read_available_frames(master.sample_buffer) // self.block_size
+                if self._ready() or backlog >= self.max_latency:
+                    self._emit()
+                    active = True
+            if not active:
+                Pa_Sleep(self.poll_ms)
+        return 0
+
+    cdef bint _read_block(self, AggregateSource* src, SampleTime_s* start_time) nogil:
+        """Read the next block of a stream into its ``scratch`` planes and
+        update its drift estimate
+        """
+        cdef SampleBuffer* bfr = src.sample_buffer
+        cdef SampleFormat* fmt = bfr.sample_format
+        cdef BufferItem* item = sample_buffer_borrow_read(bfr)
+        cdef SampleTime_s* st
+        cdef SAMPLE_INDEX_t index
+        if item != NULL:
+            unpack_samples(
+                item.bfr, item.chan_stride, item.frame_stride,
+                src.scratch, bfr.item_length, 1, src.nchannels, item.length, fmt,
+            )
+            copy_sample_time_struct(&item.start_time, start_time)
+            sample_buffer_release_read(bfr)
+        elif sample_buffer_read_available_frames(bfr) >= bfr.item_length:
+            # The read position is not at the start of an item
+            st = sample_buffer_read(bfr, src.raw, bfr.item_length)
+            if st == NULL:
+                return False
+            copy_sample_time_struct(st, start_time)
+            if bfr.layout == SampleLayout_non_interleaved:
+                unpack_samples(
+                    src.raw, bfr.item_length, 1, src.scratch, bfr.item_length, 1,
+                    src.nchannels, bfr.item_length, fmt,
+                )
+            else:
+                unpack_samples(
+                    src.raw, 1, src.nchannels, src.scratch, bfr.item_length, 1,
+                    src.nchannels, bfr.item_length, fmt,
+                )
+        else:
+            return False
+        index = SampleTime_to_sample_index(start_time)
+        # Item times are offset from the ADC time of the stream's first callback
+        drift_estimator_update(
+            &src.estimator, index, bfr.callback_time.time_offset + start_time.time_offset,
+        )
+        return True
+
+    cdef bint _pull(self, AggregateSource* src) nogil:
+        """Move the next block of a (non-master) stream to its resampler
+        """
+        cdef SampleBuffer* bfr = src.sample_buffer
+        cdef SampleTime_s start_time
+        cdef SAMPLE_INDEX_t index
+        cdef Py_ssize_t skip = 0
+        if resampler_space(src.resampler) < bfr.item_length:
+            return False
+        if not self._read_block(src, &start_time):
+            return False
+        index = SampleTime_to_sample_index(&start_time)
+        if src.next_index < 0:
+            resampler_reset(src.resampler, index, <double>index)
+            src.synced = False
+        elif index > src.next_index:
+            src.lost_frames += index - src.next_index
+            resampler_push_silence(src.resampler, index - src.next_index)
+        elif index < src.next_index:
+            skip = src.next_index - index
+            if skip > bfr.item_length:
+                skip = bfr.item_length
+        if skip < bfr.item_length:
+            resampler_push(
+                src.resampler, src.scratch + skip, bfr.item_length, 1,
+                bfr.item_length - skip,
+            )
+        src.next_index = resampler_end(src.resampler)
+        return True
+
+    cdef bint _pull_master(self) nogil:
+        """Read the next master block to be output
+        """
+        cdef AggregateSource* src = &self.sources[0]
+        cdef SAMPLE_INDEX_t index
+        if not self._read_block(src, &self.pending_time):
+            return False
+        index = SampleTime_to_sample_index(&self.pending_time)
+        if src.next_index >= 0 and index > src.next_index:
+            src.lost_frames += index - src.next_index
+        src.next_index = index + src.sample_buffer.item_length
+        return True
+
+    @cython.cdivision(True)
+    cdef void _steer(self, AggregateSource* src) nogil:
+        """Find the positions in a stream's input matching the start and end
+        of the pending master block and set the resampling step between them
+        """
+        cdef DriftEstimator* master = &self.sources[0].estimator
+        cdef SAMPLE_INDEX_t n0 = SampleTime_to_sample_index(&self.pending_time)
+        cdef double s0, s1
+        if src.estimator.count == 0:
+            return
+        s0 = drift_estimator_index(&src.estimator, drift_estimator_time(master, <double>n0))
+        s1 = drift_estimator_index(
+            &src.estimator, drift_estimator_time(master, <double>(n0 + self.block_size)),
+        )
+        if not src.synced or fabs(src.resampler.position - s0) > src.resampler.half_taps:
+            if src.synced:
+                src.resyncs += 1
+            src.resampler.position = s0
+            src.synced = True
+        # Converge on the estimate by the end of the block
+        src.step = (s1 - src.resampler.position) / self.block_size
+        if src.step <= 0:
+            src.step = (s1 - s0) / self.block_size
+
+    cdef bint _ready(self) nogil:
+        """True if every stream has the input for the pending block
+        """
+        cdef Py_ssize_t i
+        cdef AggregateSource* src
+        for i in range(1, self.nsources):
+            src = &self.sources[i]
+            if not src.synced:
+                return False
+            if resampler_available(src.resampler, src.step) < self.block_size:
+                return False
+        return True
+
+    cdef void _emit(self) nogil:
+        """Write the pending block to the output buffer
+        """
+        cdef AggregateSource* src
+        cdef BufferItem* item = sample_buffer_acquire_write(self.out_buffer)
+        cdef float *dest
+        cdef Py_ssize_t i
+        self.pending = False
+        if item == NULL:
+            self.dropped_blocks += 1
+            for i in range(1, self.nsources):
+                src = &self.sources[i]
+                if src.synced:
+                    src.resampler.position += src.step * self.block_size
+            return
+        dest = <float *>item.bfr
+        memcpy(dest, self.sources[0].scratch, self.sources[0].nchannels * self.block_size * sizeof(float))
+        for i in range(1, self.nsources):
+            src = &self.sources[i]
+            self._resample(src, dest + src.channel_offset * self.block_size)
+        sample_buffer_commit_write_time(self.out_buffer, &self.pending_time)
+        atomic_store_release(&self.blocks, self.blocks + 1)
+
+    cdef void _resample(self, AggregateSource* src, float *dest) nogil:
+        cdef Py_ssize_t n = 0, block_size = self.block_size, c
+        if src.synced:
+            n = resampler_process(src.resampler, dest, block_size, 1, block_size, src.step)
+        if n < block_size:
+            for c in range(src.nchannels):
+                memset(dest + c * block_size + n, 0, (block_size - n) * sizeof(float))
+            if src.synced:
+                src.resampler.position += src.step * (block_size - n)
+            src.late_frames += block_size - n
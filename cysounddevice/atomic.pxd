@@ -0,0 +1,116 @@
+# cython: language_level=3
+
+from libc.stdint cimport uint64_t
+
+# Minimal set of atomic operations on 64-bit counters used to share indices
+# between the PortAudio callback thread and consumers without locks.
+#
+# GCC/Clang provide the ``__atomic`` builtins. For MSVC on x64 and ARM64,
+# aligned 64-bit volatile accesses are atomic. 32-bit x86 has no plain 64-bit
+# load or store so the Interlocked intrinsics are used there. Other compilers
+# are not supported.
+#
+# ``atomic_compare_exchange`` replaces ``*ptr`` with *desired* if it equals
+# ``*expected`` (with acquire/release ordering) and returns True. Otherwise
+# the current value is stored in ``*expected`` and False is returned.
+#
+# ``atomic_fence`` is a full memory barrier, for sequence counters guarding
+# data that is not itself atomic.
+#
+# ``thread_yield`` gives up the rest of the current timeslice and is meant for
+# spin-waits outside of the PortAudio callback.
+
+cdef extern from *:
+    """
+    #if defined(_MSC_VER)
+    #include <intrin.h>
+    #ifndef NOMINMAX
+    #define NOMINMAX
+    #endif
+    #include <windows.h>
+    #if defined(_M_IX86)
+    static CYTHON_INLINE uint64_t cysd_atomic_load_relaxed(uint64_t *ptr) {
+        return (uint64_t)_InterlockedCompareExchange64((volatile __int64 *)ptr, 0, 0);
+    }
+    static CYTHON_INLINE uint64_t cysd_atomic_load_acquire(uint64_t *ptr) {
+        return (uint64_t)_InterlockedCompareExchange64((volatile __int64 *)ptr, 0, 0);
+    }
+    static CYTHON_INLINE void cysd_atomic_store_release(uint64_t *ptr, uint64_t value) {
+        __int64 old = *(volatile __int64 *)ptr;
+        __int64 prev;
+        while ((prev = _InterlockedCompareExchange64((volatile __int64 *)ptr, (__int64)value, old)) != old) {
+            old = prev;
+        }
+    }
+    #elif defined(_M_X64) || defined(_M_ARM64)
+    static CYTHON_INLINE uint64_t cysd_atomic_load_relaxed(uint64_t *ptr) {
+        return *(volatile uint64_t *)ptr;
+    }
+    static CYTHON_INLINE uint64_t cysd_atomic_load_acquire(uint64_t *ptr) {
+        uint64_t value = *(volatile uint64_t *)ptr;
+    #if defined(_M_ARM64)
+        __dmb(_ARM64_BARRIER_ISH);
+    #else
+        _ReadWriteBarrier();
+    #endif
+        return value;
+    }
+    static CYTHON_INLINE void cysd_atomic_store_release(uint64_t *ptr, uint64_t value) {
+    #if defined(_M_ARM64)
+        __dmb(_ARM64_BARRIER_ISH);
+    #else
+        _ReadWriteBarrier();
+    #endif
+        *(volatile uint64_t *)ptr = value;
+    }
+    #else
+    #error "cysounddevice atomics are not implemented for this MSVC target"
+    #endif
+    static CYTHON_INLINE int cysd_atomic_compare_exchange(uint64_t *ptr, uint64_t *expected, uint64_t desired) {
+        __int64 prev = _InterlockedCompareExchange64(
+            (volatile __int64 *)ptr, (__int64)desired, (__int64)*expected
+        );
+        if (prev == (__int64)*expected) {
+            return 1;
+        }
+        *expected = (uint64_t)prev;
+        return 0;
+    }
+    static CYTHON_INLINE void cysd_atomic_fence(void) {
+        MemoryBarrier();
+    }
+    static CYTHON_INLINE void cysd_thread_yield(void) {
+        SwitchToThread();
+    }
+    #elif defined(__GNUC__) || defined(__clang__)
+    #include <sched.h>
+    static CYTHON_INLINE uint64_t cysd_atomic_load_relaxed(uint64_t *ptr) {
+        return __atomic_load_n(ptr, __ATOMIC_RELAXED);
+    }
+    static CYTHON_INLINE uint64_t cysd_atomic_load_acquire(uint64_t *ptr) {
+        return __atomic_load_n(ptr, __ATOMIC_ACQUIRE);
+    }
+    static CYTHON_INLINE void cysd_atomic_store_release(uint64_t *ptr, uint64_t value) {
+        __atomic_store_n(ptr, value, __ATOMIC_RELEASE);
+    }
+    static CYTHON_INLINE int cysd_atomic_compare_exchange(uint64_t *ptr, uint64_t *expected, uint64_t desired) {
+        return __atomic_compare_exchange_n(
+            ptr, expected, desired, 0, __ATOMIC_ACQ_REL, __ATOMIC_ACQUIRE
+        );
+    }
+    static CYTHON_INLINE void cysd_atomic_fence(void) {
+        __atomic_thread_fence(__ATOMIC_SEQ_CST);
+    }
+    static CYTHON_INLINE void cysd_thread_yield(void) {
+        sched_yield();
+    }
+    #else
+    #error "cysounddevice atomics require GCC, Clang or MSVC"
+    #endif
+    """
+    uint64_t atomic_load_relaxed "cysd_atomic_load_relaxed" (uint64_t *ptr) nogil
+    uint64_t atomic_load_acquire "cysd_atomic_load_acquire" (uint64_t *ptr) nogil
+    void atomic_store_release "cysd_atomic_store_release" (uint64_t *ptr, uint64_t value) nogil
+    bint atomic_compare_exchange "cysd_atomic_compare_exchange" (uint64_t *ptr, uint64_t *expected, uint64_t desired) nogil
+    void atomic_fence "cysd_atomic_fence" () nogil
+    void thread_yield "cysd_thread_yield" () nogil
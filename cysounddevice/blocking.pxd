@@ -0,0 +1,39 @@
+# cython: language_level=3
+
+from libc.stdint cimport uint64_t
+
+from cysounddevice.pawrapper cimport *
+from cysounddevice.types cimport *
+from cysounddevice.buffer cimport SampleLayout
+
+cdef class BlockingStreamIO:
+    cdef readonly object stream
+    cdef PaStream* _pa_stream_ptr
+    cdef SampleFormat* sample_format
+    cdef SampleLayout layout
+    cdef readonly int input_channels, output_channels
+    cdef readonly Py_ssize_t chunk_frames
+    cdef Py_ssize_t itemsize
+    cdef char *in_scratch
+    cdef char *out_scratch
+    cdef void **in_planes
+    cdef void **out_planes
+    cdef SampleTime_s in_time, out_time
+    cdef SAMPLE_INDEX_t in_frame, out_frame
+    cdef readonly Py_ssize_t input_overflows, output_underflows
+    cdef uint64_t _in_flight
+    cdef uint64_t _closing
+
+    cdef void _open(self, PaStream* ptr, SampleFormat* fmt, SampleLayout layout,
+                    int input_channels, int output_channels,
+                    Py_ssize_t block_size, double sample_rate) except *
+    cdef void _close(self) except *
+    cdef void _get_strides(self, float[:,:] data, int nchannels,
+                           Py_ssize_t *nframes, Py_ssize_t *chan_stride,
+                           Py_ssize_t *frame_stride) except *
+    cdef PaError _read(self, float *dest, Py_ssize_t chan_stride,
+                       Py_ssize_t frame_stride, Py_ssize_t nframes) nogil except? -1
+    cdef PaError _write(self, const float *src, Py_ssize_t chan_stride,
+                        Py_ssize_t frame_stride, Py_ssize_t nframes) nogil except? -1
+    cpdef SampleTime read_into(self, float[:,:] data)
+    cpdef SampleTime write(self, float[:,:] data)
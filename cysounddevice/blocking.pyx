@@ -0,0 +1,351 @@
+# cython: language_level=3
+
+cimport cython
+from cython cimport view
+from cpython.mem cimport PyMem_Malloc, PyMem_Free
+
+from cysounddevice.utils cimport handle_pa_error
+from cysounddevice.atomic cimport atomic_load_acquire, atomic_store_release, thread_yield
+from cysounddevice.buffer cimport SampleLayout_interleaved, SampleLayout_non_interleaved
+from cysounddevice.conversion cimport pack_samples, unpack_samples
+
+import warnings
+
+cdef class BlockingStreamIO:
+    """Reads and writes for a :class:`~cysounddevice.streams.Stream` opened
+    in blocking mode (without a callback)
+
+    Data is transferred directly to and from PortAudio with
+    :c:func:`Pa_ReadStream` and :c:func:`Pa_WriteStream` while the GIL is
+    released. Float32 streams whose array layout matches the host buffer
+    skip the intermediate conversion buffer entirely.
+
+    Reads and writes may be made from other threads. If the stream is
+    closed meanwhile, they stop after the current chunk (of up to
+    :attr:`chunk_frames`) and raise
+    :class:`~cysounddevice.utils.PortAudioError`.
+
+    Instances are created by :meth:`cysounddevice.streams.Stream.open`
+    and are available as :attr:`cysounddevice.streams.Stream.blocking_io`.
+
+    Arguments:
+        stream (Stream):
+
+    Attributes:
+        input_channels (int): Number of input channels
+        output_channels (int): Number of output channels
+        chunk_frames (int): Maximum number of frames passed to PortAudio in
+            one call (the size of the conversion buffers)
+        input_overflows (int): Number of reads that reported
+            ``paInputOverflowed``
+        output_underflows (int): Number of writes that reported
+            ``paOutputUnderflowed``
+        read_available (int): Number of frames that can be read without
+            blocking
+        write_available (int): Number of frames that can be written without
+            blocking
+    """
+    def __cinit__(self, stream):
+        self.stream = stream
+        self._pa_stream_ptr = NULL
+        self.in_scratch = NULL
+        self.out_scratch = NULL
+        self.in_planes = NULL
+        self.out_planes = NULL
+        self.input_channels = 0
+        self.output_channels = 0
+        self.input_overflows = 0
+        self.output_underflows = 0
+        self._in_flight = 0
+        self._closing = 0
+    def __dealloc__(self):
+        self._close()
+
+    cdef void _open(self, PaStream* ptr, SampleFormat* fmt, SampleLayout layout,
+                    int input_channels, int output_channels,
+                    Py_ssize_t block_size, double sample_rate) except *:
+        self._close()
+        if block_size <= 0:
+            block_size = 512
+        self._pa_stream_ptr = ptr
+        self.sample_format = fmt
+        self.layout = layout
+        self.input_channels = input_channels
+        self.output_channels = output_channels
+        self.chunk_frames = block_size
+        self.itemsize = fmt.bit_width // 8
+        self.in_frame = 0
+        self.out_frame = 0
+        self.input_overflows = 0
+        self.output_underflows = 0
+        _init_time(&self.in_time, block_size, sample_rate, Pa_GetStreamTime(ptr))
+        _init_time(&self.out_time, block_size, sample_rate, Pa_GetStreamTime(ptr))
+        if input_channels > 0:
+            self.in_scratch = <char *>PyMem_Malloc(block_size * input_channels * self.itemsize)
+            self.in_planes = <void **>PyMem_Malloc(input_channels * sizeof(void*))
+            if self.in_scratch == NULL or self.in_planes == NULL:
+                self._close()
+                raise MemoryError()
+        if output_channels > 0:
+            self.out_scratch = <char *>PyMem_Malloc(block_size * output_channels * self.itemsize)
+            self.out_planes = <void **>PyMem_Malloc(output_channels * sizeof(void*))
+            if self.out_scratch == NULL or self.out_planes == NULL:
+                self._close()
+                raise MemoryError()
+
+    cdef void _close(self) except *:
+        # Reads and writes from other threads stop at their next chunk.
+        # Wait for them to return before the buffers they use are freed.
+        # The count is checked with the GIL held so no new transfer can
+        # begin between the check and clearing the stream pointer.
+        atomic_store_release(&self._closing, 1)
+        while atomic_load_acquire(&self._in_flight) > 0:
+            with nogil:
+                thread_yield()
+        self._pa_stream_ptr = NULL
+        atomic_store_release(&self._closing, 0)
+        if self.in_scratch != NULL:
+            PyMem_Free(self.in_scratch)
+            self.in_scratch = NULL
+        if self.out_scratch != NULL:
+            PyMem_Free(self.out_scratch)
+            self.out_scratch = NULL
+        if self.in_planes != NULL:
+            PyMem_Free(self.in_planes)
+            self.in_planes = NULL
+        if self.out_planes != NULL:
+            PyMem_Free(self.out_planes)
+            self.out_planes = NULL
+
+    @property
+    def read_available(self):
+        if self._pa_stream_ptr == NULL or self.input_channels == 0:
+            return 0
+        cdef signed long r = Pa_GetStreamReadAvailable(self._pa_stream_ptr)
+        if r < 0:
+            handle_pa_error(r)
+        return r
+    @property
+    def write_available(self):
+        if self._pa_stream_ptr == NULL or self.output_channels == 0:
+            return 0
+        cdef signed long r = Pa_GetStreamWriteAvailable(self._pa_stream_ptr)
+        if r < 0:
+            handle_pa_error(r)
+        return r
+
+    cdef void _get_strides(self, float[:,:] data, int nchannels,
+                           Py_ssize_t *nframes, Py_ssize_t *chan_stride,
+                           Py_ssize_t *frame_stride) except *:
+        cdef Py_ssize_t itemsize = sizeof(float)
+        if self.layout == SampleLayout_interleaved:
+            if data.shape[1] != nchannels:
+                raise ValueError('data must be of shape (length, nchannels)')
+            nframes[0] = data.shape[0]
+            chan_stride[0] = data.strides[1] // itemsize
+            frame_stride[0] = data.strides[0] // itemsize
+        else:
+            if data.shape[0] != nchannels:
+                raise ValueError('data must be of shape (nchannels, length)')
+            nframes[0] = data.shape[1]
+            chan_stride[0] = data.strides[0] // itemsize
+            frame_stride[0] = data.strides[1] // itemsize
+
+    @cython.boundscheck(False)
+    @cython.wraparound(False)
+    cdef PaError _read(self, float *dest, Py_ssize_t chan_stride,
+                       Py_ssize_t frame_stride, Py_ssize_t nframes) nogil except? -1:
+        cdef SampleFormat* fmt = self.sample_format
+        cdef Py_ssize_t nchannels = self.input_channels
+        cdef Py_ssize_t chunk = self.chunk_frames
+        cdef bint planar = self.layout == SampleLayout_non_interleaved
+        cdef bint is_float = fmt.pa_ident == paFloat32
+        cdef Py_ssize_t offset = 0, n, c
+        cdef float *chunk_dest
+        cdef PaError err
+        while offset < nframes:
+            if atomic_load_acquire(&self._closing):
+                return paStreamIsStopped
+            n = nframes - offset
+            if n > chunk:
+                n = chunk
+            chunk_dest = dest + offset * frame_stride
+            if planar:
+                if is_float and frame_stride == 1:
+                    for c in range(nchannels):
+                        self.in_planes[c] = chunk_dest + c * chan_stride
+                    err = Pa_ReadStream(self._pa_stream_ptr, self.in_planes, n)
+                else:
+                    for c in range(nchannels):
+                        self.in_planes[c] = self.in_scratch + c * chunk * self.itemsize
+                    err = Pa_ReadStream(self._pa_stream_ptr, self.in_planes, n)
+                    if err == paNoError or err == paInputOverflowed:
+                        unpack_samples(
+                            self.in_scratch, chunk, 1,
+                            chunk_dest, chan_stride, frame_stride,
+                            nchannels, n, fmt,
+                        )
+            elif is_float and chan_stride == 1 and frame_stride == nchannels:
+                err = Pa_ReadStream(self._pa_stream_ptr, chunk_dest, n)
+            else:
+                err = Pa_ReadStream(self._pa_stream_ptr, self.in_scratch, n)
+                if err == paNoError or err == paInputOverflowed:
+                    unpack_samples(
+                        self.in_scratch, 1, nchannels,
+                        chunk_dest, chan_stride, frame_stride,
+                        nchannels, n, fmt,
+                    )
+            if err == paInputOverflowed:
+                self.input_overflows += 1
+            elif err != paNoError:
+                return err
+            offset += n
+        return paNoError
+
+    @cython.boundscheck(False)
+    @cython.wraparound(False)
+    cdef PaError _write(self, const float *src, Py_ssize_t chan_stride,
+                        Py_ssize_t frame_stride, Py_ssize_t nframes) nogil except? -1:
+        cdef SampleFormat* fmt = self.sample_format
+        cdef Py_ssize_t nchannels = self.output_channels
+        cdef Py_ssize_t chunk = self.chunk_frames
+        cdef bint planar = self.layout == SampleLayout_non_interleaved
+        cdef bint is_float = fmt.pa_ident == paFloat32
+        cdef Py_ssize_t offset = 0, n, c
+        cdef const float *chunk_src
+        cdef PaError err
+        while offset < nframes:
+            if atomic_load_acquire(&self._closing):
+                return paStreamIsStopped
+            n = nframes - offset
+            if n > chunk:
+                n = chunk
+            chunk_src = src + offset * frame_stride
+            if planar:
+                if is_float and frame_stride == 1:
+                    for c in range(nchannels):
+                        self.out_planes[c] = <void *>(chunk_src + c * chan_stride)
+                else:
+                    pack_samples(
+                        chunk_src, chan_stride, frame_stride,
+                        self.out_scratch, chunk, 1,
+                        nchannels, n, fmt,
+                    )
+                    for c in range(nchannels):
+                        self.out_planes[c] = self.out_scratch + c * chunk * self.itemsize
+                err = Pa_WriteStream(self._pa_stream_ptr, self.out_planes, n)
+            elif is_float and chan_stride == 1 and frame_stride == nchannels:
+                err = Pa_WriteStream(self._pa_stream_ptr, chunk_src, n)
+            else:
+                pack_samples(
+                    chunk_src, chan_stride, frame_stride,
+                    self.out_scratch, 1, nchannels,
+                    nchannels, n, fmt,
+                )
+                err = Pa_WriteStream(self._pa_stream_ptr, self.out_scratch, n)
+            if err == paOutputUnderflowed:
+                self.output_underflows += 1
+            elif err != paNoError:
+                return err
+            offset += n
+        return paNoError
+
+    cpdef SampleTime read_into(self, float[:,:] data):
+        """Read from the stream, blocking until *data* is filled
+
+        The shape of *data* follows the stream's
+        :attr:`~cysounddevice.streams.StreamInfo.layout`
+        (see :meth:`cysounddevice.buffer.StreamInputBuffer.read_into`),
+        with any number of frames.
+
+        Arguments:
+            data: A 2-dimensional float array (or memoryview) to copy data into
+
+        Returns:
+            SampleTime: The time of the first frame read, relative to the
+            start of the stream
+        """
+        if self._pa_stream_ptr == NULL or self.input_channels == 0:
+            raise RuntimeError('Stream is not open for blocking input')
+        cdef Py_ssize_t nframes, chan_stride, frame_stride
+        self._get_strides(data, self.input_channels, &nframes, &chan_stride, &frame_stride)
+        cdef SampleTime sample_time = SampleTime.from_struct(&self.in_time)
+        sample_time._set_sample_index(self.in_frame)
+        if nframes == 0:
+            return sample_time
+        cdef Py_ssize_t overflows = self.input_overflows
+        cdef PaError err
+        # The counter is only modified with the GIL held
+        atomic_store_release(&self._in_flight, self._in_flight + 1)
+        try:
+            with nogil:
+                err = self._read(&data[0,0], chan_stride, frame_stride, nframes)
+        finally:
+            atomic_store_release(&self._in_flight, self._in_flight - 1)
+        handle_pa_error(err)
+        self.in_frame += nframes
+        if self.input_overflows != overflows:
+            _warn_xrun('Input Overflow')
+        return sample_time
+
+    def read(self, Py_ssize_t nframes):
+        """Read *nframes* from the stream, blocking until they are available
+
+        Returns:
+            tuple: A tuple of ``(data, sample_time)`` where ``data`` is a new
+            float32 array (see :meth:`read_into`)
+        """
+        if self.layout == SampleLayout_interleaved:
+            shape = (nframes, self.input_channels)
+        else:
+            shape = (self.input_channels, nframes)
+        data = view.array(shape=shape, itemsize=sizeof(float), format='f')
+        sample_time = self.read_into(data)
+        return data, sample_time
+
+    cpdef SampleTime write(self, float[:,:] data):
+        """Write all frames from *data* to the stream, blocking until
+        they have been accepted
+
+        Arguments:
+            data: A 2-dimensional float array (or memoryview) shaped as for
+                :meth:`cysounddevice.buffer.StreamOutputBuffer.write_output_sf32`,
+                with any number of frames
+
+        Returns:
+            SampleTime: The time of the first frame written, relative to the
+            start of the stream
+        """
+        if self._pa_stream_ptr == NULL or self.output_channels == 0:
+            raise RuntimeError('Stream is not open for blocking output')
+        cdef Py_ssize_t nframes, chan_stride, frame_stride
+        self._get_strides(data, self.output_channels, &nframes, &chan_stride, &frame_stride)
+        cdef SampleTime sample_time = SampleTime.from_struct(&self.out_time)
+        sample_time._set_sample_index(self.out_frame)
+        if nframes == 0:
+            return sample_time
+        cdef Py_ssize_t underflows = self.output_underflows
+        cdef PaError err
+        atomic_store_release(&self._in_flight, self._in_flight + 1)
+        try:
+            with nogil:
+                err = self._write(&data[0,0], chan_stride, frame_stride, nframes)
+        finally:
+            atomic_store_release(&self._in_flight, self._in_flight - 1)
+        handle_pa_error(err)
+        self.out_frame += nframes
+        if self.output_underflows != underflows:
+            _warn_xrun('Output Underflow')
+        return sample_time
+
+cdef void _warn_xrun(str msg) except *:
+    # Imported here since stream_callback imports this module (through streams)
+    from cysounddevice.stream_callback import StreamCallbackError
+    warnings.warn(StreamCallbackError(msg))
+
+cdef void _init_time(SampleTime_s* st, Py_ssize_t block_size,
+                     double sample_rate, PaTime time_offset) nogil:
+    st.sample_rate = sample_rate
+    st.block_size = block_size
+    st.time_offset = time_offset
+    SampleTime_set_block_vars(st, 0, 0)
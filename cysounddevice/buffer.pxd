@@ -1,9 +1,21 @@
 # cython: language_level=3
 
+from libc.stdint cimport uint64_t
+
 from cysounddevice.pawrapper cimport *
 from cysounddevice.types cimport *
 from cysounddevice.streams cimport Stream
+from cysounddevice.routing cimport ChannelRouting
+
 
+cdef enum SampleLayout:
+    SampleLayout_deinterleaved
+    SampleLayout_interleaved
+    SampleLayout_non_interleaved
+
+cdef enum OverflowPolicy:
+    OverflowPolicy_drop_newest
+    OverflowPolicy_overwrite_oldest
 
 cdef struct BufferItem:
     SampleTime_s start_time
@@ -12,6 +24,8 @@ cdef struct BufferItem:
     Py_ssize_t itemsize
     Py_ssize_t nchannels
     Py_ssize_t total_size
+    Py_ssize_t chan_stride
+    Py_ssize_t frame_stride
     SampleBuffer* parent_buffer
     char *bfr
 
@@ -22,50 +36,149 @@ cdef struct SampleBuffer:
     Py_ssize_t itemsize
     Py_ssize_t item_length
     Py_ssize_t nchannels
-    Py_ssize_t write_index
-    Py_ssize_t read_index
+    char *slab
+    Py_ssize_t slab_size
+    Py_ssize_t item_stride
+    bint hugepages
+    SampleLayout layout
     BLOCK_t current_block
-    int read_available
-    int write_available
+    BLOCK_t start_block
+    SAMPLE_INDEX_t callback_frame
     SampleFormat* sample_format
+    OverflowPolicy overflow_policy
+    # The producer and consumer counters are kept on separate cache lines
+    char _pad_write[64]
+    uint64_t write_count
+    uint64_t dropped_frames
+    uint64_t dropped_blocks
+    char _pad_read[64]
+    uint64_t read_count
+    SampleTime_s read_time
+    SAMPLE_INDEX_t read_next
+    SAMPLE_INDEX_t read_gap
+    char _pad_end[64]
 
 cdef SampleBuffer* sample_buffer_create(SampleTime_s start_time,
                                         Py_ssize_t length,
                                         Py_ssize_t nchannels,
-                                        SampleFormat* sample_format) except *
+                                        SampleFormat* sample_format,
+                                        bint use_hugepages=*,
+                                        SampleLayout layout=*) except *
 cdef void sample_buffer_destroy(SampleBuffer* bfr) except *
+cdef Py_ssize_t sample_buffer_read_available(SampleBuffer* bfr) nogil
+cdef Py_ssize_t sample_buffer_write_available(SampleBuffer* bfr) nogil
+cdef Py_ssize_t sample_buffer_read_available_frames(SampleBuffer* bfr) nogil
+cdef Py_ssize_t sample_buffer_write_available_frames(SampleBuffer* bfr) nogil
 cdef int sample_buffer_write(SampleBuffer* bfr, const void *data, Py_ssize_t length) nogil
 cdef int sample_buffer_write_sf32(SampleBuffer* bfr, float[:,:] data) nogil
+cdef Py_ssize_t sample_buffer_write_frames_sf32(SampleBuffer* bfr, float[:,:] data) nogil
 cdef int sample_buffer_write_from_callback(SampleBuffer* bfr,
                                            const void *data,
                                            Py_ssize_t length,
                                            PaTime adcTime) nogil
+cdef int sample_buffer_write_sf32_from_callback(SampleBuffer* bfr,
+                                                const float *data,
+                                                Py_ssize_t chan_stride,
+                                                Py_ssize_t frame_stride,
+                                                Py_ssize_t length,
+                                                PaTime adcTime) nogil except -1
+cdef int sample_buffer_write_routed_from_callback(SampleBuffer* bfr,
+                                                  const void *data,
+                                                  ChannelRouting* routing,
+                                                  Py_ssize_t length,
+                                                  PaTime adcTime) nogil except -1
+cdef bint sample_buffer_check_overflow(SampleBuffer* bfr, Py_ssize_t length) nogil
 cdef SampleTime_s* sample_buffer_read(SampleBuffer* bfr, char *data, Py_ssize_t length) nogil
 cdef SampleTime_s* sample_buffer_read_from_callback(SampleBuffer* bfr,
                                                     char *data,
                                                     Py_ssize_t length,
                                                     PaTime dacTime) nogil
+cdef SampleTime_s* sample_buffer_read_sf32_from_callback(SampleBuffer* bfr,
+                                                         float *data,
+                                                         Py_ssize_t chan_stride,
+                                                         Py_ssize_t frame_stride,
+                                                         Py_ssize_t length,
+                                                         PaTime dacTime) nogil
+cdef SampleTime_s* sample_buffer_read_routed_from_callback(SampleBuffer* bfr,
+                                                           void *data,
+                                                           ChannelRouting* routing,
+                                                           Py_ssize_t length,
+                                                           PaTime dacTime) nogil
 cdef SampleTime_s* sample_buffer_read_sf32(SampleBuffer* bfr, float[:,:] data) nogil
+cdef Py_ssize_t sample_buffer_read_frames_sf32(SampleBuffer* bfr, float[:,:] data) nogil
+cdef Py_ssize_t sample_buffer_write_many_sf32(SampleBuffer* bfr,
+                                             float[:,:,:] data,
+                                             SampleTime_s[:] times) nogil
+cdef Py_ssize_t sample_buffer_read_many_sf32(SampleBuffer* bfr,
+                                            float[:,:,:] data,
+                                            SampleTime_s[:] times) nogil
+cdef BufferItem* sample_buffer_borrow_read(SampleBuffer* bfr) nogil
+cdef void sample_buffer_release_read(SampleBuffer* bfr) nogil
+cdef BufferItem* sample_buffer_acquire_write(SampleBuffer* bfr) nogil
+cdef void sample_buffer_commit_write(SampleBuffer* bfr) nogil
+cdef void sample_buffer_commit_write_time(SampleBuffer* bfr, SampleTime_s* start_time) nogil
+
 
+cdef class StreamBuffer
+
+cdef class BufferItemView:
+    cdef BufferItem* item
+    cdef readonly StreamBuffer owner
+    cdef readonly SampleTime start_time
+    cdef readonly bint writable
+    cdef readonly bint valid
+    cdef readonly bint interleaved
+    cdef readonly bint discontinuity
+    cdef readonly Py_ssize_t exports
+    cdef int ndim
+    cdef Py_ssize_t shape[3]
+    cdef Py_ssize_t strides[3]
+    cdef Py_ssize_t view_itemsize
+    cdef char *format
+
+    @staticmethod
+    cdef BufferItemView from_item(BufferItem* item, StreamBuffer owner, bint writable)
+    cdef void _invalidate(self) except *
 
 cdef class StreamBuffer:
     cdef readonly Stream stream
     cdef SampleBuffer* sample_buffer
     cdef readonly Py_ssize_t nchannels
     cdef bint own_buffer
+    cdef readonly BufferItemView item_view
+    cdef readonly object recorder
 
     # cpdef _build_buffers(self, Py_ssize_t buffer_len, Py_ssize_t itemsize)
     cdef void _set_sample_buffer(self, SampleBuffer* bfr) except *
+    cdef void _clear_sample_buffer(self) except *
+    cdef int _check_exports(self) except -1
     cdef int check_callback_errors(self) nogil except -1
+    cdef void _release_item_view(self, BufferItemView view) except *
+    cdef object _frames_array(self, Py_ssize_t nframes)
+    cpdef object block_array(self)
+    cdef object _check_many_args(self, float[:,:,:] data, object times)
 
 cdef class StreamInputBuffer(StreamBuffer):
     cpdef bint ready(self)
     cpdef SampleTime read_into(self, float[:,:] data)
     cdef SampleTime_s* _read_into(self, float[:,:] data) nogil
+    cpdef bint read_block_into(self, float[:,:] data, SampleTime sample_time)
     cdef SampleTime_s* _read_ptr(self, char *data) nogil
+    cpdef tuple read_many(self, float[:,:,:] data, object times=*)
+    cpdef tuple read_frames_into(self, float[:,:] data)
+    cpdef tuple read_frames(self, Py_ssize_t nframes)
+    cpdef BufferItemView borrow(self)
+    cpdef release(self)
 
 cdef class StreamOutputBuffer(StreamBuffer):
+    cdef readonly object player
+
+    cdef void _clear_sample_buffer(self) except *
     cpdef bint ready(self)
+    cpdef tuple write_many(self, float[:,:,:] data, object times=*)
+    cpdef Py_ssize_t write_frames(self, float[:,:] data)
+    cpdef BufferItemView acquire(self)
+    cpdef commit(self)
     cpdef int write_output_sf32(self, float[:,:] data)
     cdef int _write_output_sf32(self, float[:,:] data) nogil
     cdef int _write_output(self, const void *data) nogil
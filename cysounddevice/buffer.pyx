@@ -3,35 +3,131 @@
 cimport cython
 from cython cimport view
 from libc.stdlib cimport malloc, free
+from libc.string cimport memset, memcpy
 from cpython.mem cimport PyMem_Malloc, PyMem_Free
+from cpython.buffer cimport PyBUF_WRITABLE, PyBUF_FORMAT
 
 from cysounddevice.pawrapper cimport *
 from cysounddevice.types cimport *
-from cysounddevice.conversion cimport pack_buffer_item, unpack_buffer_item
+from cysounddevice.atomic cimport (
+    atomic_load_relaxed, atomic_load_acquire, atomic_store_release,
+    atomic_compare_exchange,
+)
+from cysounddevice.conversion cimport pack_samples, unpack_samples
+from cysounddevice.routing cimport routing_host_ptrs, routing_copy
+
+cdef extern from *:
+    """
+    #if defined(_WIN32)
+    #include <malloc.h>
+    static void *cysd_aligned_alloc(size_t alignment, size_t size) {
+        return _aligned_malloc(size, alignment);
+    }
+    static void cysd_aligned_free(void *ptr) {
+        _aligned_free(ptr);
+    }
+    static int cysd_advise_hugepages(void *ptr, size_t size) {
+        return -1;
+    }
+    #else
+    #include <stdlib.h>
+    #include <sys/mman.h>
+    static void *cysd_aligned_alloc(size_t alignment, size_t size) {
+        void *ptr = NULL;
+        if (posix_memalign(&ptr, alignment, size) != 0) {
+            return NULL;
+        }
+        return ptr;
+    }
+    static void cysd_aligned_free(void *ptr) {
+        free(ptr);
+    }
+    static int cysd_advise_hugepages(void *ptr, size_t size) {
+    #if defined(MADV_HUGEPAGE)
+        return madvise(ptr, size, MADV_HUGEPAGE);
+    #else
+        return -1;
+    #endif
+    }
+    #endif
+    """
+    void *aligned_alloc "cysd_aligned_alloc" (size_t alignment, size_t size) nogil
+    void aligned_free "cysd_aligned_free" (void *ptr) nogil
+    int advise_hugepages "cysd_advise_hugepages" (void *ptr, size_t size) nogil
+
+DEF CACHE_LINE_SIZE = 64
+DEF PAGE_SIZE = 4096
+DEF HUGE_PAGE_SIZE = 2097152
+
+cdef inline Py_ssize_t _round_up(Py_ssize_t value, Py_ssize_t multiple) nogil:
+    return ((value + multiple - 1) // multiple) * multiple
 
 cdef SampleBuffer* sample_buffer_create(SampleTime_s start_time,
                                         Py_ssize_t length,
                                         Py_ssize_t nchannels,
-                                        SampleFormat* sample_format) except *:
+                                        SampleFormat* sample_format,
+                                        bint use_hugepages=False,
+                                        SampleLayout layout=SampleLayout_deinterleaved) except *:
+    """Create a SampleBuffer
+
+    The payloads for all items are placed in a single allocation (the slab).
+    Each item starts on a cache line boundary so the callback and
+    conversion functions walk linear memory. Slabs of at least a page are
+    page-aligned and, if *use_hugepages* is set, the slab is aligned and
+    sized to 2MB and advised for transparent huge pages (Linux only).
+
+    With :c:enumerator:`SampleLayout_non_interleaved`, item payloads hold
+    one contiguous plane per channel, otherwise samples are interleaved.
+    """
+    if start_time.block_size <= 0 or length <= 0:
+        raise ValueError('Buffer length and block size must be greater than zero')
     cdef SampleBuffer* bfr = <SampleBuffer*>malloc(sizeof(SampleBuffer))
     cdef Py_ssize_t item_length = start_time.block_size
     cdef Py_ssize_t itemsize = sample_format.bit_width // 8
     cdef Py_ssize_t bfr_length = itemsize * item_length * nchannels
+    cdef Py_ssize_t item_stride = _round_up(bfr_length, CACHE_LINE_SIZE)
+    cdef Py_ssize_t slab_size = item_stride * length
+    cdef Py_ssize_t alignment = CACHE_LINE_SIZE
     if bfr == NULL:
         raise MemoryError()
+    if use_hugepages:
+        alignment = HUGE_PAGE_SIZE
+        slab_size = _round_up(slab_size, HUGE_PAGE_SIZE)
+    elif slab_size >= PAGE_SIZE:
+        alignment = PAGE_SIZE
+        slab_size = _round_up(slab_size, PAGE_SIZE)
+    bfr.slab = <char *>aligned_alloc(alignment, slab_size)
+    if bfr.slab == NULL:
+        free(bfr)
+        raise MemoryError()
+    bfr.hugepages = False
+    if use_hugepages:
+        bfr.hugepages = advise_hugepages(bfr.slab, slab_size) == 0
+    # Touch every page now so the callback never takes a page fault
+    memset(bfr.slab, 0, slab_size)
+    bfr.slab_size = slab_size
+    bfr.item_stride = item_stride
     copy_sample_time_struct(&start_time, &bfr.callback_time)
     bfr.length = length
     bfr.itemsize = itemsize
     bfr.item_length = item_length
     bfr.nchannels = nchannels
-    bfr.write_index = 0
-    bfr.read_index = 0
-    bfr.read_available = 0
+    bfr.layout = layout
+    bfr.write_count = 0
+    bfr.read_count = 0
     bfr.current_block = start_time.block
-    bfr.write_available = length
+    bfr.start_block = start_time.block
+    bfr.callback_frame = 0
     bfr.sample_format = sample_format
+    bfr.overflow_policy = OverflowPolicy_drop_newest
+    bfr.dropped_frames = 0
+    bfr.dropped_blocks = 0
+    bfr.read_next = -1
+    bfr.read_gap = 0
     bfr.items = <BufferItem *>malloc(sizeof(BufferItem) * length)
     if bfr.items == NULL:
+        aligned_free(bfr.slab)
+        free(bfr)
         raise MemoryError()
 
     cdef Py_ssize_t i
@@ -45,9 +141,13 @@ cdef SampleBuffer* sample_buffer_create(SampleTime_s start_time,
         item.itemsize = itemsize
         item.nchannels = nchannels
         item.total_size = bfr_length
-        item.bfr = <char *>malloc(bfr_length)
-        if item.bfr == NULL:
-            raise MemoryError()
+        if layout == SampleLayout_non_interleaved:
+            item.chan_stride = item_length
+            item.frame_stride = 1
+        else:
+            item.chan_stride = 1
+            item.frame_stride = nchannels
+        item.bfr = &bfr.slab[i * item_stride]
         item.parent_buffer = bfr
         copy_sample_time_struct(&_start_time, &item.start_time)
         _start_time.block += 1
@@ -61,124 +161,972 @@ cdef void sample_buffer_destroy(SampleBuffer* bfr) except *:
     for i in range(bfr.length):
         item = &bfr.items[i]
         item.parent_buffer = NULL
-        free(item.bfr)
         item.bfr = NULL
     item = NULL
+    aligned_free(bfr.slab)
+    bfr.slab = NULL
     free(bfr.items)
     free(bfr)
 
-cdef void _sample_buffer_write_advance(SampleBuffer* bfr) nogil:
-    bfr.write_index += 1
-    if bfr.write_index >= bfr.length:
-        bfr.write_index = 0
-    if bfr.write_available > 0:
-        bfr.write_available -= 1
-    if bfr.read_available <= bfr.length:
-        bfr.read_available += 1
+# -----------------------------------------------------------------------------
+# The SampleBuffer is a single-producer/single-consumer queue of frames.
+#
+# ``write_count`` and ``read_count`` are the total number of frames written
+# and read. They only ever increase. Frames are stored in the items
+# consecutively, so the item holding frame ``n`` is
+# ``(n // item_length) % length`` at offset ``n % item_length``.
+# This allows the PortAudio callback and the read/write functions to
+# transfer any number of frames, not only whole blocks.
+#
+# The owning side may read its own counter with relaxed ordering. The other
+# side's counter is loaded with acquire ordering and the owner publishes
+# its counter with release ordering *after* the frames have been copied, so
+# the contents are always visible before they become available.
+#
+# ``write_count`` is only modified by the producer. ``read_count`` belongs
+# to the consumer, but with OverflowPolicy_overwrite_oldest the stream
+# callback may also move it forward to discard the oldest items
+# (see sample_buffer_check_overflow). The consumer therefore copies its
+# frames out first and then advances ``read_count`` with a compare-exchange.
+# If that fails the frames may have been overwritten and the read starts
+# over from the new position. While an item is borrowed, the READ_BORROWED
+# bit is set in ``read_count`` and the producer drops new frames instead.
+#
+# The start_time of an item is set by the producer when it writes the
+# item's first frame. An item is only handed back to the producer once the
+# consumer has read all of it, so the producer never writes to (or restamps)
+# an item that is partially read. The space available for writing is
+# therefore counted from the start of the item holding ``read_count``.
+# Once the consumer advances past an item it may be reused by the producer
+# at any time. The read functions therefore copy the start time of the
+# first frame read into the consumer-owned ``read_time`` field (offset by
+# the frame's position within the item) and return a pointer to that instead.
+#
+# Writes made from the stream callback are stamped from the buffer's
+# ``callback_frame`` rather than the ring position, since the callback
+# skips writing when the buffer is full and the two would otherwise
+# drift apart. Times within an item are still counted from its first frame,
+# so a drop that ends part way through an item shows from the next item on.
+#
+# The consumer keeps the sample index it expects to read next in
+# ``read_next``. Each read stores the number of frames missing between that
+# and the frames actually read (dropped or discarded by the callback) in
+# ``read_gap``.
+# -----------------------------------------------------------------------------
+
+cdef uint64_t READ_BORROWED = (<uint64_t>1) << 63
+
+cdef inline uint64_t _read_position(uint64_t read_count) nogil:
+    """Strip the READ_BORROWED flag from a ``read_count`` value
+    """
+    return read_count & ~READ_BORROWED
+
+@cython.cdivision(True)
+cdef Py_ssize_t sample_buffer_read_available(SampleBuffer* bfr) nogil:
+    return sample_buffer_read_available_frames(bfr) // bfr.item_length
+
+@cython.cdivision(True)
+cdef Py_ssize_t sample_buffer_write_available(SampleBuffer* bfr) nogil:
+    return sample_buffer_write_available_frames(bfr) // bfr.item_length
+
+cdef Py_ssize_t sample_buffer_read_available_frames(SampleBuffer* bfr) nogil:
+    cdef uint64_t read_count = _read_position(atomic_load_acquire(&bfr.read_count))
+    cdef uint64_t write_count = atomic_load_acquire(&bfr.write_count)
+    return <Py_ssize_t>(write_count - read_count)
+
+@cython.cdivision(True)
+cdef inline Py_ssize_t _sample_buffer_free_frames(SampleBuffer* bfr,
+                                                  uint64_t write_count,
+                                                  uint64_t read_count) nogil:
+    """Number of frames between the write position and the start of the
+    item holding the read position
+    """
+    cdef uint64_t item_length = <uint64_t>bfr.item_length
+    cdef uint64_t read_item_start = _read_position(read_count) // item_length * item_length
+    return bfr.length * bfr.item_length - <Py_ssize_t>(write_count - read_item_start)
+
+cdef Py_ssize_t sample_buffer_write_available_frames(SampleBuffer* bfr) nogil:
+    cdef uint64_t write_count = atomic_load_acquire(&bfr.write_count)
+    cdef uint64_t read_count = atomic_load_acquire(&bfr.read_count)
+    return _sample_buffer_free_frames(bfr, write_count, read_count)
+
+cdef inline Py_ssize_t _sample_buffer_write_space(SampleBuffer* bfr) nogil:
+    """Number of frames the producer may write
+    """
+    cdef uint64_t write_count = atomic_load_relaxed(&bfr.write_count)
+    cdef uint64_t read_count = atomic_load_acquire(&bfr.read_count)
+    return _sample_buffer_free_frames(bfr, write_count, read_count)
+
+cdef inline uint64_t _sample_buffer_read_start(SampleBuffer* bfr) nogil:
+    """The consumer's read position
+    """
+    return _read_position(atomic_load_relaxed(&bfr.read_count))
+
+cdef inline Py_ssize_t _sample_buffer_read_space(SampleBuffer* bfr, uint64_t frame) nogil:
+    """Number of frames the consumer may read from *frame*
+    """
+    cdef uint64_t write_count = atomic_load_acquire(&bfr.write_count)
+    return <Py_ssize_t>(write_count - frame)
+
+cdef inline void _sample_buffer_write_advance(SampleBuffer* bfr, Py_ssize_t nframes) nogil:
+    cdef uint64_t write_count = atomic_load_relaxed(&bfr.write_count)
+    atomic_store_release(&bfr.write_count, write_count + <uint64_t>nframes)
+
+@cython.cdivision(True)
+cdef inline BufferItem* _sample_buffer_item_at(SampleBuffer* bfr, uint64_t frame,
+                                               Py_ssize_t *offset) nogil:
+    """Get the item holding the given frame and the frame's offset within it
+    """
+    cdef uint64_t item_length = <uint64_t>bfr.item_length
+    offset[0] = <Py_ssize_t>(frame % item_length)
+    return &bfr.items[(frame // item_length) % <uint64_t>bfr.length]
+
+@cython.cdivision(True)
+cdef void _sample_buffer_stamp_items(SampleBuffer* bfr,
+                                     uint64_t frame,
+                                     Py_ssize_t nframes,
+                                     bint from_callback,
+                                     PaTime adcTime) nogil:
+    """Set the start_time of each item whose first frame is within the range
+
+    If *from_callback* is True, *adcTime* is the time of the first frame in
+    the range and is used to set the time_offset of the items. The stream
+    position of the first frame is then taken from
+    :c:member:`~SampleBuffer.callback_frame` (which also counts the frames
+    of callbacks that were not written). Otherwise it is the ring position
+    *frame*.
+    """
+    cdef uint64_t item_length = <uint64_t>bfr.item_length
+    cdef uint64_t item_frame = (frame + item_length - 1) // item_length * item_length
+    cdef uint64_t end_frame = frame + <uint64_t>nframes
+    cdef uint64_t stream_frame = frame
+    cdef BufferItem* item
+    if from_callback:
+        stream_frame = <uint64_t>bfr.callback_frame
+    while item_frame < end_frame:
+        item = &bfr.items[(item_frame // item_length) % <uint64_t>bfr.length]
+        if from_callback:
+            item.start_time.time_offset = (
+                adcTime + (item_frame - frame) / item.start_time.sample_rate
+            ) - bfr.callback_time.time_offset
+        SampleTime_set_block_vars(
+            &item.start_time,
+            bfr.start_block + <BLOCK_t>((stream_frame + item_frame - frame) // item_length),
+            <Py_ssize_t>((stream_frame + item_frame - frame) % item_length),
+        )
+        item_frame += item_length
+
+cdef inline void _sample_time_add_frames(SampleTime_s* st, Py_ssize_t nframes) nogil:
+    """Move *st* forward by *nframes*, carrying into the block number
+    """
+    if nframes != 0:
+        SampleTime_set_sample_index(st, SampleTime_to_sample_index(st) + nframes, True)
+
+cdef SampleTime_s* _sample_buffer_set_read_time(SampleBuffer* bfr, uint64_t frame) nogil:
+    """Copy the time of *frame* into ``read_time``
+    """
+    cdef Py_ssize_t offset
+    cdef BufferItem* item = _sample_buffer_item_at(bfr, frame, &offset)
+    copy_sample_time_struct(&item.start_time, &bfr.read_time)
+    _sample_time_add_frames(&bfr.read_time, offset)
+    return &bfr.read_time
+
+cdef SAMPLE_INDEX_t _sample_buffer_read_gap(SampleBuffer* bfr, uint64_t frame,
+                                            Py_ssize_t nframes,
+                                            SAMPLE_INDEX_t *next_index) nogil:
+    """Count the stream frames missing before and within the *nframes*
+    starting at *frame*
+
+    The sample index following the last frame is stored in *next_index*
+    """
+    cdef SAMPLE_INDEX_t gap = 0, expected = bfr.read_next, index
+    cdef Py_ssize_t done = 0, offset, seg
+    cdef BufferItem* item
+    while done < nframes:
+        item = _sample_buffer_item_at(bfr, frame + done, &offset)
+        seg = item.length - offset
+        if seg > nframes - done:
+            seg = nframes - done
+        index = SampleTime_to_sample_index(&item.start_time) + offset
+        if expected >= 0 and index != expected:
+            gap += index - expected
+        expected = index + seg
+        done += seg
+    next_index[0] = expected
+    return gap
+
+cdef bint _sample_buffer_read_commit(SampleBuffer* bfr, uint64_t frame, Py_ssize_t nframes) nogil:
+    """Advance the read position past the *nframes* copied from *frame*
+
+    The time of the first frame is copied to ``read_time`` and the frames
+    missing before them to ``read_gap``. Returns False (without advancing)
+    if the producer discarded the frames while they were being copied, in
+    which case the read must be repeated.
+    """
+    cdef SAMPLE_INDEX_t gap, next_index
+    cdef uint64_t expected = atomic_load_relaxed(&bfr.read_count)
+    if _read_position(expected) != frame:
+        return False
+    _sample_buffer_set_read_time(bfr, frame)
+    gap = _sample_buffer_read_gap(bfr, frame, nframes, &next_index)
+    if not atomic_compare_exchange(&bfr.read_count, &expected, frame + <uint64_t>nframes):
+        return False
+    bfr.read_gap = gap
+    bfr.read_next = next_index
+    return True
+
+cdef void _sample_buffer_copy_in(SampleBuffer* bfr,
+                                 const char *data,
+                                 const char **planes,
+                                 Py_ssize_t data_length,
+                                 Py_ssize_t nframes) nogil:
+    """Copy raw frames to the buffer at the current write position
+
+    For non-interleaved buffers, the source channels are either given
+    by *planes* or (if NULL) stored consecutively in *data* with
+    *data_length* frames each. Otherwise *data* holds interleaved frames.
+    """
+    cdef uint64_t frame = atomic_load_relaxed(&bfr.write_count)
+    cdef Py_ssize_t itemsize = bfr.itemsize
+    cdef Py_ssize_t frame_size = itemsize * bfr.nchannels
+    cdef Py_ssize_t done = 0, offset, seg, chan_num
+    cdef const char *src
+    cdef BufferItem* item
+    while done < nframes:
+        item = _sample_buffer_item_at(bfr, frame + done, &offset)
+        seg = item.length - offset
+        if seg > nframes - done:
+            seg = nframes - done
+        if bfr.layout == SampleLayout_non_interleaved:
+            for chan_num in range(bfr.nchannels):
+                if planes != NULL:
+                    src = planes[chan_num]
+                else:
+                    src = data + chan_num * data_length * itemsize
+                memcpy(
+                    item.bfr + (chan_num * item.length + offset) * itemsize,
+                    src + done * itemsize, seg * itemsize,
+                )
+        else:
+            memcpy(item.bfr + offset * frame_size, data + done * frame_size, seg * frame_size)
+        done += seg
+
+cdef void _sample_buffer_copy_out(SampleBuffer* bfr,
+                                  uint64_t frame,
+                                  char *data,
+                                  char **planes,
+                                  Py_ssize_t data_length,
+                                  Py_ssize_t nframes) nogil:
+    """Copy raw frames from the buffer starting at *frame*
+
+    The destination is described as in :func:`_sample_buffer_copy_in`
+    """
+    cdef Py_ssize_t itemsize = bfr.itemsize
+    cdef Py_ssize_t frame_size = itemsize * bfr.nchannels
+    cdef Py_ssize_t done = 0, offset, seg, chan_num
+    cdef char *dest
+    cdef BufferItem* item
+    while done < nframes:
+        item = _sample_buffer_item_at(bfr, frame + done, &offset)
+        seg = item.length - offset
+        if seg > nframes - done:
+            seg = nframes - done
+        if bfr.layout == SampleLayout_non_interleaved:
+            for chan_num in range(bfr.nchannels):
+                if planes != NULL:
+                    dest = planes[chan_num]
+                else:
+                    dest = data + chan_num * data_length * itemsize
+                memcpy(
+                    dest + done * itemsize,
+                    item.bfr + (chan_num * item.length + offset) * itemsize,
+                    seg * itemsize,
+                )
+        else:
+            memcpy(data + done * frame_size, item.bfr + offset * frame_size, seg * frame_size)
+        done += seg
+
+# -----------------------------------------------------------------------------
+# The float32 arrays given to the ``*_sf32`` functions are shaped according
+# to the buffer's layout: ``(nframes, nchannels)`` for
+# SampleLayout_interleaved and ``(nchannels, nframes)`` otherwise.
+# The strides of the array are handed to the conversion kernels so no
+# intermediate copy is made.
+# -----------------------------------------------------------------------------
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+@cython.cdivision(True)
+cdef inline bint _sf32_strides(SampleBuffer* bfr, float[:,:] data,
+                               Py_ssize_t *nframes,
+                               Py_ssize_t *chan_stride,
+                               Py_ssize_t *frame_stride) nogil:
+    """Get the number of frames and the channel and frame strides
+    of *data* (in samples)
+
+    Returns False if the number of channels does not match the buffer
+    """
+    cdef int chan_axis = 0, frame_axis = 1
+    if bfr.layout == SampleLayout_interleaved:
+        chan_axis = 1
+        frame_axis = 0
+    if data.shape[chan_axis] != bfr.nchannels:
+        return False
+    nframes[0] = data.shape[frame_axis]
+    chan_stride[0] = data.strides[chan_axis] // <Py_ssize_t>sizeof(float)
+    frame_stride[0] = data.strides[frame_axis] // <Py_ssize_t>sizeof(float)
+    return True
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+@cython.cdivision(True)
+cdef inline bint _sf32_block_strides(SampleBuffer* bfr, float[:,:,:] data,
+                                     Py_ssize_t *nblocks,
+                                     Py_ssize_t *block_stride,
+                                     Py_ssize_t *chan_stride,
+                                     Py_ssize_t *frame_stride) nogil:
+    """Like :func:`_sf32_strides` for arrays of multiple blocks
+
+    The block axis is first for SampleLayout_interleaved
+    ``(nblocks, length, nchannels)`` and second otherwise
+    ``(nchannels, nblocks, length)``
+    """
+    cdef int block_axis = 1, chan_axis = 0, frame_axis = 2
+    if bfr.layout == SampleLayout_interleaved:
+        block_axis = 0
+        frame_axis = 1
+        chan_axis = 2
+    if data.shape[chan_axis] != bfr.nchannels or data.shape[frame_axis] != bfr.item_length:
+        return False
+    nblocks[0] = data.shape[block_axis]
+    block_stride[0] = data.strides[block_axis] // <Py_ssize_t>sizeof(float)
+    chan_stride[0] = data.strides[chan_axis] // <Py_ssize_t>sizeof(float)
+    frame_stride[0] = data.strides[frame_axis] // <Py_ssize_t>sizeof(float)
+    return True
+
+cdef int _sample_buffer_pack_sf32(SampleBuffer* bfr, const float *data,
+                                  Py_ssize_t chan_stride, Py_ssize_t frame_stride,
+                                  Py_ssize_t nframes) nogil except -1:
+    """Convert and copy frames to the buffer at the current write position
+    """
+    cdef uint64_t frame = atomic_load_relaxed(&bfr.write_count)
+    cdef Py_ssize_t done = 0, offset, seg
+    cdef BufferItem* item
+    while done < nframes:
+        item = _sample_buffer_item_at(bfr, frame + done, &offset)
+        seg = item.length - offset
+        if seg > nframes - done:
+            seg = nframes - done
+        pack_samples(
+            data + done * frame_stride, chan_stride, frame_stride,
+            item.bfr + offset * item.frame_stride * item.itemsize,
+            item.chan_stride, item.frame_stride,
+            item.nchannels, seg, bfr.sample_format,
+        )
+        done += seg
+    return 0
+
+cdef int _sample_buffer_unpack_sf32(SampleBuffer* bfr, uint64_t frame, float *data,
+                                    Py_ssize_t chan_stride, Py_ssize_t frame_stride,
+                                    Py_ssize_t nframes) nogil except -1:
+    """Copy and convert frames from the buffer starting at *frame*
+    """
+    cdef Py_ssize_t done = 0, offset, seg
+    cdef BufferItem* item
+    while done < nframes:
+        item = _sample_buffer_item_at(bfr, frame + done, &offset)
+        seg = item.length - offset
+        if seg > nframes - done:
+            seg = nframes - done
+        unpack_samples(
+            item.bfr + offset * item.frame_stride * item.itemsize,
+            item.chan_stride, item.frame_stride,
+            data + done * frame_stride, chan_stride, frame_stride,
+            item.nchannels, seg, bfr.sample_format,
+        )
+        done += seg
+    return 0
+
+cdef inline void _sample_buffer_commit(SampleBuffer* bfr, Py_ssize_t nframes,
+                                       bint from_callback, PaTime adcTime) nogil:
+    cdef uint64_t frame = atomic_load_relaxed(&bfr.write_count)
+    _sample_buffer_stamp_items(bfr, frame, nframes, from_callback, adcTime)
+    _sample_buffer_write_advance(bfr, nframes)
+
+# -----------------------------------------------------------------------------
+# Producer functions
+# -----------------------------------------------------------------------------
 
 cdef int sample_buffer_write(SampleBuffer* bfr, const void *data, Py_ssize_t length) nogil:
-    if bfr.write_available <= 0:
-        return 0
-    cdef BufferItem* item = &bfr.items[bfr.write_index]
-    if length != item.length:
+    if length <= 0 or _sample_buffer_write_space(bfr) < length:
         return 0
-    cdef const char *cdata = <char *>data
-    copy_char_array(&cdata, &item.bfr, item.total_size)
-    item.start_time.block = bfr.current_block
-    _sample_buffer_write_advance(bfr)
+    _sample_buffer_copy_in(bfr, <const char *>data, NULL, length, length)
+    _sample_buffer_commit(bfr, length, False, 0)
     return 1
 
+@cython.boundscheck(False)
+@cython.wraparound(False)
 cdef int sample_buffer_write_sf32(SampleBuffer* bfr, float[:,:] data) nogil:
-    if bfr.write_available <= 0:
+    cdef Py_ssize_t nframes, chan_stride, frame_stride
+    if not _sf32_strides(bfr, data, &nframes, &chan_stride, &frame_stride):
         return 0
-    cdef BufferItem* item = &bfr.items[bfr.write_index]
-    cdef Py_ssize_t nchannels = data.shape[0]
-    cdef Py_ssize_t length = data.shape[1]
-    if length != item.length:
+    if nframes != bfr.item_length:
         return 0
-    if nchannels != item.nchannels:
+    if _sample_buffer_write_space(bfr) < nframes:
         return 0
-    pack_buffer_item(item, data)
-    item.start_time.block = bfr.current_block
-    _sample_buffer_write_advance(bfr)
+    _sample_buffer_pack_sf32(bfr, &data[0,0], chan_stride, frame_stride, nframes)
+    _sample_buffer_commit(bfr, nframes, False, 0)
     return 1
 
+@cython.boundscheck(False)
+@cython.wraparound(False)
+cdef Py_ssize_t sample_buffer_write_frames_sf32(SampleBuffer* bfr, float[:,:] data) nogil:
+    cdef Py_ssize_t nframes, chan_stride, frame_stride
+    cdef Py_ssize_t space = _sample_buffer_write_space(bfr)
+    if not _sf32_strides(bfr, data, &nframes, &chan_stride, &frame_stride):
+        return 0
+    if nframes > space:
+        nframes = space
+    if nframes <= 0:
+        return 0
+    _sample_buffer_pack_sf32(bfr, &data[0,0], chan_stride, frame_stride, nframes)
+    _sample_buffer_commit(bfr, nframes, False, 0)
+    return nframes
+
 cdef int sample_buffer_write_from_callback(SampleBuffer* bfr,
                                            const void *data,
                                            Py_ssize_t length,
                                            PaTime adcTime) nogil:
-    if bfr.write_available <= 0:
+    if length <= 0 or _sample_buffer_write_space(bfr) < length:
         return 0
-    cdef BufferItem* item = &bfr.items[bfr.write_index]
-    if length != item.length:
+    if bfr.layout == SampleLayout_non_interleaved:
+        _sample_buffer_copy_in(bfr, NULL, <const char **>data, length, length)
+    else:
+        _sample_buffer_copy_in(bfr, <const char *>data, NULL, length, length)
+    _sample_buffer_commit(bfr, length, True, adcTime)
+    return 1
+
+cdef int sample_buffer_write_sf32_from_callback(SampleBuffer* bfr,
+                                                const float *data,
+                                                Py_ssize_t chan_stride,
+                                                Py_ssize_t frame_stride,
+                                                Py_ssize_t length,
+                                                PaTime adcTime) nogil except -1:
+    """Like :c:func:`sample_buffer_write_from_callback`, but converting
+    *length* float32 frames with the given strides (in samples)
+    """
+    if length <= 0 or _sample_buffer_write_space(bfr) < length:
+        return 0
+    _sample_buffer_pack_sf32(bfr, data, chan_stride, frame_stride, length)
+    _sample_buffer_commit(bfr, length, True, adcTime)
+    return 1
+
+cdef void _item_channel_ptrs(BufferItem* item, Py_ssize_t offset, char **ptrs) nogil:
+    """Get pointers to the samples of each channel of *item* at frame *offset*
+    """
+    cdef Py_ssize_t c
+    for c in range(item.nchannels):
+        ptrs[c] = item.bfr + (offset * item.frame_stride + c * item.chan_stride) * item.itemsize
+
+cdef int sample_buffer_write_routed_from_callback(SampleBuffer* bfr,
+                                                  const void *data,
+                                                  ChannelRouting* routing,
+                                                  Py_ssize_t length,
+                                                  PaTime adcTime) nogil except -1:
+    """Like :c:func:`sample_buffer_write_from_callback`, with the channels of
+    the callback's input (:c:member:`~ChannelRouting.nsources` of them)
+    routed to the channels of the buffer by *routing*
+    """
+    cdef uint64_t frame = atomic_load_relaxed(&bfr.write_count)
+    cdef bint planar = bfr.layout == SampleLayout_non_interleaved
+    cdef Py_ssize_t done = 0, offset, seg, src_stride
+    cdef BufferItem* item
+    if length <= 0 or _sample_buffer_write_space(bfr) < length:
         return 0
-    cdef PaTime time_offset = adcTime - bfr.callback_time.time_offset
-    item.start_time.time_offset = time_offset
-    SampleTime_set_block_vars(&item.start_time, bfr.callback_time.block, 0)
-    cdef const char *cdata = <char *>data
-    copy_char_array(&cdata, &item.bfr, item.total_size)
-    _sample_buffer_write_advance(bfr)
+    while done < length:
+        item = _sample_buffer_item_at(bfr, frame + done, &offset)
+        seg = item.length - offset
+        if seg > length - done:
+            seg = length - done
+        routing_host_ptrs(
+            data, planar, routing.nsources, done, bfr.itemsize,
+            <char **>routing.src_ptrs, &src_stride,
+        )
+        _item_channel_ptrs(item, offset, routing.dest_ptrs)
+        routing_copy(routing, routing.src_ptrs, src_stride, routing.dest_ptrs, item.frame_stride, seg)
+        done += seg
+    _sample_buffer_commit(bfr, length, True, adcTime)
     return 1
-cdef void _sample_buffer_read_advance(SampleBuffer* bfr) nogil:
-    bfr.read_index += 1
-    if bfr.read_index >= bfr.length:
-        bfr.read_index = 0
-    if bfr.read_available > 0:
-        bfr.read_available -= 1
-    if bfr.write_available <= bfr.length:
-        bfr.write_available += 1
+
+cdef inline void _sample_buffer_count_dropped(SampleBuffer* bfr, uint64_t nframes,
+                                             uint64_t nblocks) nogil:
+    atomic_store_release(
+        &bfr.dropped_frames, atomic_load_relaxed(&bfr.dropped_frames) + nframes,
+    )
+    atomic_store_release(
+        &bfr.dropped_blocks, atomic_load_relaxed(&bfr.dropped_blocks) + nblocks,
+    )
+
+@cython.cdivision(True)
+cdef bint _sample_buffer_discard_oldest(SampleBuffer* bfr, Py_ssize_t nframes) nogil:
+    """Move the read position forward by whole items so that *nframes*
+    can be written
+
+    Returns False if the consumer has borrowed the item at the read position
+    or there is still not enough space
+    """
+    cdef uint64_t item_length = <uint64_t>bfr.item_length
+    cdef uint64_t write_count = atomic_load_relaxed(&bfr.write_count)
+    cdef uint64_t read_count = atomic_load_acquire(&bfr.read_count)
+    cdef uint64_t item_start, target
+    cdef Py_ssize_t free_frames
+    while True:
+        if read_count & READ_BORROWED:
+            return False
+        free_frames = _sample_buffer_free_frames(bfr, write_count, read_count)
+        if free_frames >= nframes:
+            return True
+        item_start = read_count // item_length * item_length
+        target = item_start + (
+            <uint64_t>(nframes - free_frames) + item_length - 1
+        ) // item_length * item_length
+        if target > write_count:
+            target = write_count
+        # On failure read_count is reloaded and the space checked again
+        if atomic_compare_exchange(&bfr.read_count, &read_count, target):
+            _sample_buffer_count_dropped(
+                bfr, target - read_count,
+                (target - item_start + item_length - 1) // item_length,
+            )
+            return _sample_buffer_free_frames(bfr, write_count, target) >= nframes
+
+@cython.cdivision(True)
+cdef bint sample_buffer_check_overflow(SampleBuffer* bfr, Py_ssize_t length) nogil:
+    """Make space for the stream callback to write *length* frames
+
+    If the buffer is full, the :c:member:`~SampleBuffer.overflow_policy`
+    decides which frames are lost. With ``OverflowPolicy_drop_newest`` the
+    new frames are dropped and False is returned. With
+    ``OverflowPolicy_overwrite_oldest`` the oldest unread items are
+    discarded to make room, falling back to dropping the new frames if the
+    consumer has borrowed the oldest item.
+
+    Lost frames are added to :c:member:`~SampleBuffer.dropped_frames` and
+    the number of blocks they were part of to
+    :c:member:`~SampleBuffer.dropped_blocks`.
+    """
+    cdef uint64_t item_length = <uint64_t>bfr.item_length
+    if length <= 0 or _sample_buffer_write_space(bfr) >= length:
+        return True
+    if bfr.overflow_policy == OverflowPolicy_overwrite_oldest:
+        if _sample_buffer_discard_oldest(bfr, length):
+            return True
+    _sample_buffer_count_dropped(
+        bfr, <uint64_t>length, (<uint64_t>length + item_length - 1) // item_length,
+    )
+    return False
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+cdef Py_ssize_t sample_buffer_write_many_sf32(SampleBuffer* bfr,
+                                             float[:,:,:] data,
+                                             SampleTime_s[:] times) nogil:
+    cdef Py_ssize_t nblocks, block_stride, chan_stride, frame_stride
+    cdef Py_ssize_t count = 0
+    cdef Py_ssize_t offset
+    cdef uint64_t frame
+    cdef BufferItem* item
+    if not _sf32_block_strides(bfr, data, &nblocks, &block_stride, &chan_stride, &frame_stride):
+        return 0
+    if times.shape[0] < nblocks:
+        nblocks = times.shape[0]
+    while count < nblocks:
+        if _sample_buffer_write_space(bfr) < bfr.item_length:
+            break
+        frame = atomic_load_relaxed(&bfr.write_count)
+        _sample_buffer_pack_sf32(
+            bfr, &data[0,0,0] + count * block_stride,
+            chan_stride, frame_stride, bfr.item_length,
+        )
+        _sample_buffer_stamp_items(bfr, frame, bfr.item_length, False, 0)
+        item = _sample_buffer_item_at(bfr, frame, &offset)
+        copy_sample_time_struct(&item.start_time, &times[count])
+        _sample_time_add_frames(&times[count], offset)
+        _sample_buffer_write_advance(bfr, bfr.item_length)
+        count += 1
+    return count
+
+# -----------------------------------------------------------------------------
+# Consumer functions
+# -----------------------------------------------------------------------------
 
 cdef SampleTime_s* sample_buffer_read(SampleBuffer* bfr, char *data, Py_ssize_t length) nogil:
-    if bfr.read_available <= 0:
+    cdef uint64_t frame
+    if length <= 0:
         return NULL
-    cdef BufferItem* item = &bfr.items[bfr.read_index]
-    if length != item.length:
-        return NULL
-    cdef const char *item_bfr = item.bfr
-    copy_char_array(&item_bfr, &data, item.total_size)
-    _sample_buffer_read_advance(bfr)
-    return &item.start_time
+    while True:
+        frame = _sample_buffer_read_start(bfr)
+        if _sample_buffer_read_space(bfr, frame) < length:
+            return NULL
+        _sample_buffer_copy_out(bfr, frame, data, NULL, length, length)
+        if _sample_buffer_read_commit(bfr, frame, length):
+            return &bfr.read_time
 
 cdef SampleTime_s* sample_buffer_read_from_callback(SampleBuffer* bfr,
                                                     char *data,
                                                     Py_ssize_t length,
                                                     PaTime dacTime) nogil:
-    if bfr.read_available <= 0:
+    cdef uint64_t frame
+    if length <= 0:
         return NULL
-    cdef BufferItem* item = &bfr.items[bfr.read_index]
-    if length != item.length:
+    while True:
+        frame = _sample_buffer_read_start(bfr)
+        if _sample_buffer_read_space(bfr, frame) < length:
+            return NULL
+        if bfr.layout == SampleLayout_non_interleaved:
+            _sample_buffer_copy_out(bfr, frame, NULL, <char **>data, length, length)
+        else:
+            _sample_buffer_copy_out(bfr, frame, data, NULL, length, length)
+        if _sample_buffer_read_commit(bfr, frame, length):
+            break
+    bfr.read_time.time_offset = dacTime - bfr.callback_time.time_offset
+    SampleTime_set_block_vars(
+        &bfr.read_time, bfr.callback_time.block, bfr.callback_time.block_index,
+    )
+    return &bfr.read_time
+
+cdef SampleTime_s* sample_buffer_read_routed_from_callback(SampleBuffer* bfr,
+                                                           void *data,
+                                                           ChannelRouting* routing,
+                                                           Py_ssize_t length,
+                                                           PaTime dacTime) nogil:
+    """Like :c:func:`sample_buffer_read_from_callback`, with the channels of
+    the buffer routed to those of the callback's output
+    (:c:member:`~ChannelRouting.ndests` of them) by *routing*
+    """
+    cdef bint planar = bfr.layout == SampleLayout_non_interleaved
+    cdef Py_ssize_t done, offset, seg, dest_stride
+    cdef uint64_t frame
+    cdef BufferItem* item
+    if length <= 0:
         return NULL
-    cdef PaTime time_offset = dacTime - bfr.callback_time.time_offset
-    item.start_time.time_offset = time_offset
-    SampleTime_set_block_vars(&item.start_time, bfr.callback_time.block, 0)
-    cdef const char *item_bfr = item.bfr
-    copy_char_array(&item_bfr, &data, item.total_size)
-    _sample_buffer_read_advance(bfr)
-    return &item.start_time
+    while True:
+        frame = _sample_buffer_read_start(bfr)
+        if _sample_buffer_read_space(bfr, frame) < length:
+            return NULL
+        done = 0
+        while done < length:
+            item = _sample_buffer_item_at(bfr, frame + done, &offset)
+            seg = item.length - offset
+            if seg > length - done:
+                seg = length - done
+            routing_host_ptrs(
+                data, planar, routing.ndests, done, bfr.itemsize,
+                routing.dest_ptrs, &dest_stride,
+            )
+            _item_channel_ptrs(item, offset, <char **>routing.src_ptrs)
+            routing_copy(routing, routing.src_ptrs, item.frame_stride, routing.dest_ptrs, dest_stride, seg)
+            done += seg
+        if _sample_buffer_read_commit(bfr, frame, length):
+            break
+    bfr.read_time.time_offset = dacTime - bfr.callback_time.time_offset
+    SampleTime_set_block_vars(
+        &bfr.read_time, bfr.callback_time.block, bfr.callback_time.block_index,
+    )
+    return &bfr.read_time
 
-cdef SampleTime_s* sample_buffer_read_sf32(SampleBuffer* bfr, float[:,:] data) nogil:
-    if bfr.read_available <= 0:
+cdef SampleTime_s* sample_buffer_read_sf32_from_callback(SampleBuffer* bfr,
+                                                         float *data,
+                                                         Py_ssize_t chan_stride,
+                                                         Py_ssize_t frame_stride,
+                                                         Py_ssize_t length,
+                                                         PaTime dacTime) nogil:
+    """Like :c:func:`sample_buffer_read_from_callback`, but converting
+    *length* frames to float32 with the given strides (in samples)
+    """
+    cdef uint64_t frame
+    if length <= 0:
         return NULL
-    cdef Py_ssize_t nchannels = data.shape[0]
-    cdef Py_ssize_t length = data.shape[1]
-    cdef BufferItem* item = &bfr.items[bfr.read_index]
-    if length != item.length:
+    while True:
+        frame = _sample_buffer_read_start(bfr)
+        if _sample_buffer_read_space(bfr, frame) < length:
+            return NULL
+        _sample_buffer_unpack_sf32(bfr, frame, data, chan_stride, frame_stride, length)
+        if _sample_buffer_read_commit(bfr, frame, length):
+            break
+    bfr.read_time.time_offset = dacTime - bfr.callback_time.time_offset
+    SampleTime_set_block_vars(
+        &bfr.read_time, bfr.callback_time.block, bfr.callback_time.block_index,
+    )
+    return &bfr.read_time
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+cdef SampleTime_s* sample_buffer_read_sf32(SampleBuffer* bfr, float[:,:] data) nogil:
+    cdef Py_ssize_t nframes, chan_stride, frame_stride
+    cdef uint64_t frame
+    if not _sf32_strides(bfr, data, &nframes, &chan_stride, &frame_stride):
         return NULL
-    if nchannels != item.nchannels:
+    if nframes != bfr.item_length:
         return NULL
-    unpack_buffer_item(item, data)
-    _sample_buffer_read_advance(bfr)
-    return &item.start_time
+    while True:
+        frame = _sample_buffer_read_start(bfr)
+        if _sample_buffer_read_space(bfr, frame) < nframes:
+            return NULL
+        _sample_buffer_unpack_sf32(bfr, frame, &data[0,0], chan_stride, frame_stride, nframes)
+        if _sample_buffer_read_commit(bfr, frame, nframes):
+            return &bfr.read_time
 
 @cython.boundscheck(False)
 @cython.wraparound(False)
-cdef void copy_char_array(const char **src, char **dest, Py_ssize_t length) nogil:
-    cdef const char *src_p = src[0]
-    cdef char *dest_p = dest[0]
-    cdef Py_ssize_t i
+cdef Py_ssize_t sample_buffer_read_frames_sf32(SampleBuffer* bfr, float[:,:] data) nogil:
+    cdef Py_ssize_t nframes, count, chan_stride, frame_stride, space
+    cdef uint64_t frame
+    if not _sf32_strides(bfr, data, &nframes, &chan_stride, &frame_stride):
+        return 0
+    while True:
+        frame = _sample_buffer_read_start(bfr)
+        space = _sample_buffer_read_space(bfr, frame)
+        count = nframes
+        if count > space:
+            count = space
+        if count <= 0:
+            return 0
+        _sample_buffer_unpack_sf32(bfr, frame, &data[0,0], chan_stride, frame_stride, count)
+        if _sample_buffer_read_commit(bfr, frame, count):
+            return count
 
-    for i in range(length):
-        dest_p[i] = src_p[i]
+@cython.boundscheck(False)
+@cython.wraparound(False)
+cdef Py_ssize_t sample_buffer_read_many_sf32(SampleBuffer* bfr,
+                                            float[:,:,:] data,
+                                            SampleTime_s[:] times) nogil:
+    cdef Py_ssize_t nblocks, block_stride, chan_stride, frame_stride
+    cdef Py_ssize_t count = 0
+    cdef SAMPLE_INDEX_t gap = 0
+    cdef uint64_t frame
+    if not _sf32_block_strides(bfr, data, &nblocks, &block_stride, &chan_stride, &frame_stride):
+        return 0
+    if times.shape[0] < nblocks:
+        nblocks = times.shape[0]
+    while count < nblocks:
+        frame = _sample_buffer_read_start(bfr)
+        if _sample_buffer_read_space(bfr, frame) < bfr.item_length:
+            break
+        _sample_buffer_unpack_sf32(
+            bfr, frame, &data[0,0,0] + count * block_stride,
+            chan_stride, frame_stride, bfr.item_length,
+        )
+        if not _sample_buffer_read_commit(bfr, frame, bfr.item_length):
+            continue
+        copy_sample_time_struct(&bfr.read_time, &times[count])
+        gap += bfr.read_gap
+        count += 1
+    if count > 0:
+        bfr.read_gap = gap
+    return count
+
+# -----------------------------------------------------------------------------
+# Zero-copy access to items. The consumer borrows the next readable item and
+# releases it when done. The producer acquires the next writable item, fills
+# it in place and commits it.
+#
+# These operate on whole items, so they are only available while the read
+# (or write) position is at the start of an item.
+# -----------------------------------------------------------------------------
+
+cdef BufferItem* sample_buffer_borrow_read(SampleBuffer* bfr) nogil:
+    cdef Py_ssize_t offset
+    cdef BufferItem* item
+    cdef uint64_t read_count, frame
+    cdef SAMPLE_INDEX_t gap, next_index
+    while True:
+        read_count = atomic_load_relaxed(&bfr.read_count)
+        frame = _read_position(read_count)
+        item = _sample_buffer_item_at(bfr, frame, &offset)
+        if read_count & READ_BORROWED:
+            return item
+        if offset != 0 or _sample_buffer_read_space(bfr, frame) < bfr.item_length:
+            return NULL
+        gap = _sample_buffer_read_gap(bfr, frame, bfr.item_length, &next_index)
+        # Once the flag is set the producer will not discard the item
+        if atomic_compare_exchange(&bfr.read_count, &read_count, read_count | READ_BORROWED):
+            bfr.read_gap = gap
+            bfr.read_next = next_index
+            return item
+
+cdef void sample_buffer_release_read(SampleBuffer* bfr) nogil:
+    cdef uint64_t read_count = atomic_load_relaxed(&bfr.read_count)
+    cdef uint64_t frame = _read_position(read_count)
+    if not read_count & READ_BORROWED:
+        return
+    _sample_buffer_set_read_time(bfr, frame)
+    atomic_store_release(&bfr.read_count, frame + <uint64_t>bfr.item_length)
+
+cdef BufferItem* sample_buffer_acquire_write(SampleBuffer* bfr) nogil:
+    cdef Py_ssize_t offset
+    cdef BufferItem* item
+    cdef uint64_t frame = atomic_load_relaxed(&bfr.write_count)
+    if _sample_buffer_write_space(bfr) < bfr.item_length:
+        return NULL
+    item = _sample_buffer_item_at(bfr, frame, &offset)
+    if offset != 0:
+        return NULL
+    _sample_buffer_stamp_items(bfr, frame, bfr.item_length, False, 0)
+    return item
+
+cdef void sample_buffer_commit_write(SampleBuffer* bfr) nogil:
+    if sample_buffer_acquire_write(bfr) == NULL:
+        return
+    _sample_buffer_write_advance(bfr, bfr.item_length)
+
+cdef void sample_buffer_commit_write_time(SampleBuffer* bfr, SampleTime_s* start_time) nogil:
+    """Commit the item from :c:func:`sample_buffer_acquire_write` with its
+    start time copied from *start_time* (instead of following the previous
+    item), so items can carry the timeline of another stream
+    """
+    cdef BufferItem* item = sample_buffer_acquire_write(bfr)
+    if item == NULL:
+        return
+    copy_sample_time_struct(start_time, &item.start_time)
+    _sample_buffer_write_advance(bfr, bfr.item_length)
+
+
+cdef class BufferItemView:
+    """Zero-copy view of a :c:type:`BufferItem` payload
+
+    Supports the buffer protocol with shape ``(frames, nchannels)`` in the
+    stream's native sample format, so it can be passed directly to
+    :func:`numpy.asarray`, :meth:`io.RawIOBase.write`, sockets, etc.
+    For streams using the ``'non_interleaved'`` layout (see
+    :attr:`cysounddevice.streams.StreamInfo.layout`) the shape is
+    ``(nchannels, frames)``.
+    Since there is no native 24-bit type, ``int24`` streams are exposed as
+    unsigned bytes with an extra dimension of length 3.
+
+    Instances are created by :meth:`StreamInputBuffer.borrow` (read-only)
+    and :meth:`StreamOutputBuffer.acquire` (writable). The underlying memory
+    belongs to the stream and is handed back to it by :meth:`release`,
+    after which the view is no longer valid.
+
+    Can be used as a context manager which calls :meth:`release` on exit.
+
+    Attributes:
+        start_time (SampleTime): Copy of the item's
+            :c:member:`~BufferItem.start_time` when the view was created
+        writable (bool): Whether the view allows writes
+        valid (bool): False once the item has been released
+        interleaved (bool): False if the item holds one plane per channel
+        discontinuity (bool): For read-only views, True if stream frames
+            were lost (see :attr:`StreamInputBuffer.dropped_frames`) between
+            the previous read and the end of the item
+        exports (int): Number of buffers currently exported from the view
+    """
+    def __cinit__(self):
+        self.item = NULL
+        self.valid = False
+        self.writable = False
+        self.discontinuity = False
+        self.exports = 0
+        self.format = NULL
+
+    @staticmethod
+    cdef BufferItemView from_item(BufferItem* item, StreamBuffer owner, bint writable):
+        cdef BufferItemView obj = BufferItemView()
+        cdef SampleFormat* fmt = item.parent_buffer.sample_format
+        obj.item = item
+        obj.owner = owner
+        obj.writable = writable
+        obj.valid = True
+        obj.start_time = SampleTime.from_struct(&item.start_time)
+        obj.interleaved = item.parent_buffer.layout != SampleLayout_non_interleaved
+        if obj.interleaved:
+            obj.shape[0] = item.length
+            obj.shape[1] = item.nchannels
+        else:
+            obj.shape[0] = item.nchannels
+            obj.shape[1] = item.length
+        obj.strides[0] = obj.shape[1] * item.itemsize
+        obj.strides[1] = item.itemsize
+        if fmt.is_24bit:
+            obj.ndim = 3
+            obj.shape[2] = 3
+            obj.strides[2] = 1
+            obj.view_itemsize = 1
+            obj.format = b'B'
+        else:
+            obj.ndim = 2
+            obj.view_itemsize = item.itemsize
+            if fmt.is_float:
+                obj.format = b'f'
+            elif not fmt.is_signed:
+                obj.format = b'B'
+            elif fmt.bit_width == 32:
+                obj.format = b'i'
+            elif fmt.bit_width == 16:
+                obj.format = b'h'
+            else:
+                obj.format = b'b'
+        return obj
+
+    @property
+    def nframes(self):
+        return self.shape[0] if self.interleaved else self.shape[1]
+
+    @property
+    def nchannels(self):
+        return self.shape[1] if self.interleaved else self.shape[0]
+
+    def __getbuffer__(self, Py_buffer *buffer, int flags):
+        if not self.valid:
+            raise BufferError('BufferItemView has been released')
+        if flags & PyBUF_WRITABLE and not self.writable:
+            raise BufferError('BufferItemView is read-only')
+        buffer.buf = self.item.bfr
+        buffer.obj = self
+        buffer.len = self.item.total_size
+        buffer.readonly = not self.writable
+        buffer.itemsize = self.view_itemsize
+        buffer.format = self.format if flags & PyBUF_FORMAT else NULL
+        buffer.ndim = self.ndim
+        buffer.shape = self.shape
+        buffer.strides = self.strides
+        buffer.suboffsets = NULL
+        buffer.internal = NULL
+        self.exports += 1
+
+    def __releasebuffer__(self, Py_buffer *buffer):
+        self.exports -= 1
+
+    def release(self):
+        """Hand the item back to the stream
+
+        For views from :meth:`StreamInputBuffer.borrow` this frees the item
+        for the stream to write into. For views from
+        :meth:`StreamOutputBuffer.acquire` this commits the item for playback.
+
+        Raises:
+            BufferError: If any buffers exported from the view (numpy arrays,
+                memoryviews, etc.) are still alive
+        """
+        if not self.valid:
+            return
+        if self.exports > 0:
+            raise BufferError('BufferItemView has {} exported buffers'.format(self.exports))
+        if self.owner is not None:
+            self.owner._release_item_view(self)
+        self._invalidate()
+
+    cdef void _invalidate(self) except *:
+        self.valid = False
+        self.item = NULL
+
+    def __enter__(self):
+        return self
+    def __exit__(self, *args):
+        self.release()
+    def __repr__(self):
+        return '<{self.__class__.__name__}: ({self.nframes}, {self.nchannels}), start_time={self.start_time}>'.format(self=self)
 
 
 cdef class StreamBuffer:
@@ -191,12 +1139,18 @@ cdef class StreamBuffer:
         nchannels (int): Number of channels
         read_available (int): Number of BufferItems available for reading
         write_available (int): Number of BufferItems available for writing
+        read_available_frames (int): Number of frames available for reading
+        write_available_frames (int): Number of frames available for writing
+        recorder: The :class:`~cysounddevice.recorder.StreamRecorder` or
+            :class:`~cysounddevice.aggregate.AggregateCapture` reading from
+            the buffer (if any)
     """
     def __cinit__(self, Stream stream):
         self.stream = stream
         self.sample_buffer = NULL
         self.nchannels = 0
         self.own_buffer = False
+        self.recorder = None
     def __dealloc__(self):
         if self.own_buffer:
             if self.sample_buffer:
@@ -205,22 +1159,31 @@ cdef class StreamBuffer:
     @property
     def read_available(self):
         self.check_callback_errors()
-        cdef int result = 0
-        cdef SampleBuffer* bfr
+        cdef Py_ssize_t result = 0
         if self.sample_buffer != NULL:
-            bfr = self.sample_buffer
-            result = bfr.read_available
+            result = sample_buffer_read_available(self.sample_buffer)
         return result
     @property
     def write_available(self):
         self.check_callback_errors()
-        cdef int result = 0
-        cdef SampleBuffer* bfr
+        cdef Py_ssize_t result = 0
         if self.sample_buffer != NULL:
-            bfr = self.sample_buffer
-            result = bfr.write_available
+            result = sample_buffer_write_available(self.sample_buffer)
+        return result
+    @property
+    def read_available_frames(self):
+        self.check_callback_errors()
+        cdef Py_ssize_t result = 0
+        if self.sample_buffer != NULL:
+            result = sample_buffer_read_available_frames(self.sample_buffer)
+        return result
+    @property
+    def write_available_frames(self):
+        self.check_callback_errors()
+        cdef Py_ssize_t result = 0
+        if self.sample_buffer != NULL:
+            result = sample_buffer_write_available_frames(self.sample_buffer)
         return result
-
 
     cdef int check_callback_errors(self) nogil except -1:
         self.stream.check_callback_errors()
@@ -241,31 +1204,148 @@ cdef class StreamBuffer:
     #         if not self.sample_buffer:
     #             raise MemoryError()
     cdef void _set_sample_buffer(self, SampleBuffer* bfr) except *:
+        self._clear_sample_buffer()
+        self.own_buffer = False
+        self.sample_buffer = bfr
+        self.nchannels = bfr.nchannels
+        self.check_callback_errors()
+
+    cdef void _clear_sample_buffer(self) except *:
+        self._check_exports()
+        if self.recorder is not None:
+            # Drain and stop the recorder thread before the buffer is freed
+            self.recorder.stop()
+        if self.item_view is not None:
+            self.item_view._invalidate()
+            self.item_view = None
         if self.sample_buffer:
             if self.own_buffer:
                 sample_buffer_destroy(self.sample_buffer)
             self.sample_buffer = NULL
 
-        self.own_buffer = False
-        self.sample_buffer = bfr
-        self.nchannels = bfr.nchannels
-        self.check_callback_errors()
+    cdef int _check_exports(self) except -1:
+        """Raise :class:`BufferError` if buffers exported from the current
+        :class:`BufferItemView` are still alive (since they reference the
+        :c:type:`SampleBuffer` memory directly)
+        """
+        if self.item_view is not None and self.item_view.exports > 0:
+            raise BufferError('BufferItemView has {} exported buffers'.format(
+                self.item_view.exports,
+            ))
+        return 0
+
+    cdef void _release_item_view(self, BufferItemView view) except *:
+        """Hand the item from :meth:`StreamInputBuffer.borrow` or
+        :meth:`StreamOutputBuffer.acquire` back to the :c:type:`SampleBuffer`
+
+        Read-only views are released for writing and writable views are
+        committed for reading
+        """
+        if view is not self.item_view:
+            raise BufferError('BufferItemView does not belong to this buffer')
+        self.item_view = None
+        if view.writable:
+            sample_buffer_commit_write(self.sample_buffer)
+        else:
+            sample_buffer_release_read(self.sample_buffer)
+
+    cdef object _frames_array(self, Py_ssize_t nframes):
+        """Create a float32 array for *nframes* shaped for the buffer's layout
+        """
+        cdef SampleBuffer* bfr = self.sample_buffer
+        if bfr.layout == SampleLayout_interleaved:
+            shape = (nframes, bfr.nchannels)
+        else:
+            shape = (bfr.nchannels, nframes)
+        return view.array(shape=shape, itemsize=sizeof(float), format='f')
+
+    cpdef object block_array(self):
+        """Create a float32 array for one block, shaped for the stream's
+        :attr:`~cysounddevice.streams.StreamInfo.layout`
+
+        The result is a typed memoryview, so passing it to methods such as
+        :meth:`StreamInputBuffer.read_block_into` or
+        :meth:`StreamOutputBuffer.write_output_sf32` does not create any
+        Python objects. Passing other arrays (such as numpy arrays) creates
+        a memoryview on each call.
+        """
+        if self.sample_buffer == NULL:
+            raise RuntimeError('Stream buffer is not available')
+        cdef float[:,:] result = self._frames_array(self.sample_buffer.item_length)
+        return result
+
+    cdef object _check_many_args(self, float[:,:,:] data, object times):
+        cdef SampleBuffer* bfr = self.sample_buffer
+        cdef SampleTime_s[:] times_view
+        cdef Py_ssize_t nblocks = data.shape[1]
+        if bfr != NULL:
+            if bfr.layout == SampleLayout_interleaved:
+                if data.shape[2] != bfr.nchannels or data.shape[1] != bfr.item_length:
+                    raise ValueError('data must be of shape (nblocks, block_size, nchannels)')
+                nblocks = data.shape[0]
+            elif data.shape[0] != bfr.nchannels or data.shape[2] != bfr.item_length:
+                raise ValueError('data must be of shape (nchannels, nblocks, block_size)')
+        if times is None:
+            times = sample_time_array_create(nblocks)
+        times_view = times
+        if times_view.shape[0] < nblocks:
+            raise ValueError('times array is too small')
+        return times
 
 cdef class StreamInputBuffer(StreamBuffer):
+    """Input buffer of a :class:`~cysounddevice.streams.Stream`
+
+    If the stream callback finds the buffer full, audio is lost according to
+    the stream's :attr:`~cysounddevice.streams.StreamInfo.overflow_policy`.
+    Timestamps of the frames read always reflect their position in the
+    stream, so lost frames show as a jump between consecutive reads, which
+    is also reported by :attr:`discontinuity`.
+
+    Attributes:
+        dropped_frames (int): Total number of input frames lost because
+            the buffer was full
+        dropped_blocks (int): Total number of blocks of ``block_size``
+            frames that lost frames
+        discontinuity (bool): True if frames were lost between the previous
+            read and the end of the last read (or borrowed item)
+        gap_frames (int): The number of frames lost between the previous
+            read and the end of the last read (or borrowed item)
+    """
+    @property
+    def dropped_frames(self):
+        if self.sample_buffer == NULL:
+            return 0
+        return atomic_load_acquire(&self.sample_buffer.dropped_frames)
+    @property
+    def dropped_blocks(self):
+        if self.sample_buffer == NULL:
+            return 0
+        return atomic_load_acquire(&self.sample_buffer.dropped_blocks)
+    @property
+    def discontinuity(self):
+        return self.gap_frames != 0
+    @property
+    def gap_frames(self):
+        if self.sample_buffer == NULL:
+            return 0
+        return self.sample_buffer.read_gap
+
     cpdef bint ready(self):
         """Check the SampleBuffer for read availability
         """
         self.check_callback_errors()
         if self.sample_buffer == NULL:
             return False
-        cdef SampleBuffer* bfr = self.sample_buffer
-        return bfr.read_available > 0
+        return sample_buffer_read_available(self.sample_buffer) > 0
 
     cpdef SampleTime read_into(self, float[:,:] data):
         """Copy stream data from a :c:type:`SampleBuffer`
 
-        If the stream contains more than one channel, the samples will be deinterleaved
-        into shape (nchannels, length).
+        The shape of *data* depends on the stream's
+        :attr:`~cysounddevice.streams.StreamInfo.layout`. It is
+        ``(length, nchannels)`` for ``'interleaved'`` streams and
+        ``(nchannels, length)`` otherwise. For the default ``'deinterleaved'``
+        layout the samples are deinterleaved while copying.
 
         Note:
             The data will be converted to float32 and scaled to the range ``-1 to 1``
@@ -282,10 +1362,38 @@ cdef class StreamInputBuffer(StreamBuffer):
         cdef SampleTime sample_time = SampleTime.from_struct(item_st)
         return sample_time
 
+    cpdef bint read_block_into(self, float[:,:] data, SampleTime sample_time):
+        """Like :meth:`read_into`, but stores the start time of the block
+        in *sample_time* instead of creating a new
+        :class:`~cysounddevice.types.SampleTime`
+
+        Along with an array from :meth:`block_array`, this reads without
+        allocating any Python objects, so it can be used for every block of
+        a long running stream. Use
+        :meth:`Stream.callback_errors <cysounddevice.streams.Stream.callback_errors>`
+        to query errors explicitly.
+
+        Arguments:
+            data: A 2-dimensional float array (or memoryview) shaped as for
+                :meth:`read_into`
+            sample_time (SampleTime): The instance to update
+
+        Returns:
+            bool: True if a block was read, False if no data is available
+            (*sample_time* is unchanged)
+        """
+        cdef SampleTime_s* item_st = self._read_into(data)
+        if item_st == NULL:
+            return False
+        copy_sample_time_struct(item_st, &sample_time.data)
+        return True
+
     cdef SampleTime_s* _read_into(self, float[:,:] data) nogil:
         self.check_callback_errors()
         if self.sample_buffer == NULL:
             return NULL
+        if self.item_view is not None:
+            return NULL
         cdef SampleTime_s* item_st = sample_buffer_read_sf32(self.sample_buffer, data)
         return item_st
 
@@ -293,18 +1401,193 @@ cdef class StreamInputBuffer(StreamBuffer):
         self.check_callback_errors()
         if self.sample_buffer == NULL:
             return NULL
+        if self.item_view is not None:
+            return NULL
         cdef SampleBuffer* bfr = self.sample_buffer
         return sample_buffer_read(bfr, data, bfr.item_length)
 
+    cpdef tuple read_many(self, float[:,:,:] data, object times=None):
+        """Copy all available items (up to the size of *data*) in one call
+
+        Like :meth:`read_into`, samples are converted to float32.
+        :attr:`gap_frames` is the total for all blocks read. Blocks following
+        lost frames can be found from the sample index in *times*.
+
+        Arguments:
+            data: A 3-dimensional float array (or memoryview) of shape
+                ``(nblocks, block_size, nchannels)`` for ``'interleaved'``
+                streams or ``(nchannels, nblocks, block_size)`` otherwise
+                to copy data into
+            times: An optional array with the :c:type:`SampleTime_s` layout
+                and at least ``nblocks`` elements to store the start time of
+                each block. If not given, one will be created.
+
+        Returns:
+            tuple: A tuple of ``(count, times)`` where ``count`` is the number
+            of blocks read and ``times`` holds the :c:type:`SampleTime_s` of
+            each block read (see :func:`cysounddevice.types.get_sample_time_format`).
+            It can be viewed with :func:`numpy.asarray` as a structured array.
+        """
+        self.check_callback_errors()
+        times = self._check_many_args(data, times)
+        cdef SampleTime_s[:] times_view = times
+        cdef Py_ssize_t count = 0
+        if self.sample_buffer != NULL and self.item_view is None:
+            with nogil:
+                count = sample_buffer_read_many_sf32(self.sample_buffer, data, times_view)
+        return count, times[:count]
+
+    cpdef tuple read_frames_into(self, float[:,:] data):
+        """Copy up to as many frames as *data* holds, regardless of the block size
+
+        Arguments:
+            data: A 2-dimensional float array (or memoryview) shaped as for
+                :meth:`read_into`, with any number of frames
+
+        Returns:
+            tuple: A tuple of ``(count, sample_time)`` where ``count`` is the
+            number of frames copied to the start of *data* and ``sample_time``
+            is the :class:`~cysounddevice.types.SampleTime` of the first frame
+            (its :attr:`~cysounddevice.types.SampleTime.block_index` is the
+            position within the block). If no data is available,
+            ``sample_time`` is ``None``.
+        """
+        self.check_callback_errors()
+        if self.sample_buffer == NULL or self.item_view is not None:
+            return 0, None
+        cdef Py_ssize_t count
+        with nogil:
+            count = sample_buffer_read_frames_sf32(self.sample_buffer, data)
+        if count == 0:
+            return 0, None
+        return count, SampleTime.from_struct(&self.sample_buffer.read_time)
+
+    cpdef tuple read_frames(self, Py_ssize_t nframes):
+        """Read up to *nframes* frames, regardless of the block size
+
+        Arguments:
+            nframes (int): The maximum number of frames to read
+
+        Returns:
+            tuple: A tuple of ``(data, sample_time)`` where ``data`` is a float32
+            array shaped as for :meth:`read_into` holding the frames read and
+            ``sample_time`` is as described in :meth:`read_frames_into`.
+            If no data is available, returns ``None``.
+        """
+        self.check_callback_errors()
+        if self.sample_buffer == NULL or self.item_view is not None:
+            return None
+        cdef Py_ssize_t available = sample_buffer_read_available_frames(self.sample_buffer)
+        if nframes > available:
+            nframes = available
+        if nframes <= 0:
+            return None
+        cdef object data = self._frames_array(nframes)
+        count, sample_time = self.read_frames_into(data)
+        return data, sample_time
+
+    async def read(self, nframes=None):
+        """Wait for and read the next block of input
+
+        This is a coroutine that waits (without polling) for the stream
+        callback to provide *nframes* and then reads them as in
+        :meth:`read_frames`.
+
+        Arguments:
+            nframes (int, optional): The number of frames to read. Defaults
+                to the block size of the buffer (the stream's
+                :attr:`~cysounddevice.streams.Stream.frames_per_buffer` at the
+                :attr:`~cysounddevice.streams.Stream.buffer_sample_rate`)
+
+        Returns:
+            tuple: A tuple of ``(data, sample_time)`` (see :meth:`read_frames`),
+            or ``None`` if the stream is closed
+        """
+        cdef Py_ssize_t n
+        if nframes is None:
+            n = self.stream.frames_per_buffer
+            if self.sample_buffer != NULL:
+                n = self.sample_buffer.item_length
+        else:
+            n = nframes
+        while True:
+            self.check_callback_errors()
+            if self.sample_buffer == NULL:
+                return None
+            if self.item_view is not None:
+                raise BufferError('The previously borrowed item has not been released')
+            if n > self.sample_buffer.length * self.sample_buffer.item_length:
+                raise ValueError('nframes exceeds the buffer size')
+            if sample_buffer_read_available_frames(self.sample_buffer) >= n:
+                return self.read_frames(n)
+            if not self.stream.active:
+                return None
+            await self.stream.wait_for_callback()
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        result = await self.read()
+        if result is None:
+            raise StopAsyncIteration
+        return result
+
+    cpdef BufferItemView borrow(self):
+        """Borrow the next available item without copying
+
+        The returned :class:`BufferItemView` is read-only and references the
+        item's memory directly in the stream's native sample format.
+        It must be released (see :meth:`release`) before another item can be
+        read.
+
+        Returns:
+            BufferItemView: The view, or ``None`` if no data is available
+        """
+        self.check_callback_errors()
+        if self.sample_buffer == NULL:
+            return None
+        if self.item_view is not None:
+            raise BufferError('The previously borrowed item has not been released')
+        cdef BufferItem* item = sample_buffer_borrow_read(self.sample_buffer)
+        if item == NULL:
+            return None
+        self.item_view = BufferItemView.from_item(item, self, False)
+        self.item_view.discontinuity = self.sample_buffer.read_gap != 0
+        return self.item_view
+
+    cpdef release(self):
+        """Release the item obtained from :meth:`borrow`
+
+        This is equivalent to calling :meth:`BufferItemView.release`
+        """
+        if self.item_view is None:
+            return
+        self.item_view.release()
+
 cdef class StreamOutputBuffer(StreamBuffer):
+    """Output buffer of a :class:`~cysounddevice.streams.Stream`
+
+    Attributes:
+        player: The :class:`~cysounddevice.playback.FilePlayer` writing to
+            the buffer (if any)
+    """
+    def __cinit__(self, *args):
+        self.player = None
+
+    cdef void _clear_sample_buffer(self) except *:
+        if self.player is not None:
+            # Stop the player thread before the buffer is freed
+            self.player.stop()
+        StreamBuffer._clear_sample_buffer(self)
+
     cpdef bint ready(self):
         """Check the SampleBuffer for write availability
         """
         self.check_callback_errors()
         if self.sample_buffer == NULL:
             return False
-        cdef SampleBuffer* bfr = self.sample_buffer
-        return bfr.write_available > 0
+        return sample_buffer_write_available(self.sample_buffer) > 0
 
     cpdef int write_output_sf32(self, float[:,:] data):
         """Copy stream data to the :c:type:`SampleBuffer`
@@ -315,7 +1598,10 @@ cdef class StreamOutputBuffer(StreamBuffer):
             writing to the buffer.
 
         Arguments:
-            data: A 2-dimensional float array (or memoryview) to copy data from
+            data: A 2-dimensional float array (or memoryview) to copy data from.
+                The shape is ``(length, nchannels)`` for ``'interleaved'``
+                streams and ``(nchannels, length)`` otherwise
+                (see :attr:`~cysounddevice.streams.StreamInfo.layout`)
 
         Returns:
             int: 1 on success
@@ -326,6 +1612,8 @@ cdef class StreamOutputBuffer(StreamBuffer):
         self.check_callback_errors()
         if self.sample_buffer == NULL:
             return 0
+        if self.item_view is not None:
+            return 0
         return sample_buffer_write_sf32(self.sample_buffer, data)
 
     cdef int _write_output(self, const void *data) nogil:
@@ -343,5 +1631,125 @@ cdef class StreamOutputBuffer(StreamBuffer):
         self.check_callback_errors()
         if self.sample_buffer == NULL:
             return 0
+        if self.item_view is not None:
+            return 0
         cdef SampleBuffer* bfr = self.sample_buffer
         return sample_buffer_write(bfr, data, bfr.item_length)
+
+    cpdef tuple write_many(self, float[:,:,:] data, object times=None):
+        """Copy as many blocks from *data* as there are free items in one call
+
+        Like :meth:`write_output_sf32`, the input is expected to be float32
+        in the range ``-1 to 1``.
+
+        Arguments:
+            data: A 3-dimensional float array (or memoryview) of shape
+                ``(nblocks, block_size, nchannels)`` for ``'interleaved'``
+                streams or ``(nchannels, nblocks, block_size)`` otherwise
+                to copy data from
+            times: An optional array with the :c:type:`SampleTime_s` layout
+                and at least ``nblocks`` elements to store the start time of
+                each block. If not given, one will be created.
+
+        Returns:
+            tuple: A tuple of ``(count, times)`` where ``count`` is the number
+            of blocks written (starting from the first block in *data*) and
+            ``times`` holds the :c:type:`SampleTime_s` of each block written
+        """
+        self.check_callback_errors()
+        times = self._check_many_args(data, times)
+        cdef SampleTime_s[:] times_view = times
+        cdef Py_ssize_t count = 0
+        if self.sample_buffer != NULL and self.item_view is None:
+            with nogil:
+                count = sample_buffer_write_many_sf32(self.sample_buffer, data, times_view)
+        return count, times[:count]
+
+    cpdef Py_ssize_t write_frames(self, float[:,:] data):
+        """Copy as many frames from *data* as there is space for,
+        regardless of the block size
+
+        Arguments:
+            data: A 2-dimensional float array (or memoryview) shaped as for
+                :meth:`write_output_sf32`, with any number of frames
+
+        Returns:
+            int: The number of frames written (starting from the first frame
+            in *data*)
+        """
+        self.check_callback_errors()
+        if self.sample_buffer == NULL or self.item_view is not None:
+            return 0
+        cdef Py_ssize_t count
+        with nogil:
+            count = sample_buffer_write_frames_sf32(self.sample_buffer, data)
+        return count
+
+    async def write(self, data):
+        """Write all frames from *data*, waiting for space as needed
+
+        This is a coroutine that writes as in :meth:`write_frames` and waits
+        (without polling) for the stream callback to consume data whenever
+        the buffer is full.
+
+        Arguments:
+            data: A 2-dimensional float array (or memoryview) shaped as for
+                :meth:`write_output_sf32`, with any number of frames
+
+        Returns:
+            int: The number of frames written. This is less than the
+            length of *data* only if the stream was closed
+        """
+        cdef float[:,:] src = data
+        cdef Py_ssize_t total, count, written = 0
+        while True:
+            self.check_callback_errors()
+            if self.sample_buffer == NULL:
+                break
+            if self.item_view is not None:
+                raise BufferError('The previously acquired item has not been committed')
+            if self.sample_buffer.layout == SampleLayout_interleaved:
+                total = src.shape[0]
+                count = self.write_frames(src[written:,:])
+            else:
+                total = src.shape[1]
+                count = self.write_frames(src[:,written:])
+            written += count
+            if written >= total:
+                break
+            if not self.stream.active:
+                break
+            await self.stream.wait_for_callback()
+        return written
+
+    cpdef BufferItemView acquire(self):
+        """Acquire the next free item to be filled in place
+
+        The returned :class:`BufferItemView` is writable and references the
+        item's memory directly in the stream's native sample format.
+        Once filled, it must be committed (see :meth:`commit`) before another
+        item can be written.
+
+        Returns:
+            BufferItemView: The view, or ``None`` if the buffer is full
+        """
+        self.check_callback_errors()
+        if self.sample_buffer == NULL:
+            return None
+        if self.item_view is not None:
+            raise BufferError('The previously acquired item has not been committed')
+        cdef BufferItem* item = sample_buffer_acquire_write(self.sample_buffer)
+        if item == NULL:
+            return None
+        self.item_view = BufferItemView.from_item(item, self, True)
+        return self.item_view
+
+    cpdef commit(self):
+        """Commit the item obtained from :meth:`acquire` for playback
+
+        This is equivalent to calling :meth:`BufferItemView.release`
+        """
+        if self.item_view is None:
+            return
+        self.item_view.release()
+
@@ -0,0 +1,58 @@
+# cython: language_level=3
+
+from libc.stdint cimport uint64_t
+
+from cysounddevice.pawrapper cimport *
+from cysounddevice.types cimport *
+
+cdef struct ClockEstimator:
+    # Odd while the callback is updating the values
+    uint64_t seq
+    double sample_rate
+    # Loop bandwidth in Hz
+    double bandwidth
+    # Loop coefficients, set from the frame count of the first update
+    double b
+    double c
+    # Smoothing coefficient of mean_period
+    double a
+    # Prediction errors larger than this (in seconds) restart the loop
+    double reset_threshold
+    # Sample index of the current callback and its filtered time
+    SAMPLE_INDEX_t index
+    PaTime time
+    # Sample index and predicted time of the next callback
+    SAMPLE_INDEX_t next_index
+    PaTime next_time
+    # Seconds (of stream time) per sample from the loop, and its average
+    # over 2 / bandwidth seconds
+    double period
+    double mean_period
+    # Filtered difference between monotonic_time() and the stream time
+    double host_offset
+    # Last prediction error and its exponentially weighted mean square
+    double error
+    double error_ms
+    uint64_t count
+    uint64_t resets
+
+cdef void clock_estimator_init(ClockEstimator* est, double sample_rate, double bandwidth) nogil
+cdef PaTime clock_estimator_update(ClockEstimator* est,
+                                   SAMPLE_INDEX_t index,
+                                   PaTime t,
+                                   unsigned long nframes,
+                                   PaTime current_time,
+                                   double host_time) nogil
+cdef void clock_estimator_snapshot(ClockEstimator* est, ClockEstimator* dest) nogil
+cdef PaTime clock_estimator_time(ClockEstimator* est, double index) nogil
+cdef double clock_estimator_index(ClockEstimator* est, PaTime t) nogil
+
+cdef class StreamClock:
+    cdef ClockEstimator data
+    cdef readonly double wall_offset
+    cdef readonly double index_scale
+
+    @staticmethod
+    cdef StreamClock from_struct(ClockEstimator* data, double index_scale=*)
+
+    cdef double _get_index(self, object index) except? -1
@@ -0,0 +1,249 @@
+# cython: language_level=3
+
+cimport cython
+from libc.math cimport sqrt, fabs, M_PI
+from libc.string cimport memcpy, memset
+
+from cysounddevice.atomic cimport (
+    atomic_load_relaxed, atomic_load_acquire, atomic_store_release,
+    atomic_fence, thread_yield,
+)
+from cysounddevice.stats cimport monotonic_time
+
+import time
+
+# -----------------------------------------------------------------------------
+# Delay-locked loop
+#
+# A second order loop (as described by Fons Adriaensen in "Using a DLL to
+# filter time") predicts the time of each callback from the previous one
+# and the filtered sample period. The prediction error moves the next
+# prediction by ``b * e`` and the period by ``c * e``. The filtered time of
+# a callback is the prediction made for it, so jitter in the timestamps
+# given by PortAudio is removed while the period follows slow changes of
+# the device clock against the host clock.
+#
+# The loop's period still carries some of the jitter, so it is averaged
+# over ``2 / bandwidth`` seconds for the sample rate estimate and for
+# mapping between sample indices and times.
+# -----------------------------------------------------------------------------
+
+# Number of callback periods the prediction error may reach before the
+# loop is restarted from the next timestamp
+DEF RESET_PERIODS = 8.
+
+cdef void clock_estimator_init(ClockEstimator* est, double sample_rate, double bandwidth) nogil:
+    memset(est, 0, sizeof(ClockEstimator))
+    est.sample_rate = sample_rate
+    est.bandwidth = bandwidth
+    est.period = 1. / sample_rate
+    est.mean_period = est.period
+
+@cython.cdivision(True)
+cdef inline void _clock_estimator_start(ClockEstimator* est, SAMPLE_INDEX_t index,
+                                        PaTime t, unsigned long nframes) nogil:
+    """(Re)start the loop from the timestamp *t*, keeping the period
+    """
+    cdef double omega
+    if est.count == 0:
+        omega = 2 * M_PI * est.bandwidth * nframes * est.period
+        est.b = sqrt(2.) * omega
+        est.c = omega * omega
+        est.reset_threshold = RESET_PERIODS * nframes * est.period
+        est.a = nframes * est.period * est.bandwidth / 2
+    else:
+        est.resets += 1
+    est.index = index
+    est.time = t
+    est.next_index = index + nframes
+    est.next_time = t + est.period * nframes
+    est.error = 0
+
+@cython.cdivision(True)
+cdef PaTime clock_estimator_update(ClockEstimator* est,
+                                   SAMPLE_INDEX_t index,
+                                   PaTime t,
+                                   unsigned long nframes,
+                                   PaTime current_time,
+                                   double host_time) nogil:
+    """Add the timestamp of a callback and return its filtered time.
+    Called from the stream callback only
+
+    Arguments:
+        index: Sample index of the first frame of the callback
+        t: The ADC (or DAC) time given by PortAudio for the first frame.
+            If ``0`` (not provided by the host API), *current_time* is used
+        nframes: Number of frames in the callback
+        current_time: The ``currentTime`` given by PortAudio
+        host_time: :c:func:`monotonic_time` at the start of the callback
+    """
+    cdef uint64_t seq = est.seq
+    cdef double e, offset, a
+    atomic_store_release(&est.seq, seq + 1)
+    atomic_fence()
+    if t == 0:
+        t = current_time
+    offset = host_time - current_time
+    e = t - est.next_time
+    if est.count == 0 or index != est.next_index or fabs(e) > est.reset_threshold:
+        if est.count == 0:
+            est.host_offset = offset
+        _clock_estimator_start(est, index, t, nframes)
+    else:
+        est.index = index
+        est.time = est.next_time
+        est.next_index = index + nframes
+        est.next_time += est.b * e + est.period * nframes
+        est.period += est.c * e / nframes
+        # A running mean until the window is filled
+        a = 1. / est.count
+        if a < est.a:
+            a = est.a
+        est.mean_period += a * (est.period - est.mean_period)
+        est.error = e
+        est.error_ms += est.b * (e * e - est.error_ms)
+        est.host_offset += est.b * (offset - est.host_offset)
+    est.count += 1
+    atomic_store_release(&est.seq, seq + 2)
+    return est.time
+
+cdef void clock_estimator_snapshot(ClockEstimator* est, ClockEstimator* dest) nogil:
+    """Copy *est* to *dest*, retrying if the callback updated it during
+    the copy
+    """
+    cdef uint64_t seq
+    while True:
+        seq = atomic_load_acquire(&est.seq)
+        if seq & 1:
+            thread_yield()
+            continue
+        memcpy(dest, est, sizeof(ClockEstimator))
+        atomic_fence()
+        if atomic_load_relaxed(&est.seq) == seq:
+            return
+
+cdef PaTime clock_estimator_time(ClockEstimator* est, double index) nogil:
+    """Stream time of the (fractional) sample *index*
+    """
+    return est.time + est.mean_period * (index - est.index)
+
+@cython.cdivision(True)
+cdef double clock_estimator_index(ClockEstimator* est, PaTime t) nogil:
+    """Fractional sample index at the stream time *t*
+    """
+    return est.index + (t - est.time) / est.mean_period
+
+
+cdef class StreamClock:
+    """Snapshot of the clock model updated by the stream callback
+    (see :meth:`cysounddevice.streams.Stream.clock`)
+
+    Maps between sample indices (as given by
+    :attr:`SampleTime.sample_index <cysounddevice.types.SampleTime.sample_index>`)
+    and the stream time used by PortAudio, the :func:`time.monotonic` clock
+    and the system (wall) clock of :func:`time.time`.
+
+    Attributes:
+        nominal_sample_rate (float): The stream's sample rate
+        sample_rate (float): Estimated number of samples per second of
+            stream time (averaged over ``2 / bandwidth`` seconds)
+        period (float): Estimated duration of a sample in seconds
+            (``1 / sample_rate``)
+        bandwidth (float): Bandwidth of the loop in Hz
+        index (int): Sample index of the last callback
+        time (float): Filtered stream time of :attr:`index`
+        error (float): Difference between the last timestamp and its
+            prediction in seconds
+        jitter (float): Root mean square of the prediction errors in seconds
+        callbacks (int): Number of callbacks used
+        resets (int): Number of times the loop was restarted because a
+            timestamp was too far from its prediction (or frames were lost)
+        host_offset (float): :func:`time.monotonic` minus the stream time
+        wall_offset (float): :func:`time.time` minus :func:`time.monotonic`
+            when the snapshot was taken
+        index_scale (float): Number of device frames per sample index.
+            Other than ``1`` if the stream buffers use a different
+            :attr:`~cysounddevice.streams.Stream.buffer_sample_rate`, in
+            which case indices, rates and periods are those of the buffers
+    """
+    @staticmethod
+    cdef StreamClock from_struct(ClockEstimator* data, double index_scale=1):
+        cdef StreamClock obj = StreamClock.__new__(StreamClock)
+        clock_estimator_snapshot(data, &obj.data)
+        obj.index_scale = index_scale
+        obj.wall_offset = time.time() - monotonic_time()
+        return obj
+
+    @property
+    def nominal_sample_rate(self):
+        return self.data.sample_rate / self.index_scale
+    @property
+    def sample_rate(self):
+        return 1. / (self.data.mean_period * self.index_scale)
+    @property
+    def period(self):
+        return self.data.mean_period * self.index_scale
+    @property
+    def bandwidth(self):
+        return self.data.bandwidth
+    @property
+    def index(self):
+        return self.data.index / self.index_scale
+    @property
+    def time(self):
+        return self.data.time
+    @property
+    def error(self):
+        return self.data.error
+    @property
+    def jitter(self):
+        return sqrt(self.data.error_ms)
+    @property
+    def callbacks(self):
+        return self.data.count
+    @property
+    def resets(self):
+        return self.data.resets
+    @property
+    def host_offset(self):
+        return self.data.host_offset
+
+    cdef double _get_index(self, object index) except? -1:
+        if isinstance(index, SampleTime):
+            return SampleTime_to_sample_index(&(<SampleTime>index).data) * self.index_scale
+        return index * self.index_scale
+
+    def time_of(self, index):
+        """Stream time of a sample
+
+        Arguments:
+            index: A sample index (may be fractional) or a
+                :class:`~cysounddevice.types.SampleTime`
+        """
+        return clock_estimator_time(&self.data, self._get_index(index))
+    def monotonic_time_of(self, index):
+        """:func:`time.monotonic` time of a sample (see :meth:`time_of`)
+        """
+        return clock_estimator_time(&self.data, self._get_index(index)) + self.data.host_offset
+    def wall_time_of(self, index):
+        """:func:`time.time` time of a sample (see :meth:`time_of`)
+        """
+        return self.monotonic_time_of(index) + self.wall_offset
+
+    def index_at(self, PaTime t):
+        """Fractional sample index at the stream time *t*
+        """
+        return clock_estimator_index(&self.data, t) / self.index_scale
+    def index_at_monotonic_time(self, double t):
+        """Fractional sample index at the :func:`time.monotonic` time *t*
+        """
+        return clock_estimator_index(&self.data, t - self.data.host_offset) / self.index_scale
+    def index_at_wall_time(self, double t):
+        """Fractional sample index at the :func:`time.time` time *t*
+        """
+        return self.index_at_monotonic_time(t - self.wall_offset)
+
+    def __repr__(self):
+        return '<{}: sample_rate={:.6f}, jitter={:.3g}, resets={}>'.format(
+            self.__class__.__name__, self.sample_rate, self.jitter, self.resets,
+        )
@@ -4,6 +4,16 @@ from cysounddevice.pawrapper cimport *
 from cysounddevice.types cimport *
 from cysounddevice.buffer cimport BufferItem
 
+cdef int pack_samples(const float *src, Py_ssize_t src_chan_stride, Py_ssize_t src_frame_stride,
+                      char *dest, Py_ssize_t dest_chan_stride, Py_ssize_t dest_frame_stride,
+                      Py_ssize_t nchannels, Py_ssize_t nframes, SampleFormat* fmt) nogil except -1
+cdef int unpack_samples(const char *src, Py_ssize_t src_chan_stride, Py_ssize_t src_frame_stride,
+                        float *dest, Py_ssize_t dest_chan_stride, Py_ssize_t dest_frame_stride,
+                        Py_ssize_t nchannels, Py_ssize_t nframes, SampleFormat* fmt) nogil except -1
+cdef int unpack_add_samples(const char *src, Py_ssize_t src_stride,
+                            float *dest, Py_ssize_t dest_stride,
+                            Py_ssize_t nframes, float gain, SampleFormat* fmt) nogil except -1
+
 cdef int pack_buffer_item(BufferItem* item, float[:,:] src) nogil except -1
 cdef void pack_float32(BufferItem* item, float[:,:] src) nogil
 cdef void pack_sint32(BufferItem* item, float[:,:] src) nogil
@@ -3,219 +3,433 @@
 # TODO: Endian-ness should be checked at compilation time
 DEF LITTLE_ENDIAN = True
 
+from libc.stdint cimport int32_t, int16_t, int8_t, uint8_t
+
+cdef extern from "<math.h>" nogil:
+    float nextafterf(float x, float y)
+
 from cysounddevice.utils cimport raise_withgil, PyExc_ValueError
 
 # -----------------------------------------------------------------------------
-# Convert from 2-dimensional float32 array/memoryview into flattened values
-# scaled for the SampleBuffer's sample_format, then pack them
-# into the BufferItem's char buffer.
+# Sample conversion kernels
+#
+# The kernels operate on pointers with explicit channel and frame strides
+# (in samples, not bytes) so they can be used for any memory layout.
+#
+# When the source and destination have the same dense layout (for example a
+# Fortran-contiguous (nchannels, length) array and an interleaved BufferItem)
+# the conversion is a single flat loop the compiler can auto-vectorize.
+# Otherwise the loops walk the destination in memory order so the writes
+# are sequential.
+#
+# Values are saturated to the range ``-1.0 to float32_max`` of the format
+# without branching. Results are identical to the element-by-element
+# conversion used previously.
 # -----------------------------------------------------------------------------
 
-cdef int pack_buffer_item(BufferItem* item, float[:,:] src) nogil except -1:
-    cdef SampleFormat* fmt = item.parent_buffer.sample_format
+ctypedef fused sample_t:
+    float
+    int32_t
+    int16_t
+    int8_t
+    uint8_t
+
+cdef inline bint _is_dense(Py_ssize_t chan_stride, Py_ssize_t frame_stride,
+                           Py_ssize_t nchannels, Py_ssize_t nframes) nogil:
+    if chan_stride == 1 and (frame_stride == nchannels or nframes == 1):
+        return True
+    if frame_stride == 1 and (chan_stride == nframes or nchannels == 1):
+        return True
+    return False
+
+cdef inline bint _is_flat(Py_ssize_t src_chan_stride, Py_ssize_t src_frame_stride,
+                          Py_ssize_t dest_chan_stride, Py_ssize_t dest_frame_stride,
+                          Py_ssize_t nchannels, Py_ssize_t nframes) nogil:
+    """Check if both layouts are dense and map (channel, frame) to the same offset
+    """
+    if not _is_dense(src_chan_stride, src_frame_stride, nchannels, nframes):
+        return False
+    if not _is_dense(dest_chan_stride, dest_frame_stride, nchannels, nframes):
+        return False
+    if nchannels == 1:
+        return True
+    if nframes == 1:
+        return True
+    return src_chan_stride == dest_chan_stride and src_frame_stride == dest_frame_stride
+
+cdef inline void _pack_value(sample_t *dest, float value,
+                             float fmax, float flim, float fmult, sample_t sat) nogil:
+    # Single precision with branch-free min/max so the loops can be
+    # vectorized. The multipliers are powers of two, so scaling is exact.
+    # Values are clamped to [-1, flim] where flim is the largest float that
+    # scales into range. For int32 that is below fmax (float32_max rounds up
+    # to 1.0), and *sat* is added to values >= fmax to saturate them
+    cdef float fv
+    if sample_t is float:
+        dest[0] = value
+    else:
+        fv = value if value > -1 else -1
+        fv = fv if fv < flim else flim
+        if sample_t is uint8_t:
+            # (v + 1) * 128 truncated is floor(v * 128) + 128
+            fv = fv * 128
+            dest[0] = <uint8_t>(<int32_t>fv - <int32_t>(fv < <int32_t>fv) + 128)
+        elif sample_t is int32_t:
+            dest[0] = <int32_t>(fv * fmult) + <int32_t>(value >= fmax) * sat
+        else:
+            dest[0] = <sample_t>(fv * fmult)
+
+cdef inline float _pack_limit(double multiplier, double float32_max) nogil:
+    """Get the largest float <= *float32_max* that scales by *multiplier*
+    without exceeding ``float32_max * multiplier``
+    """
+    cdef float fmax = <float>float32_max
+    if <double>fmax * multiplier > float32_max * multiplier:
+        return nextafterf(fmax, 0)
+    return fmax
+
+cdef inline int32_t _pack_saturation(float flim, double multiplier, double float32_max) nogil:
+    # Difference between the saturated value and *flim* scaled. Computed in
+    # double precision so the compiler does not fold it into the loops
+    return <int32_t>(float32_max * multiplier) - <int32_t>(flim * multiplier)
+
+cdef inline float _unpack_value(sample_t value, double multiplier) nogil:
+    if sample_t is float:
+        return value
+    elif sample_t is int32_t:
+        return <float>value * multiplier
+    elif sample_t is uint8_t:
+        return (value - 128) * multiplier * 2
+    else:
+        return value * multiplier
+
+cdef void _pack_loop(const float *src, Py_ssize_t src_chan_stride, Py_ssize_t src_frame_stride,
+                     sample_t *dest, Py_ssize_t dest_chan_stride, Py_ssize_t dest_frame_stride,
+                     Py_ssize_t nchannels, Py_ssize_t nframes,
+                     double multiplier, double float32_max) nogil:
+    cdef Py_ssize_t i, chan_num, chan_ix
+    cdef const float *src_p
+    cdef sample_t *dest_p
+    cdef float fmax = <float>float32_max, fmult = <float>multiplier
+    cdef float flim = _pack_limit(multiplier, float32_max)
+    cdef sample_t sat = 0
+    if sample_t is int32_t:
+        sat = _pack_saturation(flim, multiplier, float32_max)
+
+    if _is_flat(src_chan_stride, src_frame_stride, dest_chan_stride, dest_frame_stride, nchannels, nframes):
+        for i in range(nchannels * nframes):
+            _pack_value(&dest[i], src[i], fmax, flim, fmult, sat)
+    elif dest_frame_stride == 1:
+        for chan_num in range(nchannels):
+            src_p = src + chan_num * src_chan_stride
+            dest_p = dest + chan_num * dest_chan_stride
+            for chan_ix in range(nframes):
+                _pack_value(&dest_p[chan_ix], src_p[chan_ix * src_frame_stride], fmax, flim, fmult, sat)
+    elif dest_chan_stride == 1:
+        # Frames outer so the writes into interleaved frames are sequential
+        for chan_ix in range(nframes):
+            src_p = src + chan_ix * src_frame_stride
+            dest_p = dest + chan_ix * dest_frame_stride
+            for chan_num in range(nchannels):
+                _pack_value(&dest_p[chan_num], src_p[chan_num * src_chan_stride], fmax, flim, fmult, sat)
+    else:
+        for chan_ix in range(nframes):
+            src_p = src + chan_ix * src_frame_stride
+            dest_p = dest + chan_ix * dest_frame_stride
+            for chan_num in range(nchannels):
+                _pack_value(&dest_p[chan_num * dest_chan_stride], src_p[chan_num * src_chan_stride], fmax, flim, fmult, sat)
+
+cdef void _unpack_loop(const sample_t *src, Py_ssize_t src_chan_stride, Py_ssize_t src_frame_stride,
+                       float *dest, Py_ssize_t dest_chan_stride, Py_ssize_t dest_frame_stride,
+                       Py_ssize_t nchannels, Py_ssize_t nframes, double multiplier) nogil:
+    cdef Py_ssize_t i, chan_num, chan_ix
+    cdef const sample_t *src_p
+    cdef float *dest_p
+
+    if _is_flat(src_chan_stride, src_frame_stride, dest_chan_stride, dest_frame_stride, nchannels, nframes):
+        for i in range(nchannels * nframes):
+            dest[i] = _unpack_value(src[i], multiplier)
+    elif dest_frame_stride == 1:
+        for chan_num in range(nchannels):
+            src_p = src + chan_num * src_chan_stride
+            dest_p = dest + chan_num * dest_chan_stride
+            for chan_ix in range(nframes):
+                dest_p[chan_ix] = _unpack_value(src_p[chan_ix * src_frame_stride], multiplier)
+    else:
+        for chan_ix in range(nframes):
+            src_p = src + chan_ix * src_frame_stride
+            dest_p = dest + chan_ix * dest_frame_stride
+            for chan_num in range(nchannels):
+                dest_p[chan_num * dest_chan_stride] = _unpack_value(src_p[chan_num * src_chan_stride], multiplier)
+
+cdef void _unpack_add_loop(const sample_t *src, Py_ssize_t src_stride,
+                           float *dest, Py_ssize_t dest_stride,
+                           Py_ssize_t nframes, double multiplier, float gain) nogil:
+    cdef Py_ssize_t i
+    if src_stride == 1 and dest_stride == 1:
+        for i in range(nframes):
+            dest[i] += _unpack_value(src[i], multiplier) * gain
+    else:
+        for i in range(nframes):
+            dest[i * dest_stride] += _unpack_value(src[i * src_stride], multiplier) * gain
 
+cdef inline void _pack_int24_value(unsigned char *bfr, float value, float flim, float fmult) nogil:
+    # Values at or above float32_max only differ from *flim* scaled in the
+    # low byte, which is not packed, so no saturation term is needed
+    cdef float fv = value if value > -1 else -1
+    cdef int32_t packed_value
+    fv = fv if fv < flim else flim
+    packed_value = <int32_t>(fv * fmult)
+    IF LITTLE_ENDIAN:
+        bfr[0] = <unsigned char>(packed_value >> 8)
+        bfr[1] = <unsigned char>(packed_value >> 16)
+        bfr[2] = <unsigned char>(packed_value >> 24)
+    ELSE:
+        bfr[2] = <unsigned char>(packed_value >> 8)
+        bfr[1] = <unsigned char>(packed_value >> 16)
+        bfr[0] = <unsigned char>(packed_value >> 24)
+
+cdef inline float _unpack_int24_value(const unsigned char *bfr, double multiplier) nogil:
+    cdef int32_t unpacked
+    IF LITTLE_ENDIAN:
+        unpacked =  ((<int32_t>bfr[0]) << 8)
+        unpacked |= ((<int32_t>bfr[1]) << 16)
+        unpacked |= ((<int32_t>bfr[2]) << 24)
+    ELSE:
+        unpacked =  <int32_t>bfr[2] << 8
+        unpacked |= <int32_t>bfr[1] << 16
+        unpacked |= <int32_t>bfr[0] << 24
+    return unpacked * multiplier
+
+cdef void _pack_int24_loop(const float *src, Py_ssize_t src_chan_stride, Py_ssize_t src_frame_stride,
+                           unsigned char *dest, Py_ssize_t dest_chan_stride, Py_ssize_t dest_frame_stride,
+                           Py_ssize_t nchannels, Py_ssize_t nframes,
+                           double multiplier, double float32_max) nogil:
+    cdef Py_ssize_t i, chan_num, chan_ix
+    cdef const float *src_p
+    cdef unsigned char *dest_p
+    cdef float fmult = <float>multiplier
+    cdef float flim = _pack_limit(multiplier, float32_max)
+
+    if _is_flat(src_chan_stride, src_frame_stride, dest_chan_stride, dest_frame_stride, nchannels, nframes):
+        for i in range(nchannels * nframes):
+            _pack_int24_value(&dest[i * 3], src[i], flim, fmult)
+    elif dest_frame_stride == 1:
+        for chan_num in range(nchannels):
+            src_p = src + chan_num * src_chan_stride
+            dest_p = dest + chan_num * dest_chan_stride * 3
+            for chan_ix in range(nframes):
+                _pack_int24_value(&dest_p[chan_ix * 3], src_p[chan_ix * src_frame_stride], flim, fmult)
+    elif dest_chan_stride == 1:
+        # Frames outer so the writes into interleaved frames are sequential
+        for chan_ix in range(nframes):
+            src_p = src + chan_ix * src_frame_stride
+            dest_p = dest + chan_ix * dest_frame_stride * 3
+            for chan_num in range(nchannels):
+                _pack_int24_value(&dest_p[chan_num * 3], src_p[chan_num * src_chan_stride], flim, fmult)
+    else:
+        for chan_ix in range(nframes):
+            src_p = src + chan_ix * src_frame_stride
+            dest_p = dest + chan_ix * dest_frame_stride * 3
+            for chan_num in range(nchannels):
+                _pack_int24_value(&dest_p[chan_num * dest_chan_stride * 3], src_p[chan_num * src_chan_stride], flim, fmult)
+
+cdef void _unpack_int24_loop(const unsigned char *src, Py_ssize_t src_chan_stride, Py_ssize_t src_frame_stride,
+                             float *dest, Py_ssize_t dest_chan_stride, Py_ssize_t dest_frame_stride,
+                             Py_ssize_t nchannels, Py_ssize_t nframes, double multiplier) nogil:
+    cdef Py_ssize_t i, chan_num, chan_ix
+    cdef const unsigned char *src_p
+    cdef float *dest_p
+
+    if _is_flat(src_chan_stride, src_frame_stride, dest_chan_stride, dest_frame_stride, nchannels, nframes):
+        for i in range(nchannels * nframes):
+            dest[i] = _unpack_int24_value(&src[i * 3], multiplier)
+    elif dest_frame_stride == 1:
+        for chan_num in range(nchannels):
+            src_p = src + chan_num * src_chan_stride * 3
+            dest_p = dest + chan_num * dest_chan_stride
+            for chan_ix in range(nframes):
+                dest_p[chan_ix] = _unpack_int24_value(&src_p[chan_ix * src_frame_stride * 3], multiplier)
+    else:
+        for chan_ix in range(nframes):
+            src_p = src + chan_ix * src_frame_stride * 3
+            dest_p = dest + chan_ix * dest_frame_stride
+            for chan_num in range(nchannels):
+                dest_p[chan_num * dest_chan_stride] = _unpack_int24_value(&src_p[chan_num * src_chan_stride * 3], multiplier)
+
+cdef int pack_samples(const float *src, Py_ssize_t src_chan_stride, Py_ssize_t src_frame_stride,
+                      char *dest, Py_ssize_t dest_chan_stride, Py_ssize_t dest_frame_stride,
+                      Py_ssize_t nchannels, Py_ssize_t nframes, SampleFormat* fmt) nogil except -1:
+    cdef double multiplier = fmt.float32_divisor
+    cdef double float32_max = fmt.float32_max
+
+    if nchannels <= 0 or nframes <= 0:
+        return 0
     if fmt.pa_ident == paFloat32:
-        pack_float32(item, src)
+        _pack_loop(src, src_chan_stride, src_frame_stride,
+                   <float *>dest, dest_chan_stride, dest_frame_stride,
+                   nchannels, nframes, multiplier, float32_max)
     elif fmt.pa_ident == paInt32:
-        pack_sint32(item, src)
+        _pack_loop(src, src_chan_stride, src_frame_stride,
+                   <int32_t *>dest, dest_chan_stride, dest_frame_stride,
+                   nchannels, nframes, multiplier, float32_max)
     elif fmt.pa_ident == paInt24:
-        pack_sint24(item, src)
+        _pack_int24_loop(src, src_chan_stride, src_frame_stride,
+                         <unsigned char *>dest, dest_chan_stride, dest_frame_stride,
+                         nchannels, nframes, multiplier, float32_max)
     elif fmt.pa_ident == paInt16:
-        pack_sint16(item, src)
+        _pack_loop(src, src_chan_stride, src_frame_stride,
+                   <int16_t *>dest, dest_chan_stride, dest_frame_stride,
+                   nchannels, nframes, multiplier, float32_max)
     elif fmt.pa_ident == paInt8:
-        pack_sint8(item, src)
+        _pack_loop(src, src_chan_stride, src_frame_stride,
+                   <int8_t *>dest, dest_chan_stride, dest_frame_stride,
+                   nchannels, nframes, multiplier, float32_max)
     elif fmt.pa_ident == paUInt8:
-        pack_uint8(item, src)
+        _pack_loop(src, src_chan_stride, src_frame_stride,
+                   <uint8_t *>dest, dest_chan_stride, dest_frame_stride,
+                   nchannels, nframes, multiplier, float32_max)
     else:
         raise_withgil(PyExc_ValueError, 'Unsupported format')
     return 0
 
-cdef void pack_float32(BufferItem* item, float[:,:] src) nogil:
-    cdef Py_ssize_t chan_ix, chan_num
-    cdef FLOAT32_DTYPE_t *data_view = <FLOAT32_DTYPE_t *>item.bfr
+cdef int unpack_samples(const char *src, Py_ssize_t src_chan_stride, Py_ssize_t src_frame_stride,
+                        float *dest, Py_ssize_t dest_chan_stride, Py_ssize_t dest_frame_stride,
+                        Py_ssize_t nchannels, Py_ssize_t nframes, SampleFormat* fmt) nogil except -1:
+    cdef double multiplier = fmt.float32_multiplier
 
-    for chan_ix in range(item.length):
-        for chan_num in range(item.nchannels):
-            data_view[0] = src[chan_num,chan_ix]
-            data_view += 1
+    if nchannels <= 0 or nframes <= 0:
+        return 0
+    if fmt.pa_ident == paFloat32:
+        _unpack_loop(<const float *>src, src_chan_stride, src_frame_stride,
+                     dest, dest_chan_stride, dest_frame_stride,
+                     nchannels, nframes, multiplier)
+    elif fmt.pa_ident == paInt32:
+        _unpack_loop(<const int32_t *>src, src_chan_stride, src_frame_stride,
+                     dest, dest_chan_stride, dest_frame_stride,
+                     nchannels, nframes, multiplier)
+    elif fmt.pa_ident == paInt24:
+        _unpack_int24_loop(<const unsigned char *>src, src_chan_stride, src_frame_stride,
+                           dest, dest_chan_stride, dest_frame_stride,
+                           nchannels, nframes, multiplier)
+    elif fmt.pa_ident == paInt16:
+        _unpack_loop(<const int16_t *>src, src_chan_stride, src_frame_stride,
+                     dest, dest_chan_stride, dest_frame_stride,
+                     nchannels, nframes, multiplier)
+    elif fmt.pa_ident == paInt8:
+        _unpack_loop(<const int8_t *>src, src_chan_stride, src_frame_stride,
+                     dest, dest_chan_stride, dest_frame_stride,
+                     nchannels, nframes, multiplier)
+    elif fmt.pa_ident == paUInt8:
+        _unpack_loop(<const uint8_t *>src, src_chan_stride, src_frame_stride,
+                     dest, dest_chan_stride, dest_frame_stride,
+                     nchannels, nframes, multiplier)
+    else:
+        raise_withgil(PyExc_ValueError, 'Unsupported format')
+    return 0
 
-cdef void pack_sint32(BufferItem* item, float[:,:] src) nogil:
-    cdef Py_ssize_t chan_ix, chan_num
-    cdef SampleFormat* fmt = item.parent_buffer.sample_format
-    cdef INT32_DTYPE_t *data_view = <INT32_DTYPE_t *>item.bfr
-    cdef double multiplier = fmt.float32_divisor
-    cdef double float32_max = fmt.float32_max
-    cdef double value
+cdef void _unpack_add_int24_loop(const unsigned char *src, Py_ssize_t src_stride,
+                                 float *dest, Py_ssize_t dest_stride,
+                                 Py_ssize_t nframes, double multiplier, float gain) nogil:
+    cdef Py_ssize_t i
+    for i in range(nframes):
+        dest[i * dest_stride] += _unpack_int24_value(&src[i * src_stride * 3], multiplier) * gain
+
+cdef int unpack_add_samples(const char *src, Py_ssize_t src_stride,
+                            float *dest, Py_ssize_t dest_stride,
+                            Py_ssize_t nframes, float gain, SampleFormat* fmt) nogil except -1:
+    """Convert *nframes* samples of a single channel and add them (scaled
+    by *gain*) to *dest*
+
+    Used to mix channels while converting. The strides are in samples
+    """
+    cdef double multiplier = fmt.float32_multiplier
+
+    if nframes <= 0:
+        return 0
+    if fmt.pa_ident == paFloat32:
+        _unpack_add_loop(<const float *>src, src_stride, dest, dest_stride, nframes, multiplier, gain)
+    elif fmt.pa_ident == paInt32:
+        _unpack_add_loop(<const int32_t *>src, src_stride, dest, dest_stride, nframes, multiplier, gain)
+    elif fmt.pa_ident == paInt24:
+        _unpack_add_int24_loop(<const unsigned char *>src, src_stride, dest, dest_stride, nframes, multiplier, gain)
+    elif fmt.pa_ident == paInt16:
+        _unpack_add_loop(<const int16_t *>src, src_stride, dest, dest_stride, nframes, multiplier, gain)
+    elif fmt.pa_ident == paInt8:
+        _unpack_add_loop(<const int8_t *>src, src_stride, dest, dest_stride, nframes, multiplier, gain)
+    elif fmt.pa_ident == paUInt8:
+        _unpack_add_loop(<const uint8_t *>src, src_stride, dest, dest_stride, nframes, multiplier, gain)
+    else:
+        raise_withgil(PyExc_ValueError, 'Unsupported format')
+    return 0
 
-    for chan_ix in range(item.length):
-        for chan_num in range(item.nchannels):
-            value = src[chan_num,chan_ix]
-            if value > float32_max:
-                value = float32_max
+# -----------------------------------------------------------------------------
+# Convert from 2-dimensional float32 array/memoryview into flattened values
+# scaled for the SampleBuffer's sample_format, then pack them
+# into the BufferItem's char buffer.
+# -----------------------------------------------------------------------------
 
-            data_view[0] = <INT32_DTYPE_t>(value*multiplier)
-            data_view += 1
+cdef inline int _pack_item(BufferItem* item, float[:,:] src, SampleFormat* fmt) nogil except -1:
+    if item.length <= 0 or item.nchannels <= 0:
+        return 0
+    return pack_samples(
+        &src[0,0], src.strides[0] // <Py_ssize_t>sizeof(float), src.strides[1] // <Py_ssize_t>sizeof(float),
+        item.bfr, item.chan_stride, item.frame_stride,
+        item.nchannels, item.length, fmt,
+    )
 
+cdef int pack_buffer_item(BufferItem* item, float[:,:] src) nogil except -1:
+    return _pack_item(item, src, item.parent_buffer.sample_format)
 
-cdef void pack_sint24(BufferItem* item, float[:,:] src) nogil:
-    cdef Py_ssize_t chan_ix, chan_num
-    cdef SampleFormat* fmt = item.parent_buffer.sample_format
-    cdef unsigned char *bfr = <unsigned char *>item.bfr
-    cdef double multiplier = fmt.float32_divisor
-    cdef int32_t packed_value
+cdef void pack_float32(BufferItem* item, float[:,:] src) nogil:
+    _pack_item(item, src, &SampleFormats.sf_float32)
+
+cdef void pack_sint32(BufferItem* item, float[:,:] src) nogil:
+    _pack_item(item, src, &SampleFormats.sf_int32)
 
-    for chan_ix in range(item.length):
-        for chan_num in range(item.nchannels):
-            packed_value = <int32_t>(src[chan_num,chan_ix] * multiplier)
-            IF LITTLE_ENDIAN:
-                bfr[0] = <unsigned char>(packed_value >> 8)
-                bfr[1] = <unsigned char>(packed_value >> 16)
-                bfr[2] = <unsigned char>(packed_value >> 24)
-            ELSE:
-                bfr[2] = <unsigned char>(packed_value >> 8)
-                bfr[1] = <unsigned char>(packed_value >> 16)
-                bfr[0] = <unsigned char>(packed_value >> 24)
-            bfr += 3
+cdef void pack_sint24(BufferItem* item, float[:,:] src) nogil:
+    _pack_item(item, src, &SampleFormats.sf_int24)
 
 cdef void pack_sint16(BufferItem* item, float[:,:] src) nogil:
-    cdef Py_ssize_t chan_ix, chan_num
-    cdef SampleFormat* fmt = item.parent_buffer.sample_format
-    cdef INT16_DTYPE_t *data_view = <INT16_DTYPE_t *>item.bfr
-    cdef double multiplier = fmt.float32_divisor
-    cdef double float32_max = fmt.float32_max
-    cdef double value
-
-    for chan_ix in range(item.length):
-        for chan_num in range(item.nchannels):
-            value = src[chan_num,chan_ix]
-            if value > float32_max:
-                value = float32_max
-            data_view[0] = <INT16_DTYPE_t>(value*multiplier)
-            data_view += 1
+    _pack_item(item, src, &SampleFormats.sf_int16)
 
 cdef void pack_sint8(BufferItem* item, float[:,:] src) nogil:
-    cdef Py_ssize_t chan_ix, chan_num
-    cdef SampleFormat* fmt = item.parent_buffer.sample_format
-    cdef INT8_DTYPE_t *data_view = <INT8_DTYPE_t *>item.bfr
-    cdef double multiplier = fmt.float32_divisor
-    cdef double float32_max = fmt.float32_max
-    cdef double value
-
-    for chan_ix in range(item.length):
-        for chan_num in range(item.nchannels):
-            value = src[chan_num,chan_ix]
-            if value > float32_max:
-                value = float32_max
-            data_view[0] = <INT8_DTYPE_t>(value*multiplier)
-            data_view += 1
+    _pack_item(item, src, &SampleFormats.sf_int8)
 
 cdef void pack_uint8(BufferItem* item, float[:,:] src) nogil:
-    cdef Py_ssize_t chan_ix, chan_num
-    cdef SampleFormat* fmt = item.parent_buffer.sample_format
-    cdef UINT8_DTYPE_t *data_view = <UINT8_DTYPE_t *>item.bfr
-    cdef double float32_max = fmt.float32_max
-    cdef double value
-
-    for chan_ix in range(item.length):
-        for chan_num in range(item.nchannels):
-            value = src[chan_num,chan_ix]
-            if value > float32_max:
-                value = float32_max
-            data_view[0] = <UINT8_DTYPE_t>((value+1.0)*128)
-            data_view += 1
+    _pack_item(item, src, &SampleFormats.sf_uint8)
 
 # -----------------------------------------------------------------------------
 # Unpack the BufferItem's char buffer and scale the values to float32,
 # placing the results into a 2-dimensional array/memoryview.
 # -----------------------------------------------------------------------------
 
+cdef inline int _unpack_item(BufferItem* item, float[:,:] dest, SampleFormat* fmt) nogil except -1:
+    if item.length <= 0 or item.nchannels <= 0:
+        return 0
+    return unpack_samples(
+        item.bfr, item.chan_stride, item.frame_stride,
+        &dest[0,0], dest.strides[0] // <Py_ssize_t>sizeof(float), dest.strides[1] // <Py_ssize_t>sizeof(float),
+        item.nchannels, item.length, fmt,
+    )
+
 cdef int unpack_buffer_item(BufferItem* item, float[:,:] dest) nogil except -1:
-    cdef SampleFormat* fmt = item.parent_buffer.sample_format
-    if fmt.pa_ident == paFloat32:
-        unpack_float32(item, dest)
-    elif fmt.pa_ident == paInt32:
-        unpack_sint32(item, dest)
-    elif fmt.pa_ident == paInt24:
-        unpack_sint24(item, dest)
-    elif fmt.pa_ident == paInt16:
-        unpack_sint16(item, dest)
-    elif fmt.pa_ident == paInt8:
-        unpack_sint8(item, dest)
-    elif fmt.pa_ident == paUInt8:
-        unpack_uint8(item, dest)
-    else:
-        raise_withgil(PyExc_ValueError, 'Unsupported format')
-    return 0
+    return _unpack_item(item, dest, item.parent_buffer.sample_format)
 
 cdef void unpack_float32(BufferItem* item, float[:,:] dest) nogil:
-    cdef Py_ssize_t chan_ix, chan_num
-    cdef FLOAT32_DTYPE_t *data_view = <FLOAT32_DTYPE_t *>item.bfr
-
-    for chan_ix in range(item.length):
-        for chan_num in range(item.nchannels):
-            dest[chan_num,chan_ix] = data_view[0]
-            data_view += 1
+    _unpack_item(item, dest, &SampleFormats.sf_float32)
 
 cdef void unpack_sint32(BufferItem* item, float[:,:] dest) nogil:
-    cdef Py_ssize_t chan_ix, chan_num
-    cdef SampleFormat* fmt = item.parent_buffer.sample_format
-    cdef INT32_DTYPE_t *data_view = <INT32_DTYPE_t *>item.bfr
-    cdef double multiplier = fmt.float32_multiplier
-
-    for chan_ix in range(item.length):
-        for chan_num in range(item.nchannels):
-            dest[chan_num,chan_ix] = <float>data_view[0] * multiplier
-            data_view += 1
+    _unpack_item(item, dest, &SampleFormats.sf_int32)
 
 cdef void unpack_sint24(BufferItem* item, float[:,:] dest) nogil:
-    cdef Py_ssize_t chan_ix, chan_num
-    cdef SampleFormat* fmt = item.parent_buffer.sample_format
-    cdef unsigned char *bfr = <unsigned char *>item.bfr
-    cdef double multiplier = fmt.float32_multiplier
-    cdef int32_t unpacked
-
-    for chan_ix in range(item.length):
-        for chan_num in range(item.nchannels):
-            IF LITTLE_ENDIAN:
-                unpacked =  ((<int32_t>bfr[0]) << 8)
-                unpacked |= ((<int32_t>bfr[1]) << 16)
-                unpacked |= ((<int32_t>bfr[2]) << 24)
-            ELSE:
-                unpacked =  <int32_t>bfr[2] << 8
-                unpacked |= <int32_t>bfr[1] << 16
-                unpacked |= <int32_t>bfr[0] << 24
-            dest[chan_num,chan_ix] = unpacked * multiplier
-            bfr += 3
+    _unpack_item(item, dest, &SampleFormats.sf_int24)
 
 cdef void unpack_sint16(BufferItem* item, float[:,:] dest) nogil:
-    cdef Py_ssize_t chan_ix, chan_num
-    cdef SampleFormat* fmt = item.parent_buffer.sample_format
-    cdef INT16_DTYPE_t *data_view = <INT16_DTYPE_t *>item.bfr
-    cdef double multiplier = fmt.float32_multiplier
-
-    for chan_ix in range(item.length):
-        for chan_num in range(item.nchannels):
-            dest[chan_num,chan_ix] = data_view[0] * multiplier
-            data_view += 1
+    _unpack_item(item, dest, &SampleFormats.sf_int16)
 
 cdef void unpack_sint8(BufferItem* item, float[:,:] dest) nogil:
-    cdef Py_ssize_t chan_ix, chan_num
-    cdef SampleFormat* fmt = item.parent_buffer.sample_format
-    cdef INT8_DTYPE_t *data_view = <INT8_DTYPE_t *>item.bfr
-    cdef double multiplier = fmt.float32_multiplier
-
-    for chan_ix in range(item.length):
-        for chan_num in range(item.nchannels):
-            dest[chan_num,chan_ix] = data_view[0] * multiplier
-            data_view += 1
+    _unpack_item(item, dest, &SampleFormats.sf_int8)
 
 cdef void unpack_uint8(BufferItem* item, float[:,:] dest) nogil:
-    cdef Py_ssize_t chan_ix, chan_num
-    cdef SampleFormat* fmt = item.parent_buffer.sample_format
-    cdef UINT8_DTYPE_t *data_view = <UINT8_DTYPE_t *>item.bfr
-    cdef double multiplier = fmt.float32_multiplier
-
-    for chan_ix in range(item.length):
-        for chan_num in range(item.nchannels):
-            dest[chan_num,chan_ix] = (data_view[0] - 128) * multiplier * 2
-            data_view += 1
+    _unpack_item(item, dest, &SampleFormats.sf_uint8)
@@ -11,12 +11,19 @@ cdef class DeviceInfo:
     cdef readonly double default_sample_rate
     cdef readonly int num_inputs, num_outputs
     cdef readonly bint active
+    cdef readonly bint is_virtual
     cdef readonly Stream stream
 
     cdef void _get_info(self) except *
     cpdef Stream _open_stream(self, dict kwargs)
     cpdef close(self)
 
+cdef class VirtualDevice(DeviceInfo):
+    cdef public bint realtime, loopback
+    cdef public PaTime latency
+    cdef PaStreamCallbackFlags _xrun_flags
+    cdef public Py_ssize_t xrun_interval
+
 cdef class HostApiInfo:
     cdef readonly PaHostApiIndex index
     cdef readonly Py_ssize_t device_count
@@ -33,6 +40,7 @@ cdef class PortAudio:
     cdef char* jack_client_name_ptr
     cdef dict devices_by_paindex, devices_by_name
     cdef dict host_apis_by_paindex, host_apis_by_name
+    cdef dict virtual_devices_by_name
     cdef readonly bint _initialized
     cdef readonly DeviceInfo default_input, default_output
 
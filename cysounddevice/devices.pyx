@@ -8,6 +8,7 @@ import atexit
 
 from cysounddevice.pawrapper cimport *
 from cysounddevice.utils cimport handle_pa_error
+from cysounddevice.virtual cimport get_callback_flags, get_callback_flag_names
 
 cdef class DeviceInfo:
     """Container for information about particular device
@@ -22,10 +23,12 @@ cdef class DeviceInfo:
         num_outputs (int): Number of output channels
         default_sample_rate (int): Default sample rate
         active (bool): The device state
+        is_virtual (bool): True for a :class:`VirtualDevice`
     """
-    def __cinit__(self, PaDeviceIndex index_):
+    def __cinit__(self, PaDeviceIndex index_=paNoDevice, *args, **kwargs):
         self.index = index_
         self.active = False
+        self.is_virtual = False
     def __init__(self, *args):
         self._get_info()
     cdef void _get_info(self) except *:
@@ -64,6 +67,72 @@ cdef class DeviceInfo:
         return '{self.index} {self.name}, {self.host_api} ({self.num_inputs} in, {self.num_outputs} out)'.format(self=self)
 
 
+cdef class VirtualDevice(DeviceInfo):
+    """A device without hardware whose streams are driven by a
+    :class:`~cysounddevice.virtual.VirtualDriver`
+
+    Streams opened on the device work as they would on a PortAudio device,
+    except that :attr:`~cysounddevice.streams.Stream.blocking` mode is not
+    supported. PortAudio does not need to be initialized.
+
+    All arguments are keyword-only.
+
+    Keyword Arguments:
+        name (str): Default is ``'Virtual'``
+        num_inputs (int): Default is 2
+        num_outputs (int): Default is 2
+        default_sample_rate (float): Default is 48000
+        realtime (bool): Default is True
+        loopback (bool): Default is False
+        latency (float): Default is 0
+        xrun_flags: Default is ``None``
+        xrun_interval (int): Default is 0
+
+    Attributes:
+        realtime (bool): If True, callbacks are paced by the sample rate.
+            Otherwise they run as fast as possible
+        loopback (bool): If True, the output of each callback is delivered as
+            the input of the next. Otherwise the input is silence
+        latency (float): Input and output latency reported for the stream's
+            ADC and DAC times. If ``0``, the duration of one block is used
+        xrun_flags (list): Names of the status flags passed to the callback
+            once every :attr:`xrun_interval` callbacks. May be set to a name,
+            a list of names (see :data:`cysounddevice.virtual.CALLBACK_FLAGS`),
+            the flags as an :class:`int` or ``None``
+        xrun_interval (int): Interval for :attr:`xrun_flags` in callbacks.
+            ``0`` to disable
+
+    Changes to the attributes take effect the next time a stream is opened.
+    Status flags can also be injected into a running stream with
+    :meth:`VirtualDriver.inject_xrun <cysounddevice.virtual.VirtualDriver.inject_xrun>`.
+    """
+    def __init__(self, *, str name='Virtual', int num_inputs=2, int num_outputs=2,
+                 double default_sample_rate=48000, bint realtime=True,
+                 bint loopback=False, PaTime latency=0, xrun_flags=None,
+                 Py_ssize_t xrun_interval=0):
+        self.is_virtual = True
+        self.name = name
+        self.host_api_index = -1
+        self.num_inputs = num_inputs
+        self.num_outputs = num_outputs
+        self.default_sample_rate = default_sample_rate
+        self.realtime = realtime
+        self.loopback = loopback
+        self.latency = latency
+        self.xrun_flags = xrun_flags
+        self.xrun_interval = xrun_interval
+    cdef void _get_info(self) except *:
+        pass
+    @property
+    def xrun_flags(self):
+        return get_callback_flag_names(self._xrun_flags)
+    @xrun_flags.setter
+    def xrun_flags(self, value):
+        self._xrun_flags = get_callback_flags(value)
+    def __str__(self):
+        return '{self.name}, virtual ({self.num_inputs} in, {self.num_outputs} out)'.format(self=self)
+
+
 cdef class HostApiInfo:
     """Container for information about a particular HostApi
 
@@ -144,6 +213,7 @@ cdef class PortAudio:
         self.devices_by_name = {}
         self.host_apis_by_paindex = {}
         self.host_apis_by_name = {}
+        self.virtual_devices_by_name = {}
         self._initialized = False
     def __init__(self, *args):
         atexit.register(self.close)
@@ -192,6 +262,8 @@ cdef class PortAudio:
     cpdef close(self):
         """Close all streams and terminates the PortAudio library
 
+        Virtual devices remain available.
+
         Note:
             This method is a no-op if not open.
         """
@@ -225,15 +297,39 @@ cdef class PortAudio:
             yield host_api
     def iter_devices(self):
         """Iterate over all devices as :class:`DeviceInfo` instances
+
+        Devices added with :meth:`add_virtual_device` follow those
+        detected by PortAudio
         """
         cdef DeviceInfo device
         cdef PaDeviceIndex ix
         for ix in sorted(self.devices_by_paindex.keys()):
             device = self.devices_by_paindex[ix]
             yield device
+        for device in self.virtual_devices_by_name.values():
+            yield device
+    def add_virtual_device(self, **kwargs):
+        """Create a :class:`VirtualDevice` and list it with the other devices
+
+        Arguments:
+            **kwargs: Keyword arguments for :class:`VirtualDevice`
+
+        Returns:
+            VirtualDevice: The new device
+
+        Raises:
+            ValueError: If a device with the same name exists
+        """
+        cdef VirtualDevice device = VirtualDevice(**kwargs)
+        if device.name in self.devices_by_name or device.name in self.virtual_devices_by_name:
+            raise ValueError('Device "{}" already exists'.format(device.name))
+        self.virtual_devices_by_name[device.name] = device
+        return device
     cpdef DeviceInfo get_device_by_name(self, str name):
         """Get a device by name
         """
+        if name in self.virtual_devices_by_name:
+            return self.virtual_devices_by_name[name]
         return self.devices_by_name[name]
     cpdef DeviceInfo get_device_by_index(self, PaDeviceIndex idx):
         """Get a device by its PortAudio index
@@ -0,0 +1,105 @@
+# cython: language_level=3
+
+from libc.stdint cimport uint64_t
+
+from cysounddevice.types cimport *
+
+cdef enum GraphOp:
+    GraphOp_gain
+    GraphOp_mix
+    GraphOp_biquad
+    GraphOp_delay
+    GraphOp_meter
+
+cdef struct BiquadState:
+    double z1
+    double z2
+
+cdef struct DelayState:
+    float *data
+    Py_ssize_t length
+    Py_ssize_t pos
+
+cdef struct MeterState:
+    float peak
+    float rms
+
+cdef struct GraphStep:
+    GraphOp op
+    Py_ssize_t dest
+    Py_ssize_t source
+    Py_ssize_t nsources
+    Py_ssize_t *sources
+    float *gains
+    float gain
+    double coef[5]
+    void *state
+
+cdef struct GraphSchedule:
+    int input_channels
+    int output_channels
+    Py_ssize_t max_frames
+    Py_ssize_t nsteps
+    GraphStep *steps
+    Py_ssize_t nplanes
+    float *scratch
+    Py_ssize_t *outputs
+    Py_ssize_t *mix_sources
+    float *mix_gains
+
+cdef struct GraphState:
+    # Addresses of the GraphSchedule published by Python and the one last
+    # picked up by the callback
+    uint64_t pending
+    uint64_t active
+
+cdef int graph_process(void *state,
+                       const float **inputs,
+                       float **outputs,
+                       int input_channels,
+                       int output_channels,
+                       unsigned long nframes,
+                       const SampleTime_s *sample_time) nogil
+
+cdef class ProcessGraph
+
+cdef class GraphNode:
+    cdef readonly ProcessGraph graph
+    cdef void *state
+    cdef tuple _sources
+
+    cdef void _alloc_state(self, size_t size) except *
+
+cdef class InputNode(GraphNode):
+    cdef readonly int channel
+
+cdef class GainNode(GraphNode):
+    cdef public float gain
+
+cdef class MixerNode(GraphNode):
+    cdef list _gains
+
+cdef class BiquadNode(GraphNode):
+    cdef double coef[5]
+
+cdef class DelayNode(GraphNode):
+    cdef readonly Py_ssize_t frames
+
+cdef class MeterNode(GraphNode):
+    pass
+
+cdef class _CompiledGraph:
+    cdef GraphSchedule* schedule
+    cdef list refs
+
+cdef class ProcessGraph:
+    cdef readonly int input_channels, output_channels
+    cdef readonly Py_ssize_t max_frames
+    cdef GraphState state
+    cdef list _nodes
+    cdef list _outputs
+    cdef _CompiledGraph _current
+    cdef list _retired
+
+    cdef _CompiledGraph _compile(self)
+    cdef void _collect(self) except *
@@ -0,0 +1,638 @@
+# cython: language_level=3
+
+cimport cython
+from libc.math cimport sqrt, fabs
+from libc.string cimport memset, memcpy
+from cpython.mem cimport PyMem_Malloc, PyMem_Free
+
+from cysounddevice.atomic cimport atomic_load_acquire, atomic_store_release
+from cysounddevice.processing cimport ProcessFunc
+from cysounddevice.stream_callback cimport StreamCallback
+
+import math
+
+# -----------------------------------------------------------------------------
+# A ProcessGraph is compiled into a GraphSchedule: a flat list of steps in
+# topological order. Every node writes one float32 plane. Planes below
+# ``input_channels`` are the callback's input planes, the rest are
+# preallocated scratch planes of ``max_frames`` each (meters pass their
+# source's plane through and have none).
+#
+# The address of the newest schedule is published in GraphState.pending.
+# On each call the callback loads it and stores it to GraphState.active
+# before using it. Old schedules are kept alive (by Python) until the
+# callback has picked up the newest one, so a schedule is never freed
+# while in use. Node state (delay lines, filter history and meter values)
+# belongs to the node and carries over between schedules.
+# -----------------------------------------------------------------------------
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+cdef inline float* _graph_plane(GraphSchedule* sched, const float **inputs,
+                                Py_ssize_t plane, Py_ssize_t offset) nogil:
+    if plane < sched.input_channels:
+        return <float *>inputs[plane] + offset
+    return sched.scratch + (plane - sched.input_channels) * sched.max_frames
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+@cython.cdivision(True)
+cdef void _graph_run_step(GraphSchedule* sched, GraphStep* step,
+                          const float **inputs, Py_ssize_t offset,
+                          Py_ssize_t nframes) nogil:
+    cdef float *dest = NULL
+    cdef float *src
+    cdef Py_ssize_t i, j
+    cdef float g, v, peak = 0
+    cdef double x, y, z1, z2, total = 0
+    cdef BiquadState* bq
+    cdef DelayState* dl
+    cdef MeterState* mt
+    if step.op != GraphOp_meter:
+        dest = _graph_plane(sched, inputs, step.dest, offset)
+    if step.op == GraphOp_gain:
+        src = _graph_plane(sched, inputs, step.source, offset)
+        g = step.gain
+        for i in range(nframes):
+            dest[i] = src[i] * g
+    elif step.op == GraphOp_mix:
+        memset(dest, 0, nframes * sizeof(float))
+        for j in range(step.nsources):
+            src = _graph_plane(sched, inputs, step.sources[j], offset)
+            g = step.gains[j]
+            for i in range(nframes):
+                dest[i] = dest[i] + src[i] * g
+    elif step.op == GraphOp_biquad:
+        # Transposed direct form II
+        src = _graph_plane(sched, inputs, step.source, offset)
+        bq = <BiquadState*>step.state
+        z1 = bq.z1
+        z2 = bq.z2
+        for i in range(nframes):
+            x = src[i]
+            y = step.coef[0] * x + z1
+            z1 = step.coef[1] * x - step.coef[3] * y + z2
+            z2 = step.coef[2] * x - step.coef[4] * y
+            dest[i] = <float>y
+        bq.z1 = z1
+        bq.z2 = z2
+    elif step.op == GraphOp_delay:
+        src = _graph_plane(sched, inputs, step.source, offset)
+        dl = <DelayState*>step.state
+        if dl.length == 0:
+            memcpy(dest, src, nframes * sizeof(float))
+            return
+        for i in range(nframes):
+            v = src[i]
+            dest[i] = dl.data[dl.pos]
+            dl.data[dl.pos] = v
+            dl.pos += 1
+            if dl.pos == dl.length:
+                dl.pos = 0
+    elif step.op == GraphOp_meter:
+        src = _graph_plane(sched, inputs, step.source, offset)
+        mt = <MeterState*>step.state
+        for i in range(nframes):
+            v = fabs(src[i])
+            if v > peak:
+                peak = v
+            total += <double>src[i] * src[i]
+        mt.peak = peak
+        if nframes > 0:
+            mt.rms = <float>sqrt(total / nframes)
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+cdef int graph_process(void *state,
+                       const float **inputs,
+                       float **outputs,
+                       int input_channels,
+                       int output_channels,
+                       unsigned long nframes,
+                       const SampleTime_s *sample_time) nogil:
+    """:c:type:`ProcessFunc` that runs the schedule of a :class:`ProcessGraph`
+
+    *state* is the graph's :c:type:`GraphState`. The outputs of the graph
+    are added to the output planes
+    """
+    cdef GraphState* gs = <GraphState*>state
+    cdef uint64_t addr = atomic_load_acquire(&gs.pending)
+    cdef GraphSchedule* sched = <GraphSchedule*><size_t>addr
+    cdef Py_ssize_t offset = 0, n, total = nframes, s, c, i
+    cdef float *out
+    cdef float *src
+    atomic_store_release(&gs.active, addr)
+    if sched == NULL:
+        return 0
+    if input_channels < sched.input_channels or output_channels < sched.output_channels:
+        return 0
+    while offset < total:
+        n = total - offset
+        if n > sched.max_frames:
+            n = sched.max_frames
+        for s in range(sched.nsteps):
+            _graph_run_step(sched, &sched.steps[s], inputs, offset, n)
+        for c in range(sched.output_channels):
+            if sched.outputs[c] < 0:
+                continue
+            src = _graph_plane(sched, inputs, sched.outputs[c], offset)
+            out = outputs[c] + offset
+            for i in range(n):
+                out[i] = out[i] + src[i]
+        offset += n
+    return 0
+
+cdef void _graph_schedule_destroy(GraphSchedule* sched) except *:
+    if sched == NULL:
+        return
+    PyMem_Free(sched.steps)
+    PyMem_Free(sched.scratch)
+    PyMem_Free(sched.outputs)
+    PyMem_Free(sched.mix_sources)
+    PyMem_Free(sched.mix_gains)
+    PyMem_Free(sched)
+
+
+def biquad_coefficients(str kind, double freq, double sample_rate,
+                        double q=0.7071067811865476, double gain_db=0):
+    """Calculate normalized biquad coefficients for a :class:`BiquadNode`
+
+    Uses the formulas from the Audio EQ Cookbook (R. Bristow-Johnson)
+
+    Arguments:
+        kind (str): One of ``'lowpass'``, ``'highpass'``, ``'bandpass'``,
+            ``'notch'`` or ``'peak'``
+        freq (float): The corner (or center) frequency in Hz
+        sample_rate (float): The sample rate in Hz
+        q (float): The filter's Q
+        gain_db (float): Gain in dB (``'peak'`` only)
+
+    Returns:
+        tuple: ``(b0, b1, b2, a1, a2)``
+    """
+    cdef double w0 = 2 * math.pi * freq / sample_rate
+    cdef double cosw = math.cos(w0)
+    cdef double alpha = math.sin(w0) / (2 * q)
+    cdef double A = 10 ** (gain_db / 40)
+    cdef double a0 = 1 + alpha, a1 = -2 * cosw, a2 = 1 - alpha
+    if kind == 'lowpass':
+        b0, b1, b2 = (1 - cosw) / 2, 1 - cosw, (1 - cosw) / 2
+    elif kind == 'highpass':
+        b0, b1, b2 = (1 + cosw) / 2, -(1 + cosw), (1 + cosw) / 2
+    elif kind == 'bandpass':
+        b0, b1, b2 = alpha, 0, -alpha
+    elif kind == 'notch':
+        b0, b1, b2 = 1, -2 * cosw, 1
+    elif kind == 'peak':
+        b0, b1, b2 = 1 + alpha * A, -2 * cosw, 1 - alpha * A
+        a0, a2 = 1 + alpha / A, 1 - alpha / A
+    else:
+        raise ValueError('Unknown filter type "{}"'.format(kind))
+    return (b0 / a0, b1 / a0, b2 / a0, a1 / a0, a2 / a0)
+
+
+def _sort_nodes(roots, nodes):
+    """Topologically sort the nodes reachable from *roots* (sources first)
+    """
+    order = []
+    marks = {}
+
+    def visit(GraphNode node):
+        mark = marks.get(id(node))
+        if mark == 1:
+            return
+        if mark == 0:
+            raise ValueError('The graph contains a cycle')
+        if node not in nodes:
+            raise ValueError('{!r} has been removed from the graph'.format(node))
+        marks[id(node)] = 0
+        for src in node._sources:
+            visit(src)
+        marks[id(node)] = 1
+        order.append(node)
+
+    for node in roots:
+        visit(node)
+    return order
+
+
+cdef class GraphNode:
+    """A node in a :class:`ProcessGraph` producing one channel of audio
+
+    Nodes are created by the methods of :class:`ProcessGraph`. Changes to
+    their parameters take effect on the next :meth:`ProcessGraph.commit`.
+
+    Attributes:
+        graph (ProcessGraph): The graph the node belongs to
+        sources (tuple): The nodes this node reads from
+    """
+    def __cinit__(self, ProcessGraph graph, *args, **kwargs):
+        self.graph = graph
+        self.state = NULL
+        self._sources = ()
+    def __dealloc__(self):
+        if self.state != NULL:
+            PyMem_Free(self.state)
+            self.state = NULL
+    @property
+    def sources(self):
+        return self._sources
+    cdef void _alloc_state(self, size_t size) except *:
+        self.state = PyMem_Malloc(size)
+        if self.state == NULL:
+            raise MemoryError()
+        memset(self.state, 0, size)
+    def __repr__(self):
+        return '<{}>'.format(self.__class__.__name__)
+
+cdef class InputNode(GraphNode):
+    """A channel of the stream's input
+
+    Attributes:
+        channel (int): The input channel index
+    """
+    def __init__(self, ProcessGraph graph, int channel):
+        if not 0 <= channel < graph.input_channels:
+            raise ValueError('Invalid input channel {}'.format(channel))
+        self.channel = channel
+
+cdef class GainNode(GraphNode):
+    """Multiplies its source by :attr:`gain`
+
+    Attributes:
+        gain (float): The linear gain
+    """
+    def __init__(self, ProcessGraph graph, GraphNode source, float gain=1):
+        self._sources = (graph._check_node(source),)
+        self.gain = gain
+
+cdef class MixerNode(GraphNode):
+    """Sums any number of sources, each scaled by a gain
+
+    Attributes:
+        gains (list): The gain of each source
+    """
+    def __init__(self, ProcessGraph graph, sources, gains=None):
+        self.set_sources(sources, gains)
+    def set_sources(self, sources, gains=None):
+        """Replace the sources and their gains
+
+        Arguments:
+            sources: A sequence of :class:`GraphNode`
+            gains: A sequence of gains (one per source). If not given, all
+                gains are ``1``
+        """
+        sources = tuple(self.graph._check_node(node) for node in sources)
+        if gains is None:
+            gains = [1.] * len(sources)
+        gains = [float(g) for g in gains]
+        if len(gains) != len(sources):
+            raise ValueError('Number of gains must match the number of sources')
+        self._sources = sources
+        self._gains = gains
+    @property
+    def gains(self):
+        return list(self._gains)
+    @gains.setter
+    def gains(self, value):
+        self.set_sources(self._sources, value)
+
+cdef class BiquadNode(GraphNode):
+    """A second order IIR filter
+
+    Attributes:
+        coefficients (tuple): The normalized coefficients
+            ``(b0, b1, b2, a1, a2)``
+            (see :func:`biquad_coefficients`)
+    """
+    def __init__(self, ProcessGraph graph, GraphNode source, coefficients):
+        self._sources = (graph._check_node(source),)
+        self.coefficients = coefficients
+        self._alloc_state(sizeof(BiquadState))
+    @property
+    def coefficients(self):
+        return tuple(self.coef[i] for i in range(5))
+    @coefficients.setter
+    def coefficients(self, value):
+        value = tuple(value)
+        if len(value) != 5:
+            raise ValueError('Coefficients must be (b0, b1, b2, a1, a2)')
+        for i in range(5):
+            self.coef[i] = value[i]
+
+cdef class DelayNode(GraphNode):
+    """Delays its source by a fixed number of frames
+
+    Attributes:
+        frames (int): The delay length
+    """
+    def __init__(self, ProcessGraph graph, GraphNode source, Py_ssize_t frames):
+        if frames < 0:
+            raise ValueError('Delay must not be negative')
+        self._sources = (graph._check_node(source),)
+        self.frames = frames
+        self._alloc_state(sizeof(DelayState) + frames * sizeof(float))
+        cdef DelayState* dl = <DelayState*>self.state
+        dl.data = <float *>(<char *>self.state + sizeof(DelayState))
+        dl.length = frames
+        dl.pos = 0
+
+cdef class MeterNode(GraphNode):
+    """Measures the level of its source, passing it through unchanged
+
+    The values are updated by the callback for each block processed.
+
+    Attributes:
+        peak (float): Peak absolute value of the last block
+        rms (float): RMS value of the last block
+    """
+    def __init__(self, ProcessGraph graph, GraphNode source):
+        self._sources = (graph._check_node(source),)
+        self._alloc_state(sizeof(MeterState))
+    @property
+    def peak(self):
+        return (<MeterState*>self.state).peak
+    @property
+    def rms(self):
+        return (<MeterState*>self.state).rms
+
+
+cdef class _CompiledGraph:
+    """Owns a :c:type:`GraphSchedule` and the nodes it refers to
+    """
+    def __cinit__(self):
+        self.schedule = NULL
+        self.refs = []
+    def __dealloc__(self):
+        _graph_schedule_destroy(self.schedule)
+        self.schedule = NULL
+
+
+cdef class ProcessGraph:
+    """A graph of processing nodes run inside the stream callback
+
+    Nodes (gains, mixers, biquad filters, delays and meters) are connected
+    from Python and compiled by :meth:`commit` into a flat schedule with
+    preallocated float32 buffers. This runs without the GIL as the
+    stream's process function (see :meth:`install`) so monitoring chains
+    need no Python code or trips through the stream buffers.
+
+    The graph can be changed while the stream is running. The new
+    schedule is swapped in between callbacks, and delay lines, filter
+    state and meters keep their values.
+
+    Each node produces one channel. The nodes assigned to outputs with
+    :meth:`set_output` are added to the output planes
+    (see :meth:`cysounddevice.stream_callback.StreamCallback.set_process_func`).
+    Nodes that do not lead to an output or a meter are not run.
+
+    Arguments:
+        input_channels (int): Number of stream input channels available
+            to :meth:`input`
+        output_channels (int): Number of stream output channels
+        max_frames (int): Number of frames processed at once. Callbacks with
+            more frames are processed in chunks
+
+    Attributes:
+        nodes (list): All nodes created in the graph
+    """
+    def __cinit__(self, int input_channels, int output_channels, Py_ssize_t max_frames=1024):
+        self.state.pending = 0
+        self.state.active = 0
+        self._nodes = []
+        self._retired = []
+        self._current = None
+    def __init__(self, int input_channels, int output_channels, Py_ssize_t max_frames=1024):
+        if input_channels < 0 or output_channels < 0:
+            raise ValueError('Channel counts must not be negative')
+        if max_frames <= 0:
+            raise ValueError('max_frames must be greater than zero')
+        self.input_channels = input_channels
+        self.output_channels = output_channels
+        self.max_frames = max_frames
+        self._outputs = [None] * output_channels
+
+    @property
+    def nodes(self):
+        return list(self._nodes)
+
+    def _check_node(self, GraphNode node not None):
+        if node.graph is not self:
+            raise ValueError('Node belongs to another graph')
+        return node
+
+    def _add(self, GraphNode node):
+        self._nodes.append(node)
+        return node
+
+    def input(self, int channel):
+        """Get a node for an input channel
+
+        Returns:
+            InputNode:
+        """
+        for node in self._nodes:
+            if isinstance(node, InputNode) and node.channel == channel:
+                return node
+        return self._add(InputNode(self, channel))
+
+    def gain(self, GraphNode source, float gain=1):
+        """Add a :class:`GainNode`
+        """
+        return self._add(GainNode(self, source, gain))
+
+    def mixer(self, sources, gains=None):
+        """Add a :class:`MixerNode`
+        """
+        return self._add(MixerNode(self, sources, gains))
+
+    def biquad(self, GraphNode source, coefficients):
+        """Add a :class:`BiquadNode`
+
+        Arguments:
+            source (GraphNode):
+            coefficients: ``(b0, b1, b2, a1, a2)`` as returned by
+                :func:`biquad_coefficients`
+        """
+        return self._add(BiquadNode(self, source, coefficients))
+
+    def delay(self, GraphNode source, Py_ssize_t frames):
+        """Add a :class:`DelayNode`
+        """
+        return self._add(DelayNode(self, source, frames))
+
+    def meter(self, GraphNode source):
+        """Add a :class:`MeterNode`
+        """
+        return self._add(MeterNode(self, source))
+
+    def remove(self, GraphNode node):
+        """Remove a node and any output assignments using it
+
+        Raises:
+            ValueError: If another node reads from it
+        """
+        self._check_node(node)
+        for other in self._nodes:
+            if node in (<GraphNode>other)._sources:
+                raise ValueError('{!r} is used by {!r}'.format(node, other))
+        self._nodes.remove(node)
+        self._outputs = [None if n is node else n for n in self._outputs]
+
+    def set_output(self, int channel, GraphNode node):
+        """Send a node to an output channel (or ``None`` to disconnect it)
+        """
+        if not 0 <= channel < self.output_channels:
+            raise ValueError('Invalid output channel {}'.format(channel))
+        if node is not None:
+            self._check_node(node)
+        self._outputs[channel] = node
+
+    def get_output(self, int channel):
+        return self._outputs[channel]
+
+    cdef _CompiledGraph _compile(self):
+        cdef GraphNode node
+        roots = [node for node in self._outputs if node is not None]
+        roots.extend(node for node in self._nodes if isinstance(node, MeterNode))
+        cdef list order = _sort_nodes(roots, self._nodes)
+
+        cdef dict planes = {}
+        cdef Py_ssize_t nplanes = 0, nsteps = 0, nmix = 0, i, j
+        for node in order:
+            if isinstance(node, InputNode):
+                planes[id(node)] = (<InputNode>node).channel
+            elif isinstance(node, MeterNode):
+                planes[id(node)] = planes[id(node._sources[0])]
+                nsteps += 1
+            else:
+                planes[id(node)] = self.input_channels + nplanes
+                nplanes += 1
+                nsteps += 1
+                if isinstance(node, MixerNode):
+                    nmix += len(node._sources)
+
+        cdef _CompiledGraph compiled = _CompiledGraph()
+        cdef GraphSchedule* sched = <GraphSchedule*>PyMem_Malloc(sizeof(GraphSchedule))
+        if sched == NULL:
+            raise MemoryError()
+        memset(sched, 0, sizeof(GraphSchedule))
+        compiled.schedule = sched
+        compiled.refs = order
+        sched.input_channels = self.input_channels
+        sched.output_channels = self.output_channels
+        sched.max_frames = self.max_frames
+        sched.nsteps = nsteps
+        sched.nplanes = nplanes
+        # Allocate at least one element each so NULL always means failure
+        sched.steps = <GraphStep*>PyMem_Malloc(max(nsteps, 1) * sizeof(GraphStep))
+        sched.scratch = <float *>PyMem_Malloc(max(nplanes * self.max_frames, 1) * sizeof(float))
+        sched.outputs = <Py_ssize_t *>PyMem_Malloc(max(self.output_channels, 1) * sizeof(Py_ssize_t))
+        sched.mix_sources = <Py_ssize_t *>PyMem_Malloc(max(nmix, 1) * sizeof(Py_ssize_t))
+        sched.mix_gains = <float *>PyMem_Malloc(max(nmix, 1) * sizeof(float))
+        if (sched.steps == NULL or sched.scratch == NULL or sched.outputs == NULL or
+                sched.mix_sources == NULL or sched.mix_gains == NULL):
+            raise MemoryError()
+        memset(sched.steps, 0, max(nsteps, 1) * sizeof(GraphStep))
+        memset(sched.scratch, 0, max(nplanes * self.max_frames, 1) * sizeof(float))
+
+        cdef GraphStep* step
+        cdef Py_ssize_t s = 0, m = 0
+        for node in order:
+            if isinstance(node, InputNode):
+                continue
+            step = &sched.steps[s]
+            s += 1
+            step.dest = planes[id(node)]
+            step.state = node.state
+            if len(node._sources):
+                step.source = planes[id(node._sources[0])]
+            if isinstance(node, GainNode):
+                step.op = GraphOp_gain
+                step.gain = (<GainNode>node).gain
+            elif isinstance(node, MixerNode):
+                step.op = GraphOp_mix
+                step.nsources = len(node._sources)
+                step.sources = &sched.mix_sources[m]
+                step.gains = &sched.mix_gains[m]
+                for j in range(step.nsources):
+                    step.sources[j] = planes[id(node._sources[j])]
+                    step.gains[j] = (<MixerNode>node)._gains[j]
+                m += step.nsources
+            elif isinstance(node, BiquadNode):
+                step.op = GraphOp_biquad
+                for j in range(5):
+                    step.coef[j] = (<BiquadNode>node).coef[j]
+            elif isinstance(node, DelayNode):
+                step.op = GraphOp_delay
+            elif isinstance(node, MeterNode):
+                step.op = GraphOp_meter
+        for i in range(self.output_channels):
+            node = self._outputs[i]
+            if node is None:
+                sched.outputs[i] = -1
+            else:
+                sched.outputs[i] = planes[id(node)]
+        return compiled
+
+    def commit(self):
+        """Compile the graph and hand it to the callback
+
+        The previous schedule stays in use until the next callback starts.
+
+        Raises:
+            ValueError: If the graph contains a cycle
+        """
+        cdef _CompiledGraph compiled = self._compile()
+        if self._current is not None:
+            self._retired.append(self._current)
+        self._current = compiled
+        atomic_store_release(&self.state.pending, <uint64_t><size_t>compiled.schedule)
+        self._collect()
+
+    cdef void _collect(self) except *:
+        """Free the retired schedules once the callback uses the newest one
+        """
+        if not len(self._retired):
+            return
+        if atomic_load_acquire(&self.state.active) == atomic_load_acquire(&self.state.pending):
+            self._retired = []
+
+    @property
+    def pending_swap(self):
+        """True if the callback has not yet picked up the last :meth:`commit`
+        """
+        self._collect()
+        return atomic_load_acquire(&self.state.active) != atomic_load_acquire(&self.state.pending)
+
+    @property
+    def process_address(self):
+        """Address of :c:func:`graph_process` (for use with
+        :meth:`~cysounddevice.stream_callback.StreamCallback.set_process_func`)
+        """
+        return <size_t>graph_process
+
+    @property
+    def state_address(self):
+        """Address of the graph's :c:type:`GraphState`
+        """
+        return <size_t>&self.state
+
+    def install(self, StreamCallback callback not None):
+        """Use the graph as the stream's process function
+
+        Like :meth:`~cysounddevice.stream_callback.StreamCallback.set_process_func`,
+        this must be done before the stream is opened. The graph is kept
+        alive by the callback handler until replaced.
+
+        Arguments:
+            callback: The stream's
+                :attr:`~cysounddevice.streams.Stream.callback_handler`
+
+        Raises:
+            ValueError: If the stream has fewer channels than the graph
+        """
+        if (self.input_channels > callback.stream.input_channels or
+                self.output_channels > callback.stream.output_channels):
+            raise ValueError('The graph has more channels than the stream')
+        callback._set_process_func(<ProcessFunc>graph_process, <void *>&self.state, self)
@@ -0,0 +1,86 @@
+# cython: language_level=3
+
+# File descriptor based wakeups sent from the PortAudio callback.
+#
+# On Linux an eventfd is used; on other POSIX systems a non-blocking pipe.
+# Signalling is a single write() so it is safe to call without the GIL
+# from the callback thread. Not available on Windows, where
+# ``cysd_notifier_open`` fails with ENOSYS.
+
+cdef extern from *:
+    """
+    #include <errno.h>
+    #if defined(_WIN32)
+    static int cysd_notifier_open(int *fds) {
+        fds[0] = fds[1] = -1;
+        errno = ENOSYS;
+        return -1;
+    }
+    static void cysd_notifier_close(int *fds) {
+        fds[0] = fds[1] = -1;
+    }
+    static void cysd_notifier_signal(int fd) {}
+    static void cysd_notifier_drain(int fd) {}
+    #else
+    #include <unistd.h>
+    #include <fcntl.h>
+    #if defined(__linux__)
+    #include <sys/eventfd.h>
+    #endif
+    static int cysd_notifier_open(int *fds) {
+        int i, flags;
+        fds[0] = fds[1] = -1;
+    #if defined(__linux__)
+        fds[0] = eventfd(0, EFD_NONBLOCK | EFD_CLOEXEC);
+        if (fds[0] >= 0) {
+            fds[1] = fds[0];
+            return 0;
+        }
+    #endif
+        if (pipe(fds) != 0) {
+            fds[0] = fds[1] = -1;
+            return -1;
+        }
+        for (i = 0; i < 2; i++) {
+            flags = fcntl(fds[i], F_GETFL);
+            fcntl(fds[i], F_SETFL, flags | O_NONBLOCK);
+            fcntl(fds[i], F_SETFD, FD_CLOEXEC);
+        }
+        return 0;
+    }
+    static void cysd_notifier_close(int *fds) {
+        if (fds[0] >= 0) {
+            close(fds[0]);
+        }
+        if (fds[1] >= 0 && fds[1] != fds[0]) {
+            close(fds[1]);
+        }
+        fds[0] = fds[1] = -1;
+    }
+    static void cysd_notifier_signal(int fd) {
+        /* eventfd requires an 8 byte write. A full pipe (EAGAIN) already
+           has a pending wakeup so errors are ignored */
+        unsigned long long one = 1;
+        ssize_t r = write(fd, &one, sizeof(one));
+        (void)r;
+    }
+    static void cysd_notifier_drain(int fd) {
+        char buf[64];
+        while (read(fd, buf, sizeof(buf)) > 0) {}
+    }
+    #endif
+    """
+    int notifier_open "cysd_notifier_open" (int *fds)
+    void notifier_close "cysd_notifier_close" (int *fds)
+    void notifier_signal "cysd_notifier_signal" (int fd) nogil
+    void notifier_drain "cysd_notifier_drain" (int fd) nogil
+
+cdef class Notifier:
+    cdef int fds[2]
+    cdef readonly object loop
+    cdef list _waiters
+
+    cpdef signal(self)
+    cpdef drain(self)
+    cpdef wake(self)
+    cpdef close(self)
@@ -0,0 +1,128 @@
+# cython: language_level=3
+
+from libc.errno cimport errno
+import os
+import asyncio
+
+try:
+    _get_running_loop = asyncio.get_running_loop
+except AttributeError:  # Python < 3.7
+    def _get_running_loop():
+        loop = asyncio._get_running_loop()
+        if loop is None:
+            raise RuntimeError('no running event loop')
+        return loop
+
+cdef class Notifier:
+    """Wakes an :mod:`asyncio` event loop from the PortAudio callback
+
+    The callback signals :attr:`write_fd` (without the GIL) after each
+    buffer is processed. The read end is watched by the event loop with
+    :meth:`asyncio.AbstractEventLoop.add_reader` and any futures returned
+    from :meth:`wait` are completed when it becomes readable.
+
+    Raises:
+        OSError: If the file descriptors could not be created
+            (this is always the case on Windows)
+
+    Attributes:
+        read_fd (int): The file descriptor watched by the event loop
+        write_fd (int): The file descriptor signalled by the callback.
+            This is the same as :attr:`read_fd` when an eventfd is used
+        loop: The event loop currently watching :attr:`read_fd` (if any)
+    """
+    def __cinit__(self):
+        self.fds[0] = -1
+        self.fds[1] = -1
+        self.loop = None
+        self._waiters = []
+    def __init__(self):
+        if notifier_open(self.fds) != 0:
+            raise OSError(errno, os.strerror(errno))
+    def __dealloc__(self):
+        notifier_close(self.fds)
+    @property
+    def read_fd(self):
+        return self.fds[0]
+    @property
+    def write_fd(self):
+        return self.fds[1]
+    @property
+    def closed(self):
+        return self.fds[0] < 0
+    def fileno(self):
+        return self.fds[0]
+
+    cpdef signal(self):
+        """Signal the notifier as the callback would
+        """
+        if self.fds[1] < 0:
+            return
+        with nogil:
+            notifier_signal(self.fds[1])
+
+    cpdef drain(self):
+        """Consume all pending signals
+        """
+        if self.fds[0] < 0:
+            return
+        with nogil:
+            notifier_drain(self.fds[0])
+
+    def wait(self):
+        """Get a future that completes on the next signal
+
+        Must be called from a coroutine (or callback) running in the event
+        loop. The first call for a loop starts watching :attr:`read_fd`.
+
+        Returns:
+            asyncio.Future:
+
+        Raises:
+            NotImplementedError: If the running loop does not support
+                :meth:`~asyncio.AbstractEventLoop.add_reader`
+            RuntimeError: If there is no running event loop
+        """
+        if self.fds[0] < 0:
+            raise ValueError('Notifier is closed')
+        loop = _get_running_loop()
+        if loop is not self.loop:
+            self._remove_reader()
+            loop.add_reader(self.fds[0], self._on_readable)
+            self.loop = loop
+        fut = loop.create_future()
+        self._waiters.append(fut)
+        return fut
+
+    def _on_readable(self):
+        self.drain()
+        self.wake()
+
+    cpdef wake(self):
+        """Complete all pending futures from :meth:`wait` without a signal
+        """
+        waiters = self._waiters
+        self._waiters = []
+        for fut in waiters:
+            if not fut.done():
+                fut.set_result(None)
+
+    def _remove_reader(self):
+        loop = self.loop
+        self.loop = None
+        if loop is None or loop.is_closed() or self.fds[0] < 0:
+            return
+        loop.remove_reader(self.fds[0])
+
+    cpdef close(self):
+        """Stop watching for signals and close the file descriptors
+
+        Any pending futures are cancelled.
+        """
+        self._remove_reader()
+        waiters = self._waiters
+        self._waiters = []
+        for fut in waiters:
+            if not fut.done():
+                fut.cancel()
+        notifier_close(self.fds)
@@ -187,19 +187,19 @@ cdef extern from "portaudio.h":
         PaTime outputLatency
         double sampleRate
     const PaStreamInfo* Pa_GetStreamInfo( PaStream* stream )
-    PaTime Pa_GetStreamTime( PaStream* stream )
-    double Pa_GetStreamCpuLoad( PaStream* stream )
+    PaTime Pa_GetStreamTime( PaStream* stream ) nogil
+    double Pa_GetStreamCpuLoad( PaStream* stream ) nogil
     PaError Pa_ReadStream( PaStream* stream,
                            void* buffer,
-                           unsigned long frames )
+                           unsigned long frames ) nogil
     PaError Pa_WriteStream( PaStream* stream,
                             const void* buffer,
-                            unsigned long frames )
+                            unsigned long frames ) nogil
     signed long Pa_GetStreamReadAvailable( PaStream* stream )
     signed long Pa_GetStreamWriteAvailable( PaStream* stream )
     PaHostApiTypeId Pa_GetStreamHostApiType( PaStream* stream )
     PaError Pa_GetSampleSize( PaSampleFormat format )
-    void Pa_Sleep( long msec )
+    void Pa_Sleep( long msec ) nogil
 
 cdef extern from "pa_jack.h":
     PaError PaJack_SetClientName( const char* name )
@@ -0,0 +1,38 @@
+# cython: language_level=3
+
+from libc.stdint cimport uint64_t
+
+from cysounddevice.types cimport *
+from cysounddevice.buffer cimport SampleBuffer, BufferItem, StreamOutputBuffer
+
+cdef class FilePlayer:
+    cdef readonly object filename
+    cdef readonly StreamOutputBuffer output_buffer
+    cdef readonly int nchannels
+    cdef readonly double sample_rate
+    cdef readonly SAMPLE_INDEX_t frames
+    cdef readonly SAMPLE_INDEX_t position
+    cdef readonly Py_ssize_t data_offset
+    cdef readonly Py_ssize_t prefetch_size
+    cdef readonly bint native
+    cdef SampleFormat* file_format
+    cdef SampleBuffer* sample_buffer
+    cdef object _mmap
+    cdef const unsigned char[::1] _view
+    cdef const char *data
+    cdef Py_ssize_t frame_bytes
+    cdef Py_ssize_t page_size
+    cdef Py_ssize_t prefetched
+    cdef Py_ssize_t released
+    cdef float *scratch
+    cdef long poll_ms
+    cdef object _thread
+    cdef uint64_t _stop
+    cdef uint64_t _finished
+    cdef object _error
+
+    cdef void _start(self, SampleBuffer* bfr, double sample_rate) except *
+    cdef int _play(self) nogil except -1
+    cdef int _fill_item(self, BufferItem* item, Py_ssize_t nframes) nogil except -1
+    cdef void _prefetch(self) nogil
+    cdef void _close_map(self) except *
@@ -0,0 +1,406 @@
+# cython: language_level=3
+
+cimport cython
+from libc.string cimport memcpy, memset
+from cpython.mem cimport PyMem_Malloc, PyMem_Free
+
+from cysounddevice.pawrapper cimport *
+from cysounddevice.atomic cimport atomic_load_acquire, atomic_store_release
+from cysounddevice.buffer cimport (
+    SampleLayout_non_interleaved,
+    sample_buffer_acquire_write,
+    sample_buffer_commit_write,
+)
+from cysounddevice.conversion cimport pack_samples, unpack_samples
+
+import mmap
+import os
+import struct
+import threading
+
+cdef extern from *:
+    """
+    #if defined(_WIN32)
+    static int cysd_advise_willneed(const void *ptr, size_t size) {
+        return -1;
+    }
+    static int cysd_advise_dontneed(const void *ptr, size_t size) {
+        return -1;
+    }
+    #else
+    #include <sys/mman.h>
+    static int cysd_advise_willneed(const void *ptr, size_t size) {
+    #if defined(MADV_WILLNEED)
+        return madvise((void *)ptr, size, MADV_WILLNEED);
+    #else
+        return -1;
+    #endif
+    }
+    static int cysd_advise_dontneed(const void *ptr, size_t size) {
+    #if defined(MADV_DONTNEED)
+        return madvise((void *)ptr, size, MADV_DONTNEED);
+    #else
+        return -1;
+    #endif
+    }
+    #endif
+    static void cysd_touch_pages(const char *ptr, size_t size, size_t page_size) {
+        const volatile char *p = (const volatile char *)ptr;
+        size_t i;
+        for (i = 0; i < size; i += page_size) {
+            (void)p[i];
+        }
+    }
+    """
+    int advise_willneed "cysd_advise_willneed" (const void *ptr, size_t size) nogil
+    int advise_dontneed "cysd_advise_dontneed" (const void *ptr, size_t size) nogil
+    void touch_pages "cysd_touch_pages" (const char *ptr, size_t size, size_t page_size) nogil
+
+DEF WAVE_FORMAT_PCM = 1
+DEF WAVE_FORMAT_IEEE_FLOAT = 3
+DEF WAVE_FORMAT_EXTENSIBLE = 0xFFFE
+
+_WAV_FORMATS = {
+    (WAVE_FORMAT_PCM, 8):'uint8',
+    (WAVE_FORMAT_PCM, 16):'int16',
+    (WAVE_FORMAT_PCM, 24):'int24',
+    (WAVE_FORMAT_PCM, 32):'int32',
+    (WAVE_FORMAT_IEEE_FLOAT, 32):'float32',
+}
+
+def _parse_wav(mm):
+    """Find the format and data chunk of a WAV or RF64 file
+
+    Returns:
+        tuple: ``(sample_format, nchannels, sample_rate, data_offset, data_size)``
+    """
+    if len(mm) < 12:
+        raise ValueError('Not a WAV file')
+    riff_id, riff_size, wave_id = struct.unpack_from('<4sI4s', mm, 0)
+    if riff_id not in (b'RIFF', b'RF64') or wave_id != b'WAVE':
+        raise ValueError('Not a WAV file')
+    cdef Py_ssize_t pos = 12
+    fmt = None
+    ds64_data_size = None
+    while pos + 8 <= len(mm):
+        chunk_id, size = struct.unpack_from('<4sI', mm, pos)
+        pos += 8
+        if chunk_id == b'ds64':
+            ds64_data_size = struct.unpack_from('<Q', mm, pos + 8)[0]
+        elif chunk_id == b'fmt ':
+            tag, nchannels, sample_rate, byte_rate, block_align, bits = struct.unpack_from(
+                '<HHIIHH', mm, pos,
+            )
+            if tag == WAVE_FORMAT_EXTENSIBLE:
+                # The format tag is the start of the subformat GUID
+                tag = struct.unpack_from('<H', mm, pos + 24)[0]
+            if (tag, bits) not in _WAV_FORMATS:
+                raise ValueError('Unsupported WAV format (tag={}, bits={})'.format(tag, bits))
+            fmt = (_WAV_FORMATS[(tag, bits)], nchannels, sample_rate)
+        elif chunk_id == b'data':
+            if fmt is None:
+                raise ValueError('No fmt chunk before the data chunk')
+            if size == 0xFFFFFFFF and ds64_data_size is not None:
+                size = ds64_data_size
+            # Allow for recordings that were not finalized
+            size = min(size, len(mm) - pos)
+            return fmt + (pos, size)
+        pos += size + size % 2
+    raise ValueError('No data chunk found')
+
+cdef class FilePlayer:
+    """Plays a WAV or raw PCM file through a stream's output buffer
+
+    The file is memory-mapped, so starting playback of even very large
+    files costs nothing up front and memory use stays within the page cache.
+    A worker thread (running without the GIL) fills each free
+    :c:type:`BufferItem` of the output buffer directly from the mapped file.
+    If the file's sample format matches the stream's, the frames are copied
+    as they are, otherwise they are converted from the mapped pages.
+
+    The worker reads ahead of the play position by *prefetch_size* bytes
+    using ``madvise`` so the data is in memory before it is needed, and
+    releases the pages already played.
+
+    While playing, the player is the only writer to the output buffer.
+    Writing to :attr:`Stream.output_buffer <cysounddevice.streams.Stream.output_buffer>`
+    at the same time is not supported. The player is stopped when the
+    stream is closed.
+
+    For raw files, *sample_format* and *nchannels* must be given. For WAV
+    files (including RF64) they are read from the header.
+
+    Arguments:
+        output_buffer (StreamOutputBuffer): The stream's
+            :attr:`~cysounddevice.streams.Stream.output_buffer`
+        filename (str): Path of the file to play
+        sample_format (str): Sample format of a raw file
+            (see :func:`cysounddevice.types.get_sample_formats`)
+        nchannels (int): Number of channels of a raw file
+        sample_rate (float): Sample rate of a raw file. If given it must
+            match the stream's
+        data_offset (int): Offset of the first sample in a raw file
+        prefetch_size (int): Number of bytes to read ahead
+
+    Attributes:
+        frames (int): Total number of frames in the file
+        position (int): Number of frames written to the output buffer
+        native (bool): True if the file's sample format matches the
+            stream's and no conversion is needed. Set by :meth:`start`
+        playing (bool): True while the worker thread is running
+        finished (bool): True once the whole file has been written to the
+            output buffer
+
+    Raises:
+        ValueError: If the file format is not supported
+    """
+    def __cinit__(self, StreamOutputBuffer output_buffer, filename, str sample_format=None,
+                  nchannels=None, double sample_rate=0, Py_ssize_t data_offset=0,
+                  Py_ssize_t prefetch_size=4194304):
+        self.output_buffer = output_buffer
+        self.filename = os.fspath(filename)
+        self.prefetch_size = prefetch_size
+        self.position = 0
+        self.sample_buffer = NULL
+        self.scratch = NULL
+        self.data = NULL
+        self._mmap = None
+        self._thread = None
+        self._error = None
+        self._stop = 0
+        self._finished = 0
+        self.page_size = mmap.PAGESIZE
+
+        with open(self.filename, 'rb') as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        cdef Py_ssize_t data_size
+        try:
+            if sample_format is None:
+                sample_format, nchannels, sample_rate, data_offset, data_size = _parse_wav(self._mmap)
+            else:
+                if nchannels is None:
+                    raise ValueError('nchannels is required for raw files')
+                data_size = len(self._mmap) - data_offset
+            self.file_format = get_sample_format_by_name(sample_format)
+            self.nchannels = nchannels
+            if self.nchannels <= 0:
+                raise ValueError('Invalid channel count')
+        except:
+            self._close_map()
+            raise
+        self.sample_rate = sample_rate
+        self.data_offset = data_offset
+        self.frame_bytes = self.file_format.bit_width // 8 * self.nchannels
+        self.frames = max(data_size, 0) // self.frame_bytes
+        self._view = self._mmap
+        self.data = <const char *>&self._view[0]
+    def __dealloc__(self):
+        PyMem_Free(self.scratch)
+        self.scratch = NULL
+
+    @property
+    def sample_format(self):
+        return self.file_format.name.decode('UTF-8')
+    @property
+    def playing(self):
+        return self._thread is not None and self._thread.is_alive()
+    @property
+    def finished(self):
+        return atomic_load_acquire(&self._finished) != 0
+
+    def start(self):
+        """Start filling the output buffer
+
+        Playback continues from the current :attr:`position` if the
+        player was stopped before.
+
+        Raises:
+            RuntimeError: If the stream is not open or already has a player
+            ValueError: If the channel count or sample rate does not match
+                the stream
+        """
+        cdef StreamOutputBuffer output_buffer = self.output_buffer
+        if output_buffer is None or output_buffer.sample_buffer == NULL:
+            raise RuntimeError('Stream is not open')
+        if output_buffer.player is not None:
+            raise RuntimeError('Stream already has a player')
+        cdef double stream_rate = output_buffer.stream.buffer_sample_rate
+        if self.sample_rate != 0 and self.sample_rate != stream_rate:
+            raise ValueError('File sample rate ({}) does not match the stream ({})'.format(
+                self.sample_rate, stream_rate,
+            ))
+        self._start(output_buffer.sample_buffer, stream_rate)
+        output_buffer.player = self
+
+    def stop(self):
+        """Stop the worker thread
+
+        Items already written remain in the output buffer.
+
+        Raises:
+            Exception: Any error raised in the worker thread
+        """
+        if self._thread is None:
+            return
+        atomic_store_release(&self._stop, 1)
+        self._thread.join()
+        self._thread = None
+        PyMem_Free(self.scratch)
+        self.scratch = NULL
+        if self.output_buffer is not None and self.output_buffer.player is self:
+            self.output_buffer.player = None
+        error, self._error = self._error, None
+        if error is not None:
+            raise error
+
+    def close(self):
+        """Stop playback and unmap the file
+        """
+        try:
+            self.stop()
+        finally:
+            self._close_map()
+
+    def __enter__(self):
+        self.start()
+        return self
+    def __exit__(self, *args):
+        self.close()
+
+    cdef void _start(self, SampleBuffer* bfr, double sample_rate) except *:
+        if self._thread is not None:
+            raise RuntimeError('Already playing')
+        if self.data == NULL:
+            raise RuntimeError('Player is closed')
+        if bfr.nchannels != self.nchannels:
+            raise ValueError('File has {} channels, stream has {}'.format(
+                self.nchannels, bfr.nchannels,
+            ))
+        self.sample_buffer = bfr
+        self.native = self.file_format.pa_ident == bfr.sample_format.pa_ident
+        if not self.native:
+            self.scratch = <float *>PyMem_Malloc(sizeof(float) * bfr.item_length * self.nchannels)
+            if self.scratch == NULL:
+                raise MemoryError()
+        self.poll_ms = <long>(bfr.item_length * 500 / sample_rate)
+        if self.poll_ms < 1:
+            self.poll_ms = 1
+        self.prefetched = self.data_offset + self.position * self.frame_bytes
+        self.prefetched -= self.prefetched % self.page_size
+        self.released = self.prefetched
+        self._stop = 0
+        self._finished = 0
+        self._error = None
+        self._thread = threading.Thread(target=self._run, name='FilePlayer')
+        self._thread.daemon = True
+        self._thread.start()
+
+    def _run(self):
+        try:
+            with nogil:
+                self._play()
+        except Exception as exc:
+            self._error = exc
+
+    cdef int _play(self) nogil except -1:
+        """Fill items until the end of the file or :meth:`stop` is called
+        """
+        cdef SampleBuffer* bfr = self.sample_buffer
+        cdef BufferItem* item
+        cdef Py_ssize_t nframes
+        self._prefetch()
+        while atomic_load_acquire(&self._stop) == 0:
+            if self.position >= self.frames:
+                atomic_store_release(&self._finished, 1)
+                break
+            item = sample_buffer_acquire_write(bfr)
+            if item == NULL:
+                self._prefetch()
+                Pa_Sleep(self.poll_ms)
+                continue
+            nframes = item.length
+            if nframes > self.frames - self.position:
+                nframes = self.frames - self.position
+            self._fill_item(item, nframes)
+            sample_buffer_commit_write(bfr)
+            self.position += nframes
+            self._prefetch()
+        return 0
+
+    @cython.boundscheck(False)
+    @cython.wraparound(False)
+    cdef int _fill_item(self, BufferItem* item, Py_ssize_t nframes) nogil except -1:
+        """Copy or convert *nframes* at the current position into *item*
+
+        The remainder of a partially filled item is set to silence
+        """
+        cdef SampleBuffer* bfr = self.sample_buffer
+        cdef const char *src = self.data + self.data_offset + self.position * self.frame_bytes
+        cdef Py_ssize_t itemsize = bfr.itemsize, nchannels = self.nchannels
+        cdef Py_ssize_t c, i
+        cdef int silence = 0x80 if bfr.sample_format.pa_ident == paUInt8 else 0
+        cdef bint planar = bfr.layout == SampleLayout_non_interleaved
+        if not self.native:
+            unpack_samples(
+                src, 1, nchannels, self.scratch, 1, nchannels,
+                nchannels, nframes, self.file_format,
+            )
+            pack_samples(
+                self.scratch, 1, nchannels, item.bfr, item.chan_stride, item.frame_stride,
+                nchannels, nframes, bfr.sample_format,
+            )
+        elif not planar:
+            memcpy(item.bfr, src, nframes * self.frame_bytes)
+        else:
+            for c in range(nchannels):
+                for i in range(nframes):
+                    memcpy(
+                        item.bfr + (c * item.length + i) * itemsize,
+                        src + (i * nchannels + c) * itemsize,
+                        itemsize,
+                    )
+        if nframes == item.length:
+            return 0
+        if planar:
+            for c in range(nchannels):
+                memset(
+                    item.bfr + (c * item.length + nframes) * itemsize, silence,
+                    (item.length - nframes) * itemsize,
+                )
+        else:
+            memset(
+                item.bfr + nframes * nchannels * itemsize, silence,
+                (item.length - nframes) * nchannels * itemsize,
+            )
+        return 0
+
+    cdef void _prefetch(self) nogil:
+        """Read ahead of the current position and release played pages
+        """
+        cdef Py_ssize_t pos = self.data_offset + self.position * self.frame_bytes
+        cdef Py_ssize_t end = self.data_offset + self.frames * self.frame_bytes
+        cdef Py_ssize_t target = pos + self.prefetch_size
+        cdef Py_ssize_t start, played
+        if target > end:
+            target = end
+        # Advise in steps of a quarter of the prefetch size to limit syscalls
+        if target > self.prefetched and (target == end or
+                                         target - self.prefetched >= self.prefetch_size // 4):
+            start = self.prefetched
+            if start < pos:
+                start = pos
+            start -= start % self.page_size
+            advise_willneed(self.data + start, target - start)
+            touch_pages(self.data + start, target - start, self.page_size)
+            self.prefetched = target
+        played = pos - pos % self.page_size
+        if played - self.released >= self.prefetch_size:
+            advise_dontneed(self.data + self.released, played - self.released)
+            self.released = played
+
+    cdef void _close_map(self) except *:
+        self.data = NULL
+        self._view = None
+        if self._mmap is not None:
+            self._mmap.close()
+            self._mmap = None
@@ -0,0 +1,46 @@
+# cython: language_level=3
+
+from cysounddevice.pawrapper cimport *
+from cysounddevice.types cimport *
+
+ctypedef int (*ProcessFunc)(void *state,
+                            const float **inputs,
+                            float **outputs,
+                            int input_channels,
+                            int output_channels,
+                            unsigned long nframes,
+                            const SampleTime_s *sample_time) nogil
+
+cdef struct ProcessHook:
+    ProcessFunc func
+    void *state
+    SampleFormat* sample_format
+    bint planar
+    int input_channels
+    int output_channels
+    Py_ssize_t max_frames
+    float *in_data
+    float *out_data
+    const float **in_planes
+    float **out_planes
+    SAMPLE_INDEX_t frame
+    SampleTime_s sample_time
+
+cdef ProcessHook* process_hook_create(ProcessFunc func,
+                                      void *state,
+                                      SampleFormat* sample_format,
+                                      bint planar,
+                                      int input_channels,
+                                      int output_channels,
+                                      Py_ssize_t max_frames,
+                                      SampleTime_s* sample_time) except NULL
+cdef void process_hook_destroy(ProcessHook* hook) except *
+cdef int process_hook_run(ProcessHook* hook,
+                          const void *in_bfr,
+                          void *out_bfr,
+                          unsigned long frame_count,
+                          PaTime start_time) nogil except -1
+cdef void process_hook_clear_output(ProcessHook* hook,
+                                    void *out_bfr,
+                                    unsigned long frame_count) nogil
+cdef size_t get_address(object obj) except? 0
@@ -0,0 +1,210 @@
+# cython: language_level=3
+
+cimport cython
+from libc.string cimport memset
+from cpython.mem cimport PyMem_Malloc, PyMem_Free
+
+from cysounddevice.conversion cimport pack_samples, unpack_samples
+
+cdef ProcessHook* process_hook_create(ProcessFunc func,
+                                      void *state,
+                                      SampleFormat* sample_format,
+                                      bint planar,
+                                      int input_channels,
+                                      int output_channels,
+                                      Py_ssize_t max_frames,
+                                      SampleTime_s* sample_time) except NULL:
+    """Allocate a :c:type:`ProcessHook` and its float32 planes
+
+    Arguments:
+        func: The :c:type:`ProcessFunc` to call
+        state: Opaque pointer passed as the first argument to *func*
+        sample_format: The stream's sample format
+        planar: True if the stream uses the ``non_interleaved`` layout
+        input_channels: Number of input channels
+        output_channels: Number of output channels
+        max_frames: Maximum number of frames passed to *func* in one call.
+            Callbacks with more frames are processed in chunks
+        sample_time: A :c:type:`SampleTime_s` to copy the sample rate and
+            block size from
+    """
+    cdef ProcessHook* hook = <ProcessHook*>PyMem_Malloc(sizeof(ProcessHook))
+    if hook == NULL:
+        raise MemoryError()
+    memset(hook, 0, sizeof(ProcessHook))
+    hook.func = func
+    hook.state = state
+    hook.sample_format = sample_format
+    hook.planar = planar
+    hook.input_channels = input_channels
+    hook.output_channels = output_channels
+    hook.max_frames = max_frames
+    hook.frame = 0
+    copy_sample_time_struct(sample_time, &hook.sample_time)
+    SampleTime_set_block_vars(&hook.sample_time, 0, 0)
+    if input_channels > 0:
+        hook.in_data = <float *>PyMem_Malloc(input_channels * max_frames * sizeof(float))
+        hook.in_planes = <const float **>PyMem_Malloc(input_channels * sizeof(float *))
+        if hook.in_data == NULL or hook.in_planes == NULL:
+            process_hook_destroy(hook)
+            raise MemoryError()
+    if output_channels > 0:
+        hook.out_data = <float *>PyMem_Malloc(output_channels * max_frames * sizeof(float))
+        hook.out_planes = <float **>PyMem_Malloc(output_channels * sizeof(float *))
+        if hook.out_data == NULL or hook.out_planes == NULL:
+            process_hook_destroy(hook)
+            raise MemoryError()
+    return hook
+
+cdef void process_hook_destroy(ProcessHook* hook) except *:
+    if hook.in_data != NULL:
+        PyMem_Free(hook.in_data)
+    if hook.in_planes != NULL:
+        PyMem_Free(hook.in_planes)
+    if hook.out_data != NULL:
+        PyMem_Free(hook.out_data)
+    if hook.out_planes != NULL:
+        PyMem_Free(hook.out_planes)
+    PyMem_Free(hook)
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+cdef int process_hook_run(ProcessHook* hook,
+                          const void *in_bfr,
+                          void *out_bfr,
+                          unsigned long frame_count,
+                          PaTime start_time) nogil except -1:
+    """Call the hook's :c:type:`ProcessFunc` for the host buffers given to
+    the stream callback
+
+    The input and output buffers (in the stream's native format) are
+    converted to float32 planes before the call and the output planes are
+    converted back afterwards. For float32 ``non_interleaved`` streams the
+    host planes are passed directly.
+
+    Arguments:
+        hook: The :c:type:`ProcessHook`
+        in_bfr: The callback's input buffer (``NULL`` if no input)
+        out_bfr: The callback's output buffer (``NULL`` if no output)
+        frame_count: Number of frames in each buffer
+        start_time: The PortAudio time of the first frame. This is only
+            used on the first call to set the hook's time offset
+
+    Returns:
+        int: 0 on success or 1 if the :c:type:`ProcessFunc` returned
+        a non-zero value
+    """
+    cdef SampleFormat* fmt = hook.sample_format
+    cdef bint planar = hook.planar
+    cdef bint direct = planar and fmt.pa_ident == paFloat32
+    cdef Py_ssize_t itemsize = fmt.bit_width // 8
+    cdef Py_ssize_t nin = hook.input_channels, nout = hook.output_channels
+    cdef Py_ssize_t max_frames = hook.max_frames
+    cdef Py_ssize_t nframes = frame_count, offset = 0, n, c
+    cdef const char *in_host = <const char *>in_bfr
+    cdef char *out_host = <char *>out_bfr
+    cdef const char **in_host_planes = <const char **>in_bfr
+    cdef char **out_host_planes = <char **>out_bfr
+    cdef int r = 0
+
+    if hook.frame == 0:
+        hook.sample_time.time_offset = start_time
+
+    while offset < nframes:
+        n = nframes - offset
+        if n > max_frames:
+            n = max_frames
+        if direct:
+            for c in range(nin):
+                hook.in_planes[c] = (<const float *>in_host_planes[c]) + offset
+            for c in range(nout):
+                hook.out_planes[c] = (<float *>out_host_planes[c]) + offset
+        else:
+            for c in range(nin):
+                hook.in_planes[c] = hook.in_data + c * max_frames
+            for c in range(nout):
+                hook.out_planes[c] = hook.out_data + c * max_frames
+            if planar:
+                for c in range(nin):
+                    unpack_samples(
+                        in_host_planes[c] + offset * itemsize, 1, 1,
+                        hook.in_data + c * max_frames, 1, 1, 1, n, fmt,
+                    )
+                for c in range(nout):
+                    unpack_samples(
+                        out_host_planes[c] + offset * itemsize, 1, 1,
+                        hook.out_data + c * max_frames, 1, 1, 1, n, fmt,
+                    )
+            else:
+                if nin > 0:
+                    unpack_samples(
+                        in_host + offset * nin * itemsize, 1, nin,
+                        hook.in_data, max_frames, 1, nin, n, fmt,
+                    )
+                if nout > 0:
+                    unpack_samples(
+                        out_host + offset * nout * itemsize, 1, nout,
+                        hook.out_data, max_frames, 1, nout, n, fmt,
+                    )
+
+        SampleTime_set_sample_index(&hook.sample_time, hook.frame, True)
+        r = hook.func(
+            hook.state, hook.in_planes, hook.out_planes,
+            <int>nin, <int>nout, <unsigned long>n, &hook.sample_time,
+        )
+
+        if not direct:
+            if planar:
+                for c in range(nout):
+                    pack_samples(
+                        hook.out_data + c * max_frames, 1, 1,
+                        out_host_planes[c] + offset * itemsize, 1, 1, 1, n, fmt,
+                    )
+            elif nout > 0:
+                pack_samples(
+                    hook.out_data, max_frames, 1,
+                    out_host + offset * nout * itemsize, 1, nout, nout, n, fmt,
+                )
+        hook.frame += n
+        offset += n
+        if r != 0:
+            return 1
+    return 0
+
+cdef void process_hook_clear_output(ProcessHook* hook,
+                                    void *out_bfr,
+                                    unsigned long frame_count) nogil:
+    """Fill the callback's output buffer with silence
+
+    Used when no output data is available from the stream's
+    :c:type:`SampleBuffer` so the :c:type:`ProcessFunc` always receives
+    defined output planes
+    """
+    cdef Py_ssize_t itemsize = hook.sample_format.bit_width // 8
+    cdef int silence = 0
+    cdef Py_ssize_t c
+    if hook.sample_format.pa_ident == paUInt8:
+        silence = 128
+    if hook.planar:
+        for c in range(hook.output_channels):
+            memset((<void **>out_bfr)[c], silence, frame_count * itemsize)
+    else:
+        memset(out_bfr, silence, frame_count * hook.output_channels * itemsize)
+
+cdef size_t get_address(object obj) except? 0:
+    """Get the address of a function or data pointer
+
+    Arguments:
+        obj: An :class:`int` address, a :mod:`ctypes` function or pointer
+            instance or ``None`` (for ``NULL``). Addresses of :mod:`cffi`
+            objects can be obtained with ``int(ffi.cast('uintptr_t', obj))``
+    """
+    if obj is None:
+        return 0
+    if isinstance(obj, int):
+        return obj
+    import ctypes
+    cdef object value = ctypes.cast(obj, ctypes.c_void_p).value
+    if value is None:
+        return 0
+    return value
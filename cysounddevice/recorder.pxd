@@ -0,0 +1,37 @@
+# cython: language_level=3
+
+from libc.stdint cimport uint64_t
+from libc.stdio cimport FILE
+
+from cysounddevice.types cimport *
+from cysounddevice.buffer cimport SampleBuffer, StreamInputBuffer
+
+cdef class StreamRecorder:
+    cdef readonly object filename
+    cdef readonly StreamInputBuffer input_buffer
+    cdef readonly Py_ssize_t write_buffer_size
+    cdef readonly bint rf64
+    cdef SampleBuffer* sample_buffer
+    cdef FILE* fp
+    cdef char *write_buffer
+    cdef char *scratch
+    cdef Py_ssize_t write_pos
+    cdef Py_ssize_t data_offset
+    cdef Py_ssize_t frame_bytes
+    cdef double sample_rate
+    cdef long poll_ms
+    cdef object _thread
+    cdef uint64_t _stop
+    cdef int _errno
+    cdef readonly uint64_t bytes_written
+    cdef readonly SAMPLE_INDEX_t dropped_frames
+    cdef SAMPLE_INDEX_t _next_frame
+
+    cdef void _start(self, SampleBuffer* bfr, double sample_rate) except *
+    cdef int _record(self) nogil
+    cdef int _append(self, const char *data, Py_ssize_t nframes) nogil
+    cdef int _flush(self) nogil
+    cdef int _write(self, const char *data, Py_ssize_t nbytes) nogil
+    cdef void _check_position(self, SampleTime_s* st, Py_ssize_t nframes) nogil
+    cdef bytes _header(self)
+    cdef void _close_file(self) except *
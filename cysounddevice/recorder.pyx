@@ -0,0 +1,359 @@
+# cython: language_level=3
+
+cimport cython
+from libc.errno cimport errno
+from libc.stdio cimport fopen, fclose, fwrite, fseek, setvbuf, SEEK_SET, _IONBF
+from libc.stdint cimport uint8_t, uint16_t, uint32_t, uint64_t
+from libc.string cimport memcpy
+from cpython.mem cimport PyMem_Malloc, PyMem_Free
+
+from cysounddevice.pawrapper cimport *
+from cysounddevice.atomic cimport atomic_load_acquire, atomic_store_release
+from cysounddevice.buffer cimport (
+    BufferItem,
+    SampleLayout_non_interleaved,
+    sample_buffer_borrow_read,
+    sample_buffer_release_read,
+    sample_buffer_read,
+    sample_buffer_read_available_frames,
+)
+
+import os
+import struct
+import threading
+
+DEF WAVE_FORMAT_PCM = 1
+DEF WAVE_FORMAT_IEEE_FLOAT = 3
+DEF WAVE_FORMAT_EXTENSIBLE = 0xFFFE
+DEF MAX_SIZE_32 = 0xFFFFFFFF
+
+# Trailing bytes of the KSDATAFORMAT_SUBTYPE GUIDs. The format tag is
+# packed in front of them
+cdef bytes _SUBTYPE_SUFFIX = b'\x00\x00\x10\x00\x80\x00\x00\xaa\x00\x38\x9b\x71'
+
+cdef class StreamRecorder:
+    """Records the input of a :class:`~cysounddevice.streams.Stream` to a
+    WAV file from a background thread
+
+    A worker thread (running without the GIL) borrows each block from the
+    input :c:type:`SampleBuffer` as soon as it is available and copies it in
+    the stream's native sample format to a write buffer. The write buffer is
+    written to the file each time it fills, so the callback never waits on
+    disk I/O and no sample conversion takes place.
+
+    The header is written with placeholder sizes and filled in by
+    :meth:`stop`. The file is written as RF64 if *rf64* is True or if the
+    data grows past 4GB.
+
+    While recording, the recorder is the only reader of the input buffer.
+    Reading from :attr:`Stream.input_buffer <cysounddevice.streams.Stream.input_buffer>`
+    at the same time is not supported. The recorder is stopped when the
+    stream is closed.
+
+    Arguments:
+        input_buffer (StreamInputBuffer): The stream's
+            :attr:`~cysounddevice.streams.Stream.input_buffer`
+        filename (str): Path of the file to write
+        write_buffer_size (int): Size of the write buffer in bytes
+        rf64 (bool): If True, always write an RF64 header
+
+    Attributes:
+        bytes_written (int): Number of bytes of audio data recorded
+        frames_written (int): Number of frames recorded
+        dropped_frames (int): Number of frames lost because the input
+            buffer was full when the stream callback tried to write them
+        dropped_blocks (int): :attr:`dropped_frames` in blocks
+        recording (bool): True while the worker thread is running
+
+    Note:
+        ``int8`` samples are stored as unsigned 8-bit as required by WAV.
+        All other formats are written as they are.
+    """
+    def __cinit__(self, StreamInputBuffer input_buffer, filename,
+                  Py_ssize_t write_buffer_size=4194304, bint rf64=False):
+        self.input_buffer = input_buffer
+        self.filename = os.fspath(filename)
+        self.write_buffer_size = write_buffer_size
+        self.rf64 = rf64
+        self.sample_buffer = NULL
+        self.fp = NULL
+        self.write_buffer = NULL
+        self.scratch = NULL
+        self.write_pos = 0
+        self.frame_bytes = 0
+        self._thread = None
+        self._stop = 0
+        self._errno = 0
+        self.bytes_written = 0
+        self.dropped_frames = 0
+        self._next_frame = -1
+    def __dealloc__(self):
+        # The thread holds a reference so it cannot be running here
+        if self.fp != NULL:
+            fclose(self.fp)
+            self.fp = NULL
+        PyMem_Free(self.write_buffer)
+        PyMem_Free(self.scratch)
+        self.write_buffer = NULL
+        self.scratch = NULL
+
+    @property
+    def frames_written(self):
+        if self.frame_bytes == 0:
+            return 0
+        return self.bytes_written // self.frame_bytes
+    @property
+    def dropped_blocks(self):
+        if self.sample_buffer == NULL:
+            return 0
+        return self.dropped_frames // self.sample_buffer.item_length
+    @property
+    def recording(self):
+        return self._thread is not None
+
+    def start(self):
+        """Open the file and start recording
+
+        Raises:
+            RuntimeError: If the stream is not open or is already
+                being recorded
+            OSError: If the file could not be opened
+        """
+        cdef StreamInputBuffer input_buffer = self.input_buffer
+        if input_buffer is None or input_buffer.sample_buffer == NULL:
+            raise RuntimeError('Stream is not open')
+        if input_buffer.recorder is not None:
+            raise RuntimeError('Stream is already being recorded')
+        self._start(input_buffer.sample_buffer, input_buffer.stream.buffer_sample_rate)
+        input_buffer.recorder = self
+
+    def stop(self):
+        """Write any remaining data, finish the header and close the file
+
+        Blocks still in the input buffer are recorded before returning.
+
+        Raises:
+            OSError: If writing to the file failed
+        """
+        if self._thread is None:
+            return
+        atomic_store_release(&self._stop, 1)
+        self._thread.join()
+        self._thread = None
+        if self.input_buffer is not None and self.input_buffer.recorder is self:
+            self.input_buffer.recorder = None
+        cdef bytes header
+        cdef char pad = 0
+        try:
+            if self._errno == 0:
+                # Chunks are padded to an even length
+                if self.bytes_written % 2 and fwrite(&pad, 1, 1, self.fp) != 1:
+                    self._errno = errno
+            if self._errno == 0:
+                header = self._header()
+                if fseek(self.fp, 0, SEEK_SET) != 0:
+                    self._errno = errno
+                elif fwrite(<char *>header, 1, len(header), self.fp) != <size_t>len(header):
+                    self._errno = errno
+        finally:
+            self._close_file()
+        if self._errno != 0:
+            raise OSError(self._errno, os.strerror(self._errno), self.filename)
+
+    def __enter__(self):
+        self.start()
+        return self
+    def __exit__(self, *args):
+        self.stop()
+
+    cdef void _start(self, SampleBuffer* bfr, double sample_rate) except *:
+        if self._thread is not None:
+            raise RuntimeError('Already recording')
+        cdef Py_ssize_t item_bytes = bfr.item_length * bfr.itemsize * bfr.nchannels
+        cdef bytes path = os.fsencode(self.filename)
+        cdef bytes header
+        self.sample_buffer = bfr
+        self.sample_rate = sample_rate
+        self.frame_bytes = bfr.itemsize * bfr.nchannels
+        self.bytes_written = 0
+        self.dropped_frames = 0
+        self._next_frame = -1
+        self._errno = 0
+        self._stop = 0
+        self.poll_ms = <long>(bfr.item_length * 500 / sample_rate)
+        if self.poll_ms < 1:
+            self.poll_ms = 1
+        if self.write_buffer_size < item_bytes:
+            self.write_buffer_size = item_bytes
+        self.write_pos = 0
+        self.write_buffer = <char *>PyMem_Malloc(self.write_buffer_size)
+        self.scratch = <char *>PyMem_Malloc(item_bytes)
+        if self.write_buffer == NULL or self.scratch == NULL:
+            self._close_file()
+            raise MemoryError()
+
+        self.fp = fopen(path, b'wb')
+        if self.fp == NULL:
+            err = errno
+            self._close_file()
+            raise OSError(err, os.strerror(err), self.filename)
+        # Writes are already made in large blocks
+        setvbuf(self.fp, NULL, _IONBF, 0)
+        header = self._header()
+        self.data_offset = len(header)
+        if fwrite(<char *>header, 1, len(header), self.fp) != <size_t>len(header):
+            err = errno
+            self._close_file()
+            raise OSError(err, os.strerror(err), self.filename)
+
+        self._thread = threading.Thread(target=self._run, name='StreamRecorder')
+        self._thread.daemon = True
+        self._thread.start()
+
+    def _run(self):
+        with nogil:
+            self._record()
+
+    cdef int _record(self) nogil:
+        """Consume blocks until :meth:`stop` is called and the buffer
+        is drained
+        """
+        cdef SampleBuffer* bfr = self.sample_buffer
+        cdef BufferItem* item
+        cdef SampleTime_s* st
+        cdef bint stopping
+        while True:
+            # Loaded before checking the buffer so everything written
+            # before stop() is recorded
+            stopping = atomic_load_acquire(&self._stop) != 0
+            item = sample_buffer_borrow_read(bfr)
+            if item != NULL:
+                self._check_position(&item.start_time, item.length)
+                if self._append(item.bfr, item.length) != 0:
+                    return -1
+                sample_buffer_release_read(bfr)
+                continue
+            if sample_buffer_read_available_frames(bfr) >= bfr.item_length:
+                # The read position is not at the start of an item so the
+                # frames cannot be borrowed
+                st = sample_buffer_read(bfr, self.scratch, bfr.item_length)
+                self._check_position(st, bfr.item_length)
+                if self._append(self.scratch, bfr.item_length) != 0:
+                    return -1
+                continue
+            if stopping:
+                break
+            Pa_Sleep(self.poll_ms)
+        return self._flush()
+
+    cdef void _check_position(self, SampleTime_s* st, Py_ssize_t nframes) nogil:
+        """Count the frames skipped since the last block
+        """
+        cdef SAMPLE_INDEX_t frame = SampleTime_to_sample_index(st)
+        if self._next_frame >= 0 and frame > self._next_frame:
+            self.dropped_frames += frame - self._next_frame
+        self._next_frame = frame + nframes
+
+    @cython.boundscheck(False)
+    @cython.wraparound(False)
+    cdef int _append(self, const char *data, Py_ssize_t nframes) nogil:
+        """Copy *nframes* in the buffer's layout to the write buffer as
+        interleaved frames
+        """
+        cdef SampleBuffer* bfr = self.sample_buffer
+        cdef SampleFormat* sf = bfr.sample_format
+        cdef Py_ssize_t nbytes = nframes * self.frame_bytes
+        cdef Py_ssize_t itemsize = bfr.itemsize, nchannels = bfr.nchannels
+        cdef Py_ssize_t i, c
+        cdef char *dest
+        cdef const char *src
+        if self.write_buffer_size - self.write_pos < nbytes:
+            if self._flush() != 0:
+                return -1
+        dest = self.write_buffer + self.write_pos
+        if bfr.layout != SampleLayout_non_interleaved:
+            memcpy(dest, data, nbytes)
+        elif itemsize == 4:
+            for c in range(nchannels):
+                src = data + c * nframes * 4
+                for i in range(nframes):
+                    (<uint32_t *>dest)[i * nchannels + c] = (<const uint32_t *>src)[i]
+        elif itemsize == 2:
+            for c in range(nchannels):
+                src = data + c * nframes * 2
+                for i in range(nframes):
+                    (<uint16_t *>dest)[i * nchannels + c] = (<const uint16_t *>src)[i]
+        else:
+            for c in range(nchannels):
+                src = data + c * nframes * itemsize
+                for i in range(nframes):
+                    memcpy(dest + (i * nchannels + c) * itemsize, src + i * itemsize, itemsize)
+        if sf != NULL and sf.bit_width == 8 and sf.is_signed:
+            for i in range(nbytes):
+                (<uint8_t *>dest)[i] ^= 0x80
+        self.write_pos += nbytes
+        self.bytes_written += nbytes
+        return 0
+
+    cdef int _flush(self) nogil:
+        cdef int r = self._write(self.write_buffer, self.write_pos)
+        self.write_pos = 0
+        return r
+
+    cdef int _write(self, const char *data, Py_ssize_t nbytes) nogil:
+        if nbytes == 0:
+            return 0
+        if fwrite(data, 1, nbytes, self.fp) != <size_t>nbytes:
+            self._errno = errno
+            return -1
+        return 0
+
+    cdef bytes _header(self):
+        """Build the file header using the current data size
+        """
+        cdef SampleBuffer* bfr = self.sample_buffer
+        cdef SampleFormat* sf = bfr.sample_format
+        cdef int nchannels = bfr.nchannels
+        cdef int bits = bfr.itemsize * 8
+        cdef int valid_bits = sf.bit_width
+        cdef int block_align = bfr.itemsize * nchannels
+        cdef int tag = WAVE_FORMAT_IEEE_FLOAT if sf.is_float else WAVE_FORMAT_PCM
+        cdef uint64_t data_size = self.bytes_written
+        cdef uint64_t padded = data_size + (data_size % 2)
+        cdef uint64_t sample_count = data_size // block_align
+        cdef bint extensible = nchannels > 2 or (bits > 16 and not sf.is_float)
+        cdef bytes fmt = struct.pack(
+            '<HHIIHH', WAVE_FORMAT_EXTENSIBLE if extensible else tag, nchannels,
+            <uint32_t>self.sample_rate, <uint32_t>self.sample_rate * block_align,
+            block_align, bits,
+        )
+        if extensible:
+            fmt += struct.pack('<HHIH', 22, valid_bits, 0, tag) + _SUBTYPE_SUFFIX
+        elif tag == WAVE_FORMAT_IEEE_FLOAT:
+            fmt += struct.pack('<H', 0)
+        cdef uint64_t riff_size = 4 + (8 + 28) + (8 + len(fmt)) + 8 + padded
+        cdef bint rf64 = self.rf64 or riff_size > MAX_SIZE_32
+        cdef bytes ds64
+        if rf64:
+            ds64 = b'ds64' + struct.pack('<IQQQI', 28, riff_size, data_size, sample_count, 0)
+            return b''.join([
+                b'RF64', struct.pack('<I', MAX_SIZE_32), b'WAVE', ds64,
+                b'fmt ', struct.pack('<I', len(fmt)), fmt,
+                b'data', struct.pack('<I', MAX_SIZE_32),
+            ])
+        # Reserve space for the ds64 chunk in case the file becomes RF64
+        return b''.join([
+            b'RIFF', struct.pack('<I', riff_size), b'WAVE',
+            b'JUNK', struct.pack('<I', 28), bytes(28),
+            b'fmt ', struct.pack('<I', len(fmt)), fmt,
+            b'data', struct.pack('<I', data_size),
+        ])
+
+    cdef void _close_file(self) except *:
+        if self.fp != NULL:
+            fclose(self.fp)
+            self.fp = NULL
+        PyMem_Free(self.write_buffer)
+        PyMem_Free(self.scratch)
+        self.write_buffer = NULL
+        self.scratch = NULL
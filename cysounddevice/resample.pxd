@@ -0,0 +1,109 @@
+# cython: language_level=3
+
+from cysounddevice.types cimport *
+from cysounddevice.routing cimport ChannelRouting
+
+cdef struct ResamplerState:
+    Py_ssize_t nchannels
+    # Number of input frames on each side of the output position
+    Py_ssize_t half_taps
+    # Number of kernel values per input frame in ``table``
+    Py_ssize_t nphases
+    double cutoff
+    double beta
+    # The kernel over ``[-half_taps, half_taps]`` (plus one guard value)
+    float *table
+    # Coefficients for the current output frame (``2 * half_taps``)
+    float *coefs
+    # Float planes of ``capacity`` input frames each
+    float *history
+    Py_ssize_t capacity
+    Py_ssize_t fill
+    # Input frame index of the first frame in ``history``
+    SAMPLE_INDEX_t start
+    # Input frame index (with fraction) of the next output frame
+    double position
+
+cdef ResamplerState* resampler_create(Py_ssize_t nchannels,
+                                      Py_ssize_t half_taps,
+                                      Py_ssize_t nphases,
+                                      double cutoff,
+                                      double beta,
+                                      Py_ssize_t capacity) except NULL
+cdef void resampler_destroy(ResamplerState* r) except *
+cdef void resampler_reset(ResamplerState* r, SAMPLE_INDEX_t start, double position) nogil
+cdef SAMPLE_INDEX_t resampler_end(ResamplerState* r) nogil
+cdef Py_ssize_t resampler_space(ResamplerState* r) nogil
+cdef Py_ssize_t resampler_push(ResamplerState* r,
+                               const float *data,
+                               Py_ssize_t chan_stride,
+                               Py_ssize_t frame_stride,
+                               Py_ssize_t nframes) nogil
+cdef Py_ssize_t resampler_push_silence(ResamplerState* r, Py_ssize_t nframes) nogil
+cdef Py_ssize_t resampler_available(ResamplerState* r, double step) nogil
+cdef Py_ssize_t resampler_process(ResamplerState* r,
+                                  float *out,
+                                  Py_ssize_t chan_stride,
+                                  Py_ssize_t frame_stride,
+                                  Py_ssize_t nframes,
+                                  double step) nogil
+
+cdef enum ResampleQuality:
+    ResampleQuality_fast
+    ResampleQuality_medium
+    ResampleQuality_high
+    ResampleQuality_best
+
+cdef ResampleQuality get_resample_quality(str name) except *
+cdef str get_resample_quality_name(ResampleQuality quality)
+cdef ResamplerState* resampler_create_for_rates(Py_ssize_t nchannels,
+                                                double in_rate,
+                                                double out_rate,
+                                                ResampleQuality quality,
+                                                Py_ssize_t max_frames) except NULL
+
+cdef struct ResampleStage:
+    # Converts between the host buffers of the stream callback (at the
+    # device rate) and float32 frames at the rate of the stream buffers
+    ResamplerState* resampler
+    SampleFormat* sample_format
+    bint planar
+    # Number of channels of the stream buffers
+    Py_ssize_t nchannels
+    # Routing between the host channels and the buffer channels, or NULL
+    # if they are the same (not owned by the stage)
+    ChannelRouting* routing
+    # The device sample rate
+    double host_rate
+    # Resampler input frames per output frame
+    double step
+    # Length of the scratch planes
+    Py_ssize_t max_frames
+    # Float planes of device frames
+    float *host_data
+    # Float planes of buffer frames
+    float *buffer_data
+    # Number of device frames processed
+    SAMPLE_INDEX_t host_frame
+
+cdef ResampleStage* resample_stage_create(Py_ssize_t nchannels,
+                                          SampleFormat* sample_format,
+                                          bint planar,
+                                          double host_rate,
+                                          double buffer_rate,
+                                          bint output,
+                                          ResampleQuality quality,
+                                          Py_ssize_t max_frames,
+                                          ChannelRouting* routing=*) except NULL
+cdef void resample_stage_destroy(ResampleStage* stage) except *
+cdef Py_ssize_t resample_stage_push_host(ResampleStage* stage,
+                                         const void *host_bfr,
+                                         Py_ssize_t offset,
+                                         Py_ssize_t nframes) nogil except -1
+cdef int resample_stage_pack_host(ResampleStage* stage,
+                                  void *host_bfr,
+                                  Py_ssize_t offset,
+                                  Py_ssize_t nframes) nogil except -1
+
+cdef class Resampler:
+    cdef ResamplerState* state
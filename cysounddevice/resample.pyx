@@ -0,0 +1,622 @@
+# cython: language_level=3
+
+cimport cython
+from libc.math cimport sin, sqrt, floor, ceil, M_PI
+from libc.string cimport memset, memmove
+from cpython.mem cimport PyMem_Malloc, PyMem_Free
+
+from cysounddevice.conversion cimport pack_samples, unpack_samples
+from cysounddevice.routing cimport routing_host_ptrs, routing_unpack, routing_pack
+
+# -----------------------------------------------------------------------------
+# Windowed-sinc resampling with a variable ratio.
+#
+# Input frames are appended to ``history`` as float32 planes. Each output
+# frame is interpolated at ``position`` (an input frame index with a
+# fraction) from the ``2 * half_taps`` input frames around it, then
+# ``position`` moves forward by ``step`` input frames. The step can change
+# for every call, which is how drift between clocks is followed.
+#
+# The kernel (a Kaiser windowed sinc) is sampled ``nphases`` times per
+# input frame into ``table``. The coefficients for a position are linearly
+# interpolated from the two nearest phases and shared by all channels.
+#
+# Frames before the start of the history are treated as silence. Frames no
+# longer needed (before ``position - half_taps``) are discarded when room
+# is needed for new input.
+# -----------------------------------------------------------------------------
+
+cdef double _bessel_i0(double x) nogil:
+    """Modified Bessel function of the first kind (order 0)
+    """
+    cdef double result = 1, term = 1, y = x * x / 4
+    cdef int k = 1
+    while term > result * 1e-12:
+        term *= y / (k * k)
+        result += term
+        k += 1
+    return result
+
+@cython.cdivision(True)
+cdef double _kernel(double x, double half_taps, double cutoff, double beta) nogil:
+    cdef double u = x / half_taps, t
+    if u <= -1 or u >= 1:
+        return 0
+    t = M_PI * cutoff * x
+    if t == 0:
+        return cutoff
+    return cutoff * sin(t) / t * _bessel_i0(beta * sqrt(1 - u * u)) / _bessel_i0(beta)
+
+cdef ResamplerState* resampler_create(Py_ssize_t nchannels,
+                                      Py_ssize_t half_taps,
+                                      Py_ssize_t nphases,
+                                      double cutoff,
+                                      double beta,
+                                      Py_ssize_t capacity) except NULL:
+    """Allocate a :c:type:`ResamplerState`
+
+    Arguments:
+        nchannels: Number of channels
+        half_taps: Number of input frames used on each side of an output frame
+        nphases: Resolution of the kernel table per input frame
+        cutoff: Cutoff frequency relative to the input Nyquist frequency
+            (``1.0``). For downsampling this should be at most the ratio of
+            the output rate to the input rate
+        beta: Kaiser window parameter. Higher values give more stopband
+            attenuation and a wider transition band
+        capacity: Number of input frames that can be held. Must be more than
+            ``2 * half_taps``
+    """
+    if nchannels <= 0 or half_taps <= 0 or nphases <= 0:
+        raise ValueError('nchannels, half_taps and nphases must be greater than zero')
+    if not 0 < cutoff <= 1:
+        raise ValueError('cutoff must be in the range (0, 1]')
+    if capacity <= 2 * half_taps:
+        raise ValueError('capacity must be greater than 2 * half_taps')
+    cdef ResamplerState* r = <ResamplerState*>PyMem_Malloc(sizeof(ResamplerState))
+    if r == NULL:
+        raise MemoryError()
+    memset(r, 0, sizeof(ResamplerState))
+    r.nchannels = nchannels
+    r.half_taps = half_taps
+    r.nphases = nphases
+    r.cutoff = cutoff
+    r.beta = beta
+    r.capacity = capacity
+    cdef Py_ssize_t table_len = 2 * half_taps * nphases + 2
+    r.table = <float *>PyMem_Malloc(table_len * sizeof(float))
+    r.coefs = <float *>PyMem_Malloc(2 * half_taps * sizeof(float))
+    r.history = <float *>PyMem_Malloc(nchannels * capacity * sizeof(float))
+    if r.table == NULL or r.coefs == NULL or r.history == NULL:
+        resampler_destroy(r)
+        raise MemoryError()
+    _build_table(r)
+    resampler_reset(r, 0, 0)
+    return r
+
+cdef void resampler_destroy(ResamplerState* r) except *:
+    PyMem_Free(r.table)
+    PyMem_Free(r.coefs)
+    PyMem_Free(r.history)
+    PyMem_Free(r)
+
+@cython.cdivision(True)
+cdef void _build_table(ResamplerState* r) nogil:
+    cdef Py_ssize_t nphases = r.nphases, half_taps = r.half_taps
+    cdef Py_ssize_t n = 2 * half_taps * nphases, j, k
+    cdef double total = 0
+    for j in range(n + 1):
+        r.table[j] = _kernel(<double>j / nphases - half_taps, half_taps, r.cutoff, r.beta)
+    r.table[n + 1] = 0
+    # Normalize for unity gain at DC
+    for k in range(1, 2 * half_taps):
+        total += r.table[k * nphases]
+    if total > 0:
+        for j in range(n + 2):
+            r.table[j] = <float>(r.table[j] / total)
+
+cdef void resampler_reset(ResamplerState* r, SAMPLE_INDEX_t start, double position) nogil:
+    """Discard all input and set the index of the next input frame and
+    the position of the next output frame
+    """
+    r.fill = 0
+    r.start = start
+    r.position = position
+
+cdef SAMPLE_INDEX_t resampler_end(ResamplerState* r) nogil:
+    """The input frame index following the last frame pushed
+    """
+    return r.start + r.fill
+
+cdef Py_ssize_t resampler_space(ResamplerState* r) nogil:
+    """Discard the input frames that are no longer needed and return the
+    number of frames that can be pushed
+    """
+    cdef SAMPLE_INDEX_t keep = <SAMPLE_INDEX_t>floor(r.position) - r.half_taps + 1
+    cdef Py_ssize_t drop, c
+    if keep > r.start:
+        drop = <Py_ssize_t>(keep - r.start)
+        if drop > r.fill:
+            drop = r.fill
+        if drop > 0:
+            for c in range(r.nchannels):
+                memmove(
+                    r.history + c * r.capacity,
+                    r.history + c * r.capacity + drop,
+                    (r.fill - drop) * sizeof(float),
+                )
+            r.fill -= drop
+            r.start += drop
+    return r.capacity - r.fill
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+cdef Py_ssize_t resampler_push(ResamplerState* r,
+                               const float *data,
+                               Py_ssize_t chan_stride,
+                               Py_ssize_t frame_stride,
+                               Py_ssize_t nframes) nogil:
+    """Append up to *nframes* input frames
+
+    The strides are in floats, so the same function handles interleaved
+    and planar input.
+
+    Returns:
+        The number of frames appended
+    """
+    cdef Py_ssize_t space = r.capacity - r.fill, c, i
+    cdef float *dest
+    cdef const float *src
+    if space < nframes:
+        space = resampler_space(r)
+    if nframes > space:
+        nframes = space
+    for c in range(r.nchannels):
+        dest = r.history + c * r.capacity + r.fill
+        src = data + c * chan_stride
+        for i in range(nframes):
+            dest[i] = src[i * frame_stride]
+    r.fill += nframes
+    return nframes
+
+cdef Py_ssize_t resampler_push_silence(ResamplerState* r, Py_ssize_t nframes) nogil:
+    """Append up to *nframes* of silence (for input that was lost)
+    """
+    cdef Py_ssize_t space = r.capacity - r.fill, c
+    if space < nframes:
+        space = resampler_space(r)
+    if nframes > space:
+        nframes = space
+    for c in range(r.nchannels):
+        memset(r.history + c * r.capacity + r.fill, 0, nframes * sizeof(float))
+    r.fill += nframes
+    return nframes
+
+@cython.cdivision(True)
+cdef Py_ssize_t resampler_available(ResamplerState* r, double step) nogil:
+    """Number of output frames that can be produced from the input pushed
+    so far with the given *step*
+    """
+    # The last output position with all of its input frames available
+    cdef double last = <double>(r.start + r.fill - r.half_taps - 1)
+    if step <= 0 or floor(r.position) > last:
+        return 0
+    return <Py_ssize_t>floor((last + 1 - r.position) / step - 1e-9) + 1
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+@cython.cdivision(True)
+cdef Py_ssize_t resampler_process(ResamplerState* r,
+                                  float *out,
+                                  Py_ssize_t chan_stride,
+                                  Py_ssize_t frame_stride,
+                                  Py_ssize_t nframes,
+                                  double step) nogil:
+    """Produce up to *nframes* output frames, moving the position forward
+    by *step* input frames for each
+
+    The strides of *out* are in floats.
+
+    Returns:
+        The number of frames produced. This is less than *nframes* if more
+        input is needed
+    """
+    cdef Py_ssize_t ntaps = 2 * r.half_taps, nphases = r.nphases
+    cdef Py_ssize_t n, k, kstart, c, j
+    cdef SAMPLE_INDEX_t i0, end = r.start + r.fill
+    cdef Py_ssize_t base
+    cdef double frac, f0, w
+    cdef float acc
+    cdef float *coefs = r.coefs
+    cdef const float *table = r.table
+    cdef const float *src
+    for n in range(nframes):
+        i0 = <SAMPLE_INDEX_t>floor(r.position)
+        if i0 + r.half_taps >= end:
+            return n
+        frac = r.position - i0
+        # coefs[k] applies to input frame i0 - half_taps + 1 + k, at an
+        # offset of k + 1 - half_taps - frac. In phases from the start of
+        # the table, the first is (1 - frac) * nphases
+        f0 = (1 - frac) * nphases
+        j = <Py_ssize_t>f0
+        w = f0 - j
+        for k in range(ntaps):
+            coefs[k] = <float>(table[j] + w * (table[j + 1] - table[j]))
+            j += nphases
+        base = <Py_ssize_t>(i0 - r.half_taps + 1 - r.start)
+        kstart = 0
+        if base < 0:
+            kstart = -base
+            if kstart > ntaps:
+                kstart = ntaps
+        for c in range(r.nchannels):
+            src = r.history + c * r.capacity + base
+            acc = 0
+            for k in range(kstart, ntaps):
+                acc = acc + src[k] * coefs[k]
+            out[c * chan_stride + n * frame_stride] = acc
+        r.position += step
+    return nframes
+
+
+# -----------------------------------------------------------------------------
+# Quality presets
+#
+# Each preset is (half_taps, nphases, cutoff, beta). The Kaiser beta sets
+# the stopband attenuation (about 60, 80, 100 and 120 dB) and the number of
+# taps sets the width of the transition band. The table resolution is
+# raised with the attenuation to keep the interpolation error below it.
+# -----------------------------------------------------------------------------
+
+cdef struct _QualityParams:
+    Py_ssize_t half_taps
+    Py_ssize_t nphases
+    double cutoff
+    double beta
+
+cdef _QualityParams _QUALITY_PARAMS[4]
+_QUALITY_PARAMS[<int>ResampleQuality_fast] = _QualityParams(8, 64, .85, 5.65)
+_QUALITY_PARAMS[<int>ResampleQuality_medium] = _QualityParams(16, 128, .9, 7.86)
+_QUALITY_PARAMS[<int>ResampleQuality_high] = _QualityParams(32, 512, .94, 10.06)
+_QUALITY_PARAMS[<int>ResampleQuality_best] = _QualityParams(64, 1024, .96, 12.26)
+
+cdef ResampleQuality get_resample_quality(str name) except *:
+    if name == 'fast':
+        return ResampleQuality_fast
+    elif name == 'medium':
+        return ResampleQuality_medium
+    elif name == 'high':
+        return ResampleQuality_high
+    elif name == 'best':
+        return ResampleQuality_best
+    raise ValueError('Invalid resample_quality: {!r}'.format(name))
+
+cdef str get_resample_quality_name(ResampleQuality quality):
+    if quality == ResampleQuality_fast:
+        return 'fast'
+    elif quality == ResampleQuality_high:
+        return 'high'
+    elif quality == ResampleQuality_best:
+        return 'best'
+    return 'medium'
+
+@cython.cdivision(True)
+cdef _QualityParams _quality_params(ResampleQuality quality, double in_rate, double out_rate) except *:
+    """The preset for *quality*, with the cutoff lowered (and the taps
+    widened to match) when downsampling
+    """
+    cdef _QualityParams p = _QUALITY_PARAMS[<int>quality]
+    cdef double ratio = 1
+    if in_rate <= 0 or out_rate <= 0:
+        raise ValueError('Sample rates must be greater than zero')
+    if out_rate < in_rate:
+        ratio = out_rate / in_rate
+        p.cutoff *= ratio
+        p.half_taps = <Py_ssize_t>ceil(p.half_taps / ratio)
+    return p
+
+def quality_params(str quality='medium', double in_rate=1, double out_rate=1):
+    """Get the :class:`Resampler` arguments for a quality preset
+
+    Presets trade CPU for stopband attenuation:
+
+    * ``'fast'``: 16 taps, about 60 dB
+    * ``'medium'``: 32 taps, about 80 dB
+    * ``'high'``: 64 taps, about 100 dB
+    * ``'best'``: 128 taps, about 120 dB
+
+    When downsampling, the cutoff is scaled by ``out_rate / in_rate`` and
+    the number of taps by its inverse.
+
+    Arguments:
+        quality (str): The preset name
+        in_rate (float): The input sample rate
+        out_rate (float): The output sample rate
+
+    Returns:
+        dict: The ``half_taps``, ``nphases``, ``cutoff`` and ``beta`` arguments
+    """
+    cdef _QualityParams p = _quality_params(get_resample_quality(quality), in_rate, out_rate)
+    return dict(half_taps=p.half_taps, nphases=p.nphases, cutoff=p.cutoff, beta=p.beta)
+
+cdef ResamplerState* resampler_create_for_rates(Py_ssize_t nchannels,
+                                                double in_rate,
+                                                double out_rate,
+                                                ResampleQuality quality,
+                                                Py_ssize_t max_frames) except NULL:
+    """Allocate a :c:type:`ResamplerState` using a quality preset, with
+    room for *max_frames* input frames beyond those held for the kernel
+    """
+    cdef _QualityParams p = _quality_params(quality, in_rate, out_rate)
+    return resampler_create(
+        nchannels, p.half_taps, p.nphases, p.cutoff, p.beta,
+        max_frames + 4 * p.half_taps + 2,
+    )
+
+# -----------------------------------------------------------------------------
+# Stream callback stage
+# -----------------------------------------------------------------------------
+
+@cython.cdivision(True)
+cdef ResampleStage* resample_stage_create(Py_ssize_t nchannels,
+                                          SampleFormat* sample_format,
+                                          bint planar,
+                                          double host_rate,
+                                          double buffer_rate,
+                                          bint output,
+                                          ResampleQuality quality,
+                                          Py_ssize_t max_frames,
+                                          ChannelRouting* routing=NULL) except NULL:
+    """Allocate a :c:type:`ResampleStage`
+
+    Arguments:
+        nchannels: Number of channels of the stream buffers
+        sample_format: Format of the host buffers
+        planar: True if the host buffers are ``non_interleaved``
+        host_rate: The device sample rate
+        buffer_rate: The sample rate of the stream buffers
+        output: If True, buffer frames are converted to device frames.
+            Otherwise device frames are converted to buffer frames
+        quality: The :c:type:`ResampleQuality` preset
+        max_frames: Number of frames converted at a time
+        routing: A :c:type:`ChannelRouting` from the host channels to the
+            buffer channels (or the reverse if *output* is True). If NULL,
+            both have *nchannels*
+    """
+    cdef ResampleStage* stage = <ResampleStage*>PyMem_Malloc(sizeof(ResampleStage))
+    cdef double in_rate = host_rate, out_rate = buffer_rate
+    if stage == NULL:
+        raise MemoryError()
+    memset(stage, 0, sizeof(ResampleStage))
+    if output:
+        in_rate, out_rate = buffer_rate, host_rate
+    stage.sample_format = sample_format
+    stage.planar = planar
+    stage.nchannels = nchannels
+    stage.routing = routing
+    stage.host_rate = host_rate
+    stage.step = in_rate / out_rate
+    stage.max_frames = max_frames
+    stage.host_data = <float *>PyMem_Malloc(nchannels * max_frames * sizeof(float))
+    stage.buffer_data = <float *>PyMem_Malloc(nchannels * max_frames * sizeof(float))
+    if stage.host_data == NULL or stage.buffer_data == NULL:
+        resample_stage_destroy(stage)
+        raise MemoryError()
+    try:
+        stage.resampler = resampler_create_for_rates(
+            nchannels, in_rate, out_rate, quality, max_frames,
+        )
+    except:
+        resample_stage_destroy(stage)
+        raise
+    return stage
+
+cdef void resample_stage_destroy(ResampleStage* stage) except *:
+    if stage.resampler != NULL:
+        resampler_destroy(stage.resampler)
+    PyMem_Free(stage.host_data)
+    PyMem_Free(stage.buffer_data)
+    PyMem_Free(stage)
+
+cdef Py_ssize_t resample_stage_push_host(ResampleStage* stage,
+                                         const void *host_bfr,
+                                         Py_ssize_t offset,
+                                         Py_ssize_t nframes) nogil except -1:
+    """Convert up to *nframes* frames of the host input buffer starting at
+    *offset* and push them to the resampler
+
+    Returns:
+        The number of frames pushed (limited by the space in the resampler
+        and :c:member:`max_frames`)
+    """
+    cdef SampleFormat* fmt = stage.sample_format
+    cdef Py_ssize_t nch = stage.nchannels, max_frames = stage.max_frames
+    cdef Py_ssize_t itemsize = fmt.bit_width // 8, space, c, host_stride
+    cdef const char **planes = <const char **>host_bfr
+    space = resampler_space(stage.resampler)
+    if nframes > space:
+        nframes = space
+    if nframes > max_frames:
+        nframes = max_frames
+    if nframes <= 0:
+        return 0
+    if stage.routing != NULL:
+        routing_host_ptrs(
+            host_bfr, stage.planar, stage.routing.nsources, offset, itemsize,
+            <char **>stage.routing.src_ptrs, &host_stride,
+        )
+        routing_unpack(
+            stage.routing, stage.routing.src_ptrs, host_stride,
+            stage.host_data, max_frames, 1, nframes,
+        )
+    elif stage.planar:
+        for c in range(nch):
+            unpack_samples(
+                planes[c] + offset * itemsize, 1, 1,
+                stage.host_data + c * max_frames, 1, 1, 1, nframes, fmt,
+            )
+    else:
+        unpack_samples(
+            <const char *>host_bfr + offset * nch * itemsize, 1, nch,
+            stage.host_data, max_frames, 1, nch, nframes, fmt,
+        )
+    resampler_push(stage.resampler, stage.host_data, max_frames, 1, nframes)
+    stage.host_frame += nframes
+    return nframes
+
+cdef int resample_stage_pack_host(ResampleStage* stage,
+                                  void *host_bfr,
+                                  Py_ssize_t offset,
+                                  Py_ssize_t nframes) nogil except -1:
+    """Convert *nframes* frames from :c:member:`host_data` into the host
+    output buffer starting at *offset*
+    """
+    cdef SampleFormat* fmt = stage.sample_format
+    cdef Py_ssize_t nch = stage.nchannels, max_frames = stage.max_frames
+    cdef Py_ssize_t itemsize = fmt.bit_width // 8, c, host_stride
+    cdef char **planes = <char **>host_bfr
+    if nframes <= 0:
+        return 0
+    if stage.routing != NULL:
+        routing_host_ptrs(
+            host_bfr, stage.planar, stage.routing.ndests, offset, itemsize,
+            stage.routing.dest_ptrs, &host_stride,
+        )
+        routing_pack(
+            stage.routing, stage.host_data, max_frames, 1,
+            stage.routing.dest_ptrs, host_stride, nframes,
+        )
+    elif stage.planar:
+        for c in range(nch):
+            pack_samples(
+                stage.host_data + c * max_frames, 1, 1,
+                planes[c] + offset * itemsize, 1, 1, 1, nframes, fmt,
+            )
+    else:
+        pack_samples(
+            stage.host_data, max_frames, 1,
+            <char *>host_bfr + offset * nch * itemsize, 1, nch, nch, nframes, fmt,
+        )
+    return 0
+
+
+cdef class Resampler:
+    """Resamples float32 audio with a variable ratio using a Kaiser
+    windowed-sinc filter
+
+    Input is added with :meth:`push` and output is taken with
+    :meth:`process`. Each output frame is interpolated at :attr:`position`
+    (an input frame index) which then moves forward by the ``step`` given
+    to :meth:`process` (the input rate divided by the output rate).
+    Output lags the input by :attr:`half_taps` frames.
+
+    All processing is done without the GIL.
+
+    Arguments:
+        nchannels (int): Number of channels
+        half_taps (int): Number of input frames used on each side of an
+            output frame. More taps give a sharper transition band
+        nphases (int): Resolution of the kernel per input frame
+        cutoff (float): Cutoff frequency relative to the input Nyquist
+            frequency. For downsampling this should be at most the
+            output rate divided by the input rate
+        beta (float): Kaiser window parameter
+        capacity (int): Number of input frames that can be held
+
+    Attributes:
+        nchannels (int):
+        half_taps (int):
+        cutoff (float):
+        position (float): Input frame index of the next output frame
+        start (int): Input frame index of the oldest frame held
+        end (int): Input frame index following the last frame pushed
+    """
+    def __cinit__(self, Py_ssize_t nchannels, Py_ssize_t half_taps=16,
+                  Py_ssize_t nphases=256, double cutoff=.95, double beta=8.6,
+                  Py_ssize_t capacity=8192):
+        self.state = resampler_create(nchannels, half_taps, nphases, cutoff, beta, capacity)
+    def __dealloc__(self):
+        if self.state != NULL:
+            resampler_destroy(self.state)
+            self.state = NULL
+
+    @property
+    def nchannels(self):
+        return self.state.nchannels
+    @property
+    def half_taps(self):
+        return self.state.half_taps
+    @property
+    def cutoff(self):
+        return self.state.cutoff
+    @property
+    def position(self):
+        return self.state.position
+    @position.setter
+    def position(self, double value):
+        self.state.position = value
+    @property
+    def start(self):
+        return self.state.start
+    @property
+    def end(self):
+        return resampler_end(self.state)
+
+    def reset(self, SAMPLE_INDEX_t start=0, double position=0):
+        """Discard all input and set the index of the next input frame and
+        the :attr:`position` of the next output frame
+        """
+        resampler_reset(self.state, start, position)
+
+    def push(self, const float[:,:] data):
+        """Append input frames
+
+        Arguments:
+            data: A float32 array of shape ``(nchannels, nframes)``
+
+        Returns:
+            int: The number of frames appended (less than ``nframes`` if
+            there was no room)
+        """
+        if data.shape[0] != self.state.nchannels:
+            raise ValueError('data must be of shape (nchannels, nframes)')
+        cdef Py_ssize_t result = 0
+        if data.shape[1] == 0:
+            return 0
+        with nogil:
+            result = resampler_push(
+                self.state, &data[0,0], data.strides[0] // sizeof(float),
+                data.strides[1] // sizeof(float), data.shape[1],
+            )
+        return result
+
+    def available(self, double step=1):
+        """Number of output frames that can be produced from the input
+        pushed so far
+        """
+        return resampler_available(self.state, step)
+
+    def process(self, float[:,:] out, double step=1):
+        """Produce output frames
+
+        Arguments:
+            out: A float32 array of shape ``(nchannels, nframes)`` to fill
+            step (float): Number of input frames per output frame
+
+        Returns:
+            int: The number of frames produced at the start of *out*
+        """
+        if out.shape[0] != self.state.nchannels:
+            raise ValueError('out must be of shape (nchannels, nframes)')
+        if step <= 0:
+            raise ValueError('step must be greater than zero')
+        cdef Py_ssize_t result = 0
+        if out.shape[1] == 0:
+            return 0
+        with nogil:
+            result = resampler_process(
+                self.state, &out[0,0], out.strides[0] // sizeof(float),
+                out.strides[1] // sizeof(float), out.shape[1], step,
+            )
+        return result
@@ -0,0 +1,52 @@
+# cython: language_level=3
+
+from cysounddevice.pawrapper cimport *
+from cysounddevice.types cimport *
+
+cdef struct ChannelRouting:
+    # Number of channels read (source) and written (destination)
+    Py_ssize_t nsources
+    Py_ssize_t ndests
+    # The nonzero gains of destination channel ``j`` are
+    # ``gains[offsets[j]:offsets[j + 1]]``, applied to the source channels
+    # at the same positions in ``sources``
+    Py_ssize_t *offsets
+    Py_ssize_t *sources
+    float *gains
+    # The source channel copied to each destination without conversion
+    # (a single source with unity gain), or -1
+    Py_ssize_t *direct
+    SampleFormat* sample_format
+    # Float plane used to mix up to ``max_frames`` frames
+    float *scratch
+    Py_ssize_t max_frames
+    # Pointers to the first sample of each channel for the current call
+    const char **src_ptrs
+    char **dest_ptrs
+
+cdef object get_routing_gains(object channel_map, object mix,
+                              Py_ssize_t device_channels, bint output)
+cdef ChannelRouting* channel_routing_create(object gains,
+                                            Py_ssize_t nsources,
+                                            SampleFormat* sample_format,
+                                            Py_ssize_t max_frames) except NULL
+cdef void channel_routing_destroy(ChannelRouting* r) except *
+cdef void routing_host_ptrs(const void *host_bfr,
+                            bint planar,
+                            Py_ssize_t nchannels,
+                            Py_ssize_t offset,
+                            Py_ssize_t itemsize,
+                            char **ptrs,
+                            Py_ssize_t *frame_stride) nogil
+cdef int routing_copy(ChannelRouting* r,
+                      const char **src, Py_ssize_t src_stride,
+                      char **dest, Py_ssize_t dest_stride,
+                      Py_ssize_t nframes) nogil except -1
+cdef int routing_unpack(ChannelRouting* r,
+                        const char **src, Py_ssize_t src_stride,
+                        float *dest, Py_ssize_t dest_chan_stride, Py_ssize_t dest_frame_stride,
+                        Py_ssize_t nframes) nogil except -1
+cdef int routing_pack(ChannelRouting* r,
+                      const float *src, Py_ssize_t src_chan_stride, Py_ssize_t src_frame_stride,
+                      char **dest, Py_ssize_t dest_stride,
+                      Py_ssize_t nframes) nogil except -1
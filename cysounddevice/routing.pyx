@@ -0,0 +1,307 @@
+# cython: language_level=3
+
+cimport cython
+from libc.stdint cimport uint32_t, uint16_t, uint8_t
+from libc.string cimport memset, memcpy
+from cpython.mem cimport PyMem_Malloc, PyMem_Free
+
+from cysounddevice.conversion cimport pack_samples, unpack_samples, unpack_add_samples
+
+# -----------------------------------------------------------------------------
+# Channel routing
+#
+# A routing maps source channels to destination channels with a gain matrix
+# stored by destination row, keeping only the nonzero gains. The work done
+# for each destination channel depends only on the sources it uses:
+#
+# * A single source with unity gain is copied in the source format
+#   (a channel selection needs no conversion at all)
+# * Otherwise the sources are converted and mixed in a float plane which is
+#   then converted to the destination (silence if there are no sources)
+#
+# Channels are given as pointers to their first sample with a frame stride
+# (in samples) so the same functions handle interleaved, planar and
+# SampleBuffer item layouts.
+# -----------------------------------------------------------------------------
+
+cdef object get_routing_gains(object channel_map, object mix,
+                              Py_ssize_t device_channels, bint output):
+    """Build the gain matrix for a stream direction
+
+    Arguments:
+        channel_map: A sequence of device channel indices (one for each
+            buffer channel) or ``None``
+        mix: A sequence of gain rows or ``None``. For input, the rows are
+            the buffer channels and the columns the device channels. For
+            output, the rows are the device channels
+        device_channels: Number of channels opened on the device
+        output: True for the output direction
+
+    Returns:
+        list: The gains as rows of destination channels (each a list of
+        source channel gains), or ``None`` if the routing has no effect
+    """
+    cdef Py_ssize_t nbuffer, i, j
+    cdef list rows
+    if channel_map is not None and mix is not None:
+        raise ValueError('Only one of the channel map or the mix can be set')
+    if channel_map is not None:
+        nbuffer = len(channel_map)
+        for i in channel_map:
+            if not 0 <= i < device_channels:
+                raise ValueError('Channel {} is not in the range of the {} device channels'.format(
+                    i, device_channels,
+                ))
+        if output:
+            rows = [[0.] * nbuffer for i in range(device_channels)]
+            for j in range(nbuffer):
+                rows[channel_map[j]][j] += 1.
+        else:
+            rows = [[0.] * device_channels for i in range(nbuffer)]
+            for j in range(nbuffer):
+                rows[j][channel_map[j]] = 1.
+    elif mix is not None:
+        rows = [[float(v) for v in row] for row in mix]
+        if output:
+            if len(rows) != device_channels:
+                raise ValueError('The output mix must have a row for each of the {} device channels'.format(
+                    device_channels,
+                ))
+            nbuffer = len(rows[0]) if len(rows) else 0
+        else:
+            nbuffer = len(rows)
+            for row in rows:
+                if len(row) != device_channels:
+                    raise ValueError('The input mix must have a column for each of the {} device channels'.format(
+                        device_channels,
+                    ))
+        for row in rows:
+            if len(row) != len(rows[0]):
+                raise ValueError('The rows of the mix must have the same length')
+    else:
+        return None
+    if nbuffer == 0:
+        raise ValueError('At least one buffer channel is required')
+    if nbuffer == device_channels:
+        for i in range(nbuffer):
+            for j in range(nbuffer):
+                if rows[i][j] != (1. if i == j else 0.):
+                    return rows
+        return None
+    return rows
+
+cdef ChannelRouting* channel_routing_create(object gains,
+                                            Py_ssize_t nsources,
+                                            SampleFormat* sample_format,
+                                            Py_ssize_t max_frames) except NULL:
+    """Allocate a :c:type:`ChannelRouting`
+
+    Arguments:
+        gains: A list of destination rows, each with *nsources* gains
+            (see :c:func:`get_routing_gains`)
+        nsources: Number of source channels
+        sample_format: Format of the raw samples
+        max_frames: Number of frames mixed at a time
+    """
+    cdef Py_ssize_t ndests = len(gains), nentries = 0, i, j, k
+    cdef float g
+    for row in gains:
+        for g in row:
+            if g != 0:
+                nentries += 1
+    cdef ChannelRouting* r = <ChannelRouting*>PyMem_Malloc(sizeof(ChannelRouting))
+    if r == NULL:
+        raise MemoryError()
+    memset(r, 0, sizeof(ChannelRouting))
+    r.nsources = nsources
+    r.ndests = ndests
+    r.sample_format = sample_format
+    r.max_frames = max_frames
+    r.offsets = <Py_ssize_t *>PyMem_Malloc((ndests + 1) * sizeof(Py_ssize_t))
+    r.sources = <Py_ssize_t *>PyMem_Malloc((nentries + 1) * sizeof(Py_ssize_t))
+    r.gains = <float *>PyMem_Malloc((nentries + 1) * sizeof(float))
+    r.direct = <Py_ssize_t *>PyMem_Malloc(ndests * sizeof(Py_ssize_t))
+    r.scratch = <float *>PyMem_Malloc(max_frames * sizeof(float))
+    r.src_ptrs = <const char **>PyMem_Malloc(nsources * sizeof(char *))
+    r.dest_ptrs = <char **>PyMem_Malloc(ndests * sizeof(char *))
+    if (r.offsets == NULL or r.sources == NULL or r.gains == NULL or r.direct == NULL or
+            r.scratch == NULL or r.src_ptrs == NULL or r.dest_ptrs == NULL):
+        channel_routing_destroy(r)
+        raise MemoryError()
+    k = 0
+    for j in range(ndests):
+        r.offsets[j] = k
+        for i in range(nsources):
+            g = gains[j][i]
+            if g != 0:
+                r.sources[k] = i
+                r.gains[k] = g
+                k += 1
+        r.direct[j] = -1
+        if k - r.offsets[j] == 1 and r.gains[k - 1] == 1:
+            r.direct[j] = r.sources[k - 1]
+    r.offsets[ndests] = k
+    return r
+
+cdef void channel_routing_destroy(ChannelRouting* r) except *:
+    PyMem_Free(r.offsets)
+    PyMem_Free(r.sources)
+    PyMem_Free(r.gains)
+    PyMem_Free(r.direct)
+    PyMem_Free(r.scratch)
+    PyMem_Free(<void *>r.src_ptrs)
+    PyMem_Free(r.dest_ptrs)
+    PyMem_Free(r)
+
+cdef void routing_host_ptrs(const void *host_bfr,
+                            bint planar,
+                            Py_ssize_t nchannels,
+                            Py_ssize_t offset,
+                            Py_ssize_t itemsize,
+                            char **ptrs,
+                            Py_ssize_t *frame_stride) nogil:
+    """Get the channel pointers of a stream callback buffer starting at
+    frame *offset*
+    """
+    cdef char **planes = <char **>host_bfr
+    cdef Py_ssize_t c
+    if planar:
+        for c in range(nchannels):
+            ptrs[c] = planes[c] + offset * itemsize
+        frame_stride[0] = 1
+    else:
+        for c in range(nchannels):
+            ptrs[c] = <char *>host_bfr + (offset * nchannels + c) * itemsize
+        frame_stride[0] = nchannels
+
+cdef void _copy_samples(const char *src, Py_ssize_t src_stride,
+                        char *dest, Py_ssize_t dest_stride,
+                        Py_ssize_t nframes, Py_ssize_t itemsize) nogil:
+    """Copy the raw samples of one channel
+    """
+    cdef Py_ssize_t i
+    if src_stride == 1 and dest_stride == 1:
+        memcpy(dest, src, nframes * itemsize)
+    elif itemsize == 4:
+        for i in range(nframes):
+            (<uint32_t *>dest)[i * dest_stride] = (<const uint32_t *>src)[i * src_stride]
+    elif itemsize == 2:
+        for i in range(nframes):
+            (<uint16_t *>dest)[i * dest_stride] = (<const uint16_t *>src)[i * src_stride]
+    elif itemsize == 1:
+        for i in range(nframes):
+            (<uint8_t *>dest)[i * dest_stride] = (<const uint8_t *>src)[i * src_stride]
+    else:
+        for i in range(nframes):
+            memcpy(dest + i * dest_stride * itemsize, src + i * src_stride * itemsize, itemsize)
+
+cdef int _mix_channel(ChannelRouting* r, Py_ssize_t j,
+                      const char **src, Py_ssize_t src_stride,
+                      Py_ssize_t offset, Py_ssize_t nframes) nogil except -1:
+    """Mix the sources of destination *j* into :c:member:`scratch`
+    """
+    cdef Py_ssize_t itemsize = r.sample_format.bit_width // 8, k
+    memset(r.scratch, 0, nframes * sizeof(float))
+    for k in range(r.offsets[j], r.offsets[j + 1]):
+        unpack_add_samples(
+            src[r.sources[k]] + offset * src_stride * itemsize, src_stride,
+            r.scratch, 1, nframes, r.gains[k], r.sample_format,
+        )
+    return 0
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+cdef int routing_copy(ChannelRouting* r,
+                      const char **src, Py_ssize_t src_stride,
+                      char **dest, Py_ssize_t dest_stride,
+                      Py_ssize_t nframes) nogil except -1:
+    """Route *nframes* raw frames from the *src* channels to the *dest*
+    channels (both in the routing's sample format)
+    """
+    cdef Py_ssize_t itemsize = r.sample_format.bit_width // 8
+    cdef Py_ssize_t j, s, done, n
+    for j in range(r.ndests):
+        s = r.direct[j]
+        if s >= 0:
+            _copy_samples(src[s], src_stride, dest[j], dest_stride, nframes, itemsize)
+            continue
+        done = 0
+        while done < nframes:
+            n = nframes - done
+            if n > r.max_frames:
+                n = r.max_frames
+            _mix_channel(r, j, src, src_stride, done, n)
+            pack_samples(
+                r.scratch, 1, 1, dest[j] + done * dest_stride * itemsize, 1, dest_stride,
+                1, n, r.sample_format,
+            )
+            done += n
+    return 0
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+cdef int routing_unpack(ChannelRouting* r,
+                        const char **src, Py_ssize_t src_stride,
+                        float *dest, Py_ssize_t dest_chan_stride, Py_ssize_t dest_frame_stride,
+                        Py_ssize_t nframes) nogil except -1:
+    """Route *nframes* raw frames from the *src* channels to float32
+    destination channels
+    """
+    cdef Py_ssize_t j, k, i, s
+    cdef float *dest_p
+    for j in range(r.ndests):
+        dest_p = dest + j * dest_chan_stride
+        s = r.direct[j]
+        if s >= 0:
+            unpack_samples(
+                src[s], 1, src_stride, dest_p, 1, dest_frame_stride,
+                1, nframes, r.sample_format,
+            )
+            continue
+        for i in range(nframes):
+            dest_p[i * dest_frame_stride] = 0
+        for k in range(r.offsets[j], r.offsets[j + 1]):
+            unpack_add_samples(
+                src[r.sources[k]], src_stride, dest_p, dest_frame_stride,
+                nframes, r.gains[k], r.sample_format,
+            )
+    return 0
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+cdef int routing_pack(ChannelRouting* r,
+                      const float *src, Py_ssize_t src_chan_stride, Py_ssize_t src_frame_stride,
+                      char **dest, Py_ssize_t dest_stride,
+                      Py_ssize_t nframes) nogil except -1:
+    """Route *nframes* float32 frames from the source channels to raw
+    *dest* channels
+    """
+    cdef Py_ssize_t itemsize = r.sample_format.bit_width // 8
+    cdef Py_ssize_t j, k, i, s, done, n
+    cdef const float *src_p
+    cdef float g
+    for j in range(r.ndests):
+        s = r.direct[j]
+        if s >= 0:
+            pack_samples(
+                src + s * src_chan_stride, 1, src_frame_stride, dest[j], 1, dest_stride,
+                1, nframes, r.sample_format,
+            )
+            continue
+        done = 0
+        while done < nframes:
+            n = nframes - done
+            if n > r.max_frames:
+                n = r.max_frames
+            memset(r.scratch, 0, n * sizeof(float))
+            for k in range(r.offsets[j], r.offsets[j + 1]):
+                src_p = src + r.sources[k] * src_chan_stride + done * src_frame_stride
+                g = r.gains[k]
+                for i in range(n):
+                    r.scratch[i] += src_p[i * src_frame_stride] * g
+            pack_samples(
+                r.scratch, 1, 1, dest[j] + done * dest_stride * itemsize, 1, dest_stride,
+                1, n, r.sample_format,
+            )
+            done += n
+    return 0
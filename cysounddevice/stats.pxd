@@ -0,0 +1,54 @@
+# cython: language_level=3
+
+from libc.stdint cimport uint64_t
+
+cdef enum:
+    STATS_NUM_BUCKETS = 16
+
+cdef struct StatValue:
+    uint64_t count
+    double minimum
+    double maximum
+    double total
+    double last
+    uint64_t histogram[STATS_NUM_BUCKETS]
+
+cdef struct CallbackStats:
+    # Odd while the callback is updating the values
+    uint64_t seq
+    # Incremented by Python to request a reset, copied to reset_done by
+    # the callback once the values are cleared
+    uint64_t reset_request
+    uint64_t reset_done
+    double sample_rate
+    double last_start
+    StatValue duration
+    StatValue interval
+    StatValue cpu_load
+    StatValue input_fill
+    StatValue output_fill
+
+cdef double monotonic_time() nogil
+cdef void callback_stats_init(CallbackStats* stats, double sample_rate) nogil
+cdef void callback_stats_update(CallbackStats* stats,
+                                double start,
+                                double end,
+                                unsigned long frame_count,
+                                double input_fill,
+                                double output_fill,
+                                double cpu_load) nogil
+cdef void callback_stats_snapshot(CallbackStats* stats, CallbackStats* dest) nogil
+cdef void callback_stats_request_reset(CallbackStats* stats) nogil
+
+cdef class StatSummary:
+    cdef StatValue data
+    cdef readonly double bucket_width
+
+    @staticmethod
+    cdef StatSummary from_struct(StatValue* data, double bucket_width)
+
+cdef class StreamStats:
+    cdef CallbackStats data
+
+    @staticmethod
+    cdef StreamStats from_struct(CallbackStats* data)
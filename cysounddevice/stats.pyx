@@ -0,0 +1,248 @@
+# cython: language_level=3
+
+cimport cython
+from libc.string cimport memcpy, memset
+
+from cysounddevice.atomic cimport (
+    atomic_load_relaxed, atomic_load_acquire, atomic_store_release,
+    atomic_fence, thread_yield,
+)
+
+cdef extern from *:
+    """
+    #if defined(_WIN32)
+    #ifndef NOMINMAX
+    #define NOMINMAX
+    #endif
+    #include <windows.h>
+    static double cysd_monotonic_time(void) {
+        LARGE_INTEGER freq, count;
+        QueryPerformanceFrequency(&freq);
+        QueryPerformanceCounter(&count);
+        return (double)count.QuadPart / (double)freq.QuadPart;
+    }
+    #else
+    #include <time.h>
+    static double cysd_monotonic_time(void) {
+        struct timespec ts;
+        clock_gettime(CLOCK_MONOTONIC, &ts);
+        return (double)ts.tv_sec + (double)ts.tv_nsec * 1e-9;
+    }
+    #endif
+    """
+    double _monotonic_time "cysd_monotonic_time" () nogil
+
+# Histogram ranges. Durations and intervals are binned in block periods
+# (the duration of the frames in each callback)
+DEF PERIOD_RANGE = 2.
+DEF RATIO_RANGE = 1.
+
+cdef double monotonic_time() nogil:
+    """Seconds from a monotonic clock (``clock_gettime(CLOCK_MONOTONIC)``,
+    or ``QueryPerformanceCounter`` on Windows)
+    """
+    return _monotonic_time()
+
+cdef void callback_stats_init(CallbackStats* stats, double sample_rate) nogil:
+    memset(stats, 0, sizeof(CallbackStats))
+    stats.sample_rate = sample_rate
+
+@cython.cdivision(True)
+cdef inline void _stat_add(StatValue* v, double value, double position) nogil:
+    """Add *value* to the summary. *position* is its place in the
+    histogram range (0 to 1). Values beyond the range go in the end buckets
+    """
+    cdef Py_ssize_t ix = <Py_ssize_t>(position * STATS_NUM_BUCKETS)
+    if v.count == 0 or value < v.minimum:
+        v.minimum = value
+    if v.count == 0 or value > v.maximum:
+        v.maximum = value
+    v.total += value
+    v.last = value
+    v.count += 1
+    if ix < 0:
+        ix = 0
+    elif ix >= STATS_NUM_BUCKETS:
+        ix = STATS_NUM_BUCKETS - 1
+    v.histogram[ix] += 1
+
+@cython.cdivision(True)
+cdef void callback_stats_update(CallbackStats* stats,
+                                double start,
+                                double end,
+                                unsigned long frame_count,
+                                double input_fill,
+                                double output_fill,
+                                double cpu_load) nogil:
+    """Record one callback. Called from the stream callback only
+
+    Arguments:
+        start: :c:func:`monotonic_time` at the start of the callback
+        end: :c:func:`monotonic_time` at the end of the callback
+        frame_count: Number of frames processed
+        input_fill: Fill level of the input ring (0 to 1) or -1 to skip
+        output_fill: Fill level of the output ring (0 to 1) or -1 to skip
+        cpu_load: The value from ``Pa_GetStreamCpuLoad`` or -1 to skip
+    """
+    cdef uint64_t seq = stats.seq
+    cdef uint64_t reset_request = atomic_load_acquire(&stats.reset_request)
+    cdef double period = 0
+    atomic_store_release(&stats.seq, seq + 1)
+    atomic_fence()
+    if reset_request != stats.reset_done:
+        memset(&stats.duration, 0, sizeof(StatValue))
+        memset(&stats.interval, 0, sizeof(StatValue))
+        memset(&stats.cpu_load, 0, sizeof(StatValue))
+        memset(&stats.input_fill, 0, sizeof(StatValue))
+        memset(&stats.output_fill, 0, sizeof(StatValue))
+        stats.last_start = 0
+        stats.reset_done = reset_request
+    if stats.sample_rate > 0:
+        period = frame_count / stats.sample_rate
+    if period > 0:
+        _stat_add(&stats.duration, end - start, (end - start) / period / PERIOD_RANGE)
+        if stats.last_start > 0:
+            _stat_add(&stats.interval, start - stats.last_start,
+                      (start - stats.last_start) / period / PERIOD_RANGE)
+    stats.last_start = start
+    if cpu_load >= 0:
+        _stat_add(&stats.cpu_load, cpu_load, cpu_load / RATIO_RANGE)
+    if input_fill >= 0:
+        _stat_add(&stats.input_fill, input_fill, input_fill / RATIO_RANGE)
+    if output_fill >= 0:
+        _stat_add(&stats.output_fill, output_fill, output_fill / RATIO_RANGE)
+    atomic_store_release(&stats.seq, seq + 2)
+
+cdef void callback_stats_snapshot(CallbackStats* stats, CallbackStats* dest) nogil:
+    """Copy *stats* to *dest*, retrying if the callback updated them
+    during the copy
+    """
+    cdef uint64_t seq
+    while True:
+        seq = atomic_load_acquire(&stats.seq)
+        if seq & 1:
+            thread_yield()
+            continue
+        memcpy(dest, stats, sizeof(CallbackStats))
+        atomic_fence()
+        if atomic_load_relaxed(&stats.seq) == seq:
+            return
+
+cdef void callback_stats_request_reset(CallbackStats* stats) nogil:
+    """Have the callback clear the values before recording its next call
+    """
+    atomic_store_release(
+        &stats.reset_request, atomic_load_relaxed(&stats.reset_request) + 1,
+    )
+
+
+cdef class StatSummary:
+    """Summary of one value recorded by the stream callback
+
+    Attributes:
+        count (int): Number of values recorded
+        minimum (float): Smallest value
+        maximum (float): Largest value
+        mean (float): Mean of all values (``0`` if none were recorded)
+        last (float): Most recent value
+        histogram (list): Count of values in each of
+            ``16`` equal width buckets. The lowest and highest buckets also
+            hold the values outside the range
+        bucket_width (float): Width of each histogram bucket
+    """
+    @staticmethod
+    cdef StatSummary from_struct(StatValue* data, double bucket_width):
+        cdef StatSummary obj = StatSummary.__new__(StatSummary)
+        memcpy(&obj.data, data, sizeof(StatValue))
+        obj.bucket_width = bucket_width
+        return obj
+    @property
+    def count(self):
+        return self.data.count
+    @property
+    def minimum(self):
+        return self.data.minimum
+    @property
+    def maximum(self):
+        return self.data.maximum
+    @property
+    def mean(self):
+        if self.data.count == 0:
+            return 0.
+        return self.data.total / self.data.count
+    @property
+    def last(self):
+        return self.data.last
+    @property
+    def histogram(self):
+        return [self.data.histogram[i] for i in range(STATS_NUM_BUCKETS)]
+    @property
+    def bucket_edges(self):
+        """The lower edge of each histogram bucket
+        """
+        return [i * self.bucket_width for i in range(STATS_NUM_BUCKETS)]
+    def __repr__(self):
+        return '<{}: count={}, min={:.6g}, max={:.6g}, mean={:.6g}>'.format(
+            self.__class__.__name__, self.count, self.minimum, self.maximum, self.mean,
+        )
+
+
+cdef class StreamStats:
+    """Snapshot of the timing and load statistics recorded by the stream
+    callback (see :meth:`cysounddevice.streams.Stream.stats`)
+
+    Attributes:
+        callbacks (int): Number of callbacks recorded
+        duration (StatSummary): Time spent in the callback in seconds. The
+            histogram is in block periods (the duration of the frames in
+            each callback) from ``0`` to ``2``, so values above ``1`` are
+            callbacks that took longer than real time
+        interval (StatSummary): Time between the start of consecutive
+            callbacks in seconds. The histogram is in block periods
+            from ``0`` to ``2``
+        cpu_load (StatSummary): The value of ``Pa_GetStreamCpuLoad`` at the
+            end of each callback (``0`` to ``1``)
+        input_fill (StatSummary): Fill level of the input buffer (``0`` to
+            ``1``) after the callback writes to it. The maximum is the high
+            watermark
+        output_fill (StatSummary): Fill level of the output buffer (``0`` to
+            ``1``) before the callback reads from it. The minimum is the low
+            watermark
+    """
+    @staticmethod
+    cdef StreamStats from_struct(CallbackStats* data):
+        cdef StreamStats obj = StreamStats.__new__(StreamStats)
+        callback_stats_snapshot(data, &obj.data)
+        return obj
+    @property
+    def callbacks(self):
+        return self.data.duration.count
+    @property
+    def duration(self):
+        return StatSummary.from_struct(
+            &self.data.duration, PERIOD_RANGE / STATS_NUM_BUCKETS,
+        )
+    @property
+    def interval(self):
+        return StatSummary.from_struct(
+            &self.data.interval, PERIOD_RANGE / STATS_NUM_BUCKETS,
+        )
+    @property
+    def cpu_load(self):
+        return StatSummary.from_struct(
+            &self.data.cpu_load, RATIO_RANGE / STATS_NUM_BUCKETS,
+        )
+    @property
+    def input_fill(self):
+        return StatSummary.from_struct(
+            &self.data.input_fill, RATIO_RANGE / STATS_NUM_BUCKETS,
+        )
+    @property
+    def output_fill(self):
+        return StatSummary.from_struct(
+            &self.data.output_fill, RATIO_RANGE / STATS_NUM_BUCKETS,
+        )
+    def __repr__(self):
+        return '<{}: callbacks={}, duration={!r}>'.format(
+            self.__class__.__name__, self.callbacks, self.duration,
+        )
@@ -1,15 +1,35 @@
 # cython: language_level=3
 
+from libc.stdint cimport uint64_t
+
 from cysounddevice.pawrapper cimport *
 from cysounddevice.types cimport *
 from cysounddevice.buffer cimport *
 from cysounddevice.streams cimport *
+from cysounddevice.processing cimport ProcessHook, ProcessFunc
+from cysounddevice.stats cimport CallbackStats
+from cysounddevice.underrun cimport UnderrunHandler
+from cysounddevice.clock cimport ClockEstimator
+from cysounddevice.resample cimport ResampleStage
+from cysounddevice.routing cimport ChannelRouting
 
 cdef enum CallbackErrorStatus:
     CallbackError_none
     CallbackError_flags
     CallbackError_input_aborted
     CallbackError_output_aborted
+    CallbackError_process_aborted
+
+cdef struct CallbackErrorCounts:
+    # Number of callbacks given each of the PaStreamCallbackFlags
+    uint64_t input_underflow
+    uint64_t input_overflow
+    uint64_t output_underflow
+    uint64_t output_overflow
+    uint64_t priming_output
+    # Number of callbacks given any flags plus the number of aborts.
+    # Stored last (with release ordering) by the callback
+    uint64_t total
 
 cdef struct CallbackUserData:
     int input_channels
@@ -21,8 +41,29 @@ cdef struct CallbackUserData:
     PaTime firstOutputDacTime
     PaStreamCallbackFlags last_callback_flags
     CallbackErrorStatus error_status
+    # The flags and status of the last callback that counted an error
+    PaStreamCallbackFlags last_error_flags
+    CallbackErrorStatus last_error_status
+    CallbackErrorCounts error_counts
     bint exit_signal
     bint stream_exit_complete
+    int notify_fd
+    ProcessHook* process_hook
+    UnderrunHandler* underrun
+    PaStream* pa_stream
+    CallbackStats stats
+    # Clock models of the input (ADC) and output (DAC) timestamps
+    ClockEstimator input_clock
+    ClockEstimator output_clock
+    # Sample rate conversion between the host buffers and the stream
+    # buffers (NULL if they use the device rate)
+    ResampleStage* in_resample
+    ResampleStage* out_resample
+    # Routing of the device channels to the input buffer channels and of
+    # the output buffer channels to the device channels (NULL if the
+    # buffers have the device channels)
+    ChannelRouting* in_routing
+    ChannelRouting* out_routing
 
 cdef class StreamCallback:
     cdef PaStreamCallbackFlags _pa_flags
@@ -32,13 +73,29 @@ cdef class StreamCallback:
     cdef readonly SampleTime sample_time
     cdef public bint input_underflow, input_overflow
     cdef public bint output_underflow, output_overflow, priming_output
+    cdef int notify_fd
+    cdef ProcessFunc _process_func
+    cdef void *_process_state
+    cdef object _process_refs
+    cdef uint64_t _next_underrun_gap
+    cdef uint64_t _reported_errors
+    cdef public bint warn_errors
 
     cdef void _build_user_data(self, Py_ssize_t buffer_len=*) except *
     cdef void _free_user_data(self) except *
     cdef void _send_exit_signal(self, float timeout) except *
     cdef void _update_pa_data(self) except *
+    cdef void _set_notify_fd(self, int fd) except *
+    cdef void _set_process_func(self, ProcessFunc func, void *state, object refs=*) except *
     cdef int check_callback_errors(self) nogil except -1
 
+cdef class CallbackErrors:
+    cdef CallbackErrorCounts data
+    cdef readonly str last_error
+
+    @staticmethod
+    cdef CallbackErrors from_user_data(CallbackUserData* user_data)
+
 
 cdef int _stream_callback(const void* in_bfr,
                           void* out_bfr,
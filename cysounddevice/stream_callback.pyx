@@ -1,7 +1,34 @@
 # cython: language_level=3
 
 cimport cython
+from libc.math cimport floor
+from libc.string cimport memset
 from cpython.mem cimport PyMem_Malloc, PyMem_Free
+from cysounddevice.atomic cimport atomic_load_acquire, atomic_store_release
+from cysounddevice.notify cimport notifier_signal
+from cysounddevice.processing cimport (
+    process_hook_create, process_hook_destroy, process_hook_run,
+    process_hook_clear_output, get_address,
+)
+from cysounddevice.stats cimport (
+    StreamStats, monotonic_time, callback_stats_init, callback_stats_update,
+    callback_stats_request_reset,
+)
+from cysounddevice.clock cimport (
+    StreamClock, clock_estimator_init, clock_estimator_update,
+)
+from cysounddevice.resample cimport (
+    ResamplerState, resample_stage_create, resample_stage_destroy,
+    resample_stage_push_host, resample_stage_pack_host, resampler_process,
+    resampler_end, resampler_space, resampler_push,
+)
+from cysounddevice.routing cimport (
+    get_routing_gains, channel_routing_create, channel_routing_destroy,
+)
+from cysounddevice.underrun cimport (
+    UnderrunReport, underrun_handler_create, underrun_handler_destroy,
+    underrun_handler_played, underrun_handler_conceal,
+)
 
 import time
 import warnings
@@ -23,6 +50,10 @@ cdef class StreamCallback:
         sample_time (SampleTime): A :class:`cysounddevice.types.SampleTime`
             instance to track timing from PortAudio
         user_data: Pointer to a :any:`CallbackUserData` structure
+        warn_errors (bool): If True (the default), :meth:`check_callback_errors`
+            issues a :class:`StreamCallbackError` warning when new errors
+            were counted since the previous check. If False, errors are
+            only reported by :meth:`callback_errors`
     """
     def __cinit__(self, Stream stream):
         self.stream = stream
@@ -33,6 +64,13 @@ cdef class StreamCallback:
         self.output_overflow = False
         self.priming_output = False
         self.user_data = NULL
+        self.notify_fd = -1
+        self._process_func = NULL
+        self._process_state = NULL
+        self._process_refs = None
+        self._next_underrun_gap = 0
+        self._reported_errors = 0
+        self.warn_errors = True
         self.sample_time = SampleTime(0, 0, stream._frames_per_buffer, stream.sample_rate)
     def __init__(self, *args):
         self._update_pa_data()
@@ -58,24 +96,97 @@ cdef class StreamCallback:
                 self.sample_time.block_size != self.stream.frames_per_buffer):
             self.sample_time = SampleTime(0, 0, self.stream.frames_per_buffer, self.stream.sample_rate)
 
+        cdef double host_rate = self.sample_time.sample_rate
+        cdef double buffer_rate = self.stream.buffer_sample_rate
+        cdef bint resample = buffer_rate != host_rate
+        cdef bint planar = info._layout == SampleLayout_non_interleaved
+        cdef Py_ssize_t block_size = self.sample_time.block_size
+        cdef Py_ssize_t max_frames = block_size if block_size > 0 else 1024
+        cdef SampleTime buffer_time = self.sample_time
+        if resample:
+            if block_size > 0:
+                block_size = max(1, <Py_ssize_t>(block_size * buffer_rate / host_rate + .5))
+            buffer_time = SampleTime(0, 0, block_size, buffer_rate)
+            max_frames = max(max_frames, block_size, 256)
+
+        cdef object in_gains = None, out_gains = None
+        cdef Py_ssize_t in_bfr_chan = in_chan, out_bfr_chan = out_chan
+        if in_chan > 0:
+            in_gains = get_routing_gains(info._input_channel_map, info._input_mix, in_chan, False)
+            if in_gains is not None:
+                in_bfr_chan = len(in_gains)
+        if out_chan > 0:
+            out_gains = get_routing_gains(info._output_channel_map, info._output_mix, out_chan, True)
+            if out_gains is not None:
+                out_bfr_chan = len(out_gains[0])
+
         print('{!r}, bfr_len={}, in={}, out={}, itemsize={}'.format(
-            self.sample_time, buffer_len, in_chan, out_chan, itemsize,
+            buffer_time, buffer_len, in_chan, out_chan, itemsize,
         ))
+        memset(user_data, 0, sizeof(CallbackUserData))
+        self.user_data = user_data
         if in_chan > 0:
-            user_data.in_buffer = sample_buffer_create(self.sample_time.data, buffer_len, in_chan, info.sample_format)
-        else:
-            user_data.in_buffer = NULL
+            user_data.in_buffer = sample_buffer_create(
+                buffer_time.data, buffer_len, in_bfr_chan, info.sample_format,
+                info.use_hugepages, info._layout,
+            )
+            user_data.in_buffer.overflow_policy = info._overflow_policy
+            if in_gains is not None:
+                user_data.in_routing = channel_routing_create(
+                    in_gains, in_chan, info.sample_format, max_frames,
+                )
+            if resample:
+                user_data.in_resample = resample_stage_create(
+                    in_bfr_chan, info.sample_format, planar, host_rate, buffer_rate,
+                    False, info._resample_quality, max_frames, user_data.in_routing,
+                )
         if out_chan > 0:
-            user_data.out_buffer = sample_buffer_create(self.sample_time.data, buffer_len, out_chan, info.sample_format)
-        else:
-            user_data.out_buffer = NULL
+            user_data.out_buffer = sample_buffer_create(
+                buffer_time.data, buffer_len, out_bfr_chan, info.sample_format,
+                info.use_hugepages, info._layout,
+            )
+            if out_gains is not None:
+                user_data.out_routing = channel_routing_create(
+                    out_gains, out_bfr_chan, info.sample_format, max_frames,
+                )
+            if resample:
+                user_data.out_resample = resample_stage_create(
+                    out_bfr_chan, info.sample_format, planar, host_rate, buffer_rate,
+                    True, info._resample_quality, max_frames, user_data.out_routing,
+                )
         user_data.input_channels = in_chan
         user_data.output_channels = out_chan
         user_data.last_callback_flags = 0
         user_data.error_status = CallbackError_none
+        user_data.last_error_flags = 0
+        user_data.last_error_status = CallbackError_none
+        memset(&user_data.error_counts, 0, sizeof(CallbackErrorCounts))
         user_data.exit_signal = False
         user_data.stream_exit_complete = False
-        self.user_data = user_data
+        user_data.notify_fd = self.notify_fd
+        user_data.process_hook = NULL
+        user_data.underrun = NULL
+        user_data.pa_stream = NULL
+        callback_stats_init(&user_data.stats, self.sample_time.sample_rate)
+        clock_estimator_init(&user_data.input_clock, self.sample_time.sample_rate, info.clock_bandwidth)
+        clock_estimator_init(&user_data.output_clock, self.sample_time.sample_rate, info.clock_bandwidth)
+        self._next_underrun_gap = 0
+        self._reported_errors = 0
+        if out_chan > 0:
+            user_data.underrun = underrun_handler_create(
+                info._underrun_policy, info.sample_format,
+                planar, out_chan,
+                self.sample_time.block_size if self.sample_time.block_size > 0 else 1024,
+                info.underrun_fade_frames,
+            )
+        if self._process_func != NULL:
+            user_data.process_hook = process_hook_create(
+                self._process_func, self._process_state,
+                info.sample_format, planar,
+                in_chan, out_chan,
+                self.sample_time.block_size if self.sample_time.block_size > 0 else 1024,
+                &self.sample_time.data,
+            )
     cdef void _free_user_data(self) except *:
         cdef CallbackUserData* user_data
         if self.user_data:
@@ -128,14 +239,209 @@ cdef class StreamCallback:
         if self.priming_output:
             flags |= 16
 
-    cdef int check_callback_errors(self) nogil except -1:
-        cdef CallbackUserData* user_data
+    cdef void _set_notify_fd(self, int fd) except *:
+        """Set the file descriptor signalled after each callback
+
+        See :class:`cysounddevice.notify.Notifier`. Use ``-1`` to disable.
+        """
+        self.notify_fd = fd
         if self.user_data:
-            user_data = self.user_data
-            if user_data.error_status != CallbackError_none:
-                raise_stream_callback_error(user_data)
+            self.user_data.notify_fd = fd
+
+    def set_process_func(self, func, state=None):
+        """Install a native function to process audio inside the callback
+
+        The function must match the :c:type:`ProcessFunc` signature. It is
+        called from the PortAudio callback (after the stream buffers have
+        been updated) with the input and output as float32 planes, so
+        effects and monitoring run with one block of latency. The output
+        planes hold the data read from the
+        :attr:`~cysounddevice.streams.Stream.output_buffer` (or silence)
+        and can be modified or replaced.
+
+        This must be called before the stream is opened.
+
+        Note:
+            The function runs on the audio thread and must not block.
+            Functions created with :mod:`ctypes` from Python callables
+            acquire the GIL when called and are not suitable for real-time use
+
+        Arguments:
+            func: The address of the function as an :class:`int`, a
+                :mod:`ctypes` function pointer or ``None`` to remove it.
+                For :mod:`cffi`, use ``int(ffi.cast('uintptr_t', func))``
+            state: An opaque pointer passed as the function's first argument.
+                May be an :class:`int` address, a :mod:`ctypes` pointer or
+                ``None``
+
+        Cython code can use :meth:`_set_process_func` with the function
+        pointer directly. Chains of built-in nodes can be run with a
+        :class:`cysounddevice.graph.ProcessGraph` instead.
+        """
+        cdef size_t func_addr = get_address(func)
+        cdef size_t state_addr = get_address(state)
+        self._set_process_func(<ProcessFunc>func_addr, <void *>state_addr, (func, state))
+
+    cdef void _set_process_func(self, ProcessFunc func, void *state, object refs=None) except *:
+        """Set the :c:type:`ProcessFunc` and its state pointer
+
+        Arguments:
+            func: The function or ``NULL`` to remove it
+            state: Opaque pointer passed to *func*
+            refs: Any objects that must be kept alive while the function is in use
+        """
+        if self.stream.active:
+            raise RuntimeError('Cannot change the process function while the stream is active')
+        self._process_func = func
+        self._process_state = state
+        if func == NULL:
+            self._process_refs = None
+        else:
+            self._process_refs = refs
+
+    @property
+    def has_process_func(self):
+        return self._process_func != NULL
+
+    def stats(self, bint reset=False):
+        """Get the timing and load statistics recorded by the callback
+
+        Arguments:
+            reset (bool): If True, the statistics are cleared after the
+                snapshot is taken (by the next callback)
+
+        Returns:
+            StreamStats: A :class:`cysounddevice.stats.StreamStats` snapshot,
+            or ``None`` if the stream is not open
+        """
+        if self.user_data == NULL:
+            return None
+        cdef StreamStats result = StreamStats.from_struct(&self.user_data.stats)
+        if reset:
+            callback_stats_request_reset(&self.user_data.stats)
+        return result
+
+    def underruns(self):
+        """Get the output underruns recorded by the callback
+
+        Each call reports the gaps logged since the previous one
+
+        Returns:
+            UnderrunReport: A :class:`cysounddevice.underrun.UnderrunReport`,
+            or ``None`` if the stream is not open or has no output
+        """
+        if self.user_data == NULL or self.user_data.underrun == NULL:
+            return None
+        return UnderrunReport.from_handler(self.user_data.underrun, &self._next_underrun_gap)
+
+    def clock(self, bint output=False):
+        """Get the clock model updated by the callback
+
+        Arguments:
+            output (bool): If True, get the model of the output (DAC)
+                timestamps. Otherwise the input (ADC) timestamps
+
+        Returns:
+            StreamClock: A :class:`cysounddevice.clock.StreamClock` snapshot,
+            or ``None`` if the stream is not open or has no channels in that
+            direction
+        """
+        if self.user_data == NULL:
+            return None
+        cdef double index_scale = self.sample_time.sample_rate / self.stream.buffer_sample_rate
+        if output:
+            if self.user_data.output_channels == 0:
+                return None
+            return StreamClock.from_struct(&self.user_data.output_clock, index_scale)
+        if self.user_data.input_channels == 0:
+            return None
+        return StreamClock.from_struct(&self.user_data.input_clock, index_scale)
+
+    def callback_errors(self):
+        """Get the number of errors reported to (or raised by) the callback
+
+        Returns:
+            CallbackErrors: A :class:`CallbackErrors` snapshot, or ``None``
+            if the stream is not open
+        """
+        if self.user_data == NULL:
+            return None
+        return CallbackErrors.from_user_data(self.user_data)
+
+    cdef int check_callback_errors(self) nogil except -1:
+        """Warn if the callback counted errors since the previous check
+        (and :attr:`warn_errors` is True)
+
+        Only an atomic load is done if there are no new errors, so this is
+        safe to call for every block without the GIL
+        """
+        cdef CallbackUserData* user_data = self.user_data
+        cdef uint64_t total
+        if user_data == NULL:
+            return 0
+        total = atomic_load_acquire(&user_data.error_counts.total)
+        if total == self._reported_errors:
+            return 0
+        self._reported_errors = total
+        if self.warn_errors:
+            raise_stream_callback_error(user_data)
         return 0
 
+
+cdef class CallbackErrors:
+    """Counts of the errors reported to the stream callback
+
+    Each ``PaStreamCallbackFlags`` counter is the number of callbacks given
+    that flag by PortAudio.
+
+    Attributes:
+        input_underflow (int):
+        input_overflow (int):
+        output_underflow (int):
+        output_overflow (int):
+        priming_output (int):
+        total (int): Number of callbacks given any flags plus the number of
+            times the callback aborted the stream
+        last_error (str): Description of the last error, or ``None``
+    """
+    @staticmethod
+    cdef CallbackErrors from_user_data(CallbackUserData* user_data):
+        cdef CallbackErrors obj = CallbackErrors()
+        obj.data.total = atomic_load_acquire(&user_data.error_counts.total)
+        obj.data.input_underflow = user_data.error_counts.input_underflow
+        obj.data.input_overflow = user_data.error_counts.input_overflow
+        obj.data.output_underflow = user_data.error_counts.output_underflow
+        obj.data.output_overflow = user_data.error_counts.output_overflow
+        obj.data.priming_output = user_data.error_counts.priming_output
+        obj.last_error = None
+        if obj.data.total > 0:
+            obj.last_error = get_callback_error_message(
+                user_data.last_error_flags, user_data.last_error_status,
+            )
+        return obj
+
+    @property
+    def input_underflow(self):
+        return self.data.input_underflow
+    @property
+    def input_overflow(self):
+        return self.data.input_overflow
+    @property
+    def output_underflow(self):
+        return self.data.output_underflow
+    @property
+    def output_overflow(self):
+        return self.data.output_overflow
+    @property
+    def priming_output(self):
+        return self.data.priming_output
+    @property
+    def total(self):
+        return self.data.total
+
+    def __repr__(self):
+        return '<{self.__class__.__name__}: total={self.total}, last_error={self.last_error!r}>'.format(self=self)
+
 @cython.boundscheck(False)
 @cython.wraparound(False)
 @cython.profile(False)
@@ -149,58 +455,329 @@ cdef int _stream_callback(const void* in_bfr,
     cdef CallbackUserData* cb_data = <CallbackUserData*>user_data
     cdef SampleBuffer* samp_bfr
     cdef SampleTime_s* start_time
+    cdef SampleTime_s gap_time
+    cdef Py_ssize_t nread
     cdef PaTime adcTime, dacTime
     cdef int r
     cdef unsigned long i, bfr_size
     cdef char *in_ptr = <char *>in_bfr
     cdef char *out_ptr = <char *>out_bfr
+    cdef double start_ts = monotonic_time()
+    cdef double in_fill = -1, out_fill = -1, cpu_load = -1
     if cb_data.exit_signal:
         cb_data.stream_exit_complete = True
+        _notify(cb_data)
         return paComplete
 
     cb_data.error_status = CallbackError_none
     cb_data.last_callback_flags = status_flags
     if status_flags != 0:
         cb_data.error_status = CallbackError_flags
+        _count_error(cb_data)
 
-    if cb_data.input_channels > 0:
+    if cb_data.input_channels > 0 and cb_data.in_resample != NULL:
+        samp_bfr = cb_data.in_buffer
+        adcTime = clock_estimator_update(
+            &cb_data.input_clock, cb_data.in_resample.host_frame,
+            time_info.inputBufferAdcTime, frame_count, time_info.currentTime, start_ts,
+        )
+        if cb_data.in_resample.host_frame == 0:
+            cb_data.firstInputAdcTime = adcTime
+            samp_bfr.callback_time.time_offset = adcTime
+            SampleTime_set_pa_time(&samp_bfr.callback_time, adcTime, True)
+        if _resample_input(cb_data.in_resample, samp_bfr, in_bfr, frame_count, adcTime) != 0:
+            cb_data.error_status = CallbackError_input_aborted
+            _count_error(cb_data)
+            cb_data.stream_exit_complete = True
+            _notify(cb_data)
+            return paAbort
+        in_fill = _buffer_fill(samp_bfr)
+    elif cb_data.input_channels > 0:
         samp_bfr = cb_data.in_buffer
-        adcTime = time_info.inputBufferAdcTime
-        if samp_bfr.current_block == 0:
+        adcTime = clock_estimator_update(
+            &cb_data.input_clock, samp_bfr.callback_frame, time_info.inputBufferAdcTime,
+            frame_count, time_info.currentTime, start_ts,
+        )
+        if samp_bfr.callback_frame == 0:
             cb_data.firstInputAdcTime = adcTime
             samp_bfr.callback_time.time_offset = adcTime
             SampleTime_set_pa_time(&samp_bfr.callback_time, adcTime, True)
         else:
-            SampleTime_set_block_vars(&samp_bfr.callback_time, samp_bfr.current_block, 0)
-        if samp_bfr.write_available > 0:
-            r = sample_buffer_write_from_callback(samp_bfr, in_ptr, frame_count, adcTime)
+            SampleTime_set_sample_index(&samp_bfr.callback_time, samp_bfr.callback_frame, True)
+        if sample_buffer_check_overflow(samp_bfr, <Py_ssize_t>frame_count):
+            if cb_data.in_routing != NULL:
+                r = sample_buffer_write_routed_from_callback(
+                    samp_bfr, in_bfr, cb_data.in_routing, frame_count, adcTime,
+                )
+            else:
+                r = sample_buffer_write_from_callback(samp_bfr, in_ptr, frame_count, adcTime)
             if r != 1:
                 cb_data.error_status = CallbackError_input_aborted
+                _count_error(cb_data)
                 cb_data.stream_exit_complete = True
+                _notify(cb_data)
                 return paAbort
-        samp_bfr.current_block += 1
-    if cb_data.output_channels > 0:
+        in_fill = _buffer_fill(samp_bfr)
+        _advance_callback_frame(samp_bfr, frame_count)
+    if cb_data.output_channels > 0 and cb_data.out_resample != NULL:
+        samp_bfr = cb_data.out_buffer
+        dacTime = clock_estimator_update(
+            &cb_data.output_clock, cb_data.out_resample.host_frame,
+            time_info.outputBufferDacTime, frame_count, time_info.currentTime, start_ts,
+        )
+        if cb_data.out_resample.host_frame == 0:
+            cb_data.firstOutputDacTime = dacTime
+            samp_bfr.callback_time.time_offset = dacTime
+            SampleTime_set_pa_time(&samp_bfr.callback_time, dacTime, True)
+        out_fill = _buffer_fill(samp_bfr)
+        nread = _resample_output(cb_data.out_resample, samp_bfr, out_bfr, frame_count, dacTime)
+        if nread < 0:
+            cb_data.error_status = CallbackError_output_aborted
+            _count_error(cb_data)
+            cb_data.stream_exit_complete = True
+            _notify(cb_data)
+            return paAbort
+        if cb_data.underrun != NULL:
+            underrun_handler_played(cb_data.underrun, out_bfr, 0, nread)
+            if nread < <Py_ssize_t>frame_count:
+                copy_sample_time_struct(&samp_bfr.callback_time, &gap_time)
+                SampleTime_set_sample_index(&gap_time, samp_bfr.callback_frame, True)
+                underrun_handler_conceal(
+                    cb_data.underrun, out_bfr, nread, frame_count - nread, &gap_time,
+                )
+        elif nread < <Py_ssize_t>frame_count:
+            _resample_clear_output(cb_data.out_resample, out_bfr, nread, frame_count - nread)
+    elif cb_data.output_channels > 0:
         samp_bfr = cb_data.out_buffer
-        dacTime = time_info.outputBufferDacTime
-        if samp_bfr.current_block == 0:
+        dacTime = clock_estimator_update(
+            &cb_data.output_clock, samp_bfr.callback_frame, time_info.outputBufferDacTime,
+            frame_count, time_info.currentTime, start_ts,
+        )
+        if samp_bfr.callback_frame == 0:
             cb_data.firstOutputDacTime = dacTime
             samp_bfr.callback_time.time_offset = dacTime
             SampleTime_set_pa_time(&samp_bfr.callback_time, dacTime, True)
         else:
-            SampleTime_set_block_vars(&samp_bfr.callback_time, samp_bfr.current_block, 0)
-        if samp_bfr.read_available > 0:
-            start_time = sample_buffer_read_from_callback(samp_bfr, out_ptr, frame_count, dacTime)
+            SampleTime_set_sample_index(&samp_bfr.callback_time, samp_bfr.callback_frame, True)
+        out_fill = _buffer_fill(samp_bfr)
+        nread = sample_buffer_read_available_frames(samp_bfr)
+        if nread > <Py_ssize_t>frame_count:
+            nread = frame_count
+        if cb_data.underrun == NULL and nread < <Py_ssize_t>frame_count:
+            nread = 0
+        if nread > 0:
+            if cb_data.out_routing != NULL:
+                start_time = sample_buffer_read_routed_from_callback(
+                    samp_bfr, out_bfr, cb_data.out_routing, nread, dacTime,
+                )
+            else:
+                start_time = sample_buffer_read_from_callback(samp_bfr, out_ptr, nread, dacTime)
             if start_time == NULL:
                 cb_data.error_status = CallbackError_output_aborted
+                _count_error(cb_data)
                 cb_data.stream_exit_complete = True
+                _notify(cb_data)
                 return paAbort
-        samp_bfr.current_block += 1
+        if cb_data.underrun != NULL:
+            # Fill whatever the output buffer could not provide
+            underrun_handler_played(cb_data.underrun, out_bfr, 0, nread)
+            if nread < <Py_ssize_t>frame_count:
+                copy_sample_time_struct(&samp_bfr.callback_time, &gap_time)
+                SampleTime_set_sample_index(&gap_time, samp_bfr.callback_frame + nread, True)
+                underrun_handler_conceal(
+                    cb_data.underrun, out_bfr, nread, frame_count - nread, &gap_time,
+                )
+        elif nread == 0 and cb_data.process_hook != NULL:
+            process_hook_clear_output(cb_data.process_hook, out_bfr, frame_count)
+        _advance_callback_frame(samp_bfr, frame_count)
+    if cb_data.process_hook != NULL:
+        if cb_data.input_channels == 0:
+            adcTime = dacTime
+        r = process_hook_run(cb_data.process_hook, in_bfr, out_bfr, frame_count, adcTime)
+        if r != 0:
+            cb_data.error_status = CallbackError_process_aborted
+            _count_error(cb_data)
+            cb_data.stream_exit_complete = True
+            _notify(cb_data)
+            return paAbort
+    if cb_data.pa_stream != NULL:
+        cpu_load = Pa_GetStreamCpuLoad(cb_data.pa_stream)
+    callback_stats_update(
+        &cb_data.stats, start_ts, monotonic_time(), frame_count,
+        in_fill, out_fill, cpu_load,
+    )
+    _notify(cb_data)
     return paContinue
 
+@cython.cdivision(True)
+cdef int _resample_input(ResampleStage* stage,
+                         SampleBuffer* samp_bfr,
+                         const void* in_bfr,
+                         unsigned long frame_count,
+                         PaTime adcTime) nogil except -1:
+    """Convert the callback's input to the buffer rate and write it to
+    *samp_bfr*
+
+    The time of each buffer frame is that of its position in the input, so
+    the filter's delay is not included. Returns -1 if a write failed
+    """
+    cdef ResamplerState* r = stage.resampler
+    cdef SAMPLE_INDEX_t first = stage.host_frame
+    cdef Py_ssize_t done = 0, n, nout
+    cdef double pos
+    while done < <Py_ssize_t>frame_count:
+        n = resample_stage_push_host(stage, in_bfr, done, frame_count - done)
+        done += n
+        while True:
+            pos = r.position
+            nout = resampler_process(
+                r, stage.buffer_data, stage.max_frames, 1, stage.max_frames, stage.step,
+            )
+            if nout == 0:
+                break
+            SampleTime_set_sample_index(&samp_bfr.callback_time, samp_bfr.callback_frame, True)
+            if sample_buffer_check_overflow(samp_bfr, nout):
+                if sample_buffer_write_sf32_from_callback(
+                    samp_bfr, stage.buffer_data, stage.max_frames, 1, nout,
+                    adcTime + (pos - first) / stage.host_rate,
+                ) != 1:
+                    return -1
+            _advance_callback_frame(samp_bfr, nout)
+        if n == 0:
+            break
+    return 0
+
+@cython.cdivision(True)
+cdef Py_ssize_t _resample_output(ResampleStage* stage,
+                                 SampleBuffer* samp_bfr,
+                                 void* out_bfr,
+                                 unsigned long frame_count,
+                                 PaTime dacTime) nogil except -2:
+    """Fill the callback's output from *samp_bfr*, converting from the
+    buffer rate
+
+    Only the buffer frames needed for this callback are read. Returns the
+    number of output frames filled (less than *frame_count* if the buffer
+    ran out) or -1 if a read failed
+    """
+    cdef ResamplerState* r = stage.resampler
+    cdef Py_ssize_t produced = 0, remaining, n, want, limit
+    cdef SAMPLE_INDEX_t end
+    cdef double pos
+    while produced < <Py_ssize_t>frame_count:
+        remaining = frame_count - produced
+        n = remaining
+        if n > stage.max_frames:
+            n = stage.max_frames
+        n = resampler_process(r, stage.host_data, stage.max_frames, 1, n, stage.step)
+        if n > 0:
+            resample_stage_pack_host(stage, out_bfr, produced, n)
+            produced += n
+            continue
+        # Read the input frames needed for the rest of the callback
+        pos = r.position
+        end = resampler_end(r)
+        want = <Py_ssize_t>(
+            <SAMPLE_INDEX_t>floor(pos + (remaining - 1) * stage.step) + r.half_taps + 1 - end
+        )
+        limit = resampler_space(r)
+        if limit > stage.max_frames:
+            limit = stage.max_frames
+        if want > limit:
+            want = limit
+        if want < 1:
+            want = 1
+        n = sample_buffer_read_available_frames(samp_bfr)
+        if n == 0:
+            break
+        if want > n:
+            want = n
+        SampleTime_set_sample_index(&samp_bfr.callback_time, samp_bfr.callback_frame, True)
+        if sample_buffer_read_sf32_from_callback(
+            samp_bfr, stage.buffer_data, stage.max_frames, 1, want,
+            dacTime + (produced + (end - pos) / stage.step) / stage.host_rate,
+        ) == NULL:
+            return -1
+        resampler_push(r, stage.buffer_data, stage.max_frames, 1, want)
+        _advance_callback_frame(samp_bfr, want)
+    stage.host_frame += frame_count
+    return produced
+
+cdef void _resample_clear_output(ResampleStage* stage, void* out_bfr,
+                                 Py_ssize_t offset, Py_ssize_t nframes) nogil:
+    """Fill *nframes* of the output (from *offset*) with silence
+    """
+    cdef Py_ssize_t n
+    memset(stage.host_data, 0, stage.nchannels * stage.max_frames * sizeof(float))
+    while nframes > 0:
+        n = nframes
+        if n > stage.max_frames:
+            n = stage.max_frames
+        resample_stage_pack_host(stage, out_bfr, offset, n)
+        offset += n
+        nframes -= n
+
+@cython.cdivision(True)
+cdef inline double _buffer_fill(SampleBuffer* samp_bfr) nogil:
+    """Fraction of the buffer's frames available for reading
+    """
+    return sample_buffer_read_available_frames(samp_bfr) / <double>(
+        samp_bfr.length * samp_bfr.item_length
+    )
+
+cdef inline void _notify(CallbackUserData* cb_data) nogil:
+    """Wake any coroutines waiting on the stream's buffers
+    (if a :class:`~cysounddevice.notify.Notifier` is in use)
+    """
+    if cb_data.notify_fd >= 0:
+        notifier_signal(cb_data.notify_fd)
+
+@cython.cdivision(True)
+cdef inline void _advance_callback_frame(SampleBuffer* samp_bfr, unsigned long frame_count) nogil:
+    """Add the frames processed by a callback to the buffer's
+    :c:member:`~SampleBuffer.callback_frame` and update the current block
+
+    The frame count may vary between callbacks
+    (with ``paFramesPerBufferUnspecified`` or some host APIs)
+    """
+    samp_bfr.callback_frame += frame_count
+    samp_bfr.current_block = samp_bfr.start_block + <BLOCK_t>(
+        samp_bfr.callback_frame // samp_bfr.item_length
+    )
+
+cdef inline void _count_error(CallbackUserData* cb_data) nogil:
+    """Count the current :c:member:`~CallbackUserData.error_status` in
+    :c:member:`~CallbackUserData.error_counts`
+    """
+    cdef CallbackErrorCounts* counts = &cb_data.error_counts
+    cdef PaStreamCallbackFlags flags = cb_data.last_callback_flags
+    if cb_data.error_status == CallbackError_flags:
+        if flags & 1:
+            counts.input_underflow += 1
+        if flags & 2:
+            counts.input_overflow += 1
+        if flags & 4:
+            counts.output_underflow += 1
+        if flags & 8:
+            counts.output_overflow += 1
+        if flags & 16:
+            counts.priming_output += 1
+    cb_data.last_error_flags = flags
+    cb_data.last_error_status = cb_data.error_status
+    atomic_store_release(&counts.total, counts.total + 1)
+
 cdef int raise_stream_callback_error(CallbackUserData* user_data) except -1 with gil:
-    cdef PaStreamCallbackFlags cb_flags = user_data.last_callback_flags
+    cdef object msg = get_callback_error_message(
+        user_data.last_error_flags, user_data.last_error_status,
+    )
+    if msg is not None:
+        warnings.warn(StreamCallbackError(msg))
+    return 0
+
+cdef object get_callback_error_message(PaStreamCallbackFlags cb_flags,
+                                       CallbackErrorStatus error_status):
     cdef object msg = None
-    if user_data.error_status == CallbackError_flags:
+    if error_status == CallbackError_flags:
         msgs = []
         if cb_flags & 1:
             msgs.append('Input Underflow')
@@ -210,17 +787,15 @@ cdef int raise_stream_callback_error(CallbackUserData* user_data) except -1 with
             msgs.append('Output Underflow')
         if cb_flags & 8:
             msgs.append('Output Overflow')
-        if not len(msgs):
-            return 0
-        msg = ', '.join(msgs)
-    elif user_data.error_status == CallbackError_input_aborted:
+        if len(msgs):
+            msg = ', '.join(msgs)
+    elif error_status == CallbackError_input_aborted:
         msg = 'Input Aborted'
-    elif user_data.error_status == CallbackError_output_aborted:
+    elif error_status == CallbackError_output_aborted:
         msg = 'Output Aborted'
-    else:
-        return 0
-    warnings.warn(StreamCallbackError(msg))
-    return 0
+    elif error_status == CallbackError_process_aborted:
+        msg = 'Process Aborted'
+    return msg
 
 cdef void callback_user_data_destroy(CallbackUserData* user_data) except *:
     if user_data.in_buffer != NULL:
@@ -229,3 +804,21 @@ cdef void callback_user_data_destroy(CallbackUserData* user_data) except *:
     if user_data.out_buffer != NULL:
         sample_buffer_destroy(user_data.out_buffer)
         user_data.out_buffer = NULL
+    if user_data.process_hook != NULL:
+        process_hook_destroy(user_data.process_hook)
+        user_data.process_hook = NULL
+    if user_data.underrun != NULL:
+        underrun_handler_destroy(user_data.underrun)
+        user_data.underrun = NULL
+    if user_data.in_resample != NULL:
+        resample_stage_destroy(user_data.in_resample)
+        user_data.in_resample = NULL
+    if user_data.out_resample != NULL:
+        resample_stage_destroy(user_data.out_resample)
+        user_data.out_resample = NULL
+    if user_data.in_routing != NULL:
+        channel_routing_destroy(user_data.in_routing)
+        user_data.in_routing = NULL
+    if user_data.out_routing != NULL:
+        channel_routing_destroy(user_data.out_routing)
+        user_data.out_routing = NULL
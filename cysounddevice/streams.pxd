@@ -5,6 +5,11 @@ from cysounddevice.types cimport *
 from cysounddevice.devices cimport DeviceInfo
 from cysounddevice.buffer cimport *
 from cysounddevice.stream_callback cimport StreamCallback, CallbackUserData
+from cysounddevice.notify cimport Notifier
+from cysounddevice.blocking cimport BlockingStreamIO
+from cysounddevice.virtual cimport VirtualDriver
+from cysounddevice.underrun cimport UnderrunPolicy
+from cysounddevice.resample cimport ResampleQuality
 
 cdef class Stream:
     cdef readonly DeviceInfo device
@@ -12,15 +17,21 @@ cdef class Stream:
     cdef readonly StreamCallback callback_handler
     cdef readonly StreamInputBuffer input_buffer
     cdef readonly StreamOutputBuffer output_buffer
+    cdef readonly BlockingStreamIO blocking_io
+    cdef readonly VirtualDriver virtual_driver
     cdef PaStream* _pa_stream_ptr
     cdef unsigned long _frames_per_buffer
     cdef readonly bint starting
+    cdef bint _blocking
+    cdef Notifier _notifier
+    cdef bint _notifier_unavailable
 
     cdef SampleFormat* _get_sample_format(self)
     cdef CallbackUserData* _get_callback_data(self)
     cpdef check(self)
     cpdef check_active(self)
     cpdef open(self)
+    cdef void _open_virtual(self) except *
     cpdef close(self)
     cdef int check_callback_errors(self) nogil except -1
 
@@ -34,8 +45,19 @@ cdef class StreamInfo:
     cdef readonly int _input_channels, _output_channels
     cdef readonly PaTime _input_latency, _output_latency
     cdef public bint clip_off, dither_off, never_drop_input, prime_out_buffer
+    cdef public bint use_hugepages
+    cdef SampleLayout _layout
+    cdef OverflowPolicy _overflow_policy
+    cdef UnderrunPolicy _underrun_policy
+    cdef public Py_ssize_t underrun_fade_frames
+    cdef public double clock_bandwidth
+    cdef public double buffer_sample_rate
+    cdef ResampleQuality _resample_quality
+    cdef object _input_channel_map, _input_mix
+    cdef object _output_channel_map, _output_mix
 
     cdef void _set_sample_format(self, str name, dict kwargs) except *
+    cdef bint _has_routing(self)
     cdef PaStreamParameters* get_input_params(self)
     cdef PaStreamParameters* get_output_params(self)
     cdef void _update_from_pa_stream_info(self, const PaStreamInfo* info) except *
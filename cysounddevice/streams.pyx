@@ -4,9 +4,20 @@ cimport cython
 
 from cysounddevice.pawrapper cimport *
 from cysounddevice.utils cimport handle_pa_error
-from cysounddevice.devices cimport DeviceInfo
+from cysounddevice.devices cimport DeviceInfo, VirtualDevice
 from cysounddevice.types cimport *
 from cysounddevice.stream_callback cimport StreamCallback, CallbackUserData
+from cysounddevice.notify cimport Notifier
+from cysounddevice.blocking cimport BlockingStreamIO
+from cysounddevice.virtual cimport VirtualDriver
+from cysounddevice.underrun cimport (
+    UnderrunPolicy_zero_fill, get_underrun_policy, get_underrun_policy_name,
+)
+from cysounddevice.resample cimport (
+    ResampleQuality_medium, get_resample_quality, get_resample_quality_name,
+)
+
+import asyncio
 
 # cdef enum CallbackType:
 #     CallbackTypeFunction
@@ -34,6 +45,7 @@ cdef class Stream:
 
     Keyword Arguments:
         frames_per_buffer (int):
+        blocking (bool):
 
     Attributes:
         device (DeviceInfo): The :class:`~cysounddevice.devices.DeviceInfo`
@@ -45,18 +57,41 @@ cdef class Stream:
         callback_handler (StreamCallback): A :class:`StreamCallback` instance
             to handle callbacks from PortAudio
         frames_per_buffer (int): Number of samples per callback (block size)
+        blocking (bool): If True, the stream is opened without a callback and
+            data is read and written directly with :meth:`read`,
+            :meth:`read_into` and :meth:`write`. The :attr:`input_buffer` and
+            :attr:`output_buffer` are not used in this mode. Default is False
+        blocking_io (BlockingStreamIO): The
+            :class:`~cysounddevice.blocking.BlockingStreamIO` instance
+            used while the stream is open in :attr:`blocking` mode
+        virtual_driver (VirtualDriver): The
+            :class:`~cysounddevice.virtual.VirtualDriver` calling the
+            stream callback if the :attr:`device` is a
+            :class:`~cysounddevice.devices.VirtualDevice`
         active (bool): The stream state
+        notifier (Notifier): A :class:`~cysounddevice.notify.Notifier` used
+            to wake coroutines awaiting the stream buffers. It is created on
+            first access and is ``None`` if not supported on the platform
+
+    Iterating over the stream with ``async for`` yields ``(data, sample_time)``
+    for each block of input (see :meth:`StreamInputBuffer.read`) until the
+    stream is closed.
     """
     def __cinit__(self, DeviceInfo device, *args, **kwargs):
         self._frames_per_buffer = 512
         self.device = device
+        self.virtual_driver = VirtualDriver(self)
         self.stream_info = StreamInfo(self, **kwargs)
         self.callback_handler = StreamCallback(self)
         self.input_buffer = StreamInputBuffer(self)
         self.output_buffer = StreamOutputBuffer(self)
         self.starting = False
+        self._blocking = False
+        self.blocking_io = BlockingStreamIO(self)
+        self._notifier = None
+        self._notifier_unavailable = False
     def __init__(self, *args, **kwargs):
-        keys = ['frames_per_buffer']
+        keys = ['frames_per_buffer', 'blocking']
         for key in keys:
             if key in kwargs:
                 val = kwargs[key]
@@ -71,6 +106,14 @@ cdef class Stream:
         self._frames_per_buffer = value
         self.stream_info._update_pa_data()
     @property
+    def blocking(self):
+        return self._blocking
+    @blocking.setter
+    def blocking(self, bint value):
+        if self.active:
+            return
+        self._blocking = value
+    @property
     def active(self):
         if self.check_active():
             return True
@@ -78,6 +121,16 @@ cdef class Stream:
             return True
         return False
     @property
+    def notifier(self):
+        if self._notifier is None and not self._notifier_unavailable:
+            try:
+                self._notifier = Notifier()
+            except OSError:
+                self._notifier_unavailable = True
+                return None
+            self.callback_handler._set_notify_fd(self._notifier.write_fd)
+        return self._notifier
+    @property
     def input_channels(self): return self.stream_info.input_channels
     @input_channels.setter
     def input_channels(self, int value): self.stream_info.input_channels = value
@@ -93,6 +146,20 @@ cdef class Stream:
     @sample_rate.setter
     def sample_rate(self, double value): self.stream_info.sample_rate = value
 
+    @property
+    def buffer_sample_rate(self):
+        """The sample rate of the data in the :attr:`input_buffer` and
+        :attr:`output_buffer` (see :attr:`StreamInfo.buffer_sample_rate`)
+        """
+        if self.stream_info.buffer_sample_rate > 0:
+            return self.stream_info.buffer_sample_rate
+        return self.stream_info.sample_rate
+    @buffer_sample_rate.setter
+    def buffer_sample_rate(self, double value):
+        if self.active:
+            return
+        self.stream_info.buffer_sample_rate = value
+
     cdef SampleFormat* _get_sample_format(self):
         return self.stream_info.sample_format
 
@@ -104,9 +171,15 @@ cdef class Stream:
     cpdef check(self):
         """Check the stream configuration in PortAudio
 
+        For a :class:`~cysounddevice.devices.VirtualDevice`, only the
+        channel counts are checked
+
         Returns:
             PaError: 0 on success, see `PaErrorCode`
         """
+        if self.device.is_virtual:
+            _check_virtual_channels(self.device, self.input_channels, self.output_channels)
+            return 0
         cdef PaStreamParameters* pa_input_params = self.stream_info.get_input_params()
         cdef PaStreamParameters* pa_output_params = self.stream_info.get_output_params()
         cdef PaError err = Pa_IsFormatSupported(
@@ -121,6 +194,8 @@ cdef class Stream:
         cdef PaError err
         cdef bint active = False
 
+        if self.device.is_virtual:
+            return self.virtual_driver.running
         if self._pa_stream_ptr != NULL:
             err = Pa_IsStreamActive(self._pa_stream_ptr)
             if err == 1:
@@ -141,6 +216,13 @@ cdef class Stream:
         """
         if self.active:
             return
+        if self._blocking and self.buffer_sample_rate != self.sample_rate:
+            raise ValueError('buffer_sample_rate is not supported for blocking streams')
+        if self._blocking and self.stream_info._has_routing():
+            raise ValueError('Channel routing is not supported for blocking streams')
+        if self.device.is_virtual:
+            self._open_virtual()
+            return
         cdef PaStream* ptr = self._pa_stream_ptr
         cdef PaError sample_size = Pa_GetSampleSize(self.stream_info.sample_format.pa_ident)
         cdef PaStreamParameters* pa_input_params = self.stream_info.get_input_params()
@@ -149,8 +231,12 @@ cdef class Stream:
         print('sample_size={}, should be {} bits'.format(
             sample_size, self.stream_info.sample_format.bit_width,
         ))
-        self.callback_handler._build_user_data()
-        cdef CallbackUserData* user_data = self.callback_handler.user_data
+        cdef PaStreamCallback* callback_ptr = NULL
+        cdef CallbackUserData* user_data = NULL
+        if not self._blocking:
+            self.callback_handler._build_user_data()
+            user_data = self.callback_handler.user_data
+            callback_ptr = self.callback_handler._pa_callback_ptr
         handle_pa_error(Pa_OpenStream(
             &ptr,
             pa_input_params,
@@ -158,22 +244,34 @@ cdef class Stream:
             self.sample_rate,
             self.frames_per_buffer,
             self.stream_info._pa_flags,
-            self.callback_handler._pa_callback_ptr,
+            callback_ptr,
             # &TestData,
             <void*>user_data,
         ))
-        if self.input_channels > 0:
-            self.input_buffer._set_sample_buffer(user_data.in_buffer)
-        if self.output_channels > 0:
-            self.output_buffer._set_sample_buffer(user_data.out_buffer)
+        if not self._blocking:
+            user_data.pa_stream = ptr
+            if self.input_channels > 0:
+                self.input_buffer._set_sample_buffer(user_data.in_buffer)
+            if self.output_channels > 0:
+                self.output_buffer._set_sample_buffer(user_data.out_buffer)
         self.starting = True
         cdef const PaStreamInfo* info = Pa_GetStreamInfo(ptr)
         if info == NULL:
             raise Exception('Could not get stream info')
         self.stream_info._update_from_pa_stream_info(info)
         self._pa_stream_ptr = ptr
+        if self._blocking:
+            # Allocate before starting so no time is lost once audio is running
+            self.blocking_io._open(
+                ptr, self.stream_info.sample_format, self.stream_info._layout,
+                self.input_channels, self.output_channels,
+                self._frames_per_buffer, self.sample_rate,
+            )
         cdef PaError err = Pa_StartStream(ptr)
-        if err != paStreamIsNotStopped:
+        if err != paStreamIsNotStopped and err != paNoError:
+            if self._blocking:
+                self.blocking_io._close()
+            self.starting = False
             handle_pa_error(err)
         self.starting = False
         # print('waiting...')
@@ -181,26 +279,185 @@ cdef class Stream:
         # print('stopping...')
         # self.close()
         # self.device.close()
+    cdef void _open_virtual(self) except *:
+        cdef VirtualDevice device = self.device
+        cdef PaStreamInfo info
+        cdef PaTime latency = device.latency
+        if self._blocking:
+            raise ValueError('Virtual devices do not support blocking streams')
+        _check_virtual_channels(device, self.input_channels, self.output_channels)
+        if latency <= 0:
+            latency = self._frames_per_buffer / self.sample_rate
+        info.structVersion = 1
+        info.inputLatency = latency if self.input_channels > 0 else 0
+        info.outputLatency = latency if self.output_channels > 0 else 0
+        info.sampleRate = self.sample_rate
+        self.callback_handler._build_user_data()
+        cdef CallbackUserData* user_data = self.callback_handler.user_data
+        if self.input_channels > 0:
+            self.input_buffer._set_sample_buffer(user_data.in_buffer)
+        if self.output_channels > 0:
+            self.output_buffer._set_sample_buffer(user_data.out_buffer)
+        self.starting = True
+        self.stream_info._update_from_pa_stream_info(&info)
+        try:
+            self.virtual_driver._open(
+                user_data, self.stream_info.sample_format, self.stream_info._layout,
+                self.input_channels, self.output_channels,
+                self._frames_per_buffer, self.sample_rate,
+                info.inputLatency, info.outputLatency,
+                device.realtime, device.loopback,
+                device._xrun_flags, device.xrun_interval,
+            )
+            self.virtual_driver._start()
+        except:
+            self.virtual_driver._close()
+            self.input_buffer._clear_sample_buffer()
+            self.output_buffer._clear_sample_buffer()
+            self.callback_handler._free_user_data()
+            raise
+        finally:
+            self.starting = False
     cpdef close(self):
         """Close the stream if active
+
+        Raises:
+            BufferError: If buffers exported from a
+                :class:`~cysounddevice.buffer.BufferItemView` (numpy arrays,
+                memoryviews, etc.) are still alive. The stream is left open
         """
-        if self._pa_stream_ptr == NULL:
+        if self._pa_stream_ptr == NULL and not self.virtual_driver.opened:
             return
+        self.input_buffer._check_exports()
+        self.output_buffer._check_exports()
         cdef PaStream* ptr = self._pa_stream_ptr
         self.starting = False
 
-        self.callback_handler._send_exit_signal(2)
-        if not self.check_active():
-            Pa_AbortStream(ptr)
+        if self.virtual_driver.opened:
+            self.virtual_driver._close()
+        elif self._blocking:
+            # Let PortAudio play any pending output before closing
+            self.blocking_io._close()
+            Pa_StopStream(ptr)
+            Pa_CloseStream(ptr)
+        else:
+            self.callback_handler._send_exit_signal(2)
+            if not self.check_active():
+                Pa_AbortStream(ptr)
 
         self._pa_stream_ptr = NULL
         # handle_pa_error(Pa_StopStream(self._pa_stream_ptr))
         # print('stopped')
+        self.input_buffer._clear_sample_buffer()
+        self.output_buffer._clear_sample_buffer()
         self.callback_handler._free_user_data()
+        if self._notifier is not None:
+            # Wake any coroutines waiting on the buffers so they can exit,
+            # then stop watching the descriptor. A new notifier is created
+            # if the stream is opened again.
+            notifier = self._notifier
+            self._notifier = None
+            self.callback_handler._set_notify_fd(-1)
+            notifier.wake()
+            notifier.close()
         print('closed')
     cdef int check_callback_errors(self) nogil except -1:
         self.callback_handler.check_callback_errors()
         return 0
+    def read(self, Py_ssize_t nframes):
+        """Read from a :attr:`blocking` stream
+        (see :meth:`BlockingStreamIO.read <cysounddevice.blocking.BlockingStreamIO.read>`)
+        """
+        return self.blocking_io.read(nframes)
+    def read_into(self, float[:,:] data):
+        """Read into *data* from a :attr:`blocking` stream
+        (see :meth:`BlockingStreamIO.read_into <cysounddevice.blocking.BlockingStreamIO.read_into>`)
+        """
+        return self.blocking_io.read_into(data)
+    def write(self, float[:,:] data):
+        """Write *data* to a :attr:`blocking` stream
+        (see :meth:`BlockingStreamIO.write <cysounddevice.blocking.BlockingStreamIO.write>`)
+        """
+        return self.blocking_io.write(data)
+    def stats(self, bint reset=False):
+        """Get the timing and load statistics recorded by the stream callback
+
+        Taking a snapshot does not block the callback, so this can be
+        called as often as needed to watch for degradation before any
+        overflows or underflows occur.
+
+        Arguments:
+            reset (bool): If True, clear the statistics after the snapshot
+
+        Returns:
+            StreamStats: A :class:`cysounddevice.stats.StreamStats` snapshot,
+            or ``None`` if the stream is not open or is a blocking stream
+        """
+        return self.callback_handler.stats(reset)
+    def underruns(self):
+        """Get the output underruns concealed by the stream callback
+        (see :attr:`StreamInfo.underrun_policy`)
+
+        Each call reports the gaps that started since the previous one
+
+        Returns:
+            UnderrunReport: A :class:`cysounddevice.underrun.UnderrunReport`,
+            or ``None`` if the stream is not open, has no output or is a
+            blocking stream
+        """
+        return self.callback_handler.underruns()
+    def clock(self, bint output=False):
+        """Get the clock model of the stream's timestamps
+
+        The stream callback filters the ADC (and DAC) times given by
+        PortAudio with a delay-locked loop (see
+        :attr:`StreamInfo.clock_bandwidth`). The filtered times are used for
+        the :class:`~cysounddevice.types.SampleTime` of every block in the
+        stream buffers.
+
+        Arguments:
+            output (bool): If True, get the model of the output timestamps
+
+        Returns:
+            StreamClock: A :class:`cysounddevice.clock.StreamClock` snapshot
+            with the estimated sample rate and the mapping of sample indices
+            to stream, monotonic and wall clock times, or ``None`` if the
+            stream is not open, has no channels in that direction or is a
+            blocking stream
+        """
+        return self.callback_handler.clock(output)
+    def callback_errors(self):
+        """Get the number of errors reported to the stream callback
+
+        Unlike the :class:`~cysounddevice.stream_callback.StreamCallbackError`
+        warnings (see :attr:`StreamCallback.warn_errors <cysounddevice.stream_callback.StreamCallback.warn_errors>`),
+        the counts include every callback since the stream was opened
+
+        Returns:
+            CallbackErrors: A :class:`cysounddevice.stream_callback.CallbackErrors`,
+            or ``None`` if the stream is not open or is a blocking stream
+        """
+        return self.callback_handler.callback_errors()
+
+    def wait_for_callback(self):
+        """Get an awaitable that completes after the next callback
+
+        Uses :attr:`notifier` when possible. If it is unavailable (or the
+        running event loop cannot watch file descriptors), falls back to
+        sleeping for half of a block.
+
+        Returns:
+            An awaitable for use in a coroutine
+        """
+        cdef Notifier notifier = self.notifier
+        if notifier is not None:
+            try:
+                return notifier.wait()
+            except NotImplementedError:
+                pass
+        return asyncio.sleep(self._frames_per_buffer / self.sample_rate / 2)
+    def __aiter__(self):
+        return self.input_buffer.__aiter__()
     def __enter__(self):
         self.open()
         return self
@@ -211,6 +468,39 @@ cdef class Stream:
     def __str__(self):
         return '{self.stream_info}, block_size={self.frames_per_buffer}'.format(self=self)
 
+cdef void _check_virtual_channels(DeviceInfo device, int input_channels,
+                                  int output_channels) except *:
+    if input_channels > device.num_inputs or output_channels > device.num_outputs:
+        raise ValueError('{} supports {} inputs and {} outputs'.format(
+            device.name, device.num_inputs, device.num_outputs,
+        ))
+
+cdef object _channel_map_tuple(object value):
+    if value is None:
+        return None
+    result = tuple(int(c) for c in value)
+    if not len(result) or min(result) < 0:
+        raise ValueError('Invalid channel map: {!r}'.format(value))
+    return result
+
+cdef object _channel_map_list(object value):
+    if value is None:
+        return None
+    return list(value)
+
+cdef object _mix_tuple(object value):
+    if value is None:
+        return None
+    result = tuple(tuple(float(g) for g in row) for row in value)
+    if not len(result) or not len(result[0]) or any(len(row) != len(result[0]) for row in result):
+        raise ValueError('The mix must be a non-empty 2-dimensional matrix')
+    return result
+
+cdef object _mix_list(object value):
+    if value is None:
+        return None
+    return [list(row) for row in value]
+
 cdef class StreamInfo:
     """Configuration parameters for :class:`Stream`
 
@@ -229,6 +519,86 @@ cdef class StreamInfo:
             Use ``0`` for output-only
         output_channels (int): Number of channels to send to the device.
             Use ``0`` for input-only
+        use_hugepages (bool): If True, request transparent huge pages for
+            the memory backing the stream's sample buffers (Linux only).
+            Default is False
+        layout (str): Memory layout used for the stream's buffers and the
+            float arrays passed to the :class:`~cysounddevice.buffer.StreamInputBuffer`
+            and :class:`~cysounddevice.buffer.StreamOutputBuffer` methods.
+            One of:
+
+            * ``'deinterleaved'`` (default): PortAudio delivers interleaved
+              samples which are deinterleaved into arrays of shape
+              ``(nchannels, length)`` during conversion
+            * ``'interleaved'``: Arrays are ``(length, nchannels)`` and map
+              straight to PortAudio's interleaved buffers
+            * ``'non_interleaved'``: The stream is opened with
+              ``paNonInterleaved`` so each channel is kept in its own plane.
+              Arrays are ``(nchannels, length)``
+        overflow_policy (str): What the stream callback does with input
+            when the :class:`~cysounddevice.buffer.StreamInputBuffer` is full.
+            One of:
+
+            * ``'drop_newest'`` (default): The new input is dropped
+            * ``'overwrite_oldest'``: The oldest unread blocks are discarded
+              to make room. If the oldest block is currently borrowed
+              (see :meth:`~cysounddevice.buffer.StreamInputBuffer.borrow`)
+              the new input is dropped instead
+
+            Either way the frames lost are counted in
+            :attr:`~cysounddevice.buffer.StreamInputBuffer.dropped_frames`.
+            Changes take effect the next time the stream is opened
+        underrun_policy (str): How the stream callback fills the output
+            when the :class:`~cysounddevice.buffer.StreamOutputBuffer` runs
+            out of data. One of:
+
+            * ``'zero_fill'`` (default): Silence
+            * ``'hold'``: The last block played is repeated, fading out over
+              :attr:`underrun_fade_frames`
+            * ``'crossfade'``: As for ``'hold'``, and the first
+              :attr:`underrun_fade_frames` after the output resumes are
+              crossfaded from the repeated block
+
+            Underruns are reported by :meth:`Stream.underruns`. Changes
+            take effect the next time the stream is opened
+        underrun_fade_frames (int): Length of the fades used by
+            :attr:`underrun_policy`. If ``0`` (the default), the stream's
+            block size is used
+        clock_bandwidth (float): Bandwidth in Hz of the loop filtering the
+            callback timestamps (see :meth:`Stream.clock`). Lower values
+            remove more jitter but follow changes of the device clock more
+            slowly. Default is ``0.2``
+        buffer_sample_rate (float): If set (and different from
+            :attr:`sample_rate`), the stream callback converts between the
+            device rate and this rate so the data in the
+            :attr:`~Stream.input_buffer` and :attr:`~Stream.output_buffer`
+            (and their block size) is at this rate. For example a 16 kHz
+            input from a device running at 48 kHz. Not supported for
+            :attr:`~Stream.blocking` streams. Default is ``0`` (no conversion)
+        resample_quality (str): The quality preset used for the conversion,
+            one of ``'fast'``, ``'medium'`` (default), ``'high'`` or
+            ``'best'`` (see :func:`cysounddevice.resample.quality_params`)
+        input_channel_map (list): The device channels (of the
+            :attr:`input_channels` opened) to place in the
+            :attr:`~Stream.input_buffer`, one for each buffer channel.
+            For example ``[0, 5]`` to read a stereo pair from a multichannel
+            interface. The selected channels are copied without conversion
+        input_mix (list): A gain matrix with a row for each channel of the
+            :attr:`~Stream.input_buffer` and a column for each device
+            channel, for downmixing (or upmixing). Only the nonzero gains
+            are used. Setting either of :attr:`input_channel_map` or
+            :attr:`input_mix` clears the other
+        output_channel_map (list): The device channel (of the
+            :attr:`output_channels` opened) that each channel of the
+            :attr:`~Stream.output_buffer` is played on. Device channels not
+            in the map are silent
+        output_mix (list): A gain matrix with a row for each device channel
+            and a column for each channel of the :attr:`~Stream.output_buffer`
+
+    The routing is applied by the stream callback while copying between
+    the host buffers and the stream buffers, so only the channels used are
+    converted. Changes take effect the next time the stream is opened.
+    Not supported for :attr:`~Stream.blocking` streams.
     """
     def __cinit__(self, Stream stream, *args, **kwargs):
         cdef DeviceInfo device = stream.device
@@ -240,11 +610,25 @@ cdef class StreamInfo:
         self._output_latency = 0
         self._pa_input_params.device = device.index
         self._pa_output_params.device = device.index
+        self._layout = SampleLayout_deinterleaved
+        self._overflow_policy = OverflowPolicy_drop_newest
+        self._underrun_policy = UnderrunPolicy_zero_fill
+        self.underrun_fade_frames = 0
+        self.clock_bandwidth = .2
+        self.buffer_sample_rate = 0
+        self._resample_quality = ResampleQuality_medium
+        self._input_channel_map = None
+        self._input_mix = None
+        self._output_channel_map = None
+        self._output_mix = None
     def __init__(self, *args, **kwargs):
         cdef str sf_name = kwargs.get('sample_format', '')
         self._set_sample_format(sf_name, kwargs)
 
-        keys = ['input_channels', 'output_channels', 'sample_rate']
+        keys = ['input_channels', 'output_channels', 'sample_rate', 'use_hugepages', 'layout',
+                'overflow_policy', 'underrun_policy', 'underrun_fade_frames', 'clock_bandwidth',
+                'buffer_sample_rate', 'resample_quality', 'input_channel_map',
+                'input_mix', 'output_channel_map', 'output_mix']
         for key in keys:
             if key in kwargs:
                 val = kwargs[key]
@@ -294,6 +678,94 @@ cdef class StreamInfo:
         self._sample_rate = value
         self._update_pa_data()
     @property
+    def layout(self):
+        if self._layout == SampleLayout_interleaved:
+            return 'interleaved'
+        elif self._layout == SampleLayout_non_interleaved:
+            return 'non_interleaved'
+        return 'deinterleaved'
+    @layout.setter
+    def layout(self, str value):
+        cdef SampleLayout layout
+        if value == 'deinterleaved':
+            layout = SampleLayout_deinterleaved
+        elif value == 'interleaved':
+            layout = SampleLayout_interleaved
+        elif value == 'non_interleaved':
+            layout = SampleLayout_non_interleaved
+        else:
+            raise ValueError('Invalid layout: {!r}'.format(value))
+        if self.stream.active:
+            return
+        if layout == self._layout:
+            return
+        self._layout = layout
+        self._update_pa_data()
+    @property
+    def overflow_policy(self):
+        if self._overflow_policy == OverflowPolicy_overwrite_oldest:
+            return 'overwrite_oldest'
+        return 'drop_newest'
+    @overflow_policy.setter
+    def overflow_policy(self, str value):
+        if value == 'drop_newest':
+            self._overflow_policy = OverflowPolicy_drop_newest
+        elif value == 'overwrite_oldest':
+            self._overflow_policy = OverflowPolicy_overwrite_oldest
+        else:
+            raise ValueError('Invalid overflow_policy: {!r}'.format(value))
+    @property
+    def underrun_policy(self):
+        return get_underrun_policy_name(self._underrun_policy)
+    @underrun_policy.setter
+    def underrun_policy(self, str value):
+        self._underrun_policy = get_underrun_policy(value)
+    @property
+    def input_channel_map(self):
+        return _channel_map_list(self._input_channel_map)
+    @input_channel_map.setter
+    def input_channel_map(self, value):
+        if self.stream.active:
+            return
+        self._input_channel_map = _channel_map_tuple(value)
+        self._input_mix = None
+    @property
+    def input_mix(self):
+        return _mix_list(self._input_mix)
+    @input_mix.setter
+    def input_mix(self, value):
+        if self.stream.active:
+            return
+        self._input_mix = _mix_tuple(value)
+        self._input_channel_map = None
+    @property
+    def output_channel_map(self):
+        return _channel_map_list(self._output_channel_map)
+    @output_channel_map.setter
+    def output_channel_map(self, value):
+        if self.stream.active:
+            return
+        self._output_channel_map = _channel_map_tuple(value)
+        self._output_mix = None
+    @property
+    def output_mix(self):
+        return _mix_list(self._output_mix)
+    @output_mix.setter
+    def output_mix(self, value):
+        if self.stream.active:
+            return
+        self._output_mix = _mix_tuple(value)
+        self._output_channel_map = None
+    cdef bint _has_routing(self):
+        return (self._input_channel_map is not None or self._input_mix is not None or
+                self._output_channel_map is not None or self._output_mix is not None)
+    @property
+    def resample_quality(self):
+        return get_resample_quality_name(self._resample_quality)
+    @resample_quality.setter
+    def resample_quality(self, str value):
+        self._resample_quality = get_resample_quality(value)
+    @property
     def suggested_latency(self):
         cdef double result
         cdef double block_size = <double>self.stream.frames_per_buffer * 2
@@ -350,6 +822,10 @@ cdef class StreamInfo:
         self._pa_output_params.sampleFormat = self.sample_format.pa_ident
         self._pa_output_params.suggestedLatency = self.suggested_latency
 
+        if self._layout == SampleLayout_non_interleaved:
+            self._pa_input_params.sampleFormat |= paNonInterleaved
+            self._pa_output_params.sampleFormat |= paNonInterleaved
+
         cdef PaStreamFlags flags = 0
 
         if self.clip_off:
@@ -76,6 +76,8 @@ cdef struct SampleTime_s:
     Py_ssize_t block_index
     # SAMPLE_INDEX_t sample_index
 
+cdef str SampleTime_s_format
+cdef object sample_time_array_create(Py_ssize_t length)
 cdef void copy_sample_time_struct(SampleTime_s* ptr_from, SampleTime_s* ptr_to) nogil
 cdef SAMPLE_INDEX_t SampleTime_to_sample_index(SampleTime_s* st) nogil
 # cdef PaTime SampleTime_get_rel_time(SampleTime_s* st) nogil
@@ -113,3 +115,18 @@ cdef class SampleTime:
     cdef void _set_sample_index(self, SAMPLE_INDEX_t value) nogil
 
     cdef SampleTime _handle_op(self, object other, Operation op)
+
+ctypedef enum SampleTimeField:
+    SampleTimeField_sample_index
+    SampleTimeField_rel_time
+    SampleTimeField_pa_time
+
+cdef class SampleTimeArray:
+    cdef SampleTime_s[:] data
+    cdef readonly object base
+
+    @staticmethod
+    cdef SampleTimeArray from_view(SampleTime_s[:] data, object base)
+
+    cdef Py_ssize_t _search(self, double value, SampleTimeField field, bint right) nogil
+    cdef Py_ssize_t _find_block(self, double value, SampleTimeField field) nogil
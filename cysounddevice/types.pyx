@@ -1,6 +1,8 @@
 cimport cython
+from cython cimport view
 from libc.math cimport llrint
 from cpython.object cimport Py_LT, Py_LE, Py_EQ, Py_NE, Py_GT, Py_GE
+from cpython.buffer cimport PyBUF_FORMAT
 import numbers
 
 
@@ -148,6 +150,34 @@ def get_sample_formats():
     return SampleFormats
 
 
+# Buffer protocol format string matching the layout of SampleTime_s.
+# This allows arrays of the struct to be shared with typed memoryviews
+# and numpy (as a structured dtype) without conversion.
+cdef str _ssize_fmt = 'q' if sizeof(Py_ssize_t) == 8 else 'i'
+SampleTime_s_format = ''.join([
+    'T{',
+    'd:pa_time:',
+    'd:rel_time:',
+    'd:time_offset:',
+    'd:sample_rate:',
+    '{}:block_size:'.format(_ssize_fmt),
+    'i:block:',
+    '{}:block_index:'.format(_ssize_fmt),
+    '}',
+])
+
+cdef object sample_time_array_create(Py_ssize_t length):
+    """Allocate a 1-dimensional array of :c:type:`SampleTime_s` structs
+
+    The result supports the buffer protocol using :c:data:`SampleTime_s_format`
+    """
+    return _new_array(length, sizeof(SampleTime_s), SampleTime_s_format)
+
+def get_sample_time_format():
+    """Get the buffer format string describing the :c:type:`SampleTime_s` layout
+    """
+    return SampleTime_s_format
+
 cdef void copy_sample_time_struct(SampleTime_s* ptr_from, SampleTime_s* ptr_to) nogil:
     ptr_to.pa_time = ptr_from.pa_time
     ptr_to.rel_time = ptr_from.rel_time
@@ -286,7 +316,9 @@ cdef class SampleTime:
 
     @staticmethod
     cdef SampleTime from_struct(SampleTime_s* data):
-        cdef SampleTime obj = SampleTime(0, 0, data.block_size, data.sample_rate, is_from_struct=True)
+        # Avoid the keyword arguments (and SampleTime_set_block_vars)
+        # of the Python-level constructor
+        cdef SampleTime obj = SampleTime.__new__(SampleTime, 0, 0, data.block_size, data.sample_rate)
         copy_sample_time_struct(data, &obj.data)
         return obj
 
@@ -441,3 +473,343 @@ cdef class SampleTime:
         return '<{self.__class__.__name__}: {self}>'.format(self=self)
     def __str__(self):
         return '({self.block}, {self.block_index})'.format(self=self)
+
+
+cdef object _new_array(Py_ssize_t length, Py_ssize_t itemsize, str fmt):
+    # view.array does not allow empty shapes
+    cdef Py_ssize_t alloc_length = length if length > 0 else 1
+    arr = view.array(shape=(alloc_length,), itemsize=itemsize, format=fmt)
+    if alloc_length != length:
+        return arr[:length]
+    return arr
+
+cdef bytes _SampleTime_s_format_bytes = SampleTime_s_format.encode('UTF-8')
+cdef SampleTime_s _empty_sample_time
+
+cdef SampleTimeField _get_field(str key) except *:
+    if key == 'sample_index':
+        return SampleTimeField_sample_index
+    elif key == 'rel_time':
+        return SampleTimeField_rel_time
+    elif key == 'pa_time':
+        return SampleTimeField_pa_time
+    raise ValueError('Invalid key: {!r}'.format(key))
+
+cdef inline double _field_value(SampleTime_s* st, SampleTimeField field) nogil:
+    if field == SampleTimeField_sample_index:
+        return <double>SampleTime_to_sample_index(st)
+    elif field == SampleTimeField_rel_time:
+        return st.rel_time
+    return st.pa_time
+
+@cython.cdivision(True)
+cdef inline double _block_span(SampleTime_s* st, SampleTimeField field) nogil:
+    """Distance from *st* to the end of its block
+    """
+    cdef double nframes = st.block_size - st.block_index
+    if field == SampleTimeField_sample_index:
+        return nframes
+    return nframes / st.sample_rate
+
+cdef class SampleTimeArray:
+    """A 1-dimensional array of :c:type:`SampleTime_s` with vectorized
+    conversions
+
+    Entry ``i`` of a new array is the start of block ``i``. Existing
+    arrays using :c:data:`SampleTime_s_format` (such as the ``times`` from
+    :meth:`StreamInputBuffer.read_many <cysounddevice.buffer.StreamInputBuffer.read_many>`
+    or a numpy structured array) can be wrapped without copying using
+    :meth:`from_buffer`.
+
+    The array supports the buffer protocol, so ``numpy.asarray(array)``
+    gives a structured array sharing the same memory. Indexing returns a
+    :class:`SampleTime` copy of the entry and slicing returns a
+    :class:`SampleTimeArray` view.
+
+    Conversions run without the GIL. The search methods expect the entries
+    to be in ascending order (as they are when read from a stream).
+
+    Arguments:
+        length (int): Number of entries
+        block_size (int):
+        sample_rate (float):
+        time_offset (float):
+
+    Attributes:
+        base: The object owning the memory
+    """
+    def __cinit__(self, Py_ssize_t length=0, Py_ssize_t block_size=512,
+                  SAMPLE_RATE_t sample_rate=48000, PaTime time_offset=0):
+        cdef Py_ssize_t i
+        self.base = sample_time_array_create(length)
+        self.data = self.base
+        with nogil:
+            for i in range(length):
+                self.data[i].sample_rate = sample_rate
+                self.data[i].block_size = block_size
+                self.data[i].time_offset = time_offset
+                SampleTime_set_block_vars(&self.data[i], <BLOCK_t>i, 0)
+
+    @staticmethod
+    cdef SampleTimeArray from_view(SampleTime_s[:] data, object base):
+        cdef SampleTimeArray obj = SampleTimeArray()
+        obj.data = data
+        obj.base = base
+        return obj
+
+    @staticmethod
+    def from_buffer(obj):
+        """Wrap an existing array using :c:data:`SampleTime_s_format`
+        """
+        cdef SampleTime_s[:] data = obj
+        return SampleTimeArray.from_view(data, obj)
+
+    @staticmethod
+    def from_sample_indices(const SAMPLE_INDEX_t[:] indices, Py_ssize_t block_size,
+                            SAMPLE_RATE_t sample_rate, PaTime time_offset=0):
+        """Create an array from an array of sample indices
+        """
+        cdef SampleTimeArray obj = SampleTimeArray(
+            indices.shape[0], block_size, sample_rate, time_offset,
+        )
+        obj.set_sample_indices(indices)
+        return obj
+
+    def __len__(self):
+        return self.data.shape[0]
+
+    def __getitem__(self, key):
+        cdef Py_ssize_t i
+        cdef SampleTime_s[:] view
+        if isinstance(key, slice):
+            view = (<object>self.data)[key]
+            return SampleTimeArray.from_view(view, self.base)
+        i = key
+        if i < 0:
+            i += self.data.shape[0]
+        if i < 0 or i >= self.data.shape[0]:
+            raise IndexError('SampleTimeArray index out of range')
+        return SampleTime.from_struct(&self.data[i])
+
+    def __setitem__(self, Py_ssize_t i, SampleTime value):
+        if i < 0:
+            i += self.data.shape[0]
+        if i < 0 or i >= self.data.shape[0]:
+            raise IndexError('SampleTimeArray index out of range')
+        copy_sample_time_struct(&value.data, &self.data[i])
+
+    def __iter__(self):
+        cdef Py_ssize_t i
+        for i in range(self.data.shape[0]):
+            yield SampleTime.from_struct(&self.data[i])
+
+    def __getbuffer__(self, Py_buffer *buffer, int flags):
+        if self.data.shape[0] > 0:
+            buffer.buf = &self.data[0]
+        else:
+            buffer.buf = &_empty_sample_time
+        buffer.obj = self
+        buffer.len = self.data.shape[0] * sizeof(SampleTime_s)
+        buffer.readonly = 0
+        buffer.itemsize = sizeof(SampleTime_s)
+        if flags & PyBUF_FORMAT:
+            buffer.format = _SampleTime_s_format_bytes
+        else:
+            buffer.format = NULL
+        buffer.ndim = 1
+        buffer.shape = self.data.shape
+        buffer.strides = self.data.strides
+        buffer.suboffsets = NULL
+        buffer.internal = NULL
+
+    def __releasebuffer__(self, Py_buffer *buffer):
+        pass
+
+    def sample_indices(self):
+        """Get the :attr:`SampleTime.sample_index` of all entries as an
+        array of ``int64``
+        """
+        cdef Py_ssize_t i, n = self.data.shape[0]
+        arr = _new_array(n, sizeof(SAMPLE_INDEX_t), 'q')
+        cdef SAMPLE_INDEX_t[:] result = arr
+        with nogil:
+            for i in range(n):
+                result[i] = SampleTime_to_sample_index(&self.data[i])
+        return arr
+
+    def blocks(self):
+        """Get the :attr:`SampleTime.block` of all entries as an array of ``int32``
+        """
+        cdef Py_ssize_t i, n = self.data.shape[0]
+        arr = _new_array(n, sizeof(BLOCK_t), 'i')
+        cdef BLOCK_t[:] result = arr
+        with nogil:
+            for i in range(n):
+                result[i] = self.data[i].block
+        return arr
+
+    def block_indices(self):
+        """Get the :attr:`SampleTime.block_index` of all entries as an array
+        of ``Py_ssize_t``
+        """
+        cdef Py_ssize_t i, n = self.data.shape[0]
+        arr = _new_array(n, sizeof(Py_ssize_t), _ssize_fmt)
+        cdef Py_ssize_t[:] result = arr
+        with nogil:
+            for i in range(n):
+                result[i] = self.data[i].block_index
+        return arr
+
+    def rel_times(self):
+        """Get the :attr:`SampleTime.rel_time` of all entries as an array of ``float64``
+        """
+        cdef Py_ssize_t i, n = self.data.shape[0]
+        arr = _new_array(n, sizeof(PaTime), 'd')
+        cdef PaTime[:] result = arr
+        with nogil:
+            for i in range(n):
+                result[i] = self.data[i].rel_time
+        return arr
+
+    def pa_times(self):
+        """Get the :attr:`SampleTime.pa_time` of all entries as an array of ``float64``
+        """
+        cdef Py_ssize_t i, n = self.data.shape[0]
+        arr = _new_array(n, sizeof(PaTime), 'd')
+        cdef PaTime[:] result = arr
+        with nogil:
+            for i in range(n):
+                result[i] = self.data[i].pa_time
+        return arr
+
+    def set_sample_indices(self, const SAMPLE_INDEX_t[:] values):
+        """Set the :attr:`SampleTime.sample_index` of all entries, updating
+        their blocks and times
+        """
+        cdef Py_ssize_t i, n = self.data.shape[0]
+        if values.shape[0] != n:
+            raise ValueError('Expected {} values, got {}'.format(n, values.shape[0]))
+        with nogil:
+            for i in range(n):
+                SampleTime_set_sample_index(&self.data[i], values[i], True)
+
+    def set_blocks(self, const BLOCK_t[:] blocks, const Py_ssize_t[:] block_indices):
+        """Set the :attr:`SampleTime.block` and :attr:`SampleTime.block_index`
+        of all entries, updating their times
+        """
+        cdef Py_ssize_t i, n = self.data.shape[0]
+        if blocks.shape[0] != n or block_indices.shape[0] != n:
+            raise ValueError('Expected {} values'.format(n))
+        with nogil:
+            for i in range(n):
+                SampleTime_set_block_vars(&self.data[i], blocks[i], block_indices[i])
+
+    def set_rel_times(self, const PaTime[:] values):
+        """Set the :attr:`SampleTime.rel_time` of all entries, rounded to
+        the nearest sample
+        """
+        cdef Py_ssize_t i, n = self.data.shape[0]
+        if values.shape[0] != n:
+            raise ValueError('Expected {} values, got {}'.format(n, values.shape[0]))
+        with nogil:
+            for i in range(n):
+                SampleTime_set_rel_time(&self.data[i], values[i], True)
+
+    def set_pa_times(self, const PaTime[:] values):
+        """Set the :attr:`SampleTime.pa_time` of all entries, rounded to
+        the nearest sample
+        """
+        cdef Py_ssize_t i, n = self.data.shape[0]
+        if values.shape[0] != n:
+            raise ValueError('Expected {} values, got {}'.format(n, values.shape[0]))
+        with nogil:
+            for i in range(n):
+                SampleTime_set_pa_time(&self.data[i], values[i], True)
+
+    def set_time_offset(self, PaTime value):
+        """Set the :attr:`SampleTime.time_offset` of all entries, updating
+        their :attr:`~SampleTime.pa_time`
+        """
+        cdef Py_ssize_t i
+        with nogil:
+            for i in range(self.data.shape[0]):
+                self.data[i].time_offset = value
+                self.data[i].pa_time = self.data[i].rel_time + value
+
+    def update(self):
+        """Recalculate the times of all entries from their blocks
+        """
+        cdef Py_ssize_t i
+        with nogil:
+            for i in range(self.data.shape[0]):
+                SampleTime_set_block_vars(&self.data[i], self.data[i].block, self.data[i].block_index)
+
+    cdef Py_ssize_t _search(self, double value, SampleTimeField field, bint right) nogil:
+        cdef Py_ssize_t lo = 0, hi = self.data.shape[0], mid
+        cdef double v
+        while lo < hi:
+            mid = (lo + hi) // 2
+            v = _field_value(&self.data[mid], field)
+            if v < value or (right and v == value):
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    cdef Py_ssize_t _find_block(self, double value, SampleTimeField field) nogil:
+        cdef Py_ssize_t i = self._search(value, field, True) - 1
+        cdef SampleTime_s* st
+        if i < 0:
+            return -1
+        st = &self.data[i]
+        if value >= _field_value(st, field) + _block_span(st, field):
+            return -1
+        return i
+
+    def searchsorted(self, double value, str key='pa_time', str side='left'):
+        """Find the index where *value* would be inserted to keep the order
+
+        Arguments:
+            value: The value to search for
+            key (str): The value compared. One of ``'sample_index'``,
+                ``'rel_time'`` or ``'pa_time'``
+            side (str): ``'left'`` for the first suitable index or
+                ``'right'`` for the last (as in :func:`numpy.searchsorted`)
+        """
+        cdef SampleTimeField field = _get_field(key)
+        if side not in ('left', 'right'):
+            raise ValueError('Invalid side: {!r}'.format(side))
+        return self._search(value, field, side == 'right')
+
+    def find_block(self, double value, str key='pa_time'):
+        """Find the entry whose block covers *value*
+
+        Each entry covers the span from itself to the end of its block.
+
+        Arguments:
+            value: The time or sample index
+            key (str): One of ``'sample_index'``, ``'rel_time'`` or ``'pa_time'``
+
+        Returns:
+            int: The index of the entry or ``-1`` if no entry covers *value*
+        """
+        return self._find_block(value, _get_field(key))
+
+    def find_blocks(self, const double[:] values, str key='pa_time'):
+        """Like :meth:`find_block` for an array of values
+
+        Returns:
+            An array of ``Py_ssize_t`` indices (``-1`` where no entry covers
+            the value)
+        """
+        cdef SampleTimeField field = _get_field(key)
+        cdef Py_ssize_t i, n = values.shape[0]
+        arr = _new_array(n, sizeof(Py_ssize_t), _ssize_fmt)
+        cdef Py_ssize_t[:] result = arr
+        with nogil:
+            for i in range(n):
+                result[i] = self._find_block(values[i], field)
+        return arr
+
+    def __repr__(self):
+        return '<{self.__class__.__name__}: {n} entries>'.format(self=self, n=len(self))
@@ -0,0 +1,70 @@
+# cython: language_level=3
+
+from libc.stdint cimport uint64_t
+
+from cysounddevice.pawrapper cimport *
+from cysounddevice.types cimport *
+
+cdef enum UnderrunPolicy:
+    UnderrunPolicy_zero_fill
+    UnderrunPolicy_hold
+    UnderrunPolicy_crossfade
+
+cdef enum:
+    UNDERRUN_LOG_SIZE = 64
+
+cdef struct UnderrunGap:
+    SampleTime_s start_time
+    # Updated by the callback while the gap lasts
+    uint64_t nframes
+
+cdef struct UnderrunHandler:
+    UnderrunPolicy policy
+    SampleFormat* sample_format
+    bint planar
+    Py_ssize_t nchannels
+    Py_ssize_t hold_frames
+    Py_ssize_t fade_frames
+    # Float planes of hold_frames each. ``history`` is a ring holding the
+    # last frames played, ``scratch`` has room for two sets of planes
+    float *history
+    float *scratch
+    Py_ssize_t history_pos
+    Py_ssize_t history_fill
+    bint active
+    Py_ssize_t conceal_pos
+    Py_ssize_t resume_pos
+    uint64_t underruns
+    uint64_t underrun_frames
+    # Total number of gaps logged. The gap ``n`` is stored in
+    # ``gaps[n % UNDERRUN_LOG_SIZE]``
+    uint64_t gap_count
+    UnderrunGap gaps[UNDERRUN_LOG_SIZE]
+
+cdef UnderrunHandler* underrun_handler_create(UnderrunPolicy policy,
+                                              SampleFormat* sample_format,
+                                              bint planar,
+                                              Py_ssize_t nchannels,
+                                              Py_ssize_t hold_frames,
+                                              Py_ssize_t fade_frames) except NULL
+cdef void underrun_handler_destroy(UnderrunHandler* handler) except *
+cdef void underrun_handler_played(UnderrunHandler* handler,
+                                  void *out_bfr,
+                                  Py_ssize_t offset,
+                                  Py_ssize_t nframes) nogil
+cdef void underrun_handler_conceal(UnderrunHandler* handler,
+                                   void *out_bfr,
+                                   Py_ssize_t offset,
+                                   Py_ssize_t nframes,
+                                   SampleTime_s* start_time) nogil
+cdef UnderrunPolicy get_underrun_policy(str name) except *
+cdef str get_underrun_policy_name(UnderrunPolicy policy)
+
+cdef class UnderrunReport:
+    cdef readonly uint64_t count
+    cdef readonly uint64_t frames
+    cdef readonly list gaps
+    cdef readonly uint64_t lost_gaps
+
+    @staticmethod
+    cdef UnderrunReport from_handler(UnderrunHandler* handler, uint64_t *next_gap)
@@ -0,0 +1,350 @@
+# cython: language_level=3
+
+cimport cython
+from libc.string cimport memset
+from cpython.mem cimport PyMem_Malloc, PyMem_Free
+
+from cysounddevice.atomic cimport atomic_load_relaxed, atomic_load_acquire, atomic_store_release
+from cysounddevice.conversion cimport pack_samples, unpack_samples
+
+# -----------------------------------------------------------------------------
+# Output underrun handling for the stream callback.
+#
+# When the output SampleBuffer runs dry, the callback hands the frames it
+# could not fill to underrun_handler_conceal and the frames it did fill to
+# underrun_handler_played. Frames are processed in chunks of at most
+# ``hold_frames`` as float32 planes.
+#
+# With UnderrunPolicy_hold and UnderrunPolicy_crossfade the last
+# ``hold_frames`` played are kept in ``history``. During an underrun they
+# are repeated from the oldest frame on, fading out linearly over
+# ``fade_frames`` (``conceal_pos`` counts the frames since the underrun
+# started). With UnderrunPolicy_crossfade the first ``fade_frames`` after
+# the producer resumes are crossfaded from the continuing concealment
+# signal (``resume_pos`` counts them).
+#
+# Each underrun is logged with the SampleTime_s of its first frame. The
+# callback writes the entry before publishing ``gap_count`` with release
+# ordering and then keeps the entry's ``nframes`` up to date.
+# -----------------------------------------------------------------------------
+
+cdef UnderrunHandler* underrun_handler_create(UnderrunPolicy policy,
+                                              SampleFormat* sample_format,
+                                              bint planar,
+                                              Py_ssize_t nchannels,
+                                              Py_ssize_t hold_frames,
+                                              Py_ssize_t fade_frames) except NULL:
+    """Allocate an :c:type:`UnderrunHandler`
+
+    Arguments:
+        policy: The :c:type:`UnderrunPolicy`
+        sample_format: The stream's sample format
+        planar: True if the stream uses the ``non_interleaved`` layout
+        nchannels: Number of output channels
+        hold_frames: Number of frames played to keep for concealment
+            (normally the block size)
+        fade_frames: Length of the fade-out and crossfade. If less than 1,
+            *hold_frames* is used
+    """
+    if nchannels <= 0 or hold_frames <= 0:
+        raise ValueError('nchannels and hold_frames must be greater than zero')
+    cdef UnderrunHandler* handler = <UnderrunHandler*>PyMem_Malloc(sizeof(UnderrunHandler))
+    if handler == NULL:
+        raise MemoryError()
+    memset(handler, 0, sizeof(UnderrunHandler))
+    handler.policy = policy
+    handler.sample_format = sample_format
+    handler.planar = planar
+    handler.nchannels = nchannels
+    handler.hold_frames = hold_frames
+    handler.fade_frames = fade_frames if fade_frames > 0 else hold_frames
+    handler.resume_pos = -1
+    if policy != UnderrunPolicy_zero_fill:
+        handler.history = <float *>PyMem_Malloc(nchannels * hold_frames * sizeof(float))
+        handler.scratch = <float *>PyMem_Malloc(2 * nchannels * hold_frames * sizeof(float))
+        if handler.history == NULL or handler.scratch == NULL:
+            underrun_handler_destroy(handler)
+            raise MemoryError()
+    return handler
+
+cdef void underrun_handler_destroy(UnderrunHandler* handler) except *:
+    if handler.history != NULL:
+        PyMem_Free(handler.history)
+    if handler.scratch != NULL:
+        PyMem_Free(handler.scratch)
+    PyMem_Free(handler)
+
+cdef void _host_to_float(UnderrunHandler* handler, const void *host,
+                         Py_ssize_t offset, Py_ssize_t nframes, float *dest) nogil:
+    """Unpack *nframes* of the host buffer starting at *offset* into planes
+    of ``hold_frames`` starting at *dest*
+    """
+    cdef SampleFormat* fmt = handler.sample_format
+    cdef Py_ssize_t itemsize = fmt.bit_width // 8
+    cdef Py_ssize_t nch = handler.nchannels, stride = handler.hold_frames, c
+    if handler.planar:
+        for c in range(nch):
+            unpack_samples(
+                (<const char **>host)[c] + offset * itemsize, 1, 1,
+                dest + c * stride, 1, 1, 1, nframes, fmt,
+            )
+    else:
+        unpack_samples(
+            <const char *>host + offset * nch * itemsize, 1, nch,
+            dest, stride, 1, nch, nframes, fmt,
+        )
+
+cdef void _float_to_host(UnderrunHandler* handler, const float *src,
+                         void *host, Py_ssize_t offset, Py_ssize_t nframes) nogil:
+    """Pack *nframes* from planes of ``hold_frames`` into the host buffer
+    starting at *offset*
+    """
+    cdef SampleFormat* fmt = handler.sample_format
+    cdef Py_ssize_t itemsize = fmt.bit_width // 8
+    cdef Py_ssize_t nch = handler.nchannels, stride = handler.hold_frames, c
+    if handler.planar:
+        for c in range(nch):
+            pack_samples(
+                src + c * stride, 1, 1,
+                (<char **>host)[c] + offset * itemsize, 1, 1, 1, nframes, fmt,
+            )
+    else:
+        pack_samples(
+            src, stride, 1,
+            <char *>host + offset * nch * itemsize, 1, nch, nch, nframes, fmt,
+        )
+
+cdef void _fill_silence(UnderrunHandler* handler, void *host,
+                        Py_ssize_t offset, Py_ssize_t nframes) nogil:
+    cdef Py_ssize_t itemsize = handler.sample_format.bit_width // 8
+    cdef Py_ssize_t nch = handler.nchannels, c
+    cdef int silence = 0
+    if handler.sample_format.pa_ident == paUInt8:
+        silence = 128
+    if handler.planar:
+        for c in range(nch):
+            memset((<char **>host)[c] + offset * itemsize, silence, nframes * itemsize)
+    else:
+        memset(<char *>host + offset * nch * itemsize, silence, nframes * nch * itemsize)
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+@cython.cdivision(True)
+cdef void _conceal_signal(UnderrunHandler* handler, Py_ssize_t nframes, float *dest) nogil:
+    """Generate *nframes* (up to ``hold_frames``) of the concealment signal
+    from ``conceal_pos`` on
+    """
+    cdef Py_ssize_t stride = handler.hold_frames
+    cdef Py_ssize_t period = handler.history_fill
+    cdef Py_ssize_t start = 0, i, c, j
+    cdef float gain
+    cdef float *src
+    cdef float *dst
+    if period == 0:
+        memset(dest, 0, handler.nchannels * stride * sizeof(float))
+        return
+    if period == stride:
+        # The oldest frame is at the write position once the ring is full
+        start = handler.history_pos
+    for i in range(nframes):
+        j = handler.conceal_pos + i
+        gain = 0
+        if j < handler.fade_frames:
+            gain = <float>(handler.fade_frames - j) / handler.fade_frames
+        src = handler.history + (start + j) % period
+        dst = dest + i
+        for c in range(handler.nchannels):
+            dst[c * stride] = src[c * stride] * gain
+
+cdef void _push_history(UnderrunHandler* handler, const void *host,
+                        Py_ssize_t offset, Py_ssize_t nframes) nogil:
+    """Store the frames played in the ``history`` ring
+    """
+    cdef Py_ssize_t size = handler.hold_frames, n
+    if nframes > size:
+        offset += nframes - size
+        nframes = size
+    while nframes > 0:
+        n = size - handler.history_pos
+        if n > nframes:
+            n = nframes
+        _host_to_float(handler, host, offset, n, handler.history + handler.history_pos)
+        handler.history_pos = (handler.history_pos + n) % size
+        if handler.history_fill < size:
+            handler.history_fill += n
+        offset += n
+        nframes -= n
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+@cython.cdivision(True)
+cdef void _crossfade(UnderrunHandler* handler, void *host,
+                     Py_ssize_t offset, Py_ssize_t nframes) nogil:
+    """Crossfade *nframes* of the host buffer from the concealment signal
+    """
+    cdef Py_ssize_t stride = handler.hold_frames
+    cdef Py_ssize_t nch = handler.nchannels
+    cdef float *conceal = handler.scratch
+    cdef float *data = handler.scratch + nch * stride
+    cdef Py_ssize_t done = 0, n, i, c
+    cdef float w
+    while done < nframes:
+        n = nframes - done
+        if n > stride:
+            n = stride
+        _conceal_signal(handler, n, conceal)
+        _host_to_float(handler, host, offset + done, n, data)
+        for i in range(n):
+            w = <float>(handler.resume_pos + i) / handler.fade_frames
+            for c in range(nch):
+                data[c * stride + i] = data[c * stride + i] * w + conceal[c * stride + i] * (1 - w)
+        _float_to_host(handler, data, host, offset + done, n)
+        handler.conceal_pos += n
+        handler.resume_pos += n
+        done += n
+
+cdef void underrun_handler_played(UnderrunHandler* handler,
+                                  void *out_bfr,
+                                  Py_ssize_t offset,
+                                  Py_ssize_t nframes) nogil:
+    """Called by the stream callback with the *nframes* of *out_bfr* (from
+    *offset*) that were filled from the output buffer
+
+    Ends an underrun, crossfades the first frames after one (for
+    ``UnderrunPolicy_crossfade``) and keeps the frames for concealment
+    """
+    cdef Py_ssize_t n
+    if nframes <= 0:
+        return
+    if handler.active:
+        handler.active = False
+        if handler.policy == UnderrunPolicy_crossfade:
+            handler.resume_pos = 0
+    if handler.resume_pos >= 0:
+        n = handler.fade_frames - handler.resume_pos
+        if n > nframes:
+            n = nframes
+        _crossfade(handler, out_bfr, offset, n)
+        if handler.resume_pos >= handler.fade_frames:
+            handler.resume_pos = -1
+    if handler.policy != UnderrunPolicy_zero_fill:
+        _push_history(handler, out_bfr, offset, nframes)
+
+cdef void underrun_handler_conceal(UnderrunHandler* handler,
+                                   void *out_bfr,
+                                   Py_ssize_t offset,
+                                   Py_ssize_t nframes,
+                                   SampleTime_s* start_time) nogil:
+    """Called by the stream callback to fill the *nframes* of *out_bfr*
+    (from *offset*) that had no data available
+
+    Arguments:
+        handler: The :c:type:`UnderrunHandler`
+        out_bfr: The callback's output buffer
+        offset: The first frame to fill
+        nframes: Number of frames to fill
+        start_time: The stream time of the first frame. It is logged if this
+            starts a new underrun
+    """
+    cdef UnderrunGap* gap
+    cdef uint64_t gap_count = atomic_load_relaxed(&handler.gap_count)
+    cdef Py_ssize_t done = 0, n
+    if nframes <= 0:
+        return
+    if not handler.active:
+        handler.active = True
+        handler.conceal_pos = 0
+        handler.resume_pos = -1
+        gap = &handler.gaps[gap_count % UNDERRUN_LOG_SIZE]
+        copy_sample_time_struct(start_time, &gap.start_time)
+        atomic_store_release(&gap.nframes, 0)
+        gap_count += 1
+        atomic_store_release(&handler.gap_count, gap_count)
+        atomic_store_release(&handler.underruns, atomic_load_relaxed(&handler.underruns) + 1)
+    gap = &handler.gaps[(gap_count - 1) % UNDERRUN_LOG_SIZE]
+
+    if handler.policy != UnderrunPolicy_zero_fill:
+        while done < nframes and handler.conceal_pos < handler.fade_frames:
+            n = nframes - done
+            if n > handler.hold_frames:
+                n = handler.hold_frames
+            _conceal_signal(handler, n, handler.scratch)
+            _float_to_host(handler, handler.scratch, out_bfr, offset + done, n)
+            handler.conceal_pos += n
+            done += n
+    if done < nframes:
+        _fill_silence(handler, out_bfr, offset + done, nframes - done)
+        handler.conceal_pos += nframes - done
+
+    atomic_store_release(&gap.nframes, atomic_load_relaxed(&gap.nframes) + <uint64_t>nframes)
+    atomic_store_release(
+        &handler.underrun_frames,
+        atomic_load_relaxed(&handler.underrun_frames) + <uint64_t>nframes,
+    )
+
+cdef UnderrunPolicy get_underrun_policy(str name) except *:
+    if name == 'zero_fill':
+        return UnderrunPolicy_zero_fill
+    elif name == 'hold':
+        return UnderrunPolicy_hold
+    elif name == 'crossfade':
+        return UnderrunPolicy_crossfade
+    raise ValueError('Invalid underrun_policy: {!r}'.format(name))
+
+cdef str get_underrun_policy_name(UnderrunPolicy policy):
+    if policy == UnderrunPolicy_hold:
+        return 'hold'
+    elif policy == UnderrunPolicy_crossfade:
+        return 'crossfade'
+    return 'zero_fill'
+
+
+cdef class UnderrunReport:
+    """Output underruns recorded by the stream callback
+    (see :meth:`cysounddevice.streams.Stream.underruns`)
+
+    Attributes:
+        count (int): Total number of underruns
+        frames (int): Total number of frames concealed
+        gaps (list): A ``(start_time, nframes)`` tuple for each underrun
+            started since the previous report, where ``start_time`` is the
+            :class:`~cysounddevice.types.SampleTime` of the first frame
+            concealed. The last gap may still be in progress
+        lost_gaps (int): Number of gaps since the previous report that were
+            no longer in the log (it holds the last 64)
+    """
+    @staticmethod
+    cdef UnderrunReport from_handler(UnderrunHandler* handler, uint64_t *next_gap):
+        cdef UnderrunReport obj = UnderrunReport.__new__(UnderrunReport)
+        cdef uint64_t first = next_gap[0]
+        cdef uint64_t count = atomic_load_acquire(&handler.gap_count)
+        cdef uint64_t i
+        cdef UnderrunGap* gap
+        cdef list entries = []
+        obj.count = atomic_load_acquire(&handler.underruns)
+        obj.frames = atomic_load_acquire(&handler.underrun_frames)
+        obj.lost_gaps = 0
+        if count - first > UNDERRUN_LOG_SIZE:
+            obj.lost_gaps = count - first - UNDERRUN_LOG_SIZE
+            first = count - UNDERRUN_LOG_SIZE
+        for i in range(first, count):
+            gap = &handler.gaps[i % UNDERRUN_LOG_SIZE]
+            entries.append((
+                i, SampleTime.from_struct(&gap.start_time),
+                atomic_load_acquire(&gap.nframes),
+            ))
+        # Entries may have been reused by gaps logged while copying
+        cdef uint64_t end = atomic_load_acquire(&handler.gap_count)
+        obj.gaps = []
+        for i, start_time, nframes in entries:
+            if end - i > UNDERRUN_LOG_SIZE:
+                obj.lost_gaps += 1
+            else:
+                obj.gaps.append((start_time, nframes))
+        next_gap[0] = count
+        return obj
+
+    def __repr__(self):
+        return '<{}: count={}, frames={}, gaps={}>'.format(
+            self.__class__.__name__, self.count, self.frames, len(self.gaps),
+        )
@@ -0,0 +1,51 @@
+# cython: language_level=3
+
+from libc.stdint cimport uint64_t
+
+from cysounddevice.pawrapper cimport *
+from cysounddevice.types cimport *
+from cysounddevice.buffer cimport SampleLayout
+from cysounddevice.stream_callback cimport CallbackUserData
+
+cdef PaStreamCallbackFlags get_callback_flags(object flags) except *
+cdef list get_callback_flag_names(PaStreamCallbackFlags flags)
+
+cdef class VirtualDriver:
+    cdef readonly object stream
+    cdef CallbackUserData* user_data
+    cdef PaStreamCallbackTimeInfo time_info
+    cdef SampleFormat* sample_format
+    cdef bint planar
+    cdef readonly int input_channels, output_channels
+    cdef readonly unsigned long block_size
+    cdef readonly double sample_rate
+    cdef readonly PaTime input_latency, output_latency
+    cdef readonly bint realtime, loopback
+    cdef PaStreamCallbackFlags _xrun_flags
+    cdef readonly uint64_t xrun_interval
+    cdef Py_ssize_t itemsize
+    cdef char *in_data
+    cdef char *out_data
+    cdef void **in_planes
+    cdef void **out_planes
+    cdef double start_ts, end_ts
+    cdef uint64_t _callbacks
+    cdef uint64_t _xruns
+    cdef uint64_t _pending_flags
+    cdef uint64_t _running
+    cdef uint64_t _stop
+    cdef int _result
+    cdef object _thread
+
+    cdef void _open(self, CallbackUserData* user_data, SampleFormat* fmt,
+                    SampleLayout layout, int input_channels, int output_channels,
+                    unsigned long block_size, double sample_rate,
+                    PaTime input_latency, PaTime output_latency,
+                    bint realtime, bint loopback,
+                    PaStreamCallbackFlags xrun_flags, uint64_t xrun_interval) except *
+    cdef void _start(self) except *
+    cdef void _close(self) except *
+    cdef void _free_buffers(self)
+    cdef int _drive(self) nogil
+    cdef PaStreamCallbackFlags _next_flags(self, uint64_t callback_index) nogil
+    cdef void _copy_loopback(self) nogil
@@ -0,0 +1,338 @@
+# cython: language_level=3
+
+cimport cython
+from libc.string cimport memcpy, memset
+from cpython.mem cimport PyMem_Malloc, PyMem_Free
+
+from cysounddevice.atomic cimport (
+    atomic_load_relaxed, atomic_load_acquire, atomic_store_release,
+    atomic_compare_exchange,
+)
+from cysounddevice.buffer cimport SampleLayout_non_interleaved
+from cysounddevice.stats cimport monotonic_time
+from cysounddevice.stream_callback cimport _stream_callback
+
+import threading
+
+cdef extern from *:
+    """
+    #if defined(_WIN32)
+    #ifndef NOMINMAX
+    #define NOMINMAX
+    #endif
+    #include <windows.h>
+    static void cysd_sleep(double seconds) {
+        Sleep((DWORD)(seconds * 1000.0));
+    }
+    #else
+    #include <time.h>
+    static void cysd_sleep(double seconds) {
+        struct timespec ts;
+        ts.tv_sec = (time_t)seconds;
+        ts.tv_nsec = (long)((seconds - (double)ts.tv_sec) * 1e9);
+        nanosleep(&ts, NULL);
+    }
+    #endif
+    """
+    void _sleep "cysd_sleep" (double seconds) nogil
+
+# PaStreamCallbackFlags by the names used for the StreamCallback attributes
+CALLBACK_FLAGS = {
+    'input_underflow':1,
+    'input_overflow':2,
+    'output_underflow':4,
+    'output_overflow':8,
+    'priming_output':16,
+}
+
+cdef PaStreamCallbackFlags get_callback_flags(object flags) except *:
+    """Get ``PaStreamCallbackFlags`` from an :class:`int`, a flag name
+    (see :data:`CALLBACK_FLAGS`), an iterable of names or ``None``
+    """
+    cdef PaStreamCallbackFlags result = 0
+    if flags is None:
+        return 0
+    if isinstance(flags, int):
+        return flags
+    if isinstance(flags, str):
+        flags = [flags]
+    for name in flags:
+        if name not in CALLBACK_FLAGS:
+            raise ValueError('Invalid callback flag: {!r}'.format(name))
+        result |= CALLBACK_FLAGS[name]
+    return result
+
+cdef list get_callback_flag_names(PaStreamCallbackFlags flags):
+    return [name for name, flag in CALLBACK_FLAGS.items() if flags & flag]
+
+
+cdef class VirtualDriver:
+    """Drives the stream callback of a :class:`~cysounddevice.streams.Stream`
+    opened on a :class:`~cysounddevice.devices.VirtualDevice`
+
+    A worker thread (running without the GIL) calls the callback with
+    host buffers of :attr:`block_size` frames. The ADC and DAC times passed
+    in the ``PaStreamCallbackTimeInfo`` come from a software clock advanced
+    by one block per callback, offset by :attr:`input_latency` and
+    :attr:`output_latency`.
+
+    If :attr:`realtime` is True, each callback waits until its block is due
+    on the monotonic clock. Otherwise callbacks run back to back, so
+    :attr:`frames_per_second` is the most the stream and its consumers can
+    sustain.
+
+    Instances are created by the stream and are available as
+    :attr:`cysounddevice.streams.Stream.virtual_driver`.
+
+    Arguments:
+        stream (Stream):
+
+    Attributes:
+        input_channels (int): Number of input channels
+        output_channels (int): Number of output channels
+        block_size (int): Number of frames per callback
+        sample_rate (float): Sample rate of the stream
+        input_latency (float): Time between the ADC time of each input
+            block and the callback
+        output_latency (float): Time between the callback and the DAC time
+            of each output block
+        realtime (bool): Whether callbacks are paced by the sample rate
+        loopback (bool): If True, the input of each callback is the output
+            of the previous one (for as many channels as both have).
+            Otherwise the input is silence
+        xrun_flags (list): Names of the flags (see :data:`CALLBACK_FLAGS`)
+            passed to the callback once every :attr:`xrun_interval` callbacks
+        xrun_interval (int): Interval for :attr:`xrun_flags` in callbacks.
+            ``0`` if disabled
+        running (bool): True while the worker thread is calling the callback
+        callbacks (int): Number of callbacks made since the stream was opened
+        frames (int): Number of frames processed since the stream was opened
+        xruns (int): Number of callbacks given any status flags
+        elapsed (float): Seconds from the first callback until now (or until
+            the driver stopped)
+        frames_per_second (float): Average rate at which frames were processed
+        result (int): The ``PaStreamCallbackResult`` that stopped the driver,
+            or ``-1``
+    """
+    def __cinit__(self, stream):
+        self.stream = stream
+        self.user_data = NULL
+        self.in_data = NULL
+        self.out_data = NULL
+        self.in_planes = NULL
+        self.out_planes = NULL
+        self._callbacks = 0
+        self._xruns = 0
+        self._pending_flags = 0
+        self._running = 0
+        self._stop = 0
+        self._result = -1
+        self._thread = None
+    def __dealloc__(self):
+        self._free_buffers()
+
+    @property
+    def xrun_flags(self):
+        return get_callback_flag_names(self._xrun_flags)
+    @property
+    def opened(self):
+        return self.user_data != NULL
+    @property
+    def running(self):
+        return atomic_load_acquire(&self._running) != 0
+    @property
+    def callbacks(self):
+        return atomic_load_acquire(&self._callbacks)
+    @property
+    def frames(self):
+        return atomic_load_acquire(&self._callbacks) * self.block_size
+    @property
+    def xruns(self):
+        return atomic_load_acquire(&self._xruns)
+    @property
+    def elapsed(self):
+        if self.start_ts == 0:
+            return 0.
+        if self.running:
+            return monotonic_time() - self.start_ts
+        return self.end_ts - self.start_ts
+    @property
+    def frames_per_second(self):
+        cdef double elapsed = self.elapsed
+        if elapsed <= 0:
+            return 0.
+        return self.frames / elapsed
+    @property
+    def result(self):
+        return self._result
+
+    def inject_xrun(self, flags):
+        """Pass the given status flags to the next callback
+
+        Arguments:
+            flags: A flag name (see :data:`CALLBACK_FLAGS`), a list of names
+                or the ``PaStreamCallbackFlags`` as an :class:`int`
+        """
+        cdef uint64_t value = get_callback_flags(flags)
+        cdef uint64_t expected = atomic_load_relaxed(&self._pending_flags)
+        while not atomic_compare_exchange(&self._pending_flags, &expected, expected | value):
+            pass
+
+    cdef void _open(self, CallbackUserData* user_data, SampleFormat* fmt,
+                    SampleLayout layout, int input_channels, int output_channels,
+                    unsigned long block_size, double sample_rate,
+                    PaTime input_latency, PaTime output_latency,
+                    bint realtime, bint loopback,
+                    PaStreamCallbackFlags xrun_flags, uint64_t xrun_interval) except *:
+        cdef Py_ssize_t c
+        self._close()
+        if block_size == 0:
+            block_size = 512
+        self.sample_format = fmt
+        self.planar = layout == SampleLayout_non_interleaved
+        self.input_channels = input_channels
+        self.output_channels = output_channels
+        self.block_size = block_size
+        self.sample_rate = sample_rate
+        self.input_latency = input_latency
+        self.output_latency = output_latency
+        self.realtime = realtime
+        self.loopback = loopback
+        self._xrun_flags = xrun_flags
+        self.xrun_interval = xrun_interval
+        self.itemsize = fmt.bit_width // 8
+        if input_channels > 0:
+            self.in_data = <char *>PyMem_Malloc(block_size * input_channels * self.itemsize)
+            self.in_planes = <void **>PyMem_Malloc(input_channels * sizeof(void*))
+            if self.in_data == NULL or self.in_planes == NULL:
+                self._free_buffers()
+                raise MemoryError()
+            memset(self.in_data, 0, block_size * input_channels * self.itemsize)
+            for c in range(input_channels):
+                self.in_planes[c] = self.in_data + c * block_size * self.itemsize
+        if output_channels > 0:
+            self.out_data = <char *>PyMem_Malloc(block_size * output_channels * self.itemsize)
+            self.out_planes = <void **>PyMem_Malloc(output_channels * sizeof(void*))
+            if self.out_data == NULL or self.out_planes == NULL:
+                self._free_buffers()
+                raise MemoryError()
+            memset(self.out_data, 0, block_size * output_channels * self.itemsize)
+            for c in range(output_channels):
+                self.out_planes[c] = self.out_data + c * block_size * self.itemsize
+        memset(&self.time_info, 0, sizeof(PaStreamCallbackTimeInfo))
+        self._callbacks = 0
+        self._xruns = 0
+        self._pending_flags = 0
+        self._result = -1
+        self.start_ts = 0
+        self.end_ts = 0
+        self.user_data = user_data
+
+    cdef void _start(self) except *:
+        if self.user_data == NULL:
+            raise RuntimeError('Driver is not open')
+        if self._thread is not None:
+            raise RuntimeError('Driver is already running')
+        self._stop = 0
+        self._running = 1
+        self.start_ts = monotonic_time()
+        self._thread = threading.Thread(target=self._run, name='VirtualDriver')
+        self._thread.daemon = True
+        self._thread.start()
+
+    cdef void _close(self) except *:
+        if self._thread is not None:
+            atomic_store_release(&self._stop, 1)
+            self._thread.join()
+            self._thread = None
+        self.user_data = NULL
+        self._free_buffers()
+
+    cdef void _free_buffers(self):
+        PyMem_Free(self.in_data)
+        PyMem_Free(self.out_data)
+        PyMem_Free(self.in_planes)
+        PyMem_Free(self.out_planes)
+        self.in_data = NULL
+        self.out_data = NULL
+        self.in_planes = NULL
+        self.out_planes = NULL
+
+    def _run(self):
+        with nogil:
+            self._drive()
+
+    @cython.cdivision(True)
+    cdef int _drive(self) nogil:
+        """Call the stream callback until it stops the stream or
+        :meth:`_close` is called
+        """
+        cdef uint64_t n = 0
+        cdef double block_time = self.block_size / self.sample_rate
+        cdef double stream_time, wait
+        cdef PaStreamCallbackFlags flags
+        cdef const void *in_bfr = self.in_data
+        cdef void *out_bfr = self.out_data
+        cdef int r = paContinue
+        if self.planar:
+            in_bfr = self.in_planes
+            out_bfr = self.out_planes
+        while atomic_load_acquire(&self._stop) == 0:
+            stream_time = self.start_ts + n * block_time
+            if self.realtime:
+                wait = stream_time - monotonic_time()
+                if wait > 0:
+                    _sleep(wait)
+            self.time_info.currentTime = stream_time
+            self.time_info.inputBufferAdcTime = stream_time - self.input_latency
+            self.time_info.outputBufferDacTime = stream_time + self.output_latency
+            flags = self._next_flags(n)
+            if flags != 0:
+                atomic_store_release(&self._xruns, self._xruns + 1)
+            if self.loopback and n > 0:
+                self._copy_loopback()
+            r = _stream_callback(
+                in_bfr, out_bfr, self.block_size, &self.time_info, flags, self.user_data,
+            )
+            n += 1
+            atomic_store_release(&self._callbacks, n)
+            if r != paContinue:
+                self._result = r
+                break
+        self.end_ts = monotonic_time()
+        atomic_store_release(&self._running, 0)
+        return r
+
+    cdef PaStreamCallbackFlags _next_flags(self, uint64_t callback_index) nogil:
+        cdef uint64_t pending = atomic_load_relaxed(&self._pending_flags)
+        cdef PaStreamCallbackFlags flags = 0
+        while pending != 0:
+            if atomic_compare_exchange(&self._pending_flags, &pending, 0):
+                flags = pending
+                break
+        if self.xrun_interval > 0 and (callback_index + 1) % self.xrun_interval == 0:
+            flags |= self._xrun_flags
+        return flags
+
+    cdef void _copy_loopback(self) nogil:
+        """Copy the previous callback's output to the input host buffer
+        """
+        cdef Py_ssize_t nchannels = self.input_channels, c, i
+        cdef Py_ssize_t itemsize = self.itemsize
+        cdef Py_ssize_t nframes = self.block_size
+        if self.output_channels < nchannels:
+            nchannels = self.output_channels
+        if nchannels == 0:
+            return
+        if self.planar:
+            for c in range(nchannels):
+                memcpy(self.in_planes[c], self.out_planes[c], nframes * itemsize)
+        elif self.input_channels == self.output_channels:
+            memcpy(self.in_data, self.out_data, nframes * nchannels * itemsize)
+        else:
+            for i in range(nframes):
+                memcpy(
+                    self.in_data + i * self.input_channels * itemsize,
+                    self.out_data + i * self.output_channels * itemsize,
+                    nchannels * itemsize,
+                )
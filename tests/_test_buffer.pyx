@@ -2,7 +2,10 @@
 # distutils: include_dirs=NUMPY_INCLUDE
 
 import time
+import threading
 
+from libc.stdlib cimport malloc, free
+from libc.stdint cimport uint64_t
 from cython cimport view
 from cpython cimport array
 import array
@@ -10,15 +13,41 @@ import numpy as np
 cimport numpy as np
 
 from cysounddevice.types cimport *
+from cysounddevice.atomic cimport atomic_load_acquire, atomic_store_release, thread_yield
 from cysounddevice.buffer cimport (
     SampleBuffer,
     BufferItem,
+    SampleLayout,
+    SampleLayout_deinterleaved,
+    SampleLayout_interleaved,
+    SampleLayout_non_interleaved,
+    OverflowPolicy_drop_newest,
+    OverflowPolicy_overwrite_oldest,
     sample_buffer_create,
     sample_buffer_destroy,
+    sample_buffer_read_available,
+    sample_buffer_write_available,
     sample_buffer_write,
     sample_buffer_read,
     sample_buffer_read_sf32,
+    sample_buffer_write_sf32,
+    sample_buffer_read_frames_sf32,
+    sample_buffer_write_frames_sf32,
+    sample_buffer_read_available_frames,
+    sample_buffer_write_available_frames,
+    sample_buffer_write_from_callback,
+    sample_buffer_read_from_callback,
+    sample_buffer_check_overflow,
+    sample_buffer_borrow_read,
+    sample_buffer_release_read,
+    sample_buffer_acquire_write,
+    sample_buffer_commit_write,
+    sample_buffer_write_many_sf32,
+    sample_buffer_read_many_sf32,
+    BufferItemView,
 )
+from cysounddevice.recorder cimport StreamRecorder
+from cysounddevice.playback cimport FilePlayer
 
 cdef bint check_char_array(float[:,:] arr_view, void *data_ptr, Py_ssize_t length) except *:
     # print('check_char_array')
@@ -126,23 +155,22 @@ cdef bint _test() except *:
             assert bfr_item.nchannels == nchannels
             assert bfr_item.total_size == itemsize * block_size * nchannels
             assert bfr_item.start_time.block == i
+            assert bfr_item.bfr == &bfr.slab[i * bfr.item_stride]
+            assert <size_t>bfr_item.bfr % 64 == 0
 
-        assert bfr.write_available == write_available
+        assert sample_buffer_write_available(bfr) == write_available
         for i in range(length):
             print('write: {}'.format(i))
             # sarray_ptr = <char *>sarray[i]
             # _sarray_view[:] = sarray_view[i,:]
             sarray_write = np.vstack((sarray[i], sarray[i]))
             sarray_write[1] *= -1
-            assert bfr.write_index == i
+            assert bfr.write_count == i * block_size
             # write_result = sample_buffer_write(bfr, &_sarray_view[0], block_size)
             write_result = test_write(bfr, sarray_write)
             assert write_result == 1
-            assert bfr.read_index == 0
-            if i == length - 1:
-                assert bfr.write_index == 0
-            else:
-                assert bfr.write_index == i + 1
+            assert bfr.read_count == 0
+            assert bfr.write_count == (i + 1) * block_size
             bfr_item = &bfr.items[i]
             # print('check: {}'.format(i))
             sarray_temp = np.vstack((sarray[i], sarray[i]))
@@ -150,19 +178,20 @@ cdef bint _test() except *:
             assert check_char_array(sarray_temp, bfr_item.bfr, block_size)
             write_available -= 1
             read_available += 1
-            assert bfr.write_available == write_available
-            assert bfr.read_available == read_available
+            assert sample_buffer_write_available(bfr) == write_available
+            assert sample_buffer_read_available(bfr) == read_available
             bfr.current_block += 1
             # time.sleep(.1)
         # time.sleep(.1)
         # print('filled')
         # time.sleep(.5)
-        assert bfr.write_available == 0
-        assert bfr.read_available == length
+        assert sample_buffer_write_available(bfr) == 0
+        assert sample_buffer_read_available(bfr) == length
+        assert test_write(bfr, np.vstack((sarray[0], sarray[0]))) == 0
 
         for i in range(length):
             print('read: {}'.format(i))
-            assert bfr.read_index == i
+            assert bfr.read_count == i * block_size
             # time.sleep(.1)
             sarray_read = np.vstack((sarray[i], sarray[i]))
             sarray_read[1] *= -1
@@ -171,14 +200,11 @@ cdef bint _test() except *:
             assert read_start_time != NULL
             # print('read complete')
             # time.sleep(.1)
-            if i == length - 1:
-                assert bfr.read_index == 0
-            else:
-                assert bfr.read_index == i + 1
+            assert bfr.read_count == (i + 1) * block_size
             write_available += 1
             read_available -= 1
-            assert bfr.write_available == write_available
-            assert bfr.read_available == read_available
+            assert sample_buffer_write_available(bfr) == write_available
+            assert sample_buffer_read_available(bfr) == read_available
             assert read_start_time.block == i
             bfr_item = &bfr.items[i]
             sarray_temp = np.vstack((sarray[i], sarray[i]))
@@ -206,5 +232,277 @@ cdef bint _test() except *:
 def test():
     return _test()
 
+
+cdef class StressTest:
+    """Hammer a :c:type:`SampleBuffer` from a producer and a consumer thread
+
+    Each block written contains ``seq + i`` for sample ``i`` so the consumer
+    can verify that no blocks were lost, duplicated or reordered.
+    """
+    cdef SampleBuffer* bfr
+    cdef readonly Py_ssize_t num_items, block_size, nchannels
+    cdef readonly Py_ssize_t items_read, items_written
+    cdef readonly Py_ssize_t data_errors, time_errors
+    cdef uint64_t stop_flag
+    def __cinit__(self, Py_ssize_t num_items, Py_ssize_t length, Py_ssize_t block_size, Py_ssize_t nchannels):
+        cdef SampleTime s = SampleTime(0, 0, block_size, 48000)
+        self.num_items = num_items
+        self.block_size = block_size
+        self.nchannels = nchannels
+        self.items_read = 0
+        self.items_written = 0
+        self.data_errors = 0
+        self.time_errors = 0
+        self.stop_flag = 0
+        self.bfr = sample_buffer_create(s.data, length, nchannels, &SampleFormats.sf_float32)
+    def __dealloc__(self):
+        if self.bfr != NULL:
+            sample_buffer_destroy(self.bfr)
+            self.bfr = NULL
+
+    def run(self, float timeout=60):
+        """Run both threads until all items are transferred or *timeout*
+        has elapsed
+
+        Returns True if both threads completed
+        """
+        producer = threading.Thread(target=self.run_producer)
+        consumer = threading.Thread(target=self.run_consumer)
+        consumer.start()
+        producer.start()
+        producer.join(timeout)
+        consumer.join(timeout)
+        completed = not producer.is_alive() and not consumer.is_alive()
+        atomic_store_release(&self.stop_flag, 1)
+        producer.join()
+        consumer.join()
+        return completed
+
+    def run_producer(self):
+        cdef float *data = <float *>malloc(sizeof(float) * self.block_size * self.nchannels)
+        if data == NULL:
+            raise MemoryError()
+        try:
+            with nogil:
+                self._produce(data)
+        finally:
+            free(data)
+
+    def run_consumer(self):
+        cdef float *data = <float *>malloc(sizeof(float) * self.block_size * self.nchannels)
+        if data == NULL:
+            raise MemoryError()
+        try:
+            with nogil:
+                self._consume(data)
+        finally:
+            free(data)
+
+    cdef void _produce(self, float *data) nogil:
+        cdef Py_ssize_t seq, i, n = self.block_size * self.nchannels
+        for seq in range(self.num_items):
+            for i in range(n):
+                data[i] = <float>(seq + i)
+            while sample_buffer_write(self.bfr, data, self.block_size) == 0:
+                if atomic_load_acquire(&self.stop_flag):
+                    return
+                thread_yield()
+            self.bfr.current_block += 1
+            self.items_written += 1
+
+    cdef void _consume(self, float *data) nogil:
+        cdef Py_ssize_t seq, i, n = self.block_size * self.nchannels
+        cdef SampleTime_s* start_time
+        for seq in range(self.num_items):
+            start_time = sample_buffer_read(self.bfr, <char *>data, self.block_size)
+            while start_time == NULL:
+                if atomic_load_acquire(&self.stop_flag):
+                    return
+                thread_yield()
+                start_time = sample_buffer_read(self.bfr, <char *>data, self.block_size)
+            if start_time.block != seq:
+                self.time_errors += 1
+            for i in range(n):
+                if data[i] != <float>(seq + i):
+                    self.data_errors += 1
+                    break
+            self.items_read += 1
+
 if __name__ == '__main__':
     test()
+
+
+def sample_time_array(Py_ssize_t length):
+    return sample_time_array_create(length)
+
+cdef class ItemViewTest:
+    """Access a :c:type:`SampleBuffer` through :class:`BufferItemView` objects
+    """
+    cdef SampleBuffer* bfr
+    def __cinit__(self, str sample_format, Py_ssize_t nchannels, Py_ssize_t block_size,
+                  Py_ssize_t length, str layout='deinterleaved'):
+        cdef SampleTime s = SampleTime(0, 0, block_size, 48000)
+        cdef SampleFormat* fmt = get_sample_format_by_name(sample_format)
+        cdef SampleLayout _layout = SampleLayout_deinterleaved
+        if layout == 'interleaved':
+            _layout = SampleLayout_interleaved
+        elif layout == 'non_interleaved':
+            _layout = SampleLayout_non_interleaved
+        self.bfr = sample_buffer_create(s.data, length, nchannels, fmt, False, _layout)
+    def __dealloc__(self):
+        if self.bfr != NULL:
+            sample_buffer_destroy(self.bfr)
+            self.bfr = NULL
+    def acquire(self):
+        cdef BufferItem* item = sample_buffer_acquire_write(self.bfr)
+        if item == NULL:
+            return None
+        return BufferItemView.from_item(item, None, True)
+    def commit(self):
+        sample_buffer_commit_write(self.bfr)
+        self.bfr.current_block += 1
+    def borrow(self):
+        cdef BufferItem* item = sample_buffer_borrow_read(self.bfr)
+        cdef BufferItemView view
+        if item == NULL:
+            return None
+        view = BufferItemView.from_item(item, None, False)
+        view.discontinuity = self.bfr.read_gap != 0
+        return view
+    def release(self):
+        sample_buffer_release_read(self.bfr)
+    cdef Py_ssize_t _nblocks(self, float[:,:,:] data):
+        if self.bfr.layout == SampleLayout_interleaved:
+            return data.shape[0]
+        return data.shape[1]
+    def write_many(self, float[:,:,:] data, times=None):
+        if times is None:
+            times = sample_time_array_create(self._nblocks(data))
+        cdef Py_ssize_t count = sample_buffer_write_many_sf32(self.bfr, data, times)
+        self.bfr.current_block += count
+        return count, times[:count]
+    def read_many(self, float[:,:,:] data, times=None):
+        if times is None:
+            times = sample_time_array_create(self._nblocks(data))
+        cdef Py_ssize_t count = sample_buffer_read_many_sf32(self.bfr, data, times)
+        return count, times[:count]
+    def read_sf32(self, float[:,:] data):
+        cdef SampleTime_s* st = sample_buffer_read_sf32(self.bfr, data)
+        if st == NULL:
+            return None
+        return SampleTime.from_struct(st)
+    def write_sf32(self, float[:,:] data):
+        cdef int r = sample_buffer_write_sf32(self.bfr, data)
+        if r == 1:
+            self.bfr.current_block += 1
+        return r
+    def write_frames(self, float[:,:] data):
+        return sample_buffer_write_frames_sf32(self.bfr, data)
+    def read_frames(self, float[:,:] data):
+        cdef Py_ssize_t count = sample_buffer_read_frames_sf32(self.bfr, data)
+        if count == 0:
+            return 0, None
+        return count, SampleTime.from_struct(&self.bfr.read_time)
+    @property
+    def read_available_frames(self):
+        return sample_buffer_read_available_frames(self.bfr)
+    @property
+    def write_available_frames(self):
+        return sample_buffer_write_available_frames(self.bfr)
+    @property
+    def overflow_policy(self):
+        if self.bfr.overflow_policy == OverflowPolicy_overwrite_oldest:
+            return 'overwrite_oldest'
+        return 'drop_newest'
+    @overflow_policy.setter
+    def overflow_policy(self, str value):
+        if value == 'overwrite_oldest':
+            self.bfr.overflow_policy = OverflowPolicy_overwrite_oldest
+        else:
+            self.bfr.overflow_policy = OverflowPolicy_drop_newest
+    @property
+    def dropped_frames(self):
+        return self.bfr.dropped_frames
+    @property
+    def dropped_blocks(self):
+        return self.bfr.dropped_blocks
+    @property
+    def read_gap(self):
+        return self.bfr.read_gap
+    def record(self, filename, **kwargs):
+        """Start a :class:`StreamRecorder` reading from the buffer
+
+        The recorder must be stopped before this object is deallocated
+        """
+        cdef StreamRecorder recorder = StreamRecorder(None, filename, **kwargs)
+        recorder._start(self.bfr, 48000)
+        return recorder
+    def play(self, filename, **kwargs):
+        """Start a :class:`FilePlayer` writing to the buffer
+
+        The player must be stopped before this object is deallocated
+        """
+        cdef FilePlayer player = FilePlayer(None, filename, **kwargs)
+        player._start(self.bfr, 48000)
+        return player
+    def write_from_callback(self, list channel_data, Py_ssize_t nframes=-1):
+        """Write raw data as the stream callback would
+
+        *channel_data* holds one bytes object per channel for non-interleaved
+        buffers or a single interleaved bytes object otherwise
+        """
+        cdef Py_ssize_t i, nplanes = len(channel_data)
+        cdef const char **planes = <const char **>malloc(sizeof(char*) * nplanes)
+        cdef const void *data
+        cdef int r
+        if planes == NULL:
+            raise MemoryError()
+        try:
+            for i in range(nplanes):
+                planes[i] = <bytes>channel_data[i]
+            if self.bfr.layout == SampleLayout_non_interleaved:
+                data = <const void *>planes
+            else:
+                data = <const void *>planes[0]
+            if nframes < 0:
+                nframes = self.bfr.item_length
+            r = 0
+            if sample_buffer_check_overflow(self.bfr, nframes):
+                r = sample_buffer_write_from_callback(self.bfr, data, nframes, 0)
+        finally:
+            free(planes)
+        # The callback counts its frames whether or not they were written
+        self.bfr.callback_frame += nframes
+        self.bfr.current_block = self.bfr.start_block + self.bfr.callback_frame // self.bfr.item_length
+        return r
+    def read_from_callback(self, Py_ssize_t nframes=-1):
+        """Read raw data as the stream callback would
+
+        Returns a list in the same form as :meth:`write_from_callback` takes
+        or None if the buffer is empty
+        """
+        cdef BufferItem* item = &self.bfr.items[0]
+        cdef bint planar = self.bfr.layout == SampleLayout_non_interleaved
+        cdef Py_ssize_t i, nplanes = item.nchannels if planar else 1
+        if nframes < 0:
+            nframes = item.length
+        cdef Py_ssize_t total_size = nframes * item.nchannels * item.itemsize
+        cdef Py_ssize_t plane_size = total_size // nplanes
+        cdef bytearray result = bytearray(total_size)
+        cdef char *result_p = result
+        cdef char **planes = <char **>malloc(sizeof(char*) * nplanes)
+        cdef SampleTime_s* st
+        if planes == NULL:
+            raise MemoryError()
+        try:
+            for i in range(nplanes):
+                planes[i] = result_p + i * plane_size
+            if planar:
+                st = sample_buffer_read_from_callback(self.bfr, <char *>planes, nframes, 0)
+            else:
+                st = sample_buffer_read_from_callback(self.bfr, planes[0], nframes, 0)
+        finally:
+            free(planes)
+        if st == NULL:
+            return None
+        return [bytes(result[i*plane_size:(i+1)*plane_size]) for i in range(nplanes)]
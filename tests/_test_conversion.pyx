@@ -5,6 +5,7 @@ import numpy as np
 cimport numpy as np
 
 cimport cython
+from libc.string cimport memcpy
 
 from cysounddevice.types cimport *
 from cysounddevice cimport buffer
@@ -45,6 +46,17 @@ cdef class BufferWrapper:
         cdef BufferItem* item = self.buffer_item
         conversion.unpack_buffer_item(item, dest)
 
+    cpdef bytes pack_to_bytes(self, float[:,:] src):
+        cdef BufferItem* item = self.buffer_item
+        conversion.pack_buffer_item(item, src)
+        return item.bfr[:item.total_size]
+
+    cpdef unpack_from_bytes(self, bytes data, float[:,:] dest):
+        cdef BufferItem* item = self.buffer_item
+        assert len(data) == item.total_size
+        memcpy(item.bfr, <char *>data, item.total_size)
+        conversion.unpack_buffer_item(item, dest)
+
     cpdef np.ndarray[FLOAT32_DTYPE_t, ndim=2] unpack_buffer_item(self):
         cdef BufferItem* item = self.buffer_item
         cdef np.ndarray[FLOAT32_DTYPE_t, ndim=2] dest = np.empty(
@@ -0,0 +1,329 @@
+# cython: language_level=3
+
+cimport cython
+from libc.stdlib cimport malloc, free
+from libc.string cimport memset
+from libc.stdint cimport uint64_t
+
+from cysounddevice.pawrapper cimport *
+from cysounddevice.types cimport *
+from cysounddevice.buffer cimport (
+    SampleBuffer,
+    SampleLayout,
+    SampleLayout_interleaved,
+    SampleLayout_non_interleaved,
+    sample_buffer_create,
+    sample_buffer_destroy,
+    sample_buffer_read_sf32,
+    sample_buffer_write_sf32,
+    sample_buffer_write_frames_sf32,
+)
+from cysounddevice.conversion cimport pack_samples, unpack_samples
+from cysounddevice.processing cimport *
+from cysounddevice.stream_callback cimport (
+    CallbackUserData,
+    CallbackError_none,
+    CallbackError_process_aborted,
+    _stream_callback,
+)
+from cysounddevice.stats cimport (
+    StreamStats, callback_stats_init, callback_stats_request_reset,
+)
+from cysounddevice.clock cimport StreamClock, clock_estimator_init
+from cysounddevice.underrun cimport (
+    UnderrunReport, underrun_handler_create, underrun_handler_destroy,
+    get_underrun_policy,
+)
+
+PA_CONTINUE = paContinue
+PA_ABORT = paAbort
+
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+cdef int gain_process(void *state,
+                      const float **inputs,
+                      float **outputs,
+                      int input_channels,
+                      int output_channels,
+                      unsigned long nframes,
+                      const SampleTime_s *sample_time) nogil:
+    """Add each input channel (scaled by the gain in *state*) to the outputs
+    """
+    cdef float gain = (<float *>state)[0]
+    cdef int c
+    cdef unsigned long i
+    if input_channels == 0:
+        return 0
+    for c in range(output_channels):
+        for i in range(nframes):
+            outputs[c][i] = outputs[c][i] + inputs[c % input_channels][i] * gain
+    return 0
+
+def gain_process_address():
+    return <size_t>gain_process
+
+cdef int abort_process(void *state,
+                       const float **inputs,
+                       float **outputs,
+                       int input_channels,
+                       int output_channels,
+                       unsigned long nframes,
+                       const SampleTime_s *sample_time) nogil:
+    """Ask the callback to abort the stream
+    """
+    return 1
+
+
+cdef class ProcessHookTest:
+    """Runs a :c:type:`ProcessHook` on host buffers built from float arrays
+
+    Uses :c:func:`gain_process` unless *func* is given
+    """
+    cdef ProcessHook* hook
+    cdef SampleFormat* sample_format
+    cdef readonly bint planar
+    cdef readonly int nchannels
+    cdef public float gain
+    def __cinit__(self, str sample_format, bint planar, int nchannels,
+                  Py_ssize_t max_frames, Py_ssize_t block_size=64,
+                  func=None, state=None):
+        cdef SampleTime st = SampleTime(0, 0, block_size, 48000)
+        cdef ProcessFunc func_ptr = gain_process
+        cdef void *state_ptr = &self.gain
+        self.hook = NULL
+        self.gain = 1
+        self.sample_format = get_sample_format_by_name(sample_format)
+        self.planar = planar
+        self.nchannels = nchannels
+        if func is not None:
+            func_ptr = <ProcessFunc>get_address(func)
+            state_ptr = <void *>get_address(state)
+        self.hook = process_hook_create(
+            func_ptr, state_ptr, self.sample_format, planar,
+            nchannels, nchannels, max_frames, &st.data,
+        )
+    def __dealloc__(self):
+        if self.hook != NULL:
+            process_hook_destroy(self.hook)
+            self.hook = NULL
+
+    def run(self, float[:,::1] inputs, float[:,::1] outputs, bint clear_output=False):
+        """Pack *inputs* and *outputs* (nchannels, nframes) to the host format,
+        run the hook and unpack the result back into *outputs*
+
+        Returns the value from :c:func:`process_hook_run`
+        """
+        cdef SampleFormat* fmt = self.sample_format
+        cdef Py_ssize_t nch = self.nchannels, nframes = inputs.shape[1], c
+        cdef Py_ssize_t itemsize = fmt.bit_width // 8
+        cdef char *in_data = <char *>malloc(nch * nframes * itemsize)
+        cdef char *out_data = <char *>malloc(nch * nframes * itemsize)
+        cdef void *in_planes[64]
+        cdef void *out_planes[64]
+        cdef void *in_bfr = in_data
+        cdef void *out_bfr = out_data
+        cdef int r
+        assert nch <= 64
+        try:
+            if self.planar:
+                for c in range(nch):
+                    in_planes[c] = in_data + c * nframes * itemsize
+                    out_planes[c] = out_data + c * nframes * itemsize
+                in_bfr = in_planes
+                out_bfr = out_planes
+                pack_samples(&inputs[0,0], nframes, 1, in_data, nframes, 1, nch, nframes, fmt)
+                pack_samples(&outputs[0,0], nframes, 1, out_data, nframes, 1, nch, nframes, fmt)
+            else:
+                pack_samples(&inputs[0,0], nframes, 1, in_data, 1, nch, nch, nframes, fmt)
+                pack_samples(&outputs[0,0], nframes, 1, out_data, 1, nch, nch, nframes, fmt)
+            if clear_output:
+                process_hook_clear_output(self.hook, out_bfr, nframes)
+            r = process_hook_run(self.hook, in_bfr, out_bfr, nframes, 1.)
+            if self.planar:
+                unpack_samples(out_data, nframes, 1, &outputs[0,0], nframes, 1, nch, nframes, fmt)
+            else:
+                unpack_samples(out_data, 1, nch, &outputs[0,0], nframes, 1, nch, nframes, fmt)
+        finally:
+            free(in_data)
+            free(out_data)
+        return r
+
+
+cdef class CallbackTest:
+    """Calls :c:func:`_stream_callback` with a :c:type:`ProcessHook` installed,
+    as PortAudio would for a full duplex stream
+
+    Uses :c:func:`gain_process` (or :c:func:`abort_process` if *abort* is True)
+    with ``interleaved`` or ``non_interleaved`` host buffers
+    """
+    cdef CallbackUserData user_data
+    cdef SampleFormat* sample_format
+    cdef PaStreamCallbackTimeInfo time_info
+    cdef char *in_data
+    cdef char *out_data
+    cdef void **in_planes
+    cdef void **out_planes
+    cdef readonly bint planar
+    cdef readonly int nchannels
+    cdef readonly Py_ssize_t block_size
+    cdef public float gain
+    cdef uint64_t next_gap
+    def __cinit__(self, str sample_format, bint planar, int nchannels,
+                  Py_ssize_t block_size, Py_ssize_t length=8, bint abort=False,
+                  str underrun_policy=None, Py_ssize_t fade_frames=0):
+        cdef SampleTime st = SampleTime(0, 0, block_size, 48000)
+        cdef SampleLayout layout = SampleLayout_interleaved
+        cdef ProcessFunc func = gain_process
+        cdef Py_ssize_t itemsize, c
+        memset(&self.user_data, 0, sizeof(CallbackUserData))
+        memset(&self.time_info, 0, sizeof(PaStreamCallbackTimeInfo))
+        self.in_data = NULL
+        self.out_data = NULL
+        self.in_planes = NULL
+        self.out_planes = NULL
+        self.sample_format = get_sample_format_by_name(sample_format)
+        self.planar = planar
+        self.nchannels = nchannels
+        self.block_size = block_size
+        self.gain = 1
+        if planar:
+            layout = SampleLayout_non_interleaved
+        if abort:
+            func = abort_process
+        itemsize = self.sample_format.bit_width // 8
+        self.in_data = <char *>malloc(nchannels * block_size * itemsize)
+        self.out_data = <char *>malloc(nchannels * block_size * itemsize)
+        self.in_planes = <void **>malloc(nchannels * sizeof(void *))
+        self.out_planes = <void **>malloc(nchannels * sizeof(void *))
+        if (self.in_data == NULL or self.out_data == NULL or
+                self.in_planes == NULL or self.out_planes == NULL):
+            raise MemoryError()
+        for c in range(nchannels):
+            self.in_planes[c] = self.in_data + c * block_size * itemsize
+            self.out_planes[c] = self.out_data + c * block_size * itemsize
+
+        self.user_data.input_channels = nchannels
+        self.user_data.output_channels = nchannels
+        self.user_data.error_status = CallbackError_none
+        self.user_data.notify_fd = -1
+        callback_stats_init(&self.user_data.stats, 48000)
+        clock_estimator_init(&self.user_data.input_clock, 48000, .2)
+        clock_estimator_init(&self.user_data.output_clock, 48000, .2)
+        self.user_data.in_buffer = sample_buffer_create(
+            st.data, length, nchannels, self.sample_format, False, layout,
+        )
+        self.user_data.out_buffer = sample_buffer_create(
+            st.data, length, nchannels, self.sample_format, False, layout,
+        )
+        self.user_data.process_hook = process_hook_create(
+            func, &self.gain, self.sample_format, planar,
+            nchannels, nchannels, block_size, &st.data,
+        )
+        self.next_gap = 0
+        if underrun_policy is not None:
+            self.user_data.underrun = underrun_handler_create(
+                get_underrun_policy(underrun_policy), self.sample_format,
+                planar, nchannels, block_size, fade_frames,
+            )
+    def __dealloc__(self):
+        if self.user_data.in_buffer != NULL:
+            sample_buffer_destroy(self.user_data.in_buffer)
+        if self.user_data.out_buffer != NULL:
+            sample_buffer_destroy(self.user_data.out_buffer)
+        if self.user_data.process_hook != NULL:
+            process_hook_destroy(self.user_data.process_hook)
+        if self.user_data.underrun != NULL:
+            underrun_handler_destroy(self.user_data.underrun)
+        free(self.in_data)
+        free(self.out_data)
+        free(self.in_planes)
+        free(self.out_planes)
+
+    def stats(self, bint reset=False):
+        """Snapshot of the callback statistics as from
+        :meth:`StreamCallback.stats`
+        """
+        cdef StreamStats result = StreamStats.from_struct(&self.user_data.stats)
+        if reset:
+            callback_stats_request_reset(&self.user_data.stats)
+        return result
+
+    def underruns(self):
+        """Report of the underruns as from :meth:`StreamCallback.underruns`
+        """
+        return UnderrunReport.from_handler(self.user_data.underrun, &self.next_gap)
+
+    def clock(self, bint output=False):
+        """Snapshot of the clock model as from :meth:`StreamCallback.clock`
+        """
+        if output:
+            return StreamClock.from_struct(&self.user_data.output_clock)
+        return StreamClock.from_struct(&self.user_data.input_clock)
+
+    def set_times(self, double adc_time, double dac_time, double current_time=0):
+        """Set the timestamps given to the next callback (they are moved
+        forward by one block after each call to :meth:`run`)
+        """
+        self.time_info.inputBufferAdcTime = adc_time
+        self.time_info.outputBufferDacTime = dac_time
+        self.time_info.currentTime = current_time
+
+    @property
+    def process_aborted(self):
+        return self.user_data.error_status == CallbackError_process_aborted
+
+    def write_output(self, float[:,:] data):
+        """Write one block to the output :c:type:`SampleBuffer`
+        (as the stream's output buffer would)
+
+        *data* is in the buffer's layout
+        """
+        return sample_buffer_write_sf32(self.user_data.out_buffer, data)
+
+    def write_output_frames(self, float[:,:] data):
+        """Write any number of frames to the output :c:type:`SampleBuffer`
+        """
+        return sample_buffer_write_frames_sf32(self.user_data.out_buffer, data)
+
+    def read_input(self, float[:,:] data):
+        """Read one block from the input :c:type:`SampleBuffer`
+
+        Returns False if no data was available
+        """
+        return sample_buffer_read_sf32(self.user_data.in_buffer, data) != NULL
+
+    def run(self, float[:,::1] inputs, float[:,::1] outputs):
+        """Call the stream callback with *inputs* (nchannels, block_size) as
+        the host input buffer
+
+        The host output buffer is filled from *outputs* before the call (to
+        stand in for uninitialized memory) and unpacked back into it after.
+
+        Returns the callback's ``PaStreamCallbackResult``
+        """
+        cdef SampleFormat* fmt = self.sample_format
+        cdef Py_ssize_t nch = self.nchannels, nframes = self.block_size
+        cdef void *in_bfr = self.in_data
+        cdef void *out_bfr = self.out_data
+        cdef int r
+        assert inputs.shape[0] == nch and inputs.shape[1] == nframes
+        assert outputs.shape[0] == nch and outputs.shape[1] == nframes
+        if self.planar:
+            in_bfr = self.in_planes
+            out_bfr = self.out_planes
+            pack_samples(&inputs[0,0], nframes, 1, self.in_data, nframes, 1, nch, nframes, fmt)
+            pack_samples(&outputs[0,0], nframes, 1, self.out_data, nframes, 1, nch, nframes, fmt)
+        else:
+            pack_samples(&inputs[0,0], nframes, 1, self.in_data, 1, nch, nch, nframes, fmt)
+            pack_samples(&outputs[0,0], nframes, 1, self.out_data, 1, nch, nch, nframes, fmt)
+        with nogil:
+            r = _stream_callback(in_bfr, out_bfr, nframes, &self.time_info, 0, &self.user_data)
+        if self.planar:
+            unpack_samples(self.out_data, nframes, 1, &outputs[0,0], nframes, 1, nch, nframes, fmt)
+        else:
+            unpack_samples(self.out_data, 1, nch, &outputs[0,0], nframes, 1, nch, nframes, fmt)
+        self.time_info.inputBufferAdcTime += nframes / 48000.
+        self.time_info.outputBufferDacTime += nframes / 48000.
+        self.time_info.currentTime += nframes / 48000.
+        return r
@@ -0,0 +1,106 @@
+import time
+
+import pytest
+import numpy as np
+
+from cysounddevice.devices import VirtualDevice
+from cysounddevice.aggregate import AggregateCapture
+
+def wait_for(predicate, timeout=5):
+    start = time.monotonic()
+    while not predicate():
+        assert time.monotonic() - start < timeout
+        time.sleep(.001)
+
+def open_streams(block_size):
+    master = VirtualDevice(num_inputs=1, num_outputs=1, loopback=True).open_stream(
+        sample_rate=48000, frames_per_buffer=block_size, sample_format='float32',
+        input_channels=1, output_channels=1,
+    )
+    # A device with a clock running 500 ppm fast
+    secondary = VirtualDevice(num_inputs=2, num_outputs=2, loopback=True).open_stream(
+        sample_rate=48024, frames_per_buffer=block_size, sample_format='int16',
+        input_channels=2, output_channels=2, layout='interleaved',
+    )
+    return master, secondary
+
+def fill_outputs(streams, block_size, values):
+    shapes = [(1, block_size), (block_size, 2)]
+    for stream, shape, value in zip(streams, shapes, values):
+        while stream.output_buffer.ready():
+            stream.output_buffer.write_output_sf32(np.full(shape, value, dtype=np.float32))
+
+def test_aggregate_capture():
+    block_size = 256
+    streams = open_streams(block_size)
+    values = [.25, .5]
+    with streams[0], streams[1]:
+        capture = AggregateCapture(streams, buffer_len=16)
+        with capture:
+            assert capture.running
+            assert capture.nchannels == 3
+            assert capture.block_size == block_size
+            assert capture.sample_rate == 48000
+            for stream in streams:
+                assert stream.input_buffer.recorder is capture
+            # Only one reader at a time
+            with pytest.raises(RuntimeError):
+                AggregateCapture(streams[1:]).start()
+
+            output_buffer = capture.output_buffer
+            data = output_buffer.block_array()
+            assert data.shape == (3, block_size)
+            blocks = []
+            start = time.monotonic()
+            while len(blocks) < 200:
+                assert time.monotonic() - start < 10
+                fill_outputs(streams, block_size, values)
+                sample_time = output_buffer.read_into(data)
+                if sample_time is None:
+                    time.sleep(.001)
+                    continue
+                blocks.append((sample_time.block, np.array(data)))
+            ratios = capture.ratios
+        assert not capture.running
+        for stream in streams:
+            assert stream.input_buffer.recorder is None
+
+    assert ratios[0] == 1
+    assert ratios[1] == pytest.approx(48024 / 48000, abs=1e-5)
+    assert capture.lost_frames == [0, 0]
+    assert capture.dropped_blocks == 0
+    assert capture.blocks >= len(blocks)
+    # Blocks follow the master's timeline
+    assert [b[0] for b in blocks] == list(range(len(blocks)))
+    # All channels present once the loopback has started
+    for _, data in blocks[20:]:
+        assert np.all(data[0] == .25)
+        assert np.allclose(data[1:], .5, atol=1e-3)
+
+def test_aggregate_stream_close():
+    streams = open_streams(128)
+    streams[0].open()
+    streams[1].open()
+    capture = AggregateCapture(streams)
+    capture.start()
+    wait_for(lambda: capture.blocks > 10)
+    # Closing a stream stops the capture
+    streams[1].close()
+    assert not capture.running
+    assert streams[0].input_buffer.recorder is None
+    streams[0].close()
+
+def test_aggregate_errors():
+    with pytest.raises(ValueError):
+        AggregateCapture([])
+    with pytest.raises(TypeError):
+        AggregateCapture([object()])
+    streams = open_streams(128)
+    with pytest.raises(ValueError):
+        AggregateCapture(streams, max_latency=0)
+    capture = AggregateCapture(streams)
+    # Streams are not open
+    with pytest.raises(RuntimeError):
+        capture.start()
+    assert not capture.running
+    assert capture.ratios is None
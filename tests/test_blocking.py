@@ -0,0 +1,103 @@
+import numpy as np
+import pytest
+
+DURATION = 1
+
+@pytest.mark.filterwarnings('ignore::cysounddevice.stream_callback.StreamCallbackError')
+@pytest.mark.parametrize('layout', ['deinterleaved', 'interleaved', 'non_interleaved'])
+@pytest.mark.parametrize('sample_format', ['float32', 'int16'])
+def test_blocking_record(port_audio, block_size, jack_sample_rate, sample_format, layout):
+    with port_audio(jack_sample_rate, block_size) as pa:
+        hostapi = pa.get_host_api_by_name('JACK Audio Connection Kit')
+        device = hostapi.devices[0]
+        stream = device.open_stream(
+            sample_rate=jack_sample_rate,
+            frames_per_buffer=block_size,
+            sample_format=sample_format,
+            input_channels=2,
+            layout=layout,
+            blocking=True,
+        )
+        stream.stream_info.output_channels = 0
+        assert stream.blocking
+        nframes = block_size + block_size // 2
+        nreads = int(DURATION * jack_sample_rate // nframes)
+        with stream:
+            assert not stream.input_buffer.ready()
+            for i in range(nreads):
+                data, sample_time = stream.read(nframes)
+                if layout == 'interleaved':
+                    assert data.shape == (nframes, 2)
+                else:
+                    assert data.shape == (2, nframes)
+                assert sample_time.block * block_size + sample_time.block_index == i * nframes
+        with pytest.raises(RuntimeError):
+            stream.read(nframes)
+        device.close_stream()
+
+@pytest.mark.filterwarnings('ignore::cysounddevice.stream_callback.StreamCallbackError')
+@pytest.mark.parametrize('layout', ['deinterleaved', 'interleaved', 'non_interleaved'])
+@pytest.mark.parametrize('sample_format', ['float32', 'int16'])
+def test_blocking_playback(port_audio, block_size, jack_sample_rate, sample_format, layout):
+    with port_audio(jack_sample_rate, block_size) as pa:
+        hostapi = pa.get_host_api_by_name('JACK Audio Connection Kit')
+        device = hostapi.devices[0]
+        stream = device.open_stream(
+            sample_rate=jack_sample_rate,
+            frames_per_buffer=block_size,
+            sample_format=sample_format,
+            output_channels=2,
+            layout=layout,
+            blocking=True,
+        )
+        stream.stream_info.input_channels = 0
+        nframes = int(DURATION * jack_sample_rate)
+        t = np.arange(nframes) / jack_sample_rate
+        sig = np.sin(2 * np.pi * 1000 * t).astype(np.float32) * .5
+        if layout == 'interleaved':
+            data = np.stack([sig, sig], axis=1)
+        else:
+            data = np.stack([sig, sig])
+        with stream:
+            sample_time = stream.write(data)
+            assert sample_time.block == 0 and sample_time.block_index == 0
+            sample_time = stream.write(data)
+            assert sample_time.block * block_size + sample_time.block_index == nframes
+        device.close_stream()
+
+@pytest.mark.filterwarnings('ignore::cysounddevice.stream_callback.StreamCallbackError')
+def test_blocking_close_during_read(port_audio, block_size, jack_sample_rate):
+    import threading
+    import time
+    from cysounddevice.utils import PortAudioError
+
+    with port_audio(jack_sample_rate, block_size) as pa:
+        hostapi = pa.get_host_api_by_name('JACK Audio Connection Kit')
+        device = hostapi.devices[0]
+        stream = device.open_stream(
+            sample_rate=jack_sample_rate,
+            frames_per_buffer=block_size,
+            sample_format='int16',
+            input_channels=2,
+            blocking=True,
+        )
+        stream.stream_info.output_channels = 0
+        errors = []
+
+        def reader():
+            try:
+                # Far longer than the test runs
+                stream.read(jack_sample_rate * 60)
+            except PortAudioError as exc:
+                errors.append(exc)
+
+        stream.open()
+        t = threading.Thread(target=reader)
+        t.start()
+        time.sleep(.1)
+        # Waits for the read to stop at its next chunk before freeing it
+        stream.close()
+        t.join(5)
+        assert not t.is_alive()
+        assert len(errors) == 1
+        device.close_stream()
@@ -1,4 +1,410 @@
-from _test_buffer import test as _test
+import pytest
+import numpy as np
+
+from _test_buffer import test as _test, StressTest, ItemViewTest, sample_time_array
 
 def test_buffer():
     assert _test()
+
+def test_buffer_threaded():
+    num_items = 20000
+    stress = StressTest(num_items, 8, 16, 2)
+    completed = stress.run(timeout=60)
+    assert completed, 'Transferred {} of {} items'.format(stress.items_read, num_items)
+    assert stress.items_written == num_items
+    assert stress.items_read == num_items
+    assert stress.data_errors == 0
+    assert stress.time_errors == 0
+
+def test_item_views(sample_format, nchannels):
+    block_size = 64
+    length = 4
+    fmt_name = sample_format['name']
+    bfr = ItemViewTest(fmt_name, nchannels, block_size, length)
+    if fmt_name == 'int24':
+        shape = (block_size, nchannels, 3)
+        dtype = np.uint8
+    else:
+        shape = (block_size, nchannels)
+        dtype = np.dtype(fmt_name)
+
+    assert bfr.borrow() is None
+
+    blocks = []
+    for i in range(length):
+        view = bfr.acquire()
+        assert view.writable
+        assert view.nframes == block_size
+        assert view.nchannels == nchannels
+        assert view.start_time.block == i
+        arr = np.asarray(view)
+        assert arr.shape == shape
+        assert arr.dtype == dtype
+        data = np.random.randint(0, 100, size=shape).astype(dtype)
+        arr[...] = data
+        blocks.append(data)
+        with pytest.raises(BufferError):
+            view.release()
+        del arr
+        view.release()
+        assert not view.valid
+        with pytest.raises(BufferError):
+            memoryview(view)
+        bfr.commit()
+    assert bfr.acquire() is None
+
+    for i in range(length):
+        view = bfr.borrow()
+        assert not view.writable
+        assert view.start_time.block == i
+        arr = np.asarray(view)
+        assert not arr.flags.writeable
+        assert np.array_equal(arr, blocks[i])
+        with pytest.raises(TypeError):
+            memoryview(view).cast('B')[0] = 1
+        del arr
+        with view:
+            pass
+        assert not view.valid
+        bfr.release()
+    assert bfr.borrow() is None
+
+def test_read_write_many(sample_format, nchannels):
+    block_size = 64
+    length = 8
+    fmt_name = sample_format['name']
+    bfr = ItemViewTest(fmt_name, nchannels, block_size, length)
+
+    src = np.random.uniform(-.9, .9, (nchannels, length + 4, block_size)).astype(np.float32)
+    dest = np.zeros((nchannels, length + 4, block_size), dtype=np.float32)
+    tolerance = 1. / (2 ** sample_format['bit_width'] / 2)
+
+    count, times = bfr.read_many(dest)
+    assert count == 0
+
+    count, times = bfr.write_many(src)
+    assert count == length
+    times = np.asarray(times)
+    assert times['block'].tolist() == list(range(length))
+
+    # The buffer is full now
+    count, times = bfr.write_many(src)
+    assert count == 0
+
+    count, times = bfr.read_many(dest[:,:3])
+    assert count == 3
+    count, times = bfr.read_many(dest[:,3:])
+    assert count == length - 3
+    times = np.asarray(times)
+    assert times['block'].tolist() == list(range(3, length))
+    assert np.all(times['block_size'] == block_size)
+
+    if fmt_name == 'float32':
+        assert np.array_equal(src[:,:length], dest[:,:length])
+    else:
+        assert np.abs(src[:,:length] - dest[:,:length]).max() <= tolerance
+    assert np.all(dest[:,length:] == 0)
+
+@pytest.mark.parametrize('layout', ['deinterleaved', 'interleaved', 'non_interleaved'])
+def test_layouts(sample_format, layout):
+    nchannels = 3
+    block_size = 64
+    length = 4
+    fmt_name = sample_format['name']
+    tolerance = 1. / (2 ** sample_format['bit_width'] / 2)
+    bfr = ItemViewTest(fmt_name, nchannels, block_size, length, layout)
+
+    if layout == 'interleaved':
+        shape = (block_size, nchannels)
+        many_shape = (length, block_size, nchannels)
+    else:
+        shape = (nchannels, block_size)
+        many_shape = (nchannels, length, block_size)
+
+    src = np.random.uniform(-.9, .9, shape).astype(np.float32)
+
+    # Arrays in the wrong orientation are rejected
+    assert bfr.write_sf32(np.zeros(shape[::-1], dtype=np.float32)) == 0
+    assert bfr.write_sf32(src) == 1
+
+    view = bfr.borrow()
+    assert view.interleaved is (layout != 'non_interleaved')
+    assert view.nframes == block_size
+    assert view.nchannels == nchannels
+    if fmt_name == 'float32':
+        arr = np.asarray(view)
+        if layout == 'non_interleaved':
+            assert arr.shape == (nchannels, block_size)
+            assert np.array_equal(arr, src)
+        elif layout == 'interleaved':
+            assert arr.shape == (block_size, nchannels)
+            assert np.array_equal(arr, src)
+        else:
+            assert arr.shape == (block_size, nchannels)
+            assert np.array_equal(arr, src.T)
+        del arr
+    view.release()
+
+    dest = np.zeros(shape, dtype=np.float32)
+    assert bfr.read_sf32(dest) is not None
+    assert np.abs(src - dest).max() <= tolerance
+
+    src_many = np.random.uniform(-.9, .9, many_shape).astype(np.float32)
+    dest_many = np.zeros(many_shape, dtype=np.float32)
+    count, times = bfr.write_many(src_many)
+    assert count == length
+    count, times = bfr.read_many(dest_many)
+    assert count == length
+    assert np.abs(src_many - dest_many).max() <= tolerance
+
+def test_many_interleaved():
+    # The block axis is first for interleaved data. Use more blocks than
+    # frames per block so it can't be confused with the block_size axis
+    nchannels = 2
+    block_size = 4
+    length = 16
+    nblocks = 12
+    bfr = ItemViewTest('float32', nchannels, block_size, length, 'interleaved')
+
+    src = np.random.uniform(-.9, .9, (nblocks, block_size, nchannels)).astype(np.float32)
+    count, times = bfr.write_many(src)
+    assert count == nblocks
+    assert np.asarray(times)['block'].tolist() == list(range(nblocks))
+
+    # A times array with exactly one element per block
+    dest = np.zeros((nblocks - 1, block_size, nchannels), dtype=np.float32)
+    times = sample_time_array(nblocks - 1)
+    count, times = bfr.read_many(dest, times)
+    assert count == nblocks - 1
+    assert np.asarray(times)['block'].tolist() == list(range(nblocks - 1))
+    assert np.array_equal(dest, src[:nblocks - 1])
+
+    dest = np.zeros((2, block_size, nchannels), dtype=np.float32)
+    count, times = bfr.read_many(dest, sample_time_array(2))
+    assert count == 1
+    assert np.array_equal(dest[0], src[-1])
+
+def test_callback_planes(nchannels):
+    block_size = 64
+    length = 4
+    planar = ItemViewTest('float32', nchannels, block_size, length, 'non_interleaved')
+    interleaved = ItemViewTest('float32', nchannels, block_size, length)
+
+    src = np.random.uniform(-1, 1, (nchannels, block_size)).astype(np.float32)
+
+    assert planar.write_from_callback([src[i].tobytes() for i in range(nchannels)]) == 1
+    assert interleaved.write_from_callback([src.T.tobytes()]) == 1
+
+    for bfr in [planar, interleaved]:
+        dest = np.zeros((nchannels, block_size), dtype=np.float32)
+        assert bfr.read_sf32(dest) is not None
+        assert np.array_equal(dest, src)
+
+    planar.write_sf32(src)
+    interleaved.write_sf32(src)
+    planes = planar.read_from_callback()
+    assert len(planes) == nchannels
+    for i in range(nchannels):
+        assert np.array_equal(np.frombuffer(planes[i], dtype=np.float32), src[i])
+    data = interleaved.read_from_callback()
+    assert len(data) == 1
+    assert np.array_equal(np.frombuffer(data[0], dtype=np.float32).reshape(block_size, nchannels), src.T)
+
+@pytest.mark.parametrize('layout', ['deinterleaved', 'interleaved', 'non_interleaved'])
+def test_variable_frames(layout):
+    nchannels = 2
+    block_size = 64
+    length = 4
+    bfr = ItemViewTest('float32', nchannels, block_size, length, layout)
+
+    def to_layout(arr):
+        return np.ascontiguousarray(arr.T) if layout == 'interleaved' else arr
+
+    def from_layout(arr):
+        return np.asarray(arr).T if layout == 'interleaved' else np.asarray(arr)
+
+    src = np.random.uniform(-1, 1, (nchannels, 224)).astype(np.float32)
+
+    # Callbacks with varying frame counts
+    pos = 0
+    for nframes in [17, 64, 3, 100, 40]:
+        chunk = src[:,pos:pos+nframes]
+        if layout == 'non_interleaved':
+            data = [chunk[i].tobytes() for i in range(nchannels)]
+        else:
+            data = [chunk.T.tobytes()]
+        assert bfr.write_from_callback(data, nframes) == 1
+        pos += nframes
+        assert bfr.read_available_frames == pos
+    assert bfr.write_available_frames == length * block_size - pos
+    # Not enough space for another 40 frames
+    assert bfr.write_from_callback(data, 40) == 0
+
+    pos = 0
+    for nframes in [50, 30, 144]:
+        dest = to_layout(np.zeros((nchannels, nframes), dtype=np.float32))
+        count, sample_time = bfr.read_frames(dest)
+        assert count == nframes
+        assert np.array_equal(from_layout(dest), src[:,pos:pos+nframes])
+        assert (sample_time.block, sample_time.block_index) == divmod(pos, block_size)
+        pos += nframes
+        if pos % block_size:
+            # Zero-copy access needs the read position at the start of a block
+            assert bfr.borrow() is None
+    assert bfr.read_available_frames == 0
+    assert bfr.read_frames(to_layout(np.zeros((nchannels, 8), dtype=np.float32))) == (0, None)
+
+    # Arbitrary writes, then whole blocks read across item boundaries
+    src = np.random.uniform(-1, 1, (nchannels, block_size * 2)).astype(np.float32)
+    assert bfr.write_frames(to_layout(src[:,:10])) == 10
+    assert bfr.write_frames(to_layout(src[:,10:])) == block_size * 2 - 10
+    dest = to_layout(np.zeros((nchannels, block_size), dtype=np.float32))
+    for i in range(2):
+        sample_time = bfr.read_sf32(dest)
+        assert sample_time.block_index == 224 % block_size
+        assert np.array_equal(from_layout(dest), src[:,i*block_size:(i+1)*block_size])
+
+    # Writes are limited to the free space, which starts at the
+    # (partially read) item holding the read position
+    big = to_layout(np.zeros((nchannels, block_size * length + 5), dtype=np.float32))
+    assert bfr.write_frames(big) == block_size * length - 224 % block_size
+    assert bfr.write_frames(big) == 0
+
+@pytest.mark.parametrize('layout', ['deinterleaved', 'non_interleaved'])
+def test_callback_overflow(layout):
+    nchannels = 2
+    block_size = 64
+    length = 2
+    bfr = ItemViewTest('float32', nchannels, block_size, length, layout)
+
+    src = np.random.uniform(-1, 1, (6, nchannels, block_size)).astype(np.float32)
+
+    def callback_data(block):
+        if layout == 'non_interleaved':
+            return [block[i].tobytes() for i in range(nchannels)]
+        return [block.T.tobytes()]
+
+    # Blocks 2 and 3 are dropped since the buffer is full
+    assert bfr.overflow_policy == 'drop_newest'
+    results = [bfr.write_from_callback(callback_data(src[i])) for i in range(4)]
+    assert results == [1, 1, 0, 0]
+    assert (bfr.dropped_frames, bfr.dropped_blocks) == (block_size * 2, 2)
+
+    dest = np.zeros((nchannels, block_size), dtype=np.float32)
+    for i in range(2):
+        sample_time = bfr.read_sf32(dest)
+        assert (sample_time.block, sample_time.block_index) == (i, 0)
+        assert np.array_equal(dest, src[i])
+        assert bfr.read_gap == 0
+
+    # Following blocks keep their stream position
+    for i in range(4, 6):
+        assert bfr.write_from_callback(callback_data(src[i])) == 1
+    for i in range(4, 6):
+        sample_time = bfr.read_sf32(dest)
+        assert (sample_time.block, sample_time.block_index) == (i, 0)
+        assert np.array_equal(dest, src[i])
+        # Only the first read after the drop is flagged
+        assert bfr.read_gap == (block_size * 2 if i == 4 else 0)
+
+@pytest.mark.parametrize('layout', ['deinterleaved', 'non_interleaved'])
+def test_callback_overwrite_oldest(layout):
+    nchannels = 2
+    block_size = 64
+    length = 3
+    bfr = ItemViewTest('float32', nchannels, block_size, length, layout)
+    bfr.overflow_policy = 'overwrite_oldest'
+    assert bfr.overflow_policy == 'overwrite_oldest'
+
+    src = np.random.uniform(-1, 1, (8, nchannels, block_size)).astype(np.float32)
+
+    def callback_data(block):
+        if layout == 'non_interleaved':
+            return [block[i].tobytes() for i in range(nchannels)]
+        return [block.T.tobytes()]
+
+    # Blocks 0 and 1 are discarded to make room for 3 and 4
+    results = [bfr.write_from_callback(callback_data(src[i])) for i in range(5)]
+    assert results == [1] * 5
+    assert (bfr.dropped_frames, bfr.dropped_blocks) == (block_size * 2, 2)
+    assert bfr.read_available_frames == block_size * 3
+
+    dest = np.zeros((nchannels, block_size), dtype=np.float32)
+    count, times = bfr.read_many(np.zeros((nchannels, 2, block_size), dtype=np.float32))
+    assert count == 2
+    assert list(np.asarray(times)['block']) == [2, 3]
+    # The first read starts the timeline so no gap is counted
+    assert bfr.read_gap == 0
+
+    # The partially read oldest item is discarded as a whole
+    frames = np.zeros((nchannels, 10), dtype=np.float32)
+    count, sample_time = bfr.read_frames(frames)
+    assert (count, sample_time.block) == (10, 4)
+    for i in range(5, 8):
+        assert bfr.write_from_callback(callback_data(src[i])) == 1
+    assert bfr.dropped_frames == block_size * 3 - 10
+    assert bfr.dropped_blocks == 3
+    sample_time = bfr.read_sf32(dest)
+    assert (sample_time.block, sample_time.block_index) == (5, 0)
+    assert np.array_equal(dest, src[5])
+    assert bfr.read_gap == block_size - 10
+
+    # A borrowed item is never discarded, the new block is dropped instead
+    view = bfr.borrow()
+    assert not view.discontinuity
+    assert view.start_time.block == 6
+    assert bfr.write_from_callback(callback_data(src[0])) == 1
+    assert bfr.write_from_callback(callback_data(src[0])) == 0
+    assert bfr.dropped_frames == block_size * 4 - 10
+    data = np.asarray(view)
+    if layout == 'deinterleaved':
+        data = data.T
+    assert np.array_equal(data, src[6])
+    bfr.release()
+    assert bfr.write_from_callback(callback_data(src[0])) == 1
+    view = bfr.borrow()
+    assert view.start_time.block == 7
+    assert not view.discontinuity
+    bfr.release()
+    view = bfr.borrow()
+    assert view.start_time.block == 8
+    bfr.release()
+    view = bfr.borrow()
+    assert view.start_time.block == 10
+    assert view.discontinuity
+    assert bfr.read_gap == block_size
+    bfr.release()
+    assert bfr.read_available_frames == 0
+
+def test_partial_read_restamp():
+    nchannels = 2
+    block_size = 64
+    length = 2
+    bfr = ItemViewTest('float32', nchannels, block_size, length)
+
+    src = np.random.uniform(-1, 1, (nchannels, block_size * 3)).astype(np.float32)
+    for i in range(2):
+        assert bfr.write_sf32(src[:,i*block_size:(i+1)*block_size]) == 1
+
+    dest = np.zeros((nchannels, 2), dtype=np.float32)
+    count, sample_time = bfr.read_frames(dest)
+    assert (sample_time.block, sample_time.block_index) == (0, 0)
+
+    # The first item is still being read and may not be reused
+    assert bfr.write_available_frames == 0
+    assert bfr.write_frames(src[:,block_size*2:block_size*2+2]) == 0
+
+    count, sample_time = bfr.read_frames(dest)
+    assert count == 2
+    assert (sample_time.block, sample_time.block_index) == (0, 2)
+    assert np.array_equal(dest, src[:,2:4])
+
+    dest = np.zeros((nchannels, block_size - 4), dtype=np.float32)
+    assert bfr.read_frames(dest)[0] == block_size - 4
+    assert bfr.write_available_frames == block_size
+
+def test_invalid_size():
+    with pytest.raises(ValueError):
+        ItemViewTest('float32', 2, 0, 4)
+    with pytest.raises(ValueError):
+        ItemViewTest('float32', 2, 64, 0)
@@ -50,3 +50,77 @@ def test_converters(sample_rate, block_size, sample_format):
                 assert np.array_equal(sig_orig, packed)
             else:
                 assert np.abs(sig_orig - packed).max() <= tolerance
+
+def test_memory_layouts(sample_rate, block_size, sample_format):
+    nchannels = 4
+    bfr = build_buffer(sample_rate, block_size, nchannels, sample_format['name'])
+
+    src = np.random.uniform(-1.2, 1.2, (nchannels, block_size * 2)).astype(np.float32)
+    sig_c = np.ascontiguousarray(src[:,:block_size])
+    sig_f = np.asfortranarray(sig_c)
+    sig_strided = src[:,::2]
+    sig_strided[...] = sig_c
+    assert not sig_strided.flags.c_contiguous and not sig_strided.flags.f_contiguous
+
+    packed = bfr.pack_to_bytes(sig_c)
+    assert bfr.pack_to_bytes(sig_f) == packed
+    assert bfr.pack_to_bytes(sig_strided) == packed
+
+    unpacked_c = np.empty((nchannels, block_size), dtype=np.float32)
+    unpacked_f = np.empty((nchannels, block_size), dtype=np.float32, order='F')
+    unpacked_strided = np.zeros((nchannels, block_size * 2), dtype=np.float32)[:,::2]
+    bfr.unpack_from_bytes(packed, unpacked_c)
+    bfr.unpack_from_bytes(packed, unpacked_f)
+    bfr.unpack_from_bytes(packed, unpacked_strided)
+    assert np.array_equal(unpacked_c, unpacked_f)
+    assert np.array_equal(unpacked_c, unpacked_strided)
+
+def test_saturation(sample_rate, block_size, sample_format):
+    nchannels = 2
+    bfr = build_buffer(sample_rate, block_size, nchannels, sample_format['name'])
+    fmt = bfr.sample_format
+    if sample_format['name'] == 'float32':
+        pytest.skip('float32 samples are not scaled')
+
+    sig = np.random.uniform(-4, 4, (nchannels, block_size)).astype(np.float32)
+    sig[:,0] = [-1e9, 1e9]
+    clipped = np.clip(sig.astype(np.float64), -1., fmt['float32_max']).astype(np.float32)
+    assert bfr.pack_to_bytes(sig) == bfr.pack_to_bytes(clipped)
+
+    unpacked = bfr.unpack_buffer_item()
+    assert unpacked.min() >= -1
+    assert unpacked.max() <= fmt['float32_max']
+    assert np.abs(unpacked - clipped).max() <= 2. / 2 ** sample_format['bit_width']
+
+def test_pack_reference(sample_rate, block_size, sample_format):
+    # Compare against the element-by-element conversion done in double precision
+    nchannels = 4
+    bfr = build_buffer(sample_rate, block_size, nchannels, sample_format['name'])
+    fmt = bfr.sample_format
+
+    sig = np.random.uniform(-1.2, 1.2, (nchannels, block_size)).astype(np.float32)
+    edges = np.array([
+        -2., -1., np.nextafter(np.float32(-1), np.float32(0)), -2 ** -30, 0., 2 ** -30,
+        np.nextafter(np.float32(fmt['float32_max']), np.float32(0)), fmt['float32_max'],
+        np.nextafter(np.float32(1), np.float32(0)), 1., 2.,
+    ], dtype=np.float32)
+    n = min(edges.size, block_size)
+    sig[:,:n] = edges[:n]
+    sig[-1,-n:] = edges[:n]
+
+    if sample_format['name'] == 'float32':
+        expected = sig.T.tobytes()
+    else:
+        v = np.clip(sig.astype(np.float64), -1., fmt['float32_max']).T
+        if sample_format['name'] == 'uint8':
+            expected = ((v + 1.) * 128).astype(np.uint8).tobytes()
+        else:
+            scaled = (v * fmt['float32_divisor']).astype(np.int32)
+            if sample_format['name'] == 'int24':
+                expected = np.ascontiguousarray(scaled, dtype='<i4').view(np.uint8).reshape(-1, 4)[:,1:].tobytes()
+            else:
+                dtype = {'int32':'<i4', 'int16':'<i2', 'int8':'i1'}[sample_format['name']]
+                expected = scaled.astype(dtype).tobytes()
+
+    assert bfr.pack_to_bytes(np.ascontiguousarray(sig)) == expected
+    assert bfr.pack_to_bytes(np.asfortranarray(sig)) == expected
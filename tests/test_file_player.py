@@ -0,0 +1,139 @@
+import time
+import wave
+
+import pytest
+import numpy as np
+
+from cysounddevice.playback import FilePlayer
+
+from _test_buffer import ItemViewTest
+
+def write_wav(filename, data, sample_rate=48000):
+    with wave.open(str(filename), 'wb') as f:
+        f.setnchannels(data.shape[1])
+        f.setsampwidth(data.dtype.itemsize)
+        f.setframerate(sample_rate)
+        f.writeframes(data.tobytes())
+
+def read_all(bfr, player, nchannels, block_size, timeout=5):
+    """Read blocks from the buffer as float32 until the player is finished
+    """
+    blocks = []
+    start = time.monotonic()
+    while not player.finished or bfr.read_available_frames:
+        assert time.monotonic() - start < timeout
+        dest = np.zeros((nchannels, block_size), dtype=np.float32)
+        if bfr.read_sf32(dest) is None:
+            time.sleep(.001)
+            continue
+        blocks.append(dest)
+    player.stop()
+    return np.concatenate(blocks, axis=1)
+
+@pytest.mark.parametrize('layout', ['interleaved', 'non_interleaved'])
+def test_player_native(tmp_path, layout):
+    nchannels, block_size, length = 2, 64, 4
+    nframes = block_size * 10 + 17
+    filename = tmp_path / 'source.wav'
+    data = np.random.randint(-32768, 32767, (nframes, nchannels)).astype(np.int16)
+    write_wav(filename, data)
+
+    bfr = ItemViewTest('int16', nchannels, block_size, length, layout)
+    player = bfr.play(filename, prefetch_size=4096)
+    assert (player.frames, player.nchannels) == (nframes, nchannels)
+    assert (player.sample_format, player.sample_rate) == ('int16', 48000)
+    assert player.native
+
+    blocks = []
+    start = time.monotonic()
+    while not player.finished or bfr.read_available_frames:
+        assert time.monotonic() - start < 5
+        planes = bfr.read_from_callback()
+        if planes is None:
+            time.sleep(.001)
+            continue
+        if layout == 'non_interleaved':
+            blocks.append(np.stack([np.frombuffer(p, dtype=np.int16) for p in planes], axis=1))
+        else:
+            blocks.append(np.frombuffer(planes[0], dtype=np.int16).reshape(-1, nchannels))
+    player.stop()
+    result = np.concatenate(blocks)
+    assert player.position == nframes
+    assert len(result) == block_size * 11
+    assert np.array_equal(result[:nframes], data)
+    # The last block is padded with silence
+    assert not result[nframes:].any()
+    player.close()
+
+@pytest.mark.parametrize('stream_format', ['float32', 'int24'])
+def test_player_convert(tmp_path, stream_format):
+    nchannels, block_size = 3, 32
+    nframes = block_size * 8
+    filename = tmp_path / 'source.wav'
+    data = np.random.randint(-32768, 32767, (nframes, nchannels)).astype(np.int16)
+    write_wav(filename, data)
+
+    bfr = ItemViewTest(stream_format, nchannels, block_size, 2)
+    player = bfr.play(filename)
+    assert not player.native
+    result = read_all(bfr, player, nchannels, block_size)
+    assert np.allclose(result, data.T / 32768, atol=1e-6)
+
+def test_player_raw(tmp_path):
+    nchannels, block_size, offset = 2, 64, 100
+    nframes = block_size * 4
+    filename = tmp_path / 'source.raw'
+    data = np.random.uniform(-1, 1, (nframes, nchannels)).astype(np.float32)
+    with open(filename, 'wb') as f:
+        f.write(bytes(offset))
+        f.write(data.tobytes())
+        # Trailing partial frame is ignored
+        f.write(bytes(3))
+
+    with pytest.raises(ValueError):
+        FilePlayer(None, filename, sample_format='float32')
+    bfr = ItemViewTest('float32', nchannels, block_size, 2)
+    player = bfr.play(filename, sample_format='float32', nchannels=nchannels, data_offset=offset)
+    assert player.frames == nframes
+    assert player.sample_rate == 0
+    result = read_all(bfr, player, nchannels, block_size)
+    assert np.array_equal(result, data.T)
+
+def test_player_recorded(tmp_path):
+    """Play a file written by StreamRecorder (WAVE_FORMAT_EXTENSIBLE, RF64)
+    """
+    nchannels, block_size = 4, 64
+    filename = tmp_path / 'recording.wav'
+    src = np.random.uniform(-1, 1, (6, nchannels, block_size)).astype(np.float32)
+
+    rec_bfr = ItemViewTest('int24', nchannels, block_size, 8)
+    for block in src:
+        assert rec_bfr.write_sf32(block) == 1
+    recorder = rec_bfr.record(filename, rf64=True)
+    recorder.stop()
+    assert recorder.frames_written == block_size * 6
+
+    bfr = ItemViewTest('int24', nchannels, block_size, 2)
+    player = bfr.play(filename)
+    assert player.native
+    assert player.frames == block_size * 6
+    result = read_all(bfr, player, nchannels, block_size)
+    assert np.allclose(result, np.concatenate(src, axis=1), atol=1e-6)
+
+def test_player_errors(tmp_path):
+    filename = tmp_path / 'source.wav'
+    with open(filename, 'wb') as f:
+        f.write(b'not a wav file')
+    with pytest.raises(ValueError):
+        FilePlayer(None, filename)
+
+    write_wav(filename, np.zeros((64, 2), dtype=np.int16))
+    bfr = ItemViewTest('int16', 1, 64, 2)
+    with pytest.raises(ValueError):
+        bfr.play(filename)
+    player = FilePlayer(None, filename)
+    with pytest.raises(RuntimeError):
+        player.start()
+    player.close()
+    # Closing again has no effect
+    player.close()
@@ -0,0 +1,156 @@
+import pytest
+import numpy as np
+
+from cysounddevice.graph import ProcessGraph, biquad_coefficients
+
+from _test_processing import ProcessHookTest
+
+def biquad_reference(x, coefficients):
+    b0, b1, b2, a1, a2 = coefficients
+    y = np.zeros(len(x))
+    x1 = x2 = y1 = y2 = 0.
+    for i, v in enumerate(x.astype(np.float64)):
+        y[i] = b0 * v + b1 * x1 + b2 * x2 - a1 * y1 - a2 * y2
+        x2, x1 = x1, v
+        y2, y1 = y1, y[i]
+    return y
+
+def make_hook(graph, nchannels, max_frames=64):
+    return ProcessHookTest(
+        'float32', True, nchannels, max_frames,
+        func=graph.process_address, state=graph.state_address,
+    )
+
+@pytest.mark.parametrize('max_frames', [32, 1024])
+def test_graph(max_frames):
+    nchannels, nframes, delay = 2, 150, 20
+    coefficients = biquad_coefficients('lowpass', 1000, 48000)
+
+    graph = ProcessGraph(nchannels, nchannels, max_frames)
+    in0, in1 = graph.input(0), graph.input(1)
+    assert graph.input(0) is in0
+    g = graph.gain(in0, .5)
+    bq = graph.biquad(in1, coefficients)
+    d = graph.delay(g, delay)
+    mix = graph.mixer([d, bq], [1, .25])
+    meter = graph.meter(mix)
+    graph.set_output(0, mix)
+    graph.set_output(1, g)
+    # Not connected to an output so never run
+    graph.gain(in1, 100)
+    graph.commit()
+
+    hook = make_hook(graph, nchannels)
+    inputs = np.random.uniform(-1, 1, (nchannels, nframes * 2)).astype(np.float32)
+    expected_g = inputs[0] * .5
+    expected_d = np.concatenate([np.zeros(delay), expected_g[:-delay]])
+    expected_mix = expected_d + biquad_reference(inputs[1], coefficients) * .25
+
+    result = np.zeros_like(inputs)
+    for i in range(2):
+        sl = slice(i * nframes, (i + 1) * nframes)
+        # Graph outputs are added to the output planes
+        outputs = np.full((nchannels, nframes), .125, dtype=np.float32)
+        assert hook.run(np.ascontiguousarray(inputs[:,sl]), outputs) == 0
+        result[:,sl] = outputs - .125
+    assert np.allclose(result[0], expected_mix, atol=1e-5)
+    assert np.allclose(result[1], expected_g, atol=1e-6)
+
+    # The hook runs the graph in chunks of 64 frames, the meter shows the last
+    last_chunk = expected_mix[-(nframes % 64):]
+    assert meter.peak == pytest.approx(np.abs(last_chunk).max(), abs=1e-5)
+    assert meter.rms == pytest.approx(np.sqrt(np.mean(last_chunk ** 2)), abs=1e-5)
+    assert not graph.pending_swap
+
+def test_graph_swap():
+    nchannels, nframes = 1, 64
+    graph = ProcessGraph(nchannels, nchannels, 64)
+    hook = make_hook(graph, nchannels)
+    inputs = np.random.uniform(-1, 1, (nchannels, nframes)).astype(np.float32)
+
+    # Nothing committed yet
+    outputs = np.zeros((nchannels, nframes), dtype=np.float32)
+    assert hook.run(inputs, outputs) == 0
+    assert not outputs.any()
+
+    g = graph.gain(graph.input(0), 2)
+    d = graph.delay(g, 16)
+    graph.set_output(0, d)
+    graph.commit()
+    assert graph.pending_swap
+    hook.run(inputs, outputs)
+    assert np.allclose(outputs[0,16:], inputs[0,:-16] * 2)
+
+    # Parameter changes take effect on commit. The delay line carries over
+    g.gain = -1
+    outputs = np.zeros((nchannels, nframes), dtype=np.float32)
+    hook.run(inputs, outputs)
+    assert np.allclose(outputs[0,:16], inputs[0,-16:] * 2)
+    assert np.allclose(outputs[0,16:], inputs[0,:-16] * 2)
+    graph.commit()
+    outputs = np.zeros((nchannels, nframes), dtype=np.float32)
+    hook.run(inputs, outputs)
+    assert np.allclose(outputs[0,:16], inputs[0,-16:] * 2)
+    assert np.allclose(outputs[0,16:], inputs[0,:-16] * -1)
+
+    # Restructure with several commits between callbacks
+    graph.set_output(0, None)
+    graph.commit()
+    graph.remove(d)
+    graph.set_output(0, g)
+    graph.commit()
+    assert graph.pending_swap
+    outputs = np.zeros((nchannels, nframes), dtype=np.float32)
+    hook.run(inputs, outputs)
+    assert np.allclose(outputs, inputs * -1)
+    assert not graph.pending_swap
+
+def test_graph_errors():
+    graph = ProcessGraph(2, 2)
+    other = ProcessGraph(2, 2)
+    with pytest.raises(ValueError):
+        graph.input(2)
+    with pytest.raises(ValueError):
+        graph.gain(other.input(0))
+    with pytest.raises(ValueError):
+        graph.set_output(2, None)
+    with pytest.raises(ValueError):
+        graph.delay(graph.input(0), -1)
+    with pytest.raises(ValueError):
+        graph.biquad(graph.input(0), (1, 0, 0))
+    with pytest.raises(ValueError):
+        graph.mixer([graph.input(0)], [1, 2])
+    with pytest.raises(ValueError):
+        biquad_coefficients('allpass', 1000, 48000)
+
+    in0 = graph.input(0)
+    a = graph.mixer([in0])
+    b = graph.gain(a)
+    a.set_sources([in0, b])
+    graph.set_output(0, b)
+    with pytest.raises(ValueError, match='cycle'):
+        graph.commit()
+
+    a.set_sources([in0])
+    graph.commit()
+    with pytest.raises(ValueError):
+        graph.remove(a)
+
+@pytest.mark.parametrize('kind', ['lowpass', 'highpass', 'bandpass', 'notch', 'peak'])
+def test_biquad_coefficients(kind):
+    fs, freq = 48000, 1000
+    b0, b1, b2, a1, a2 = biquad_coefficients(kind, freq, fs, gain_db=6)
+
+    def response(f):
+        z = np.exp(-2j * np.pi * f / fs)
+        return abs((b0 + b1 * z + b2 * z ** 2) / (1 + a1 * z + a2 * z ** 2))
+
+    expected = {
+        'lowpass': (1, 1 / np.sqrt(2), 0),
+        'highpass': (0, 1 / np.sqrt(2), 1),
+        'bandpass': (0, 1, 0),
+        'notch': (1, 0, 1),
+        'peak': (1, 10 ** (6 / 20), 1),
+    }[kind]
+    for f, value in zip([0, freq, fs / 2], expected):
+        assert response(f) == pytest.approx(value, abs=1e-6)
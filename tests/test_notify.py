@@ -0,0 +1,70 @@
+import asyncio
+import threading
+import pytest
+
+from cysounddevice.notify import Notifier
+
+def test_notifier():
+    async def run():
+        notifier = Notifier()
+        assert notifier.fileno() >= 0
+        assert notifier.write_fd >= 0
+
+        for _ in range(4):
+            fut = notifier.wait()
+            t = threading.Timer(.01, notifier.signal)
+            t.start()
+            await asyncio.wait_for(fut, 1)
+            t.join()
+            assert fut.result() is None
+
+        # Pending signals are drained once and complete all waiters
+        notifier.signal()
+        notifier.signal()
+        futs = [notifier.wait() for _ in range(3)]
+        await asyncio.wait_for(asyncio.gather(*futs), 1)
+
+        # No signal, no wakeup
+        fut = notifier.wait()
+        with pytest.raises(asyncio.TimeoutError):
+            await asyncio.wait_for(asyncio.shield(fut), .05)
+
+        notifier.close()
+        assert fut.cancelled()
+        assert notifier.closed
+        with pytest.raises(ValueError):
+            notifier.wait()
+
+    loop = asyncio.new_event_loop()
+    try:
+        loop.run_until_complete(run())
+    finally:
+        loop.close()
+
+def test_notifier_wake_and_close():
+    async def run():
+        notifier = Notifier()
+        loop = asyncio.get_event_loop()
+        futs = [notifier.wait() for _ in range(2)]
+        assert notifier.loop is loop
+
+        # As done by Stream.close()
+        notifier.wake()
+        notifier.close()
+        await asyncio.wait_for(asyncio.gather(*futs), 1)
+        assert notifier.loop is None
+        assert notifier.closed
+
+    loop = asyncio.new_event_loop()
+    try:
+        loop.run_until_complete(run())
+    finally:
+        loop.close()
+
+def test_notifier_requires_running_loop():
+    notifier = Notifier()
+    try:
+        with pytest.raises(RuntimeError):
+            notifier.wait()
+    finally:
+        notifier.close()
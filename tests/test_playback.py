@@ -1,3 +1,4 @@
+import asyncio
 import time
 import warnings
 import numpy as np
@@ -86,6 +87,41 @@ class Generator:
         return data
 
 
+class BulkGenerator(Generator):
+    """Writes as many blocks as possible at once with
+    :meth:`~cysounddevice.buffer.StreamOutputBuffer.write_many`
+    """
+    def fill_buffer(self):
+        bfr = self.stream.output_buffer
+        if not bfr.ready():
+            return False
+        nblocks = bfr.write_available
+        if nblocks == 0:
+            return False
+        data = self.generate_many(nblocks)
+        count, times = bfr.write_many(data)
+        if not count:
+            return False
+        self.current_time.block += count
+
+        if self.current_time >= self.end_time:
+            self.complete = True
+            return False
+        return True
+
+    def generate_many(self, nblocks):
+        block_size = self.stream.frames_per_buffer
+        fs = self.stream.sample_rate
+        data = np.zeros((self.nchannels, nblocks, block_size), dtype='float32')
+
+        t = np.arange(block_size * nblocks) / fs
+        t += self.current_time.rel_time
+        sig = np.sin(2*np.pi*t*self.center_freq).reshape((nblocks, block_size))
+        for i in range(self.nchannels):
+            data[i,...] = sig
+        return data
+
+
 def test_playback(port_audio, jack_sample_rate, block_size, SAMPLE_FORMATS):
     with port_audio(jack_sample_rate, block_size) as pa:
         hostapi = pa.get_host_api_by_name('JACK Audio Connection Kit')
@@ -109,3 +145,57 @@ def test_playback(port_audio, jack_sample_rate, block_size, SAMPLE_FORMATS):
             gen.run()
             assert gen.complete
             device.close_stream()
+
+def test_playback_many(port_audio, jack_sample_rate, block_size, SAMPLE_FORMATS):
+    with port_audio(jack_sample_rate, block_size) as pa:
+        hostapi = pa.get_host_api_by_name('JACK Audio Connection Kit')
+        device = hostapi.devices[0]
+        for sample_format in SAMPLE_FORMATS:
+            print(f'fs={jack_sample_rate}, sample_format={sample_format} block_size={block_size}')
+            stream_kw = dict(
+                sample_rate=jack_sample_rate,
+                block_size=block_size,
+                sample_format=sample_format['name'],
+                output_channels=2,
+            )
+            stream = device.open_stream(**stream_kw)
+            try:
+                stream.check()
+            except PortAudioError as exc:
+                if exc.error_msg == 'Invalid sample rate':
+                    warnings.warn(f'Invalid sample rate ({sample_rate})')
+                    return
+            gen = BulkGenerator(stream, DURATION)
+            gen.run()
+            assert gen.complete
+            device.close_stream()
+
+
+async def play_async(stream, gen):
+    with stream:
+        while not gen.complete:
+            data = gen.generate()
+            written = await stream.output_buffer.write(data)
+            assert written == data.shape[1]
+            gen.current_time.block += 1
+            if gen.current_time >= gen.end_time:
+                gen.complete = True
+
+def test_playback_async(port_audio, jack_sample_rate, block_size):
+    with port_audio(jack_sample_rate, block_size) as pa:
+        hostapi = pa.get_host_api_by_name('JACK Audio Connection Kit')
+        device = hostapi.devices[0]
+        stream = device.open_stream(
+            sample_rate=jack_sample_rate,
+            frames_per_buffer=block_size,
+            sample_format='float32',
+            output_channels=2,
+        )
+        gen = Generator(stream, DURATION)
+        loop = asyncio.new_event_loop()
+        try:
+            loop.run_until_complete(asyncio.wait_for(play_async(stream, gen), DURATION + 2))
+        finally:
+            loop.close()
+        assert gen.complete
+        device.close_stream()
@@ -0,0 +1,338 @@
+import ctypes
+import pytest
+import numpy as np
+
+from _test_processing import (
+    ProcessHookTest, CallbackTest, gain_process_address, PA_CONTINUE, PA_ABORT,
+)
+
+class SampleTimeStruct(ctypes.Structure):
+    _fields_ = [
+        ('pa_time', ctypes.c_double),
+        ('rel_time', ctypes.c_double),
+        ('time_offset', ctypes.c_double),
+        ('sample_rate', ctypes.c_double),
+        ('block_size', ctypes.c_ssize_t),
+        ('block', ctypes.c_int),
+        ('block_index', ctypes.c_ssize_t),
+    ]
+
+PROCESS_FUNC = ctypes.CFUNCTYPE(
+    ctypes.c_int,
+    ctypes.c_void_p,
+    ctypes.POINTER(ctypes.POINTER(ctypes.c_float)),
+    ctypes.POINTER(ctypes.POINTER(ctypes.c_float)),
+    ctypes.c_int,
+    ctypes.c_int,
+    ctypes.c_ulong,
+    ctypes.POINTER(SampleTimeStruct),
+)
+
+@pytest.mark.parametrize('planar', [False, True])
+def test_process_hook(sample_format, nchannels, planar):
+    fmt_name = sample_format['name']
+    nframes = 150
+    tolerance = 4. / (2 ** sample_format['bit_width'] / 2)
+    if fmt_name == 'float32':
+        tolerance = 1e-6
+
+    # max_frames < nframes so processing is done in chunks
+    hook = ProcessHookTest(fmt_name, planar, nchannels, 64)
+    hook.gain = .5
+    inputs = np.random.uniform(-.5, .5, (nchannels, nframes)).astype(np.float32)
+    outputs = np.random.uniform(-.25, .25, (nchannels, nframes)).astype(np.float32)
+    expected = outputs + inputs * .5
+    assert hook.run(inputs, outputs) == 0
+    assert np.allclose(outputs, expected, atol=tolerance)
+
+    outputs = np.random.uniform(-.25, .25, (nchannels, nframes)).astype(np.float32)
+    assert hook.run(inputs, outputs, clear_output=True) == 0
+    assert np.allclose(outputs, inputs * .5, atol=tolerance)
+
+    # Same function through its address
+    gain = ctypes.c_float(2)
+    hook = ProcessHookTest(fmt_name, planar, nchannels, 64, func=gain_process_address(), state=ctypes.pointer(gain))
+    outputs = np.zeros((nchannels, nframes), dtype=np.float32)
+    inputs *= .25
+    assert hook.run(inputs, outputs) == 0
+    assert np.allclose(outputs, inputs * 2, atol=tolerance)
+
+def test_process_hook_ctypes():
+    nchannels, nframes, block_size = 2, 150, 64
+    calls = []
+
+    @PROCESS_FUNC
+    def process(state, inputs, outputs, input_channels, output_channels, n, sample_time):
+        st = sample_time.contents
+        calls.append((n, st.block, st.block_index, st.time_offset))
+        for c in range(output_channels):
+            for i in range(n):
+                outputs[c][i] = -inputs[c][i]
+        if len(calls) == 5:
+            return 1
+        return 0
+
+    hook = ProcessHookTest('float32', False, nchannels, block_size, block_size, func=process)
+    inputs = np.random.uniform(-1, 1, (nchannels, nframes)).astype(np.float32)
+    outputs = np.zeros((nchannels, nframes), dtype=np.float32)
+    assert hook.run(inputs, outputs) == 0
+    assert np.array_equal(outputs, -inputs)
+    assert [c[:3] for c in calls] == [(64, 0, 0), (64, 1, 0), (22, 2, 0)]
+    assert all(c[3] == 1. for c in calls)
+
+    # Timing continues from the previous call. A non-zero return stops processing
+    assert hook.run(inputs, outputs) == 1
+    assert [c[:3] for c in calls[3:]] == [(64, 2, 22), (64, 3, 22)]
+
+@pytest.mark.parametrize('planar', [False, True])
+def test_stream_callback_hook(sample_format, nchannels, planar):
+    fmt_name = sample_format['name']
+    block_size = 64
+    tolerance = 4. / (2 ** sample_format['bit_width'] / 2)
+    if fmt_name == 'float32':
+        tolerance = 1e-6
+
+    def to_layout(arr):
+        # The buffer layout is (nframes, nchannels) when interleaved
+        return arr if planar else arr.T
+
+    cb = CallbackTest(fmt_name, planar, nchannels, block_size)
+    cb.gain = .5
+    inputs = np.random.uniform(-.5, .5, (nchannels, block_size)).astype(np.float32)
+
+    # Nothing is in the output buffer so the host buffer is cleared before
+    # the hook is called. Fill it with garbage to make sure
+    outputs = np.full((nchannels, block_size), .75, dtype=np.float32)
+    assert cb.run(inputs, outputs) == PA_CONTINUE
+    assert not cb.process_aborted
+    assert np.allclose(outputs, inputs * .5, atol=tolerance)
+
+    # The input was stored before the hook ran
+    data = np.zeros((nchannels, block_size), dtype=np.float32)
+    assert cb.read_input(to_layout(data))
+    assert np.allclose(data, inputs, atol=tolerance)
+
+    # Output buffer data is mixed with the hook's output
+    written = np.random.uniform(-.25, .25, (nchannels, block_size)).astype(np.float32)
+    assert cb.write_output(to_layout(written)) == 1
+    outputs = np.full((nchannels, block_size), .75, dtype=np.float32)
+    assert cb.run(inputs, outputs) == PA_CONTINUE
+    assert np.allclose(outputs, written + inputs * .5, atol=tolerance * 2)
+
+def test_stream_callback_hook_abort(nchannels):
+    block_size = 64
+    cb = CallbackTest('float32', False, nchannels, block_size, abort=True)
+    inputs = np.zeros((nchannels, block_size), dtype=np.float32)
+    outputs = np.zeros((nchannels, block_size), dtype=np.float32)
+    assert cb.run(inputs, outputs) == PA_ABORT
+    assert cb.process_aborted
+
+def test_stream_callback_stats():
+    nchannels, block_size, length = 2, 64, 8
+    period = block_size / 48000
+    cb = CallbackTest('float32', False, nchannels, block_size, length)
+    inputs = np.zeros((nchannels, block_size), dtype=np.float32)
+    outputs = np.zeros((nchannels, block_size), dtype=np.float32)
+
+    stats = cb.stats()
+    assert stats.callbacks == 0
+    assert stats.duration.count == 0
+    assert stats.duration.mean == 0
+
+    # The input buffer fills since nothing reads it. One output block
+    # is written before the first two callbacks
+    for i in range(4):
+        if i < 2:
+            assert cb.write_output(np.zeros((block_size, nchannels), dtype=np.float32)) == 1
+        assert cb.run(inputs, outputs) == PA_CONTINUE
+    stats = cb.stats()
+    assert stats.callbacks == 4
+    duration = stats.duration
+    assert 0 < duration.minimum <= duration.mean <= duration.maximum
+    assert sum(duration.histogram) == 4
+    assert duration.bucket_width == pytest.approx(2 / 16)
+    assert duration.bucket_edges[8] == pytest.approx(1)
+    assert stats.interval.count == 3
+    assert stats.interval.minimum > 0
+    # No PaStream so the CPU load is not recorded
+    assert stats.cpu_load.count == 0
+
+    fill = stats.input_fill
+    assert fill.count == 4
+    assert fill.minimum == pytest.approx(1 / length)
+    assert fill.maximum == fill.last == pytest.approx(4 / length)
+    assert fill.histogram[2] == 1 and fill.histogram[8] == 1
+    fill = stats.output_fill
+    assert (fill.minimum, fill.maximum) == (0, pytest.approx(1 / length))
+
+    # The callback clears the stats before recording its next call
+    stats = cb.stats(reset=True)
+    assert stats.callbacks == 4
+    assert cb.stats().callbacks == 4
+    cb.run(inputs, outputs)
+    stats = cb.stats()
+    assert stats.callbacks == 1
+    assert stats.interval.count == 0
+    assert stats.input_fill.last == pytest.approx(5 / length)
+    assert stats.duration.last < period * 100
+
+def test_stream_callback_clock():
+    nchannels, block_size = 1, 256
+    # A device clock running 200 ppm fast, with 0.5ms of timestamp jitter
+    sample_rate = 48000 * (1 + 200e-6)
+    cb = CallbackTest('float32', False, nchannels, block_size)
+    inputs = np.zeros((nchannels, block_size), dtype=np.float32)
+    outputs = np.zeros((nchannels, block_size), dtype=np.float32)
+    rng = np.random.default_rng(1)
+
+    def run(n, start=10.):
+        adc_time = start + n * block_size / sample_rate
+        jittered = adc_time + rng.normal(0, .5e-3)
+        cb.set_times(jittered, jittered + .01, jittered + .005)
+        assert cb.run(inputs, outputs) == PA_CONTINUE
+        return adc_time
+
+    clock = cb.clock()
+    assert clock.callbacks == 0
+    assert clock.sample_rate == clock.nominal_sample_rate == 48000
+    assert clock.bandwidth == pytest.approx(.2)
+
+    errors = []
+    for n in range(8000):
+        adc_time = run(n)
+        errors.append(cb.clock().time - adc_time)
+    errors = np.array(errors[4000:])
+    clock = cb.clock()
+    assert clock.callbacks == 8000
+    assert clock.resets == 0
+    assert clock.index == 7999 * block_size
+    # Jitter is removed from the timestamps
+    assert clock.jitter == pytest.approx(.5e-3, rel=.2)
+    assert np.sqrt(np.mean(errors ** 2)) < 1e-4
+    assert clock.sample_rate == pytest.approx(sample_rate, rel=1e-5)
+    assert clock.period == pytest.approx(1 / clock.sample_rate)
+    # The output clock follows the DAC times
+    assert cb.clock(True).time - clock.time == pytest.approx(.01)
+
+    # Mapping between sample indices and times
+    index = clock.index + 1000
+    t = clock.time_of(index)
+    assert t == pytest.approx(clock.time + 1000 / clock.sample_rate)
+    assert clock.index_at(t) == pytest.approx(index)
+    t = clock.monotonic_time_of(index)
+    assert t == pytest.approx(clock.time_of(index) + clock.host_offset)
+    assert clock.index_at_monotonic_time(t) == pytest.approx(index)
+    t = clock.wall_time_of(index)
+    assert t == pytest.approx(clock.monotonic_time_of(index) + clock.wall_offset)
+    assert clock.index_at_wall_time(t) == pytest.approx(index)
+
+    # A jump in the timestamps restarts the loop
+    run(8000, start=20.)
+    clock = cb.clock()
+    assert clock.resets == 1
+    assert clock.error == 0
+    assert clock.time == pytest.approx(20 + 8000 * block_size / sample_rate, abs=2e-3)
+    assert clock.sample_rate == pytest.approx(sample_rate, rel=1e-5)
+
+@pytest.mark.parametrize('planar', [False, True])
+@pytest.mark.parametrize('fmt_name', ['float32', 'int16', 'uint8'])
+def test_underrun_zero_fill(planar, fmt_name):
+    nchannels, block_size = 2, 64
+    tolerance = 1e-6 if fmt_name == 'float32' else 2. / 128
+
+    def to_layout(arr):
+        return arr if planar else arr.T
+
+    cb = CallbackTest(fmt_name, planar, nchannels, block_size, underrun_policy='zero_fill')
+    cb.gain = 0
+    inputs = np.zeros((nchannels, block_size), dtype=np.float32)
+    written = np.random.uniform(-.5, .5, (nchannels, block_size)).astype(np.float32)
+    assert cb.write_output(to_layout(written)) == 1
+    outputs = np.full((nchannels, block_size), .75, dtype=np.float32)
+    assert cb.run(inputs, outputs) == PA_CONTINUE
+    assert np.allclose(outputs, written, atol=tolerance)
+    report = cb.underruns()
+    assert (report.count, report.frames, report.gaps) == (0, 0, [])
+
+    # The host buffer is cleared instead of left untouched
+    for i in range(2):
+        outputs = np.full((nchannels, block_size), .75, dtype=np.float32)
+        assert cb.run(inputs, outputs) == PA_CONTINUE
+        assert np.allclose(outputs, 0, atol=tolerance)
+    report = cb.underruns()
+    assert (report.count, report.frames, report.lost_gaps) == (1, block_size * 2, 0)
+    assert len(report.gaps) == 1
+    start_time, nframes = report.gaps[0]
+    assert (start_time.block, start_time.block_index) == (1, 0)
+    assert nframes == block_size * 2
+
+    # Only gaps since the last report are included
+    assert cb.write_output(to_layout(written)) == 1
+    assert cb.run(inputs, outputs) == PA_CONTINUE
+    assert np.allclose(outputs, written, atol=tolerance)
+    report = cb.underruns()
+    assert (report.count, report.gaps) == (1, [])
+
+@pytest.mark.parametrize('planar', [False, True])
+def test_underrun_hold(planar):
+    nchannels, block_size = 2, 64
+    fade = np.arange(block_size, 0, -1, dtype=np.float32) / block_size
+
+    def to_layout(arr):
+        return arr if planar else arr.T
+
+    cb = CallbackTest('float32', planar, nchannels, block_size, underrun_policy='hold')
+    cb.gain = 0
+    inputs = np.zeros((nchannels, block_size), dtype=np.float32)
+    written = np.random.uniform(-.5, .5, (nchannels, block_size)).astype(np.float32)
+    assert cb.write_output(to_layout(written)) == 1
+    outputs = np.zeros((nchannels, block_size), dtype=np.float32)
+    cb.run(inputs, outputs)
+
+    # The last block is repeated while fading out, then silence
+    outputs = np.full((nchannels, block_size), .75, dtype=np.float32)
+    cb.run(inputs, outputs)
+    assert np.allclose(outputs, written * fade, atol=1e-6)
+    cb.run(inputs, outputs)
+    assert not outputs.any()
+
+    # Playback resumes without a fade
+    assert cb.write_output(to_layout(written)) == 1
+    cb.run(inputs, outputs)
+    assert np.allclose(outputs, written, atol=1e-6)
+    report = cb.underruns()
+    assert (report.count, report.frames) == (1, block_size * 2)
+
+@pytest.mark.parametrize('planar', [False, True])
+def test_underrun_crossfade(planar):
+    nchannels, block_size, half = 2, 64, 32
+    gain = np.arange(block_size, dtype=np.float32) / block_size
+
+    def to_layout(arr):
+        return arr if planar else arr.T
+
+    cb = CallbackTest('float32', planar, nchannels, block_size, underrun_policy='crossfade')
+    cb.gain = 0
+    inputs = np.zeros((nchannels, block_size), dtype=np.float32)
+    src = np.random.uniform(-.5, .5, (3, nchannels, block_size)).astype(np.float32)
+    outputs = np.zeros((nchannels, block_size), dtype=np.float32)
+    assert cb.write_output(to_layout(src[0])) == 1
+    cb.run(inputs, outputs)
+
+    # Half a block is available, the rest repeats the oldest frames played
+    assert cb.write_output_frames(to_layout(src[1,:,:half])) == half
+    cb.run(inputs, outputs)
+    history = np.concatenate([src[1,:,:half], src[0,:,half:]], axis=1)
+    assert np.allclose(outputs[:,:half], src[1,:,:half], atol=1e-6)
+    assert np.allclose(outputs[:,half:], src[0,:,half:] * (1 - gain[:half]), atol=1e-6)
+    report = cb.underruns()
+    start_time, nframes = report.gaps[0]
+    assert (start_time.block, start_time.block_index, nframes) == (1, half, half)
+
+    # The concealment signal continues (and fades) under the crossfade
+    assert cb.write_output(to_layout(src[2])) == 1
+    cb.run(inputs, outputs)
+    conceal = history * np.concatenate([1 - (gain[:half] + .5), np.zeros(half)])
+    expected = src[2] * gain + conceal * (1 - gain)
+    assert np.allclose(outputs, expected, atol=1e-6)
+    assert cb.underruns().frames == half
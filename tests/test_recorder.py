@@ -0,0 +1,145 @@
+import struct
+import time
+
+import pytest
+import numpy as np
+
+from _test_buffer import ItemViewTest
+
+ITEMSIZES = {'float32':4, 'int32':4, 'int24':3, 'int16':2, 'int8':1}
+
+def read_wav(filename):
+    with open(filename, 'rb') as f:
+        contents = f.read()
+    riff_id, riff_size, wave_id = struct.unpack('<4sI4s', contents[:12])
+    assert wave_id == b'WAVE'
+    chunks = {}
+    pos = 12
+    while pos < len(contents):
+        chunk_id, size = struct.unpack('<4sI', contents[pos:pos+8])
+        if chunk_id == b'data' and size == 0xFFFFFFFF:
+            size = struct.unpack('<Q', chunks[b'ds64'][8:16])[0]
+        chunks[chunk_id] = contents[pos+8:pos+8+size]
+        pos += 8 + size + size % 2
+    if riff_id == b'RF64':
+        assert riff_size == 0xFFFFFFFF
+        riff_size = struct.unpack('<Q', chunks[b'ds64'][:8])[0]
+    else:
+        assert riff_id == b'RIFF'
+    assert riff_size == len(contents) - 8
+    return riff_id, chunks
+
+def make_blocks(nblocks, block_size, nchannels, itemsize):
+    return np.random.randint(
+        0, 256, (nblocks, block_size, nchannels, itemsize),
+    ).astype(np.uint8)
+
+def callback_data(block, layout):
+    if layout == 'non_interleaved':
+        return [block[:,i].tobytes() for i in range(block.shape[1])]
+    return [block.tobytes()]
+
+def wait_for_empty(bfr, remaining=0, timeout=5):
+    start = time.monotonic()
+    while bfr.read_available_frames > remaining:
+        assert time.monotonic() - start < timeout
+        time.sleep(.001)
+
+@pytest.mark.parametrize('sample_format', list(ITEMSIZES.keys()))
+@pytest.mark.parametrize('layout', ['interleaved', 'non_interleaved'])
+def test_recorder(tmp_path, sample_format, layout):
+    nchannels, block_size, length, nblocks = 3, 64, 8, 40
+    itemsize = ITEMSIZES[sample_format]
+    filename = tmp_path / 'recording.wav'
+    bfr = ItemViewTest(sample_format, nchannels, block_size, length, layout)
+    src = make_blocks(nblocks, block_size, nchannels, itemsize)
+
+    # A small write buffer so the data is written in several parts
+    recorder = bfr.record(filename, write_buffer_size=1000)
+    assert recorder.recording
+    for block in src:
+        # A failed write would count as a drop
+        while bfr.write_available_frames < block_size:
+            time.sleep(.001)
+        assert bfr.write_from_callback(callback_data(block, layout)) == 1
+    recorder.stop()
+    assert not recorder.recording
+    assert recorder.dropped_frames == 0
+    assert recorder.frames_written == nblocks * block_size
+
+    riff_id, chunks = read_wav(filename)
+    assert riff_id == b'RIFF'
+    assert len(chunks[b'JUNK']) == 28
+    tag, nch, fs, byte_rate, block_align, bits = struct.unpack('<HHIIHH', chunks[b'fmt '][:16])
+    assert tag == 0xFFFE
+    assert (nch, fs, byte_rate) == (nchannels, 48000, 48000 * nchannels * itemsize)
+    assert (block_align, bits) == (nchannels * itemsize, itemsize * 8)
+    subtype = struct.unpack('<H', chunks[b'fmt '][24:26])[0]
+    assert subtype == (3 if sample_format == 'float32' else 1)
+
+    expected = src.tobytes()
+    if sample_format == 'int8':
+        expected = (src ^ 0x80).tobytes()
+    assert chunks[b'data'] == expected
+
+@pytest.mark.parametrize('sample_format,tag,fmt_size', [('int16', 1, 16), ('float32', 3, 18)])
+def test_recorder_formats(tmp_path, sample_format, tag, fmt_size):
+    nchannels, block_size = 2, 32
+    itemsize = ITEMSIZES[sample_format]
+    filename = tmp_path / 'recording.wav'
+    bfr = ItemViewTest(sample_format, nchannels, block_size, 4, 'interleaved')
+    src = make_blocks(3, block_size, nchannels, itemsize)
+
+    for block in src:
+        assert bfr.write_from_callback(callback_data(block, 'interleaved')) == 1
+    # Frames taken before the recorder starts. The rest of the blocks can
+    # no longer be borrowed in place
+    dest = np.zeros((5, nchannels), dtype=np.float32)
+    assert bfr.read_frames(dest)[0] == 5
+    recorder = bfr.record(filename, rf64=True)
+    # Whole blocks are recorded, the last partial one stays in the buffer
+    wait_for_empty(bfr, block_size - 5)
+    recorder.stop()
+    assert bfr.read_available_frames == block_size - 5
+
+    riff_id, chunks = read_wav(filename)
+    assert riff_id == b'RF64'
+    riff_size, data_size, sample_count = struct.unpack('<QQQ', chunks[b'ds64'][:24])
+    assert len(chunks[b'fmt ']) == fmt_size
+    assert struct.unpack('<HH', chunks[b'fmt '][:4]) == (tag, nchannels)
+    assert sample_count == block_size * 2
+    assert data_size == sample_count * nchannels * itemsize
+    assert chunks[b'data'] == src.reshape(-1, nchannels, itemsize)[5:5 + sample_count].tobytes()
+
+@pytest.mark.parametrize('layout', ['interleaved', 'non_interleaved'])
+def test_recorder_dropped(tmp_path, layout):
+    nchannels, block_size, length = 2, 64, 2
+    filename = tmp_path / 'recording.wav'
+    bfr = ItemViewTest('int16', nchannels, block_size, length, layout)
+    src = make_blocks(6, block_size, nchannels, 2)
+
+    # Blocks 2 and 3 are dropped since the buffer is full
+    results = [bfr.write_from_callback(callback_data(src[i], layout)) for i in range(4)]
+    assert results == [1, 1, 0, 0]
+    recorder = bfr.record(filename)
+    wait_for_empty(bfr)
+    for i in range(4, 6):
+        assert bfr.write_from_callback(callback_data(src[i], layout)) == 1
+    recorder.stop()
+    assert recorder.dropped_frames == block_size * 2
+    assert recorder.dropped_blocks == 2
+    assert recorder.frames_written == block_size * 4
+
+    riff_id, chunks = read_wav(filename)
+    assert chunks[b'data'] == np.concatenate([src[:2], src[4:]]).tobytes()
+
+def test_recorder_errors(tmp_path):
+    bfr = ItemViewTest('int16', 1, 64, 2)
+    with pytest.raises(OSError):
+        bfr.record(tmp_path / 'missing' / 'recording.wav')
+    recorder = bfr.record(tmp_path / 'recording.wav')
+    with pytest.raises(RuntimeError):
+        recorder.start()
+    recorder.stop()
+    # A second stop has no effect
+    recorder.stop()
@@ -1,11 +1,15 @@
+import asyncio
 import time
 import warnings
 import numpy as np
+import pytest
 from scipy.io import wavfile
 
 from cysounddevice.types import SampleTime
 from cysounddevice.utils import PortAudioError
 
+from _test_buffer import sample_time_array
+
 RECORD_DURATION = 3
 
 BLOCK_DATA_DTYPE = np.dtype([
@@ -150,6 +154,42 @@ class Recorder:
     def to_wav(self, filename):
         recorded_to_wav(filename, self.start_time.sample_rate, self.sample_data)
 
+
+class BulkRecorder(Recorder):
+    """Reads all available blocks at once with
+    :meth:`~cysounddevice.buffer.StreamInputBuffer.read_many`
+    """
+    def gather_samples(self):
+        if self.complete:
+            return False
+        bfr = self.stream.input_buffer
+        if not bfr.ready():
+            return False
+        cur_blk = self.current_time.block
+        block_size = self.stream.frames_per_buffer
+        assert block_size == self.start_time.block_size
+
+        # Read all available blocks directly into the remaining sample_data
+        count, times = bfr.read_many(self.sample_data[:,cur_blk:,:])
+        if count == 0:
+            return False
+        times = np.asarray(times)
+        bd = self.block_data[cur_blk:cur_blk+count]
+        bd['block'] = times['block']
+        bd['block_index'] = times['block_index']
+        bd['sample_index'] = times['block'] * times['block_size'] + times['block_index']
+        bd['pa_time'] = times['pa_time']
+        bd['rel_time'] = times['rel_time']
+        bd['time_offset'] = times['time_offset']
+
+        self.current_time.block += count
+
+        if self.current_time >= self.end_time:
+            self.complete = True
+            return False
+        return True
+
+
 def recorded_to_wav(filename, sample_rate, sample_data):
     # cdef np.ndarray[FLOAT32_DTYPE_t, ndim=3] all_data = self.sample_data
     nchannels = sample_data.shape[0]
@@ -202,3 +242,136 @@ def test_record(port_audio, block_size, jack_sample_rate, SAMPLE_FORMATS, worker
             #     print(samp_ix_diff)
             assert bad_blocks.size == 0
             device.close_stream()
+
+
+def test_record_many(port_audio, block_size, jack_sample_rate, SAMPLE_FORMATS):
+    with port_audio(jack_sample_rate, block_size) as pa:
+        hostapi = pa.get_host_api_by_name('JACK Audio Connection Kit')
+        device = hostapi.devices[0]
+        for sample_format in SAMPLE_FORMATS:
+            stream = device.open_stream(
+                sample_rate=jack_sample_rate,
+                frames_per_buffer=block_size,
+                sample_format=sample_format['name'],
+                input_channels=2,
+            )
+            try:
+                stream.check()
+            except PortAudioError as exc:
+                if exc.error_msg == 'Invalid sample rate':
+                    warnings.warn(f'Invalid sample rate ({jack_sample_rate})')
+                    return
+            rec = BulkRecorder(stream, RECORD_DURATION)
+            rec.record()
+            assert rec.complete
+
+            ix = np.flatnonzero(np.greater(rec.block_data['pa_time'], 0))
+            block_data = rec.block_data[ix]
+            assert block_data.size >= rec.end_time.block - 1
+            expected_sample_index = np.arange(rec.block_data.size) * block_size
+            assert np.array_equal(block_data['sample_index'], expected_sample_index[ix])
+            device.close_stream()
+
+
+async def record_async(stream, nblocks):
+    blocks = []
+    with stream:
+        async for data, sample_time in stream:
+            blocks.append((np.array(data), sample_time.copy()))
+            if len(blocks) >= nblocks:
+                break
+    return blocks
+
+def test_record_async(port_audio, block_size, jack_sample_rate):
+    with port_audio(jack_sample_rate, block_size) as pa:
+        hostapi = pa.get_host_api_by_name('JACK Audio Connection Kit')
+        device = hostapi.devices[0]
+        stream = device.open_stream(
+            sample_rate=jack_sample_rate,
+            frames_per_buffer=block_size,
+            sample_format='float32',
+            input_channels=2,
+        )
+        stream.stream_info.output_channels = 0
+        nblocks = int(jack_sample_rate // block_size)
+        loop = asyncio.new_event_loop()
+        try:
+            blocks = loop.run_until_complete(
+                asyncio.wait_for(record_async(stream, nblocks), RECORD_DURATION + 2),
+            )
+        finally:
+            loop.close()
+        assert len(blocks) == nblocks
+        for i, (data, sample_time) in enumerate(blocks):
+            assert data.shape == (2, block_size)
+            assert sample_time.block * block_size + sample_time.block_index == i * block_size
+        device.close_stream()
+
+def test_close_with_exported_view(port_audio, jack_sample_rate):
+    block_size = 256
+    with port_audio(jack_sample_rate, block_size) as pa:
+        hostapi = pa.get_host_api_by_name('JACK Audio Connection Kit')
+        device = hostapi.devices[0]
+        stream = device.open_stream(
+            sample_rate=jack_sample_rate,
+            frames_per_buffer=block_size,
+            sample_format='float32',
+            input_channels=2,
+        )
+        stream.stream_info.output_channels = 0
+        stream.open()
+        try:
+            view = None
+            end_ts = time.time() + 2
+            while view is None and time.time() < end_ts:
+                view = stream.input_buffer.borrow()
+                time.sleep(.01)
+            assert view is not None
+            arr = np.asarray(view)
+
+            # The array still references the stream's memory
+            with pytest.raises(BufferError):
+                stream.close()
+            assert stream.active
+            assert view.valid
+
+            del arr
+            view.release()
+        finally:
+            stream.close()
+        assert not stream.active
+        device.close_stream()
+
+def test_read_many_interleaved(port_audio, jack_sample_rate):
+    # More blocks than frames per block, so the block axis (first for
+    # interleaved streams) can't be confused with the block_size axis
+    block_size = 16
+    nblocks = 24
+    with port_audio(jack_sample_rate, block_size) as pa:
+        hostapi = pa.get_host_api_by_name('JACK Audio Connection Kit')
+        device = hostapi.devices[0]
+        stream = device.open_stream(
+            sample_rate=jack_sample_rate,
+            frames_per_buffer=block_size,
+            sample_format='float32',
+            input_channels=2,
+            layout='interleaved',
+        )
+        stream.stream_info.output_channels = 0
+        with stream:
+            bfr = stream.input_buffer
+            end_ts = time.time() + 2
+            while bfr.read_available < nblocks and time.time() < end_ts:
+                time.sleep(.01)
+            assert bfr.read_available >= nblocks
+
+            data = np.zeros((nblocks, block_size, 2), dtype=np.float32)
+            with pytest.raises(ValueError):
+                bfr.read_many(np.zeros((2, nblocks, block_size), dtype=np.float32))
+
+            # A times array with exactly one element per block
+            count, times = bfr.read_many(data, sample_time_array(nblocks))
+            assert count == nblocks
+            blocks = np.asarray(times)['block']
+            assert np.array_equal(np.diff(blocks), np.ones(nblocks - 1))
+        device.close_stream()
@@ -0,0 +1,112 @@
+import pytest
+import numpy as np
+
+from cysounddevice.resample import Resampler, quality_params
+
+def sine(freq, sample_rate, nframes, nchannels=1, phase=0):
+    t = (np.arange(nframes) + phase) / sample_rate
+    data = np.sin(2 * np.pi * freq * t).astype(np.float32)
+    return np.tile(data, (nchannels, 1))
+
+@pytest.mark.parametrize('nchannels', [1, 2])
+def test_resample_sine(nchannels):
+    in_rate, out_rate = 48024., 48000.
+    step = in_rate / out_rate
+    block_size = 256
+    r = Resampler(nchannels, half_taps=16)
+    src = sine(1000, in_rate, int(in_rate), nchannels)
+    # Different input and output block sizes
+    outputs = []
+    for i in range(0, src.shape[1], 300):
+        assert r.push(np.ascontiguousarray(src[:,i:i+300])) == src[:,i:i+300].shape[1]
+        while r.available(step) >= block_size:
+            out = np.zeros((nchannels, block_size), dtype=np.float32)
+            assert r.process(out, step) == block_size
+            outputs.append(out)
+    result = np.concatenate(outputs, axis=1)
+    assert result.shape[1] >= out_rate - 2 * block_size
+    assert r.position == pytest.approx(result.shape[1] * step)
+
+    # Frames before the first input are zero
+    expected = sine(1000, out_rate, result.shape[1], nchannels)
+    assert np.abs(result[:,64:] - expected[:,64:]).max() < 1e-3
+    for c in range(1, nchannels):
+        assert np.array_equal(result[0], result[c])
+
+def test_resample_dc():
+    r = Resampler(2, half_taps=8, capacity=1024)
+    data = np.full((2, 512), .5, dtype=np.float32)
+    data[1] = -.25
+    r.reset(start=100, position=150)
+    assert r.start == 100
+    assert r.push(data) == 512
+    assert r.end == 612
+    out = np.zeros((2, 128), dtype=np.float32)
+    for step in [.9, 1., 1.1]:
+        assert r.process(out, step) == 128
+        assert np.allclose(out[0], .5, atol=1e-4)
+        assert np.allclose(out[1], -.25, atol=1e-4)
+
+    # Output stops half_taps frames before the end of the input
+    r.position = 590
+    assert r.available() == 14
+    assert r.process(out) == 14
+    assert r.position == 604
+
+def test_resample_capacity():
+    r = Resampler(1, half_taps=4, capacity=64)
+    data = np.ones((1, 100), dtype=np.float32)
+    assert r.push(data) == 64
+    assert r.push(data) == 0
+    # Frames no longer needed for the output position are discarded
+    out = np.zeros((1, 32), dtype=np.float32)
+    assert r.process(out) == 32
+    assert r.push(data) == 32 - 3
+    assert r.start == 32 - 3
+
+def test_resample_errors():
+    with pytest.raises(ValueError):
+        Resampler(0)
+    with pytest.raises(ValueError):
+        Resampler(1, half_taps=0)
+    r = Resampler(2)
+    with pytest.raises(ValueError):
+        r.push(np.zeros((1, 16), dtype=np.float32))
+    with pytest.raises(ValueError):
+        r.process(np.zeros((1, 16), dtype=np.float32))
+    with pytest.raises(ValueError):
+        r.process(np.zeros((2, 16), dtype=np.float32), 0)
+
+def test_quality_params():
+    params = quality_params()
+    assert params == quality_params('medium', 16000, 48000)
+    assert params['half_taps'] == 16
+    # Downsampling lowers the cutoff and widens the filter to match
+    down = quality_params('medium', 48000, 16000)
+    assert down['cutoff'] == pytest.approx(params['cutoff'] / 3)
+    assert down['half_taps'] == params['half_taps'] * 3
+    assert down['beta'] == params['beta']
+    taps = [quality_params(q)['half_taps'] for q in ['fast', 'medium', 'high', 'best']]
+    assert taps == sorted(taps)
+    with pytest.raises(ValueError):
+        quality_params('ultra')
+    with pytest.raises(ValueError):
+        quality_params('fast', 0, 48000)
+
+@pytest.mark.parametrize('quality,attenuation', [
+    ('fast', 60), ('medium', 80), ('high', 100), ('best', 120),
+])
+def test_resample_quality(quality, attenuation):
+    in_rate, out_rate = 48000., 16000.
+    step = in_rate / out_rate
+    def level(freq):
+        r = Resampler(1, capacity=20000, **quality_params(quality, in_rate, out_rate))
+        assert r.push(sine(freq, in_rate, 19200)) == 19200
+        out = np.zeros((1, r.available(step)), dtype=np.float32)
+        r.process(out, step)
+        # Skip the start where the input was silent
+        return np.sqrt(2 * np.mean(out[0,1024:].astype(np.float64) ** 2))
+
+    assert level(1000) == pytest.approx(1, abs=.01)
+    # Above the output Nyquist frequency
+    assert 20 * np.log10(level(12000)) < -attenuation
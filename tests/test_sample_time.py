@@ -3,7 +3,7 @@ import pytest
 
 import numpy as np
 
-from cysounddevice.types import SampleTime
+from cysounddevice.types import SampleTime, SampleTimeArray
 # import _test_sample_time
 
 def test_blocks(sample_rate, block_size):
@@ -185,3 +185,112 @@ def test_math_ops(sample_rate, block_size):
             assert st4 == st5 == st1
 
             expected_sample_index += 1
+
+
+def test_sample_time_array(sample_rate, block_size):
+    nblocks = 64
+    time_offset = 12.5
+    arr = SampleTimeArray(nblocks, block_size, sample_rate, time_offset)
+    assert len(arr) == nblocks
+
+    # Each entry is the start of a block
+    expected = [SampleTime(i, 0, block_size, sample_rate) for i in range(nblocks)]
+    for st in expected:
+        st.time_offset = time_offset
+    assert list(arr) == expected
+    assert arr[-1] == expected[-1]
+    with pytest.raises(IndexError):
+        arr[nblocks]
+
+    # Vectorized conversions match the scalar ones
+    indices = np.arange(nblocks * block_size, dtype=np.int64)[::7].copy()
+    arr = SampleTimeArray.from_sample_indices(indices, block_size, sample_rate, time_offset)
+    assert np.array_equal(np.asarray(arr.sample_indices()), indices)
+    for st, sample_index in zip(arr, indices):
+        assert st.sample_index == sample_index
+    assert np.array_equal(np.asarray(arr.blocks()), indices // block_size)
+    assert np.array_equal(np.asarray(arr.block_indices()), indices % block_size)
+    rel_times = np.asarray(arr.rel_times())
+    assert np.allclose(rel_times, indices / sample_rate)
+    assert np.allclose(np.asarray(arr.pa_times()), rel_times + time_offset)
+
+    arr2 = SampleTimeArray(len(indices), block_size, sample_rate, time_offset)
+    arr2.set_rel_times(rel_times)
+    assert np.array_equal(np.asarray(arr2.sample_indices()), indices)
+    arr2 = SampleTimeArray(len(indices), block_size, sample_rate, time_offset)
+    arr2.set_pa_times(rel_times + time_offset)
+    assert np.array_equal(np.asarray(arr2.sample_indices()), indices)
+    arr2 = SampleTimeArray(len(indices), block_size, sample_rate, time_offset)
+    arr2.set_blocks(np.asarray(arr.blocks()), np.asarray(arr.block_indices()))
+    assert list(arr2) == list(arr)
+
+    arr2.set_time_offset(0)
+    assert np.allclose(np.asarray(arr2.pa_times()), rel_times)
+    with pytest.raises(ValueError):
+        arr2.set_rel_times(rel_times[1:])
+
+def test_sample_time_array_buffer(sample_rate, block_size):
+    nblocks = 16
+    arr = SampleTimeArray(nblocks, block_size, sample_rate)
+
+    # Shared memory with numpy
+    data = np.asarray(arr)
+    assert data.shape == (nblocks,)
+    assert np.array_equal(data['block'], np.arange(nblocks))
+    data['block_index'] = 1
+    arr.update()
+    assert all(st.block_index == 1 for st in arr)
+    assert np.array_equal(
+        np.asarray(arr.sample_indices()), np.arange(nblocks) * block_size + 1,
+    )
+
+    # Slices are views
+    sl = arr[2:10:2]
+    assert len(sl) == 4
+    assert [st.block for st in sl] == [2, 4, 6, 8]
+    st = SampleTime(100, 0, block_size, sample_rate)
+    sl[0] = st
+    assert arr[2] == st
+    assert len(arr[5:5]) == 0
+    assert len(np.asarray(arr[5:5])) == 0
+
+    wrapped = SampleTimeArray.from_buffer(data)
+    assert wrapped.base is data
+    assert list(wrapped) == list(arr)
+
+def test_sample_time_array_search(sample_rate, block_size):
+    nblocks = 32
+    time_offset = 100.
+    block_time = block_size / sample_rate
+    # Every other block
+    arr = SampleTimeArray(nblocks, block_size, sample_rate, time_offset)
+    arr.set_blocks(np.arange(nblocks, dtype=np.int32) * 2, np.zeros(nblocks, dtype=np.intp))
+    pa_times = np.asarray(arr.pa_times())
+    rel_times = np.asarray(arr.rel_times())
+
+    assert arr.searchsorted(pa_times[3]) == 3
+    assert arr.searchsorted(pa_times[3], side='right') == 4
+    assert arr.searchsorted(0) == 0
+    assert arr.searchsorted(1e9) == nblocks
+    assert arr.searchsorted(block_size * 4, key='sample_index') == 2
+    with pytest.raises(ValueError):
+        arr.searchsorted(0, key='foo')
+    with pytest.raises(ValueError):
+        arr.searchsorted(0, side='middle')
+
+    for i in range(nblocks):
+        t = pa_times[i]
+        assert arr.find_block(t) == i
+        assert arr.find_block(t + block_time / 2) == i
+        # In the gap between entries
+        assert arr.find_block(t + block_time * 1.5) == -1
+        assert arr.find_block(rel_times[i], key='rel_time') == i
+        sample_index = i * 2 * block_size
+        assert arr.find_block(sample_index + block_size - 1, key='sample_index') == i
+        assert arr.find_block(sample_index + block_size, key='sample_index') == -1
+    assert arr.find_block(time_offset - 1) == -1
+
+    values = np.concatenate([pa_times + block_time / 2, pa_times + block_time * 1.5])
+    result = np.asarray(arr.find_blocks(values))
+    assert np.array_equal(result[:nblocks], np.arange(nblocks))
+    assert np.all(result[nblocks:] == -1)
@@ -0,0 +1,410 @@
+import time
+import warnings
+import tracemalloc
+from collections import deque
+from itertools import repeat
+
+import pytest
+import numpy as np
+
+from cysounddevice import PortAudio
+from cysounddevice.stream_callback import StreamCallbackError
+from cysounddevice.devices import VirtualDevice
+from cysounddevice.types import SampleTime
+
+def wait_for(predicate, timeout=5):
+    start = time.monotonic()
+    while not predicate():
+        assert time.monotonic() - start < timeout
+        time.sleep(.001)
+
+@pytest.mark.parametrize('layout', ['deinterleaved', 'interleaved', 'non_interleaved'])
+def test_virtual_loopback(layout):
+    block_size, nblocks = 256, 8
+    device = VirtualDevice(num_inputs=2, num_outputs=2, loopback=True)
+    stream = device.open_stream(
+        sample_rate=48000, frames_per_buffer=block_size, sample_format='float32',
+        input_channels=2, output_channels=2, layout=layout,
+    )
+    shape = (block_size, 2) if layout == 'interleaved' else (2, block_size)
+    with stream:
+        assert stream.active
+        driver = stream.virtual_driver
+        assert driver.realtime and driver.loopback
+        assert stream.stream_info.input_latency == block_size / 48000
+        for i in range(nblocks):
+            assert stream.output_buffer.write_output_sf32(np.full(shape, (i + 1) / 16, dtype=np.float32))
+
+        values = []
+        times = []
+        start = time.monotonic()
+        while len(values) < nblocks:
+            assert time.monotonic() - start < 5
+            dest = np.zeros(shape, dtype=np.float32)
+            sample_time = stream.input_buffer.read_into(dest)
+            if sample_time is None:
+                time.sleep(.001)
+                continue
+            times.append(sample_time.copy())
+            if dest.any():
+                assert np.all(dest == dest.flat[0])
+                values.append(dest.flat[0])
+        clock = stream.clock()
+        end = time.monotonic()
+        assert stream.clock(output=True) is not None
+    assert stream.clock() is None
+    assert not stream.active
+    assert not driver.opened
+    assert values == [(i + 1) / 16 for i in range(nblocks)]
+    # The timestamps are exact so the clock model matches them
+    assert clock.resets == 0
+    assert clock.sample_rate == pytest.approx(48000)
+    # The software clock is monotonic_time() so the offset is only the
+    # scheduling delay of the callbacks
+    assert 0 <= clock.host_offset < .01
+    assert end - 1 < clock.monotonic_time_of(times[-1]) < end
+    # Consecutive blocks with ADC times from the software clock
+    blocks = [t.block for t in times]
+    assert blocks == list(range(len(times)))
+    for i, t in enumerate(times):
+        assert t.time_offset == pytest.approx(i * block_size / 48000)
+    # Paced in real time
+    assert driver.elapsed >= (driver.callbacks - 1) * block_size / 48000 * .9
+
+@pytest.mark.parametrize('layout', ['deinterleaved', 'interleaved', 'non_interleaved'])
+def test_virtual_resample(layout):
+    block_size, nblocks = 240, 100
+    freq = 1000
+    device = VirtualDevice(num_inputs=2, num_outputs=2, loopback=True)
+    stream = device.open_stream(
+        sample_rate=48000, frames_per_buffer=block_size, sample_format='int16',
+        input_channels=2, output_channels=2, layout=layout,
+        buffer_sample_rate=16000, resample_quality='fast',
+    )
+    assert stream.buffer_sample_rate == 16000
+    assert stream.stream_info.resample_quality == 'fast'
+    # The buffers use a block of the same duration at the buffer rate
+    n = block_size // 3
+    shape = (n, 2) if layout == 'interleaved' else (2, n)
+    written = 0
+    def write_output():
+        nonlocal written
+        while True:
+            t = np.arange(written, written + n) / 16000
+            data = np.tile(.5 * np.sin(2 * np.pi * freq * t), (2, 1)).astype(np.float32)
+            if layout == 'interleaved':
+                data = np.ascontiguousarray(data.T)
+            if not stream.output_buffer.write_output_sf32(data):
+                break
+            written += n
+
+    blocks = []
+    times = []
+    with stream:
+        start = time.monotonic()
+        while len(blocks) < nblocks:
+            assert time.monotonic() - start < 5
+            write_output()
+            dest = np.zeros(shape, dtype=np.float32)
+            sample_time = stream.input_buffer.read_into(dest)
+            if sample_time is None:
+                time.sleep(.001)
+                continue
+            blocks.append(dest.T if layout == 'interleaved' else dest)
+            times.append(sample_time.copy())
+        clock = stream.clock()
+        assert stream.callback_errors().total == 0
+    assert clock.index_scale == 3
+    assert clock.nominal_sample_rate == 16000
+    assert clock.sample_rate == pytest.approx(16000)
+    assert clock.index % n == 0
+    for i, t in enumerate(times):
+        assert t.sample_rate == 16000
+        assert t.block == i
+        assert t.time_offset == pytest.approx(i * n / 16000)
+
+    # The output is resampled to 48 kHz, looped back and resampled to
+    # 16 kHz again. Skip the silence before the loopback and the fade in
+    result = np.concatenate(blocks, axis=1)
+    assert np.array_equal(result[0], result[1])
+    signal = result[0]
+    first = np.argmax(np.abs(signal) > .1) + 200
+    y = signal[first:].astype(np.float64)
+    t = np.arange(y.size) * 2 * np.pi * freq / 16000
+    basis = np.stack([np.sin(t), np.cos(t)], axis=1)
+    coefs = np.linalg.lstsq(basis, y, rcond=None)[0]
+    assert np.hypot(*coefs) == pytest.approx(.5, abs=.005)
+    assert np.abs(y - basis @ coefs).max() < 1e-3
+
+def test_virtual_resample_blocking():
+    device = VirtualDevice(num_inputs=1, num_outputs=0)
+    stream = device.open_stream(
+        sample_rate=48000, sample_format='float32', input_channels=1, output_channels=0,
+        buffer_sample_rate=16000, blocking=True,
+    )
+    with pytest.raises(ValueError):
+        stream.open()
+    with pytest.raises(ValueError):
+        stream.stream_info.resample_quality = 'ultra'
+
+@pytest.mark.parametrize('layout', ['deinterleaved', 'interleaved', 'non_interleaved'])
+@pytest.mark.parametrize('sample_format', ['float32', 'int24', 'int16'])
+@pytest.mark.parametrize('routing', ['map', 'mix'])
+def test_virtual_routing(layout, sample_format, routing):
+    block_size, nblocks = 128, 8
+    device = VirtualDevice(num_inputs=4, num_outputs=4, loopback=True)
+    if routing == 'map':
+        # Buffer channels 0 and 1 are played on device channels 1 and 3,
+        # which are read back in the opposite order with a silent channel
+        kwargs = dict(output_channel_map=[1, 3], input_channel_map=[3, 1, 0])
+        out_gains = np.array([[0, 0], [1, 0], [0, 0], [0, 1]])
+        in_gains = np.array([[0, 0, 0, 1], [0, 1, 0, 0], [1, 0, 0, 0]])
+    else:
+        out_gains = np.array([[1, 0], [.5, .5], [0, 0], [0, -.25]])
+        in_gains = np.array([[.5, .5, 0, 0], [0, 0, 0, 1], [.25, .25, .25, .25]])
+        kwargs = dict(output_mix=out_gains, input_mix=in_gains)
+    stream = device.open_stream(
+        sample_rate=48000, frames_per_buffer=block_size, sample_format=sample_format,
+        input_channels=4, output_channels=4, layout=layout, **kwargs
+    )
+    assert stream.stream_info.input_channel_map == kwargs.get('input_channel_map')
+    if routing == 'mix':
+        assert np.array_equal(stream.stream_info.input_mix, in_gains)
+    in_shape = (block_size, 3) if layout == 'interleaved' else (3, block_size)
+    values = [(i + 1) / 16 for i in range(nblocks)]
+    with stream:
+        assert stream.output_buffer.nchannels == 2
+        assert stream.input_buffer.nchannels == 3
+        for i, v in enumerate(values):
+            data = np.empty((2, block_size), dtype=np.float32)
+            data[0] = v
+            data[1] = -v / 2
+            if layout == 'interleaved':
+                data = np.ascontiguousarray(data.T)
+            assert stream.output_buffer.write_output_sf32(data)
+        received = []
+        start = time.monotonic()
+        while len(received) < nblocks:
+            assert time.monotonic() - start < 5
+            dest = np.zeros(in_shape, dtype=np.float32)
+            if stream.input_buffer.read_into(dest) is None:
+                time.sleep(.001)
+                continue
+            if layout == 'interleaved':
+                dest = dest.T
+            if dest.any():
+                received.append(dest)
+    for v, dest in zip(values, received):
+        expected = in_gains @ (out_gains @ np.array([v, -v / 2]))
+        for c in range(3):
+            assert np.allclose(dest[c], expected[c], atol=1e-4)
+
+def test_virtual_routing_resample():
+    block_size = 240
+    device = VirtualDevice(num_inputs=8, num_outputs=8, loopback=True)
+    stream = device.open_stream(
+        sample_rate=48000, frames_per_buffer=block_size, sample_format='float32',
+        input_channels=8, output_channels=8, buffer_sample_rate=16000,
+        output_channel_map=[6], input_mix=[[0] * 6 + [.5, 0]],
+    )
+    n = block_size // 3
+    blocks = []
+    with stream:
+        assert stream.input_buffer.nchannels == 1
+        start = time.monotonic()
+        while len(blocks) < 40:
+            assert time.monotonic() - start < 5
+            while stream.output_buffer.write_output_sf32(np.full((1, n), .5, dtype=np.float32)):
+                pass
+            dest = np.zeros((1, n), dtype=np.float32)
+            if stream.input_buffer.read_into(dest) is None:
+                time.sleep(.001)
+                continue
+            blocks.append(dest)
+    result = np.concatenate(blocks, axis=1)[0]
+    # After the filters have settled
+    assert np.allclose(result[-n * 10:], .25, atol=1e-3)
+
+def test_routing_errors():
+    device = VirtualDevice(num_inputs=2, num_outputs=2)
+    stream = device.open_stream(
+        sample_rate=48000, sample_format='float32', input_channels=2, output_channels=2,
+    )
+    info = stream.stream_info
+    with pytest.raises(ValueError):
+        info.input_channel_map = [-1]
+    with pytest.raises(ValueError):
+        info.input_mix = [[1, 0], [1]]
+    info.input_mix = [[1, 1]]
+    info.input_channel_map = [1, 0]
+    # Setting one clears the other
+    assert info.input_mix is None
+    info.output_channel_map = [2]
+    with pytest.raises(ValueError):
+        stream.open()
+    assert not stream.active
+    info.output_channel_map = None
+    info.output_mix = [[1, 0], [0, 1], [1, 1]]
+    with pytest.raises(ValueError):
+        stream.open()
+    info.output_mix = None
+    stream.blocking = True
+    with pytest.raises(ValueError):
+        stream.open()
+
+def test_virtual_free_run():
+    block_size = 128
+    device = VirtualDevice(num_inputs=1, num_outputs=2, realtime=False)
+    stream = device.open_stream(
+        sample_rate=48000, frames_per_buffer=block_size, sample_format='int16',
+        input_channels=1, output_channels=2, underrun_policy='hold',
+    )
+    with stream:
+        driver = stream.virtual_driver
+        wait_for(lambda: driver.callbacks >= 2000)
+        stats = stream.stats()
+        underruns = stream.underruns()
+        # Nothing is consuming the input or writing the output
+        assert stream.input_buffer.dropped_frames > 0
+    assert driver.callbacks >= 2000
+    assert driver.frames == driver.callbacks * block_size
+    assert driver.result == -1
+    # Much faster than real time
+    assert driver.frames_per_second > 48000
+    assert stats.callbacks >= 2000
+    assert underruns.count == 1
+    assert underruns.frames >= 2000 * block_size
+
+def test_virtual_xruns():
+    device = VirtualDevice(
+        realtime=False, xrun_flags=['input_overflow', 'output_underflow'], xrun_interval=10,
+    )
+    assert device.xrun_flags == ['input_overflow', 'output_underflow']
+    stream = device.open_stream(
+        sample_rate=48000, frames_per_buffer=64, sample_format='float32',
+        input_channels=2, output_channels=2,
+    )
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore')
+        with stream:
+            driver = stream.virtual_driver
+            assert driver.xrun_flags == ['input_overflow', 'output_underflow']
+            wait_for(lambda: driver.callbacks >= 100)
+    assert driver.xruns == driver.callbacks // 10
+
+    device.xrun_flags = None
+    device.xrun_interval = 0
+    with stream:
+        driver = stream.virtual_driver
+        wait_for(lambda: driver.callbacks >= 10)
+        assert driver.xruns == 0
+        driver.inject_xrun('input_underflow')
+        wait_for(lambda: driver.xruns == 1)
+        time.sleep(.01)
+        assert driver.xruns == 1
+
+def test_virtual_errors():
+    device = VirtualDevice(name='test device', num_inputs=2, num_outputs=0)
+    assert device.is_virtual
+    assert str(device) == 'test device, virtual (2 in, 0 out)'
+    with pytest.raises(ValueError):
+        VirtualDevice(xrun_flags='not a flag')
+
+    stream = device.open_stream(sample_format='float32', input_channels=4, output_channels=0)
+    with pytest.raises(ValueError):
+        stream.check()
+    with pytest.raises(ValueError):
+        stream.open()
+    assert not stream.active
+    device.close()
+
+    stream = device.open_stream(sample_format='float32', input_channels=2, output_channels=0, blocking=True)
+    assert stream.check() == 0
+    with pytest.raises(ValueError):
+        stream.open()
+    device.close()
+
+def test_virtual_port_audio():
+    pa = PortAudio()
+    device = pa.add_virtual_device(name='virtual 1', num_inputs=1, num_outputs=1)
+    assert pa.get_device_by_name('virtual 1') is device
+    assert device in pa.devices
+    with pytest.raises(ValueError):
+        pa.add_virtual_device(name='virtual 1')
+
+def test_callback_errors():
+    device = VirtualDevice(realtime=False)
+    stream = device.open_stream(
+        sample_rate=48000, frames_per_buffer=64, sample_format='float32',
+        input_channels=2, output_channels=2,
+    )
+    with stream:
+        driver = stream.virtual_driver
+        errors = stream.callback_errors()
+        assert errors.total == 0
+        assert errors.last_error is None
+
+        driver.inject_xrun(['input_overflow', 'output_underflow'])
+        wait_for(lambda: driver.xruns == 1)
+        # Warned once for the new error, then quiet while no more are counted
+        with pytest.warns(StreamCallbackError):
+            stream.input_buffer.ready()
+        with warnings.catch_warnings():
+            warnings.simplefilter('error')
+            for i in range(10):
+                stream.input_buffer.ready()
+
+        stream.callback_handler.warn_errors = False
+        driver.inject_xrun('input_underflow')
+        wait_for(lambda: driver.xruns == 2)
+        with warnings.catch_warnings():
+            warnings.simplefilter('error')
+            stream.input_buffer.ready()
+
+        errors = stream.callback_errors()
+        assert errors.total == 2
+        assert errors.input_overflow == errors.output_underflow == 1
+        assert errors.input_underflow == 1
+        assert errors.output_overflow == errors.priming_output == 0
+        assert errors.last_error == 'Input Underflow'
+
+def test_read_block_into_allocations():
+    nblocks = 5000
+    block_size = 64
+    device = VirtualDevice(num_inputs=2, num_outputs=0, realtime=False)
+    stream = device.open_stream(
+        sample_rate=48000, frames_per_buffer=block_size, sample_format='float32',
+        input_channels=2, output_channels=0,
+    )
+    with stream:
+        driver = stream.virtual_driver
+        stream.callback_handler.warn_errors = False
+        driver.inject_xrun('input_overflow')
+        wait_for(lambda: driver.xruns == 1)
+
+        input_buffer = stream.input_buffer
+        data = input_buffer.block_array()
+        sample_time = SampleTime(0, 0, block_size, 48000)
+        wait_for(lambda: input_buffer.read_block_into(data, sample_time))
+        first_block = sample_time.block
+
+        # Consume the results without creating any objects per block
+        results = deque(maxlen=0)
+        calls = map(input_buffer.read_block_into, repeat(data, nblocks), repeat(sample_time, nblocks))
+
+        def measure(it):
+            tracemalloc.reset_peak()
+            start, _ = tracemalloc.get_traced_memory()
+            results.extend(it)
+            current, peak = tracemalloc.get_traced_memory()
+            return current - start, peak - start
+
+        tracemalloc.start()
+        try:
+            # The overhead of get_traced_memory() itself
+            baseline = measure(iter(()))
+            assert measure(calls) == baseline
+        finally:
+            tracemalloc.stop()
+        assert sample_time.block > first_block
+        assert stream.callback_errors().total == 1